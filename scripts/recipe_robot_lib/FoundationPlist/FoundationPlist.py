@@ -43,10 +43,12 @@ and writePlistToString().
 
 import os
 
-from Foundation import NSData, \
-                       NSPropertyListSerialization, \
-                       NSPropertyListMutableContainersAndLeaves, \
-                       NSPropertyListXMLFormat_v1_0
+# Foundation (PyObjC) is slow to import, so these are imported by
+# _import_foundation() when they're first needed.
+NSData = None
+NSPropertyListSerialization = None
+NSPropertyListMutableContainersAndLeaves = None
+NSPropertyListXMLFormat_v1_0 = None
 
 
 class FoundationPlistException(Exception):
@@ -65,8 +67,21 @@ class NSPropertyListWriteException(FoundationPlistException):
 
 
 # private functions
+def _import_foundation():
+    '''Import the Foundation names we use, the first time they're needed.'''
+    # pylint: disable=global-statement, redefined-outer-name
+    global NSData, NSPropertyListSerialization, \
+        NSPropertyListMutableContainersAndLeaves, NSPropertyListXMLFormat_v1_0
+    if NSData is None:
+        from Foundation import NSData, \
+                               NSPropertyListSerialization, \
+                               NSPropertyListMutableContainersAndLeaves, \
+                               NSPropertyListXMLFormat_v1_0
+
+
 def _dataToPlist(data):
     '''low-level function that parses a data object into a propertyList object'''
+    _import_foundation()
     darwin_vers = int(os.uname()[2].split('.')[0])
     if darwin_vers > 10:
         (plistObject, plistFormat, error) = (
@@ -90,6 +105,7 @@ def _dataToPlist(data):
 
 def _plistToData(plistObject):
     '''low-level function that creates NSData from a plist object'''
+    _import_foundation()
     darwin_vers = int(os.uname()[2].split('.')[0])
     if darwin_vers > 10:
         (data, error) = (
@@ -111,6 +127,7 @@ def _plistToData(plistObject):
 def readPlist(filepath):
     '''Read a .plist file from filepath.  Return the unpacked root object
     (which is usually a dictionary).'''
+    _import_foundation()
     try:
         data = NSData.dataWithContentsOfFile_(filepath)
     except NSPropertyListSerializationException, error:
@@ -1,6 +1,16 @@
 # We're effectively using this package as module
+import imp
+
+# Look for Foundation without importing it, since importing it is slow.
+# (FoundationPlist imports it when it's first used.)
 try:
-    from FoundationPlist import *
-except:
+    imp.find_module("Foundation")
+except ImportError:
     print "WARNING: using 'from plistlib import *' instead of 'from FoundationPlist import *' in " + __name__
-    from plistlib import *
\ No newline at end of file
+    from plistlib import *
+    # plistlib raises these for unreadable and unwritable plists, so
+    # callers can catch the same names either way.
+    from xml.parsers.expat import ExpatError as NSPropertyListSerializationException
+    NSPropertyListWriteException = TypeError
+else:
+    from FoundationPlist import *
@@ -19,9 +19,18 @@
 
 """
 recipe_robot_lib
+
+Submodules are imported where they're used, rather than here, so that
+commands that don't need all of them (like `recipe-robot --help`) start
+up quickly.
 """
 
 
-from recipe_generator import generate_recipes
-# TODO (Shea): We can import stuff better here to cut down on length of calls.
-import tools
+def generate_recipes(facts, prefs):
+    """Generate the selected types of recipes.
+
+    See recipe_generator.generate_recipes(), which this imports when
+    it's first called.
+    """
+    from .recipe_generator import generate_recipes as _generate_recipes
+    return _generate_recipes(facts, prefs)
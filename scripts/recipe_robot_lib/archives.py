@@ -0,0 +1,371 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+archives.py
+
+Read just the parts of a zip archive that we need to inspect an app.
+
+Inspecting an app only requires a handful of files from its bundle: the
+Info.plist, the main executable (which carries the code signature), the
+_CodeSignature folder, the icon, and the App Store receipt. For a zipped
+app that's a tiny fraction of the archive. Zip archives keep a central
+directory at the end listing every member and its offset, so with
+RangeFile (a seekable file backed by HTTP Range requests) we can read
+the directory and then only the members we need, without downloading
+the rest of the archive. Local archives are read the same way, which
+saves unpacking every file in a large app just to look at a few.
+"""
+
+
+import os
+import posixpath
+import re
+import shutil
+import stat
+import zipfile
+
+from . import FoundationPlist
+from .download import RangesNotSupported
+
+
+# Smallest read, in bytes, to make from a RangeFile. Reads that follow
+# on from the previous one double this, up to MAX_READAHEAD.
+MIN_READAHEAD = 64 * 1024
+MAX_READAHEAD = 4 * 1024 * 1024
+
+# Zip downloads smaller than this aren't worth reading remotely.
+REMOTE_MIN_SIZE = 8 * 1024 * 1024
+
+# Bytes at the end of the file to fetch on the first read there. This
+# covers the zip end of central directory record (including any
+# comment) and the zip64 locator in one request.
+TAIL_SIZE = 64 * 1024 + 1024
+
+# Matches the Info.plist of an app bundle in an archive.
+APP_INFO_PLIST_RE = re.compile(r"^(?P<app>(?:.*/)?[^/]+\.app)/Contents/"
+                               r"Info\.plist$")
+
+
+class RangeFile(object):
+    """A read-only, seekable file whose contents are fetched over HTTP.
+
+    Each read is satisfied with a Range request, and sequential reads
+    fetch progressively larger chunks ahead of time, so reading a zip
+    archive's directory and a few of its members takes a few requests.
+    """
+
+    def __init__(self, session, url, size, validator=None, headers=None):
+        """Set up a RangeFile.
+
+        Args:
+            session: The HTTPSession to make requests with.
+            url: The URL of the file.
+            size: The size of the file, in bytes.
+            validator: Optional ETag or Last-Modified value. If given,
+                requests fail rather than mixing parts of different
+                versions of the file.
+            headers: Optional dictionary of headers for every request.
+        """
+        self.session = session
+        self.url = url
+        self.size = size
+        self.validator = validator
+        self.headers = {"Accept-Encoding": "identity"}
+        self.headers.update(headers or {})
+        self.bytes_fetched = 0
+        self.requests = 0
+        self._pos = 0
+        self._buffers = {"window": (0, ""), "tail": (0, "")}
+        self._readahead = MIN_READAHEAD
+        self._last_fill_end = None
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Move to a new position in the file."""
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise IOError("Invalid seek position: %s" % offset)
+        self._pos = offset
+
+    def tell(self):
+        """Return the current position in the file."""
+        return self._pos
+
+    def read(self, size=-1):
+        """Read up to size bytes (or the rest of the file)."""
+        if size is None or size < 0:
+            size = self.size
+        size = max(0, min(size, self.size - self._pos))
+        chunks = []
+        while size > 0:
+            chunk = self._read_buffered(size)
+            if not chunk:
+                self._fill(size)
+                continue
+            chunks.append(chunk)
+            self._pos += len(chunk)
+            size -= len(chunk)
+        return "".join(chunks)
+
+    def close(self):
+        """Discard buffered data."""
+        self._buffers = {"window": (0, ""), "tail": (0, "")}
+
+    def _read_buffered(self, size):
+        """Return up to size bytes at the current position from memory."""
+        for start, data in self._buffers.values():
+            offset = self._pos - start
+            if 0 <= offset < len(data):
+                return data[offset:offset + size]
+        return ""
+
+    def _fill(self, size):
+        """Fetch data at the current position into a buffer."""
+        start = max(0, self.size - TAIL_SIZE)
+        if self._pos >= start and not self._buffers["tail"][1]:
+            self._buffers["tail"] = (start, self._fetch(start, self.size))
+            return
+        if self._pos == self._last_fill_end:
+            self._readahead = min(self._readahead * 2, MAX_READAHEAD)
+        else:
+            self._readahead = MIN_READAHEAD
+        end = min(self.size, self._pos + max(size, self._readahead))
+        self._buffers["window"] = (self._pos, self._fetch(self._pos, end))
+        self._last_fill_end = end
+
+    def _fetch(self, start, end):
+        """Return bytes start up to (but not including) end."""
+        headers = dict(self.headers)
+        headers["Range"] = "bytes=%d-%d" % (start, end - 1)
+        if self.validator:
+            headers["If-Range"] = self.validator
+        response = self.session.request("GET", self.url, headers)
+        try:
+            if response.getcode() != 206:
+                raise RangesNotSupported()
+            data = response.read()
+        finally:
+            response.close()
+        self.requests += 1
+        self.bytes_fetched += len(data)
+        if len(data) != end - start:
+            raise IOError("Expected %s bytes from %s, but received %s." %
+                          (end - start, self.url, len(data)))
+        return data
+
+
+def find_app(names):
+    """Return the path of the shallowest app bundle in an archive.
+
+    Args:
+        names: List of the paths of the members of the archive.
+
+    Returns:
+        Path of the app within the archive (e.g. "Foo/Foo.app"), or
+        None if there isn't one with an Info.plist.
+    """
+    apps = []
+    for name in names:
+        match = APP_INFO_PLIST_RE.match(name)
+        if match and not name.startswith("__MACOSX/"):
+            apps.append(match.group("app"))
+    if not apps:
+        return None
+    return min(apps, key=lambda app: (app.count("/"), app))
+
+
+def find_pkg(names):
+    """Return the path of the shallowest package in an archive.
+
+    Args:
+        names: List of the paths of the members of the archive.
+
+    Returns:
+        Path of the flat or bundle package within the archive, or None.
+    """
+    pkgs = set()
+    for name in names:
+        if name.startswith("__MACOSX/"):
+            continue
+        parts = name.split("/")
+        for index, part in enumerate(parts):
+            if part.endswith(".pkg") and not part.startswith("."):
+                pkgs.add("/".join(parts[:index + 1]))
+                break
+    if not pkgs:
+        return None
+    return min(pkgs, key=lambda pkg: (pkg.count("/"), pkg))
+
+
+def members_under(zip_file, path):
+    """Return the names of the members at or inside path."""
+    return [name for name in zip_file.namelist()
+            if name == path or name.startswith(path + "/")]
+
+
+def app_skeleton_members(zip_file, app):
+    """Return the members needed to inspect an app in a zip archive.
+
+    Args:
+        zip_file: A zipfile.ZipFile.
+        app: Path of the app within the archive, as returned by
+            find_app().
+
+    Returns:
+        List of member names: the app's Info.plist, main executable,
+        code signature, icon, and App Store receipt (where present).
+    """
+    contents = app + "/Contents/"
+    info_plist = FoundationPlist.readPlistFromString(
+        zip_file.read(contents + "Info.plist"))
+    names = set(zip_file.namelist())
+    members = [name for name in app_skeleton_paths(app, info_plist)
+               if name in names]
+    members.extend(name for name in zip_file.namelist()
+                   if name.startswith(contents + "_CodeSignature/") and
+                   not name.endswith("/"))
+    return members
+
+
+def app_skeleton_paths(app, info_plist):
+    """Return the paths of the files needed to inspect an app.
+
+    Args:
+        app: Path of the app, e.g. "Foo/Foo.app".
+        info_plist: The app's Info.plist, as a dictionary.
+
+    Returns:
+        List of the paths of the app's Info.plist, main executable, code
+        resources, icon, and App Store receipt, some of which may not
+        exist. (The files in Contents/_CodeSignature are needed too.)
+    """
+    contents = app + "/Contents/"
+    wanted = [contents + "Info.plist",
+              contents + "_MASReceipt/receipt",
+              contents + "CodeResources"]
+    if info_plist.get("CFBundleExecutable"):
+        wanted.append(contents + "MacOS/" + info_plist["CFBundleExecutable"])
+    if info_plist.get("CFBundleIconFile"):
+        icon = contents + "Resources/" + info_plist["CFBundleIconFile"]
+        wanted.extend((icon, icon + ".icns"))
+    return wanted
+
+
+def extraction_path(dest_dir, name):
+    """Return the path to extract an archive member to, or None if it
+    would be written outside of dest_dir.
+
+    Absolute names, names that climb out of dest_dir with "..", and
+    names under a symlink (extracted earlier) that leads out of dest_dir
+    are all refused. Otherwise, the member's parent folders are created.
+
+    Args:
+        dest_dir: Folder being extracted into.
+        name: The member's path within the archive.
+    """
+    rel_path = posixpath.normpath(name)
+    if rel_path.startswith(("/", "../")) or rel_path in ("..", "."):
+        return None
+    dest_path = os.path.join(dest_dir, *rel_path.split("/"))
+    parent = os.path.dirname(dest_path)
+    root = os.path.realpath(dest_dir)
+    real_parent = os.path.realpath(parent)
+    if real_parent != root and not real_parent.startswith(root + os.sep):
+        return None
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    return dest_path
+
+
+def extract_members(zip_file, members, dest_dir):
+    """Extract some members of a zip archive, keeping their paths.
+
+    Unlike ZipFile.extract(), this restores symlinks and file modes
+    (such as the executable bit) from the archive. Members that would
+    be written outside of dest_dir are skipped.
+
+    Args:
+        zip_file: A zipfile.ZipFile.
+        members: List of member names to extract.
+        dest_dir: Folder to extract into.
+    """
+    for name in members:
+        info = zip_file.getinfo(name)
+        dest_path = extraction_path(dest_dir, name)
+        if dest_path is None:
+            continue
+        if name.endswith("/"):
+            if not os.path.isdir(dest_path):
+                os.makedirs(dest_path)
+            continue
+        if os.path.lexists(dest_path):
+            # Already extracted.
+            continue
+        mode = info.external_attr >> 16
+        if stat.S_ISLNK(mode):
+            os.symlink(zip_file.read(name), dest_path)
+            continue
+        source = zip_file.open(info)
+        try:
+            with open(dest_path, "wb") as dest_file:
+                shutil.copyfileobj(source, dest_file)
+        finally:
+            source.close()
+        if mode & 0o777:
+            os.chmod(dest_path, mode & 0o777)
+
+
+def extract_app_skeleton(zip_file, dest_dir):
+    """Extract just enough of the app in a zip archive to inspect it.
+
+    Args:
+        zip_file: A zipfile.ZipFile.
+        dest_dir: Folder to extract into.
+
+    Returns:
+        Tuple of (path to the extracted app, path of the app within the
+        archive), or (None, None) if the archive contains no app.
+    """
+    app = find_app(zip_file.namelist())
+    if app is None:
+        return (None, None)
+    extract_members(zip_file, app_skeleton_members(zip_file, app), dest_dir)
+    return (os.path.join(dest_dir, *app.split("/")), app)
+
+
+def materialize_app(zip_path, app, dest_dir):
+    """Extract the rest of an app whose skeleton was extracted earlier.
+
+    Args:
+        zip_path: Path to the local zip archive.
+        app: Path of the app within the archive.
+        dest_dir: Folder the skeleton was extracted into.
+
+    Returns:
+        Path to the extracted app.
+    """
+    zip_file = zipfile.ZipFile(zip_path)
+    try:
+        extract_members(zip_file, members_under(zip_file, app), dest_dir)
+    finally:
+        zip_file.close()
+    return os.path.join(dest_dir, *app.split("/"))
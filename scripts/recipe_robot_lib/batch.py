@@ -0,0 +1,292 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+batch.py
+
+Run Recipe Robot against many input paths at once, fanning the inputs
+out over a pool of worker processes.
+
+Each job gets its own Facts, its own cache folder, and its own error
+handling, so one bad input path can't take down the rest of the batch.
+"""
+
+
+import copy
+import os
+import shutil
+import signal
+import sys
+import traceback
+from multiprocessing import cpu_count, Pool, TimeoutError
+
+from .cassette import new_replay_session
+from .exceptions import RoboError, RoboException
+from .facts import Facts
+from .inspect import process_input_path
+from .network import new_session
+from .notifications import (
+    flush as flush_notifications, NullTransport, set_transport)
+from .recipe import Recipes
+from .recipe_generator import generate_recipes
+from . import robolog
+from .tools import (
+    build_report, create_dest_dirs, LogLevel, OutputMode, robo_print)
+from .tracing import tracer
+
+
+# How often (in seconds) the parent process checks for finished jobs.
+# Keeping this short keeps the batch responsive to Control-C.
+POLL_INTERVAL = 0.5
+
+# State shared with worker processes. Set by _init_worker() in each
+# worker, rather than being passed along with every job, because the
+# preferences from NSUserDefaults can't be pickled.
+_worker_args = None
+_worker_prefs = None
+_worker_session = None
+
+
+def read_batch_inputs(batch_file):
+    """Read the list of input paths for a batch run.
+
+    Blank lines and lines beginning with "#" are ignored.
+
+    Args:
+        batch_file: Path to a file containing one input path per line,
+            or "-" to read input paths from standard input.
+
+    Returns:
+        List of input path strings, in the order given.
+    """
+    if batch_file == "-":
+        lines = sys.stdin.readlines()
+    else:
+        try:
+            with open(os.path.expanduser(batch_file), "r") as openfile:
+                lines = openfile.readlines()
+        except IOError as error:
+            raise RoboError("Unable to read batch file %s." % batch_file,
+                            error)
+    input_paths = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            input_paths.append(line)
+    return input_paths
+
+
+def run_batch(input_paths, args, prefs, cache_dir, jobs=None):
+    """Generate recipes for each input path using a pool of processes.
+
+    Args:
+        input_paths: List of input path strings.
+        args: The command line arguments. Each job receives a copy with
+            input_path set to its own input path.
+        prefs: The preference dictionary, as returned by init_prefs().
+        cache_dir: The folder under which each job's cache folder is
+            created.
+        jobs: Number of worker processes to use. Defaults to the number
+            of CPUs.
+
+    Returns:
+        List of result dictionaries (see run_job()), in the same order
+        as input_paths.
+    """
+    jobs = max(1, min(jobs or cpu_count(), len(input_paths) or 1))
+    work = [(index, input_path,
+             os.path.join(cache_dir, "job-%04d" % index))
+            for index, input_path in enumerate(input_paths)]
+    robo_print("Processing %s input paths using %s worker process(es)...",
+               LogLevel.LOG, 0, len(work), jobs)
+
+    # Post anything waiting before the workers replace the bus, and
+    # output anything waiting before the workers start their own.
+    flush_notifications()
+    robolog.flush()
+
+    results = []
+    if jobs == 1:
+        # No need for the overhead of a pool.
+        _init_worker(args, prefs, ignore_interrupts=False)
+        for job in work:
+            results.append(run_job(job))
+            report_job_result(results[-1], len(results), len(work))
+    else:
+        pool = Pool(processes=jobs, initializer=_init_worker,
+                    initargs=(args, prefs))
+        try:
+            iterator = pool.imap_unordered(run_job, work)
+            while len(results) < len(work):
+                try:
+                    # A timeout is necessary in order for the parent
+                    # process to respond to KeyboardInterrupt.
+                    results.append(iterator.next(timeout=POLL_INTERVAL))
+                except TimeoutError:
+                    continue
+                report_job_result(results[-1], len(results), len(work))
+            pool.close()
+        except KeyboardInterrupt:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    results.sort(key=lambda result: result["index"])
+    return results
+
+
+def _init_worker(args, prefs, ignore_interrupts=True):
+    """Store state shared by all jobs in this worker process."""
+    # pylint: disable=global-statement
+    global _worker_args, _worker_prefs, _worker_session
+    _worker_args = args
+    _worker_prefs = prefs
+    # Jobs in the same worker share an HTTP session, so that consecutive
+    # jobs can reuse connections to the same hosts (e.g. api.github.com).
+    if getattr(args, "replay_http", None):
+        _worker_session = new_replay_session(args.replay_http)
+    else:
+        _worker_session = new_session()
+    # The app doesn't run batches, so don't post notifications for it.
+    set_transport(NullTransport())
+    if ignore_interrupts:
+        # Let the parent process handle Control-C, and terminate us.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def run_job(job):
+    """Inspect one input path and generate its recipes.
+
+    All failures are caught and recorded in the result, so that one bad
+    input path doesn't stop the rest of the batch.
+
+    Args:
+        job: A tuple of (index, input path, cache folder path).
+
+    Returns:
+        A dictionary describing the outcome of the job, which contains
+        only picklable values:
+            index: The job's position in the batch.
+            input_path: The job's input path.
+            succeeded: True if recipes were generated.
+            errors, warnings, reminders: Lists of messages.
+            recipes: List of paths to the recipes created.
+            created_count: Number of recipes newly created on disk.
+            execution_time: Seconds spent generating recipes.
+            report: The job's report, as returned by build_report().
+            trace_events: The job's spans, as Chrome trace events (if
+                --trace was given).
+    """
+    index, input_path, cache_dir = job
+    facts = Facts()
+    args = copy.copy(_worker_args)
+    args.input_path = input_path
+    facts["args"] = args
+    facts["cache_dir"] = cache_dir
+    facts["session"] = _worker_session
+    facts["recipes"] = Recipes()
+    for recipe in facts["recipes"]:
+        recipe["preferred"] = recipe["type"] in _worker_prefs["RecipeTypes"]
+
+    # Count recipes created by this job separately, so the parent can
+    # total them up at the end.
+    prefs = dict(_worker_prefs)
+    prefs["RecipeCreateCount"] = 0
+
+    # Tag this job's output, since other jobs' output is interleaved.
+    robolog.set_context(job=index + 1, input_path=input_path)
+    # Only record this job's spans.
+    tracer.reset()
+
+    succeeded = False
+    try:
+        create_dest_dirs(cache_dir)
+        with robolog.stage("inspect"):
+            process_input_path(facts)
+        with robolog.stage("generate"):
+            time, _ = generate_recipes(facts, prefs)  # pylint: disable=assignment-from-no-return
+        facts["execution_time"] = time
+        succeeded = True
+    except RoboError as error:
+        message = error.message
+        if OutputMode.debug_mode and error.error:
+            message += error.error
+        facts["errors"].append(message)
+    except SystemExit as error:
+        facts["errors"].append(
+            "Recipe Robot tried to exit (status %s) while processing this "
+            "input path." % error.code)
+    except (RoboException, Exception) as error:  # pylint: disable=broad-except
+        message = ("Recipe Robot exploded with unexpected error: %s" %
+                   error.message)
+        if args.verbose:
+            message += "\n%s" % traceback.format_exc(error)
+        facts["errors"].append(message)
+    finally:
+        if os.path.exists(cache_dir) and not args.keep_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        robolog.set_context(job=None, input_path=None)
+        # Workers exit without running atexit handlers, so make sure
+        # this job's output is written before the next job starts.
+        robolog.flush()
+
+    return {
+        "index": index,
+        "input_path": input_path,
+        "succeeded": succeeded,
+        "errors": [str(item) for item in facts["errors"]],
+        "warnings": [str(item) for item in facts["warnings"]],
+        "reminders": [str(item) for item in facts["reminders"]],
+        "recipes": [str(item) for item in facts["recipes"]
+                    if isinstance(item, basestring)],
+        "created_count": prefs["RecipeCreateCount"],
+        "execution_time": facts.get("execution_time", 0),
+        "report": build_report(facts),
+        "trace_events": tracer.chrome_events() if args.trace else []}
+
+
+def report_job_result(result, done, total):
+    """Print a one-line summary of a finished job."""
+    if result["succeeded"]:
+        robo_print("[%s/%s] Created %s recipe(s) for %s", LogLevel.LOG, 0,
+                   done, total, len(result["recipes"]), result["input_path"])
+    else:
+        robo_print("[%s/%s] Failed to create recipes for %s", LogLevel.ERROR,
+                   0, done, total, result["input_path"])
+
+
+def print_batch_summary(results):
+    """Print the outcome of each job in the batch.
+
+    Args:
+        results: List of result dictionaries, as returned by
+            run_batch().
+
+    Returns:
+        Number of failed jobs.
+    """
+    failed = [result for result in results if not result["succeeded"]]
+    robo_print("\nBatch complete: %s succeeded, %s failed.", LogLevel.LOG, 0,
+               len(results) - len(failed), len(failed))
+    for result in failed:
+        robo_print(result["input_path"], LogLevel.ERROR, 4)
+        for message in result["errors"]:
+            robo_print(message.strip().split("\n")[0], LogLevel.LOG, 8)
+    return len(failed)
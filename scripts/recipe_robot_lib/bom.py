@@ -0,0 +1,218 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+bom.py
+
+List the files a package installs, from its Bom ("bill of materials").
+
+Each component of a flat package has a Bom file alongside its Payload,
+listing the path, type, mode and size of everything in the payload. It
+is a few KB to a few MB, and can be read in milliseconds, so we can find
+the apps a package installs without decompressing its Payload.
+
+A Bom is a "BOMStore": a header, a table of numbered blocks, and a table
+of named variables pointing at blocks. The "Paths" variable points at a
+B-tree whose leaves list each path as a pair of blocks: one holding the
+path's ID and its BOMPathInfo2 block (type, mode, size, etc.), and one
+holding the ID of its parent folder and its name.
+"""
+
+
+import posixpath
+import struct
+
+
+MAGIC = "BOMStore"
+
+# magic, version, number of blocks, index offset, index length, vars
+# offset, vars length.
+HEADER_FORMAT = ">8sIIIIII"
+
+# magic, version, root block, block size, path count, unknown.
+TREE_FORMAT = ">4sIIIIB"
+
+# is leaf, count, forward (next leaf), backward (previous leaf).
+NODE_FORMAT = ">HHII"
+
+# type, unknown, architecture, mode, user, group, modification time,
+# size.
+PATH_INFO_FORMAT = ">BBHHIIII"
+
+FILE = 1
+DIRECTORY = 2
+LINK = 3
+DEVICE = 4
+
+
+class BomError(Exception):
+    """The file isn't a Bom, or is corrupt."""
+
+
+class BomEntry(object):
+    """One path listed in a Bom."""
+
+    def __init__(self, path, entry_type, mode, size):
+        """Set up a BomEntry.
+
+        Args:
+            path: Path relative to the root of the payload, without any
+                leading "./". The root itself is "".
+            entry_type: FILE, DIRECTORY, LINK or DEVICE.
+            mode: The path's file mode.
+            size: Size of the file, in bytes.
+        """
+        self.path = path
+        self.type = entry_type
+        self.mode = mode
+        self.size = size
+
+    def isdir(self):
+        """Return whether the path is a directory."""
+        return self.type == DIRECTORY
+
+    def isfile(self):
+        """Return whether the path is a regular file."""
+        return self.type == FILE
+
+
+def read_bom(path):
+    """Return the entries listed in the Bom file at path.
+
+    Raises:
+        BomError: The file isn't a Bom, or can't be parsed.
+        IOError: The file can't be read.
+    """
+    with open(path, "rb") as bom_file:
+        return parse_bom(bom_file.read())
+
+
+def parse_bom(data):
+    """Return the entries listed in a Bom.
+
+    Args:
+        data: The contents of a Bom file.
+
+    Returns:
+        List of BomEntry objects, in the order they appear in the Bom.
+
+    Raises:
+        BomError: The data isn't a Bom, or can't be parsed.
+    """
+    try:
+        return _parse_bom(data)
+    except struct.error as error:
+        raise BomError("The Bom is corrupt. (%s)" % error)
+
+
+def find_apps(entries):
+    """Return the paths of the app bundles in a list of BomEntry objects.
+
+    Apps inside other apps (such as helpers) are included.
+    """
+    return [entry.path for entry in entries
+            if entry.isdir() and entry.path.endswith(".app")]
+
+
+def top_level_apps(apps):
+    """Return the apps that aren't inside other apps, shallowest first."""
+    outer = [app for app in apps if ".app/" not in app]
+    return sorted(outer, key=lambda app: (app.count("/"), app))
+
+
+def _parse_bom(data):
+    """Parse a Bom. (See parse_bom().)"""
+    (magic, _, _, index_offset, _, vars_offset,
+     _) = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != MAGIC:
+        raise BomError("Not a Bom file.")
+
+    block_count = struct.unpack_from(">I", data, index_offset)[0]
+    blocks = [struct.unpack_from(">II", data, index_offset + 4 + 8 * index)
+              for index in range(block_count)]
+
+    def block(index):
+        """Return the data of a block."""
+        if not 0 < index < len(blocks):
+            raise BomError("The Bom refers to a missing block.")
+        address, length = blocks[index]
+        if address + length > len(data):
+            raise BomError("The Bom is truncated.")
+        return data[address:address + length]
+
+    variables = {}
+    offset = vars_offset + 4
+    for _ in range(struct.unpack_from(">I", data, vars_offset)[0]):
+        index, length = struct.unpack_from(">IB", data, offset)
+        variables[data[offset + 5:offset + 5 + length]] = index
+        offset += 5 + length
+    if "Paths" not in variables:
+        raise BomError("The Bom has no Paths.")
+
+    tree = block(variables["Paths"])
+    tree_magic, _, node_index = struct.unpack_from(TREE_FORMAT, tree)[:3]
+    if tree_magic != "tree":
+        raise BomError("The Bom's Paths aren't a tree.")
+
+    # Descend to the leftmost leaf, then follow the leaves along.
+    node = block(node_index)
+    while not struct.unpack_from(NODE_FORMAT, node)[0]:
+        node = block(struct.unpack_from(">I", node, 12)[0])
+
+    names = {}
+    records = []
+    visited = set()
+    while True:
+        _, count, forward, _ = struct.unpack_from(NODE_FORMAT, node)
+        for pair in range(count):
+            info_index, file_index = struct.unpack_from(
+                ">II", node, 12 + 8 * pair)
+            path_id, info2_index = struct.unpack_from(">II", block(info_index))
+            file_data = block(file_index)
+            parent = struct.unpack_from(">I", file_data)[0]
+            names[path_id] = (parent, file_data[4:].split("\x00", 1)[0])
+            records.append((path_id, struct.unpack_from(
+                PATH_INFO_FORMAT, block(info2_index))))
+        if not forward or forward in visited:
+            break
+        visited.add(forward)
+        node = block(forward)
+
+    paths = {}
+
+    def full_path(path_id):
+        """Return the full path of an ID, following its parents."""
+        parts = []
+        seen = set()
+        while path_id in names and path_id not in seen:
+            if path_id in paths:
+                parts.append(paths[path_id])
+                break
+            seen.add(path_id)
+            path_id, name = names[path_id]
+            parts.append(name)
+        path = posixpath.normpath("/".join(reversed(parts)).lstrip("/"))
+        return "" if path == "." else path
+
+    entries = []
+    for path_id, info in records:
+        paths[path_id] = full_path(path_id)
+        entry_type, _, _, mode, _, _, _, size = info
+        entries.append(BomEntry(paths[path_id], entry_type, mode, size))
+    return entries
@@ -0,0 +1,378 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+bundle.py
+
+AppBundle: An app being inspected, wherever its files actually are.
+
+Inspecting an app needs its Info.plist, whether it has an App Store
+receipt, its icon, and (for codesign) a real path to the whole app. The
+app might be a folder on disk, on a mounted disk image, in a zip archive,
+or in an unmounted disk image. AppBundle reads files from whichever
+source the app is in, and only puts files on local disk when a consumer
+(such as sips or codesign) needs a real path. Files on a local volume
+are hard-linked or cloned rather than copied, where possible.
+"""
+
+
+import errno
+import os
+import posixpath
+import zipfile
+
+from . import FoundationPlist
+from .archives import app_skeleton_paths, extract_members, members_under
+from . import hfsplus
+from .store import link_or_copy
+from .udif import UdifError
+
+
+class BundleError(Exception):
+    """A file in the app can't be read from its source."""
+
+
+class AppBundle(object):
+    """An app, read lazily from its source."""
+
+    def __init__(self, path, source=None):
+        """Set up an AppBundle.
+
+        Args:
+            path: Where the app is (or will be, as its files are needed)
+                on local disk.
+            source: Where to read the app's files from, if they aren't
+                at path already: a DirectorySource, ZipSource or
+                HfsSource. AppBundle takes ownership of it.
+        """
+        self.path = path
+        self.source = source
+        self._info_plist = None
+
+    @property
+    def name(self):
+        """Return the filename of the app, e.g. "Foo.app"."""
+        return os.path.basename(self.path.rstrip("/"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Release the source. Files already made local are kept."""
+        if self.source is not None:
+            self.source.close()
+            self.source = None
+
+    def exists(self, rel_path):
+        """Return whether a path (e.g. "Contents/Info.plist") exists."""
+        if self.source is not None:
+            return self.source.exists(rel_path)
+        return os.path.lexists(self._local(rel_path))
+
+    def read(self, rel_path):
+        """Return the contents of a file in the app.
+
+        Raises:
+            BundleError: The file doesn't exist, or can't be read.
+        """
+        if self.source is not None:
+            return self.source.read(rel_path)
+        try:
+            with open(self._local(rel_path), "rb") as openfile:
+                return openfile.read()
+        except IOError as error:
+            raise BundleError("Unable to read %s. (%s)" % (rel_path, error))
+
+    def info_plist(self):
+        """Return the app's Info.plist, as a dictionary.
+
+        Raises:
+            BundleError: The Info.plist is missing.
+            FoundationPlist.NSPropertyListSerializationException: The
+                Info.plist can't be parsed.
+        """
+        if self._info_plist is None:
+            self._info_plist = FoundationPlist.readPlistFromString(
+                self.read("Contents/Info.plist"))
+        return self._info_plist
+
+    def icon(self):
+        """Return the path of the app's icon file in the app, or None."""
+        icon_file = self.info_plist().get("CFBundleIconFile")
+        if not icon_file:
+            return None
+        icon = "Contents/Resources/" + icon_file
+        for candidate in (icon, icon + ".icns"):
+            if self.exists(candidate):
+                return candidate
+        return None
+
+    def local_path(self, rel_path=""):
+        """Return a real path to a file or folder in the app.
+
+        The file is copied out of the source (hard-linked or cloned if
+        possible) if it isn't on local disk yet. Folders are copied with
+        everything in them.
+
+        Args:
+            rel_path: Path within the app. Defaults to the app itself.
+
+        Raises:
+            BundleError: The path can't be copied from the source.
+        """
+        path = self._local(rel_path)
+        if self.source is not None:
+            self.source.extract(rel_path, path)
+        return path
+
+    def real_path(self):
+        """Return a real path to the app, for tools like codesign.
+
+        If the app's source is a folder, that folder is used as-is,
+        without copying anything. Otherwise this is the app on local
+        disk, which only has the files made local so far.
+        """
+        if self.source is not None and self.source.root is not None:
+            return self.source.root
+        return self.path
+
+    def is_partial(self):
+        """Return whether real_path() may be missing some of the app."""
+        return self.source is not None and self.source.root is None
+
+    def extract_skeleton(self):
+        """Make local the files needed to inspect the app's signature.
+
+        (See archives.app_skeleton_paths().) This is usually enough for
+        codesign to display the signature, without the rest of the app.
+        """
+        if not self.is_partial():
+            return
+        wanted = app_skeleton_paths("", self.info_plist())
+        wanted.append("/Contents/_CodeSignature")
+        for rel_path in wanted:
+            if self.exists(rel_path.lstrip("/")):
+                self.local_path(rel_path.lstrip("/"))
+
+    def materialize(self):
+        """Put the whole app on local disk, and return its path."""
+        return self.local_path()
+
+    def _local(self, rel_path):
+        """Return the local path for a path within the app."""
+        if not rel_path:
+            return self.path
+        return os.path.join(self.path, *rel_path.split("/"))
+
+
+class DirectorySource(object):
+    """Files of an app in a folder, such as on a mounted disk image."""
+
+    def __init__(self, root):
+        """Set up a DirectorySource.
+
+        Args:
+            root: Path of the app.
+        """
+        self.root = root
+
+    def close(self):
+        """Do nothing; there's nothing to release."""
+        pass
+
+    def exists(self, rel_path):
+        """Return whether a path exists in the app."""
+        return os.path.lexists(os.path.join(self.root, rel_path))
+
+    def read(self, rel_path):
+        """Return the contents of a file in the app."""
+        try:
+            with open(os.path.join(self.root, rel_path), "rb") as openfile:
+                return openfile.read()
+        except IOError as error:
+            raise BundleError("Unable to read %s. (%s)" % (rel_path, error))
+
+    def extract(self, rel_path, dest_path):
+        """Put a file or folder of the app at dest_path.
+
+        Files that already exist at dest_path are left alone.
+        """
+        source_path = os.path.join(self.root, rel_path)
+        try:
+            if os.path.isdir(source_path) and not os.path.islink(source_path):
+                for dirpath, dirnames, filenames in os.walk(source_path):
+                    dest_dir = os.path.join(
+                        dest_path, os.path.relpath(dirpath, source_path))
+                    _makedirs(dest_dir)
+                    # os.walk() lists symlinks to folders as folders.
+                    filenames.extend(
+                        name for name in dirnames
+                        if os.path.islink(os.path.join(dirpath, name)))
+                    for filename in filenames:
+                        _link_file(os.path.join(dirpath, filename),
+                                   os.path.join(dest_dir, filename))
+            else:
+                _makedirs(os.path.dirname(dest_path))
+                _link_file(source_path, dest_path)
+        except (IOError, OSError) as error:
+            raise BundleError("Unable to copy %s. (%s)" % (rel_path, error))
+
+
+class ZipSource(object):
+    """Files of an app in a local zip archive."""
+
+    root = None
+
+    def __init__(self, zip_path, app):
+        """Set up a ZipSource.
+
+        Args:
+            zip_path: Path of the zip archive.
+            app: Path of the app within the archive.
+        """
+        self.zip_path = zip_path
+        self.app = app
+        self._zip_file = None
+
+    def close(self):
+        """Close the archive."""
+        if self._zip_file is not None:
+            self._zip_file.close()
+            self._zip_file = None
+
+    def exists(self, rel_path):
+        """Return whether a path exists in the app."""
+        name = posixpath.join(self.app, rel_path)
+        names = self._open().namelist()
+        return name in names or name + "/" in names or any(
+            member.startswith(name + "/") for member in names)
+
+    def read(self, rel_path):
+        """Return the contents of a file in the app."""
+        try:
+            return self._open().read(posixpath.join(self.app, rel_path))
+        except (KeyError, zipfile.BadZipfile, RuntimeError,
+                IOError) as error:
+            raise BundleError("Unable to read %s. (%s)" % (rel_path, error))
+
+    def extract(self, rel_path, dest_path):
+        """Extract a file or folder of the app to dest_path.
+
+        Files that already exist at dest_path are left alone.
+        """
+        # Members are extracted keeping their paths in the archive, so
+        # find the folder that the archive's root corresponds to.
+        name = posixpath.join(self.app, rel_path).rstrip("/")
+        dest_dir = dest_path[:-len(os.path.join(*name.split("/")))]
+        try:
+            extract_members(self._open(), members_under(self._open(), name),
+                            dest_dir.rstrip(os.sep) or os.sep)
+        except (zipfile.BadZipfile, RuntimeError, IOError, OSError,
+                KeyError) as error:
+            raise BundleError("Unable to extract %s. (%s)" % (name, error))
+
+    def _open(self):
+        """Return the open ZipFile."""
+        if self._zip_file is None:
+            try:
+                self._zip_file = zipfile.ZipFile(self.zip_path)
+            except (zipfile.BadZipfile, IOError) as error:
+                raise BundleError("Unable to open %s. (%s)" %
+                                  (self.zip_path, error))
+        return self._zip_file
+
+
+class HfsSource(object):
+    """Files of an app in an (unmounted) HFS+ disk image."""
+
+    root = None
+
+    def __init__(self, image_path, app):
+        """Set up an HfsSource.
+
+        Args:
+            image_path: Path of the disk image.
+            app: Path of the app within the disk image's volume.
+        """
+        self.image_path = image_path
+        self.app = app
+        self._volume = None
+
+    def close(self):
+        """Close the disk image."""
+        if self._volume is not None:
+            self._volume.close()
+            self._volume = None
+
+    def exists(self, rel_path):
+        """Return whether a path exists in the app."""
+        return self._open().exists(posixpath.join(self.app, rel_path))
+
+    def read(self, rel_path):
+        """Return the contents of a file in the app."""
+        try:
+            return self._open().read(posixpath.join(self.app, rel_path))
+        except (KeyError, hfsplus.HfsError, UdifError) as error:
+            raise BundleError("Unable to read %s. (%s)" % (rel_path, error))
+
+    def extract(self, rel_path, dest_path):
+        """Extract a file or folder of the app to dest_path.
+
+        Files that already exist at dest_path are left alone.
+        """
+        try:
+            _makedirs(os.path.dirname(dest_path))
+            self._open().extract(posixpath.join(self.app, rel_path),
+                                 dest_path, skip_existing=True)
+        except (KeyError, hfsplus.HfsError, UdifError, IOError,
+                OSError) as error:
+            raise BundleError("Unable to extract %s. (%s)" %
+                              (rel_path, error))
+
+    def _open(self):
+        """Return the open HfsVolume."""
+        if self._volume is None:
+            try:
+                self._volume = hfsplus.open_disk_image(self.image_path)
+            except (hfsplus.HfsError, UdifError, IOError) as error:
+                raise BundleError("Unable to open %s. (%s)" %
+                                  (self.image_path, error))
+        return self._volume
+
+
+def _makedirs(path):
+    """Create a folder and its parents, if they don't exist."""
+    try:
+        os.makedirs(path)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+
+
+def _link_file(source_path, dest_path):
+    """Link, clone or copy a file, unless dest_path already exists."""
+    if os.path.lexists(dest_path):
+        return
+    if os.path.islink(source_path):
+        os.symlink(os.readlink(source_path), dest_path)
+    else:
+        link_or_copy(source_path, dest_path)
@@ -0,0 +1,405 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+cassette.py
+
+Cassette: Recorded HTTP interactions, for network-free inspection runs.
+
+A RecordingSession makes its requests over the network as usual, and
+records each request and its response (status, headers, and body) in a
+Cassette, which can be saved to a file. A ReplaySession answers the same
+requests from a loaded Cassette without touching the network, so an
+inspection can be run again, offline and at full speed, with exactly
+the responses it got the first time.
+
+Interactions are recorded at the connection level, beneath HTTPSession,
+so redirects (each hop is a request of its own), gzipped bodies, and
+bodies read a chunk at a time all replay exactly as they happened.
+Requests are matched by method, URL, and Range header. When the same
+request was made more than once, its responses are replayed in the
+order they were recorded, and the last one is repeated after that.
+
+Requests are recorded without their conditional headers, so every
+recorded response is complete, and can be replayed whatever is (or
+isn't) in the HTTP cache and download store at the time.
+
+A cassette file is a zip archive of interactions.json (each request,
+and its response's status and headers) plus each distinct body, named
+by its SHA-1 digest and compressed.
+"""
+
+
+from cStringIO import StringIO
+from urllib2 import URLError
+import hashlib
+import httplib
+import json
+import threading
+import zipfile
+
+from .exceptions import RoboError
+from .network import HTTPSession
+from .tools import atomic_write
+
+
+# Version of the cassette file format.
+CASSETTE_VERSION = 1
+
+# Request headers that make a response depend on what the client
+# already has. They're left out of recorded requests.
+CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since", "if-range",
+                       "if-match", "if-unmodified-since")
+
+# Response headers that describe the original connection, rather than
+# the response. Replayed responses get their own Content-Length.
+CONNECTION_HEADERS = ("connection", "keep-alive", "transfer-encoding",
+                      "content-length")
+
+
+class Cassette(object):
+    """A list of recorded HTTP interactions.
+
+    Each interaction is a dictionary of:
+        method: The request's method, like "GET".
+        url: The requested URL.
+        range: The request's Range header, or None.
+        status: The response's status code.
+        reason: The response's reason phrase.
+        headers: List of the response's header lines, without their
+            line endings.
+        body: The response body, as sent (i.e. still gzipped, if it was
+            sent gzipped).
+        complete: False if the body wasn't read to the end.
+    """
+
+    def __init__(self, interactions=None):
+        self.interactions = []
+        self._by_request = {}
+        self._played = {}
+        self._lock = threading.Lock()
+        for interaction in interactions or []:
+            self.add(interaction)
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def add(self, interaction):
+        """Record an interaction."""
+        key = (interaction["method"], interaction["url"],
+               interaction["range"])
+        with self._lock:
+            self.interactions.append(interaction)
+            self._by_request.setdefault(key, []).append(interaction)
+
+    def find(self, method, url, range_header=None):
+        """Return the next recorded response to a request, or None.
+
+        Args:
+            method: The request's method.
+            url: The requested URL.
+            range_header: The request's Range header, if it has one.
+        """
+        key = (method, url, range_header)
+        with self._lock:
+            matches = self._by_request.get(key)
+            if not matches:
+                return None
+            played = self._played.get(key, 0)
+            self._played[key] = played + 1
+            return matches[min(played, len(matches) - 1)]
+
+    def rewind(self):
+        """Replay every response from the start again."""
+        with self._lock:
+            self._played = {}
+
+    def save(self, path):
+        """Write the cassette to a file.
+
+        Bodies are stored once each, however many responses share them.
+        """
+        with self._lock:
+            interactions = list(self.interactions)
+        index = []
+        bodies = {}
+        for interaction in interactions:
+            entry = dict(interaction)
+            body = entry.pop("body")
+            entry["body"] = hashlib.sha1(body).hexdigest()
+            bodies[entry["body"]] = body
+            index.append(entry)
+
+        with atomic_write(path, "wb") as cassette_file:
+            with zipfile.ZipFile(cassette_file, "w",
+                                 zipfile.ZIP_DEFLATED) as archive:
+                archive.writestr("interactions.json", json.dumps(
+                    {"version": CASSETTE_VERSION, "interactions": index},
+                    encoding="latin-1", indent=1, sort_keys=True))
+                for digest, body in sorted(bodies.items()):
+                    archive.writestr("bodies/%s" % digest, body)
+
+    @classmethod
+    def load(cls, path):
+        """Read a cassette from a file written by save().
+
+        Raises:
+            ValueError: The file isn't a cassette, or is from a newer
+                version of Recipe Robot.
+        """
+        try:
+            with zipfile.ZipFile(path) as archive:
+                index = json.loads(archive.read("interactions.json"))
+                if index.get("version") != CASSETTE_VERSION:
+                    raise ValueError("Unsupported cassette version: %s" %
+                                     index.get("version"))
+                interactions = []
+                for entry in index["interactions"]:
+                    interactions.append(_decode_entry(
+                        entry, archive.read("bodies/%s" % entry["body"])))
+        except (zipfile.BadZipfile, KeyError) as error:
+            raise ValueError("%s is not a cassette: %s" % (path, error))
+        return cls(interactions)
+
+
+class RecordingSession(HTTPSession):
+    """An HTTPSession that records every interaction in a Cassette.
+
+    Requests are made over the connections HTTPSession (or the next
+    class in the method resolution order) would use, so this can be
+    mixed into other sessions.
+    """
+
+    def __init__(self, cassette, **kwargs):
+        """Set up a RecordingSession.
+
+        Args:
+            cassette: The Cassette in which to record interactions.
+            kwargs: Passed on to HTTPSession.
+        """
+        super(RecordingSession, self).__init__(**kwargs)
+        self.cassette = cassette
+
+    def _new_connection(self, key):
+        """Return a new connection that records its interactions."""
+        return _RecordingConnection(
+            super(RecordingSession, self)._new_connection(key),
+            self.cassette)
+
+
+class ReplaySession(HTTPSession):
+    """An HTTPSession that answers every request from a Cassette.
+
+    Requests that weren't recorded fail with a URLError, as if the
+    host couldn't be reached.
+    """
+
+    def __init__(self, cassette, **kwargs):
+        """Set up a ReplaySession.
+
+        Args:
+            cassette: The Cassette from which to replay responses.
+            kwargs: Passed on to HTTPSession.
+        """
+        super(ReplaySession, self).__init__(**kwargs)
+        self.cassette = cassette
+
+    def _new_connection(self, key):
+        """Return a new connection to the cassette."""
+        return _ReplayConnection(self.cassette)
+
+
+def new_replay_session(path):
+    """Return a ReplaySession for the cassette saved at path.
+
+    Raises:
+        RoboError: The cassette couldn't be read.
+    """
+    try:
+        return ReplaySession(Cassette.load(path))
+    except (IOError, ValueError) as error:
+        raise RoboError("Unable to read HTTP cassette %s. (%s)" %
+                        (path, error), error)
+
+
+def _decode_entry(entry, body):
+    """Return an interaction read from a cassette's index, with its
+    strings turned back into the byte strings that were recorded."""
+    def to_bytes(value):
+        """Encode unicode as it was decoded by save()."""
+        if isinstance(value, unicode):
+            return value.encode("latin-1")
+        return value
+
+    interaction = dict((str(key), to_bytes(value))
+                       for key, value in entry.items())
+    interaction["headers"] = [to_bytes(line) for line in entry["headers"]]
+    interaction["body"] = body
+    return interaction
+
+
+def _header(headers, name):
+    """Return the value of a request header, whatever its case."""
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+class _RecordingConnection(object):
+    """Wrap a connection, and record its interactions."""
+
+    def __init__(self, conn, cassette):
+        self._conn = conn
+        self._cassette = cassette
+        self._request = None
+        self._url = None
+
+    def request_path(self, url, path):
+        """Note the URL requested, and return the request target."""
+        self._url = url.split("#")[0]
+        return self._conn.request_path(url, path)
+
+    def connect(self):
+        self._conn.connect()
+
+    def request(self, method, path, headers):
+        headers = dict((key, value) for key, value in headers.items()
+                       if key.lower() not in CONDITIONAL_HEADERS)
+        self._request = {"method": method, "url": self._url,
+                         "range": _header(headers, "range")}
+        self._conn.request(method, path, headers)
+
+    def getresponse(self):
+        return _RecordingResponse(self._conn.getresponse(), self._request,
+                                  self._cassette)
+
+    def close(self):
+        self._conn.close()
+
+
+class _RecordingResponse(object):
+    """Wrap an httplib response, and record it as it's read.
+
+    The interaction is added to the cassette as soon as the response's
+    headers arrive (so that responses nobody reads, like most error
+    pages, are recorded too), and its body is filled in once it's been
+    read or the response is closed.
+    """
+
+    def __init__(self, raw_response, request, cassette):
+        self._raw = raw_response
+        self._chunks = []
+        self._finished = False
+        self._interaction = dict(request)
+        self._interaction.update({
+            "status": raw_response.status,
+            "reason": raw_response.reason,
+            "headers": [line.rstrip("\r\n")
+                        for line in raw_response.msg.headers],
+            "body": "",
+            "complete": False})
+        cassette.add(self._interaction)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def read(self, amt=None):
+        """Read from the response, keeping a copy of what was read."""
+        if amt is None:
+            data = self._raw.read()
+        else:
+            data = self._raw.read(amt)
+        self._chunks.append(data)
+        if not data or self._raw.isclosed():
+            self._finish(complete=True)
+        return data
+
+    def close(self):
+        """Close the response, recording as much of it as was read."""
+        self._finish(complete=self._raw.isclosed())
+        self._raw.close()
+
+    def _finish(self, complete):
+        """Fill in the recorded body (once)."""
+        if self._finished:
+            return
+        self._finished = True
+        self._interaction["body"] = "".join(self._chunks)
+        self._interaction["complete"] = complete
+
+
+class _ReplayConnection(object):
+    """A connection that reads responses from a Cassette."""
+
+    def __init__(self, cassette):
+        self._cassette = cassette
+        self._url = None
+        self._response = None
+
+    def request_path(self, url, path):
+        """Note the URL requested, and return the request target."""
+        self._url = url.split("#")[0]
+        return path
+
+    def connect(self):
+        pass
+
+    def request(self, method, path, headers):  # pylint: disable=unused-argument
+        interaction = self._cassette.find(method, self._url,
+                                          _header(headers, "range"))
+        if interaction is None:
+            raise URLError("%s %s isn't in the cassette." %
+                           (method, self._url))
+        self._response = httplib.HTTPResponse(
+            _ReplaySocket(_serialize(interaction)), method=method)
+
+    def getresponse(self):
+        response, self._response = self._response, None
+        response.begin()
+        return response
+
+    def close(self):
+        pass
+
+
+class _ReplaySocket(object):
+    """Just enough of a socket for httplib to read a response from."""
+
+    def __init__(self, data):
+        self._data = data
+
+    def makefile(self, *args, **kwargs):  # pylint: disable=unused-argument
+        return StringIO(self._data)
+
+
+def _serialize(interaction):
+    """Return a recorded response as it would be sent over HTTP/1.1."""
+    lines = ["HTTP/1.1 %d %s" % (interaction["status"],
+                                 interaction["reason"])]
+    for line in interaction["headers"]:
+        name = line.split(":", 1)[0].strip().lower()
+        if line[:1] in " \t" or name not in CONNECTION_HEADERS:
+            lines.append(line)
+        elif interaction["method"] == "HEAD" and name == "content-length":
+            # The length of the body a GET would have returned.
+            lines.append(line)
+    if interaction["method"] != "HEAD":
+        lines.append("Content-Length: %d" % len(interaction["body"]))
+    return "\r\n".join(lines) + "\r\n\r\n" + interaction["body"]
@@ -0,0 +1,284 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+commands.py
+
+Run external tools (hdiutil, codesign, pkgutil, sips, autopkg, etc.).
+
+Commands are given as argument lists, never as shell strings, so paths
+with spaces or quotes in them are passed through intact. Every pipe of
+every process is read on its own thread, so a process can't block on a
+full pipe that nobody is reading, and each command is killed if it runs
+longer than its timeout. Each command runs in a process group of its
+own, so that anything it started in turn is killed with it. The number of commands running at once is
+limited, so that running commands concurrently (see run_async()) can't
+overwhelm the machine.
+"""
+
+
+from collections import namedtuple
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from subprocess import PIPE, Popen
+import os
+import signal
+import threading
+import timeit
+
+from .tracing import span
+
+
+# Seconds a command may run before it's killed.
+DEFAULT_TIMEOUT = 10 * 60
+
+# Maximum number of commands (or pipelines) running at once.
+MAX_CONCURRENT_COMMANDS = max(2, cpu_count())
+
+# Size of the chunks in which output is read.
+READ_SIZE = 64 * 1024
+
+# Exit code reported for commands that couldn't be started, as a shell
+# would for a command that wasn't found.
+NOT_STARTED_EXITCODE = 127
+
+# Seconds to wait for the pipes of a command that has been killed to
+# close, before giving up on the rest of its output.
+KILL_GRACE = 1
+
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT_COMMANDS)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class CommandResult(namedtuple("CommandResult", ("exitcode", "out", "err"))):
+    """The outcome of a command. Unpacks as (exitcode, out, err).
+
+    Attributes:
+        exitcode: Zero upon success. Non-zero upon error, or negative
+            if the command was killed by a signal.
+        out: String from standard output.
+        err: String from standard error.
+        timed_out: Whether the command was killed for taking too long.
+    """
+
+    timed_out = False
+
+
+def run(argv, stdin="", timeout=DEFAULT_TIMEOUT, output_callback=None):
+    """Run a command, and return its exit code and output.
+
+    Args:
+        argv: The command and its arguments, e.g.
+            ["/usr/bin/hdiutil", "detach", mount_point].
+        stdin: String to send to the command's standard input.
+        timeout: Seconds after which the command is killed, or None to
+            wait as long as it takes.
+        output_callback: Function called with ("stdout", data) or
+            ("stderr", data) as output arrives, to stream it to the
+            caller. It's called on another thread.
+
+    Returns:
+        A CommandResult.
+    """
+    return run_pipeline([argv], stdin, timeout, output_callback)
+
+
+def run_pipeline(argvs, stdin="", timeout=DEFAULT_TIMEOUT,
+                 output_callback=None):
+    """Run commands with each one's output piped to the next's input.
+
+    The standard error of every command is collected, as well as the
+    standard output of the last one.
+
+    Args:
+        argvs: List of argument lists, one per command.
+        stdin: String to send to the first command's standard input.
+        timeout: Seconds after which the whole pipeline is killed, or
+            None to wait as long as it takes.
+        output_callback: As for run().
+
+    Returns:
+        A CommandResult. Its exit code is that of the last command that
+        failed, or zero if all of them succeeded (like a shell's
+        "pipefail" option), and its standard error is that of all the
+        commands, in order.
+    """
+    name = " | ".join(os.path.basename(argv[0]) for argv in argvs)
+    with span(name, "subprocess",
+              argv=" | ".join(" ".join(argv) for argv in argvs)) as trace:
+        result = _run_pipeline(argvs, stdin, timeout, output_callback)
+        trace.args["exitcode"] = result.exitcode
+    return result
+
+
+def _run_pipeline(argvs, stdin, timeout, output_callback):
+    """Run commands as described by run_pipeline()."""
+    with _slots:
+        processes = []
+        try:
+            for argv in argvs:
+                process = Popen(
+                    argv, stdin=processes[-1].stdout if processes else PIPE,
+                    stdout=PIPE, stderr=PIPE, close_fds=True,
+                    preexec_fn=os.setsid)
+                if processes:
+                    # Only the next process should hold the read end, so
+                    # that the previous one gets SIGPIPE if it exits.
+                    processes[-1].stdout.close()
+                processes.append(process)
+        except OSError as error:
+            _kill(processes)
+            for process in processes:
+                process.wait()
+            return CommandResult(NOT_STARTED_EXITCODE, "",
+                                 "Unable to run %s: %s" % (argv[0], error))
+
+        outputs = [[] for _ in range(len(processes) + 1)]
+        pipes = [process.stderr for process in processes]
+        pipes.append(processes[-1].stdout)
+        threads = [threading.Thread(target=_write_input,
+                                    args=(processes[0].stdin, stdin))]
+        for index, pipe in enumerate(pipes):
+            threads.append(threading.Thread(
+                target=_read_output,
+                args=(pipe, outputs[index],
+                      "stdout" if pipe is pipes[-1] else "stderr",
+                      output_callback)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        timed_out = threading.Event()
+        timer = None
+        deadline = None
+        if timeout is not None:
+            deadline = timeit.default_timer() + timeout
+            timer = threading.Timer(timeout, _time_out,
+                                    args=(processes, timed_out))
+            timer.daemon = True
+            timer.start()
+        try:
+            for process in processes:
+                process.wait()
+            for thread in threads:
+                thread.join(None if deadline is None else
+                            max(0, deadline - timeit.default_timer()))
+            if any(thread.is_alive() for thread in threads):
+                # Something the command started is still holding its
+                # pipes open.
+                _time_out(processes, timed_out)
+                for thread in threads:
+                    thread.join(KILL_GRACE)
+                for pipe in pipes:
+                    pipe.close()
+        finally:
+            if timer is not None:
+                timer.cancel()
+            _kill(processes)
+
+    exitcode = 0
+    for process in processes:
+        if process.returncode != 0:
+            exitcode = process.returncode
+    err = "".join("".join(chunks) for chunks in outputs[:-1])
+    if timed_out.is_set():
+        err += "Timed out after %s seconds.\n" % timeout
+    result = CommandResult(exitcode, "".join(outputs[-1]), err)
+    result.timed_out = timed_out.is_set()
+    return result
+
+
+def run_async(argv, stdin="", timeout=DEFAULT_TIMEOUT, callback=None):
+    """Start running a command on a background thread.
+
+    Args:
+        argv, stdin, timeout: As for run().
+        callback: Function called with the CommandResult when the
+            command finishes. It's called on another thread.
+
+    Returns:
+        A multiprocessing.pool.AsyncResult. Its get() method waits for
+        the command to finish and returns its CommandResult.
+    """
+    return _get_pool().apply_async(run, (argv, stdin, timeout),
+                                   callback=callback)
+
+
+def _get_pool():
+    """Return the thread pool that runs commands asynchronously."""
+    global _pool  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPool(MAX_CONCURRENT_COMMANDS)
+    return _pool
+
+
+def _write_input(pipe, data):
+    """Write data to a process's standard input, then close it."""
+    try:
+        if data:
+            pipe.write(data)
+    except IOError:
+        # The process exited without reading all of its input.
+        pass
+    finally:
+        try:
+            pipe.close()
+        except IOError:
+            pass
+
+
+def _read_output(pipe, chunks, stream, output_callback):
+    """Read a pipe until it's closed, appending what's read to chunks."""
+    try:
+        for data in iter(lambda: os.read(pipe.fileno(), READ_SIZE), ""):
+            chunks.append(data)
+            if output_callback is not None:
+                output_callback(stream, data)
+    except ValueError:
+        # The pipe was closed after its command was killed.
+        pass
+    finally:
+        pipe.close()
+
+
+def _time_out(processes, timed_out):
+    """Kill a command that has taken too long, along with anything it
+    started."""
+    timed_out.set()
+    for process in processes:
+        _kill_group(process)
+
+
+def _kill(processes):
+    """Kill any of the processes that are still running, along with
+    anything they started."""
+    for process in processes:
+        if process.poll() is None:
+            _kill_group(process)
+
+
+def _kill_group(process):
+    """Kill the process group a process leads."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        # Everything in it has exited.
+        pass
@@ -0,0 +1,359 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+download.py
+
+Download: Fetch a large file in parallel segments, resuming if interrupted.
+
+When the server accepts byte ranges, the file is split into segments
+that are fetched at the same time over separate connections, which gets
+around CDNs that throttle each connection. Progress is written to a
+".partial" file and a JSON sidecar describing how much of each segment
+has arrived, so a download that's interrupted (by a dropped connection,
+or by quitting Recipe Robot) picks up where it left off next time,
+provided the file hasn't changed on the server.
+
+Servers that don't accept ranges, or don't say how big the file is, get
+a plain single-stream download instead.
+"""
+
+
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+from urllib2 import HTTPError, URLError
+import errno
+import fcntl
+import hashlib
+import httplib
+import json
+import os
+import shutil
+import socket
+import threading
+
+from .tools import atomic_write
+
+
+# Number of segments to fetch at once.
+SEGMENT_COUNT = 4
+
+# Files smaller than twice this size aren't worth splitting up.
+MIN_SEGMENT_SIZE = 1024 * 1024
+
+# Size of the blocks in which response bodies are read.
+BLOCK_SIZE = 64 * 1024
+
+# Number of times to retry a segment after a dropped connection.
+MAX_RETRIES = 3
+
+# Bytes to receive between saves of the sidecar file.
+STATE_SAVE_INTERVAL = 4 * 1024 * 1024
+
+
+class RangesNotSupported(Exception):
+    """The server ignored a Range request and sent the whole file."""
+
+
+class DownloadCancelled(Exception):
+    """Another segment failed, so this one stopped early."""
+
+
+class Download(object):
+    """Download one URL to a file, in parallel segments if possible."""
+
+    def __init__(self, session, url, dest_path, partial_dir, headers=None,
+                 segments=SEGMENT_COUNT, progress=None):
+        """Set up a Download.
+
+        Args:
+            session: The HTTPSession to make requests with.
+            url: The URL to download.
+            dest_path: Where to put the file once it's complete.
+            partial_dir: Folder in which to keep incomplete downloads,
+                so that they can be resumed by a later run.
+            headers: Optional dictionary of headers for every request.
+            segments: Number of segments to fetch at once.
+            progress: Optional function to call with (bytes received,
+                total bytes) as the download progresses. Total bytes is
+                0 if unknown.
+        """
+        self.session = session
+        self.url = url
+        self.dest_path = dest_path
+        self.headers = {"Accept-Encoding": "identity"}
+        self.headers.update(headers or {})
+        self.segment_count = segments
+        self.progress = progress
+        if isinstance(url, unicode):
+            url = url.encode("utf-8")
+        key = hashlib.sha1(url).hexdigest()
+        self.partial_path = os.path.join(partial_dir, key + ".partial")
+        self.state_path = self.partial_path + ".json"
+        self.size = 0
+        self.validator = None
+        self.segments = []
+        self.received = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._cancelled = False
+
+    def run(self, response):
+        """Finish the download that response started.
+
+        Args:
+            response: The (unread) response to a GET request for the
+                URL. If the file is segmented, it's closed and the
+                segments are requested separately.
+
+        Returns:
+            The size of the downloaded file, in bytes.
+
+        Raises:
+            URLError, HTTPError: A request failed.
+            IOError: The downloaded file isn't the expected size.
+        """
+        headers = response.info()
+        self.size = int(headers.getheader("Content-Length") or 0)
+        # Only resume if we can be sure the file hasn't changed since.
+        self.validator = (headers.getheader("ETag") or
+                          headers.getheader("Last-Modified"))
+        accepts_ranges = (
+            headers.getheader("Accept-Ranges", "").lower() == "bytes")
+        if not (accepts_ranges and self.size and self.validator):
+            return self._stream(response)
+
+        with _locked(self.partial_path + ".lock") as locked:
+            if not locked:
+                # Another process is downloading the same file. Don't
+                # trample on its partial file.
+                return self._stream(response)
+            resuming = self._load_state()
+            if not resuming and self.size < 2 * MIN_SEGMENT_SIZE:
+                return self._stream(response)
+            response.close()
+            try:
+                self._fetch_segments(resuming)
+            except RangesNotSupported:
+                # Perhaps the file changed since the partial download
+                # began. Either way, start again from scratch.
+                self._discard_partial()
+                return self._stream(self.session.open(self.url, self.headers))
+
+            shutil.move(self.partial_path, self.dest_path)
+            _remove(self.state_path)
+        return self.size
+
+    def _stream(self, response):
+        """Download the whole file over a single connection."""
+        self.received = 0
+        try:
+            with open(self.dest_path, "wb") as dest_file:
+                while True:
+                    data = response.read(BLOCK_SIZE)
+                    if not data:
+                        break
+                    dest_file.write(data)
+                    self._advance(None, len(data))
+        finally:
+            response.close()
+        self._verify_size(os.path.getsize(self.dest_path))
+        return self.received
+
+    def _fetch_segments(self, resuming):
+        """Fetch all the remaining segments into the partial file."""
+        if not resuming:
+            segment_size = max(MIN_SEGMENT_SIZE,
+                               -(-self.size // self.segment_count))
+            self.segments = [
+                [start, min(start + segment_size, self.size), 0]
+                for start in range(0, self.size, segment_size)]
+            with open(self.partial_path, "wb") as partial_file:
+                partial_file.truncate(self.size)
+            self._save_state()
+        self.received = sum(segment[2] for segment in self.segments)
+        self._report_progress()
+
+        def fetch(index):
+            """Return the exception fetching a segment raised, or None."""
+            try:
+                self._fetch_segment(self.segments[index])
+            except Exception as err:  # pylint: disable=broad-except
+                # Stop the other segments early. The partial file keeps
+                # what they've received so far.
+                self._cancelled = True
+                return err
+            return None
+
+        pending = [index for index, segment in enumerate(self.segments)
+                   if segment[0] + segment[2] < segment[1]]
+        pool = ThreadPool(max(1, len(pending)))
+        try:
+            # A timeout is necessary in order for the main thread to
+            # respond to KeyboardInterrupt.
+            errors = pool.map_async(fetch, pending).get(60 * 60 * 24 * 365)
+        except KeyboardInterrupt:
+            self._cancelled = True
+            self._save_state()
+            raise
+        pool.close()
+        pool.join()
+        self._save_state()
+
+        errors = [err for err in errors if err is not None and
+                  not isinstance(err, DownloadCancelled)]
+        for err in errors:
+            if isinstance(err, RangesNotSupported):
+                raise err
+        if errors:
+            raise errors[0]
+        self._verify_size(self.received)
+
+    def _fetch_segment(self, segment):
+        """Fetch one segment, retrying if the connection drops."""
+        start, end, _ = segment
+        retries = 0
+        with open(self.partial_path, "r+b", 0) as partial_file:
+            while start + segment[2] < end:
+                if self._cancelled:
+                    raise DownloadCancelled()
+                headers = dict(self.headers)
+                headers["Range"] = "bytes=%d-%d" % (start + segment[2],
+                                                    end - 1)
+                headers["If-Range"] = self.validator
+                try:
+                    response = self.session.request("GET", self.url, headers)
+                    try:
+                        if response.getcode() != 206:
+                            raise RangesNotSupported()
+                        self._copy_range(response, partial_file, segment)
+                    finally:
+                        response.close()
+                except HTTPError:
+                    raise
+                except (URLError, socket.error, httplib.HTTPException):
+                    retries += 1
+                    if retries > MAX_RETRIES:
+                        raise
+                    continue
+                if start + segment[2] < end and not self._cancelled:
+                    # The server closed the connection early.
+                    retries += 1
+                    if retries > MAX_RETRIES:
+                        raise IOError("Connection closed before segment "
+                                      "was complete.")
+
+    def _copy_range(self, response, partial_file, segment):
+        """Write a range response into its place in the partial file."""
+        start, end, _ = segment
+        partial_file.seek(start + segment[2])
+        while start + segment[2] < end and not self._cancelled:
+            data = response.read(min(BLOCK_SIZE, end - start - segment[2]))
+            if not data:
+                break
+            partial_file.write(data)
+            self._advance(segment, len(data))
+
+    def _advance(self, segment, count):
+        """Record that count more bytes of segment have arrived."""
+        with self._lock:
+            if segment is not None:
+                segment[2] += count
+            self.received += count
+            self._unsaved += count
+            save = segment is not None and self._unsaved >= STATE_SAVE_INTERVAL
+        if save:
+            self._save_state()
+        self._report_progress()
+
+    def _report_progress(self):
+        """Tell the progress function how far along we are."""
+        if self.progress is not None:
+            self.progress(self.received, self.size)
+
+    def _verify_size(self, size):
+        """Make sure we got as many bytes as the server said we would."""
+        if self.size and size != self.size:
+            raise IOError("Download is incomplete: expected %s bytes, but "
+                          "received %s." % (self.size, size))
+
+    def _load_state(self):
+        """Load the sidecar of a partial download of the same file.
+
+        Returns:
+            True if there's a partial download to resume.
+        """
+        try:
+            with open(self.state_path, "r") as state_file:
+                state = json.load(state_file)
+            partial_size = os.path.getsize(self.partial_path)
+        except (IOError, OSError, ValueError):
+            self._discard_partial()
+            return False
+        if (state.get("url") != self.url or state.get("size") != self.size or
+                state.get("validator") != self.validator or
+                partial_size != self.size):
+            self._discard_partial()
+            return False
+        self.segments = state["segments"]
+        return True
+
+    def _save_state(self):
+        """Write the sidecar describing the partial download."""
+        with self._lock:
+            state = {"url": self.url, "size": self.size,
+                     "validator": self.validator,
+                     "segments": [list(segment) for segment in self.segments]}
+            self._unsaved = 0
+            try:
+                with atomic_write(self.state_path) as state_file:
+                    json.dump(state, state_file)
+            except (IOError, OSError):
+                # Worst case, the download can't be resumed.
+                pass
+
+    def _discard_partial(self):
+        """Remove any partial download and its sidecar."""
+        _remove(self.partial_path)
+        _remove(self.state_path)
+
+
+@contextmanager
+def _locked(path):
+    """Try to lock path without waiting, and yield whether we did."""
+    with open(path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError as error:
+            if error.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _remove(path):
+    """Remove a file, ignoring errors."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -20,166 +20,295 @@
 """
 facts.py
 
-Facts is a dictionary-like object that defines recipe-robot specific
-MutableSequences; NotifyingList and NoisyNotifyingList.
-
-The NotifyingList is used to post a NSNotification whenever a value is
-set or inserted.
-
-The NoisyNotifyingList posts NSNotifications under the same conditions,
-but also robo_prints the message as well.
+Facts: Everything Recipe Robot learns about an input path.
+
+Facts is a dictionary-like object whose keys are declared, along with
+the type of value each holds, in FACT_SCHEMA. Values are stored as
+plain Python objects in the Facts instance's slots, so reading and
+writing a fact costs about as much as a dictionary lookup, and holding
+many Facts (as batch mode does) costs little memory. Setting a fact
+that isn't in the schema, or setting one to the wrong type of value,
+raises an error.
+
+Every change is recorded as a Change in the Facts' append-only
+journal, and passed to the Facts' observers. By default, these print
+errors, warnings, and reminders as they're added (print_messages()),
+and send facts to the Recipe Robot app (notify_app()).
+
+FactList: A list that records items added to it in its Facts' journal.
 """
 
 
-# pylint: disable=no-name-in-module
-from Foundation import (NSDistributedNotificationCenter,
-                        NSNotificationDeliverImmediately)
-# pylint: enable=no-name-in-module
-
-from .roboabc import RoboDict, RoboList
-from .tools import (LogLevel, robo_print)
-
-
-# pylint: disable=too-few-public-methods
-class NotificationMixin(object):
-    """Adds a send_notification method to Notifying classes."""
-
-    def send_notification(self, message):
-        """Send an NSNotification to our stored center."""
-        if isinstance(message, unicode):
-            message = message.encode("utf-8")
-        userInfo = {"message": message}  # pylint: disable=invalid-name
-        self.notification_center.postNotificationName_object_userInfo_options_(
-            "com.elliotjordan.recipe-robot.dnc.%s" % self.message_type,
-            None,
-            userInfo,
-            NSNotificationDeliverImmediately)
+from collections import namedtuple, OrderedDict
+from operator import attrgetter
+
+from . import notifications
+from .tools import LogLevel, robo_print
+
+
+# The facts we collect, and the type of value each one holds. Strings
+# are stored UTF-8 encoded. Lists are stored as FactLists, so that
+# items added to them are journaled too. Any fact may be set to None.
+FACT_SCHEMA = OrderedDict((
+    ("app_bundle", object),
+    ("app_file", basestring),
+    ("app_name", basestring),
+    ("app_name_key", basestring),
+    ("app_path", basestring),
+    ("args", object),
+    ("bitbucket_repo", basestring),
+    ("blocking_applications", list),
+    ("bundle_id", basestring),
+    ("cache_dir", basestring),
+    ("codesign_authorities", list),
+    ("codesign_reqs", basestring),
+    ("description", basestring),
+    ("developer", basestring),
+    ("download_filename", basestring),
+    ("download_format", basestring),
+    ("download_store", object),
+    ("download_url", basestring),
+    ("errors", list),
+    ("execution_time", object),
+    ("github_repo", basestring),
+    ("icon_path", basestring),
+    ("icons", list),
+    ("input_path", basestring),
+    # Names of the inspections that have been run, such as "app".
+    ("inspections", set),
+    ("is_from_app_store", bool),
+    ("recipe_dest_dir", basestring),
+    # A FactList of the recipes created, until setup() replaces it
+    # with a Recipes object.
+    ("recipes", object),
+    ("relative_path", basestring),
+    ("reminders", list),
+    ("session", object),
+    ("sourceforge_id", object),
+    ("sparkle_feed", basestring),
+    ("sparkle_provides_version", bool),
+    ("specify_filename", bool),
+    # User-Agent header the download server insists on, if any.
+    ("user-agent", basestring),
+    ("version_key", basestring),
+    ("warnings", list),
+))
+
+# Lists whose items are sent to the app as their own message type,
+# rather than as "information".
+MESSAGE_TYPES = ("errors", "icons", "recipes", "reminders", "warnings")
+
+# Lists whose items are printed as they're added, and the log level
+# they're printed at.
+PRINTED_MESSAGES = {"errors": LogLevel.ERROR,
+                    "reminders": LogLevel.REMINDER,
+                    "warnings": LogLevel.WARNING}
+
+# Each fact is stored in a slot named after it, with a leading
+# underscore so that facts can't clash with Facts' methods (and dashes
+# replaced, since slot names must be identifiers).
+_SLOT_NAMES = dict((key, "_" + key.replace("-", "_")) for key in FACT_SCHEMA)
+_GETTERS = dict((key, attrgetter(slot)) for key, slot in _SLOT_NAMES.items())
+
+
+class Change(namedtuple("Change", ("key", "action", "value"))):
+    """A change to a fact.
+
+    Attributes:
+        key: The name of the fact.
+        action: "set" if the fact was set to value, "delete" if it was
+            deleted (and value is None), or "add" if value was added
+            to the fact's list.
+        value: The new value.
+    """
+    __slots__ = ()
 
 
-# pylint: enable=too-few-public-methods
-class Facts(RoboDict):
+class Facts(object):
     """Dictionary-like object for holding all of recipe-robot's data.
 
-    To aid in intercommunication with the App, all dictionary values
-    are cast to notification-sending subclassed-variants of that type.
-
-    i.e. lists -> NotifyingList, str -> NotifyingString.
+    Attributes:
+        journal: List of every Change made to the facts, in order.
     """
-    default_suffix = "information"
 
-    def __init__(self):
-        """Set up a Fact instance with required list-like objects."""
-        super(Facts, self).__init__()
-        self._dict.update({"errors": NoisyNotifyingList("errors"),
-                           "reminders": NoisyNotifyingList("reminders"),
-                           "warnings": NoisyNotifyingList("warnings"),
-                           "recipes": NotifyingList("recipes"),
-                           "icons": NotifyingList("icons"),})
+    __slots__ = ("journal", "_observers") + tuple(_SLOT_NAMES.values())
 
-    def __setitem__(self, key, val):
-        if isinstance(val, basestring):
-            val = NotifyingString(self.default_suffix, val)
-        elif isinstance(val, list):
-            val = NotifyingList(self.default_suffix, val)
-        elif isinstance(val, bool):
-            val = NotifyingBool(self.default_suffix, val)
-        super(Facts, self).__setitem__(key, val)
-
-    def is_from_app_store(self):
-        """Can't make this recipe if the app is from the App Store."""
-        return self["is_from_app_store"]
-
-
-# pylint: disable=too-few-public-methods, too-many-ancestors
-class NotifyingList(NotificationMixin, RoboList):
-    """A list that robo_prints and sends NSNotifications on changes"""
-
-    def __init__(self, message_type, iterable=None):
-        """Set up NotifyingList for use.
+    def __init__(self, observers=None):
+        """Set up a Facts instance with required list-like objects.
 
         Args:
-            message_type: String name appended to message identifier.
-            iterable: Optional iterable to use to fill the instance.
+            observers: List of callables that are passed each Change as
+                it's made. Defaults to print_messages() and
+                notify_app().
         """
-        super(NotifyingList, self).__init__(iterable)
-        # NSDistributedNotificationCenter is the NotificationCenter
-        # that allows messages to be sent between applications.
-        self.notification_center = (
-            NSDistributedNotificationCenter.defaultCenter())
-        self.message_type = message_type
-
-    def __setitem__(self, index, val):
-        """Set val at index, and send a notification with that val."""
-        super(NotifyingList, self).__setitem__(index, val)
-        self.send_notification(str(val))
+        self.journal = []
+        if observers is None:
+            observers = [print_messages, notify_app]
+        self._observers = list(observers)
+        for key in ("errors", "reminders", "warnings", "recipes", "icons"):
+            setattr(self, _SLOT_NAMES[key], FactList(self, key))
+
+    def subscribe(self, observer):
+        """Pass each Change made from now on to observer."""
+        self._observers.append(observer)
+
+    def record(self, key, action, value):
+        """Add a Change to the journal, and pass it to the observers."""
+        change = Change(key, action, value)
+        self.journal.append(change)
+        for observer in self._observers:
+            observer(change)
+
+    def __getitem__(self, key):
+        try:
+            return _GETTERS[key](self)
+        except AttributeError:
+            raise KeyError(key)
 
-    def insert(self, index, val):
-        """Insert val before index, and send a notification with val."""
-        super(NotifyingList, self).insert(index, val)
-        self.send_notification(str(val))
+    def __setitem__(self, key, val):
+        try:
+            expected_type = FACT_SCHEMA[key]
+        except KeyError:
+            raise KeyError("%s is not a known fact." % key)
+        if val is not None and expected_type is not object:
+            if expected_type is list:
+                if not isinstance(val, FactList) or val.facts is not self:
+                    val = FactList(self, key, val)
+            elif not isinstance(val, expected_type):
+                raise TypeError("The %s fact must be a %s, not %r." % (
+                    key, expected_type.__name__, val))
+            elif isinstance(val, unicode):
+                val = val.encode("utf-8")
+        setattr(self, _SLOT_NAMES[key], val)
+        self.record(key, "set", val)
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, _SLOT_NAMES[key])
+        except AttributeError:
+            raise KeyError(key)
+        self.record(key, "delete", None)
+
+    def __contains__(self, key):
+        try:
+            _GETTERS[key](self)
+        except (AttributeError, KeyError):
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return repr(dict(self.iteritems()))
+
+    def get(self, key, default=None):
+        """Return the value of a fact, or default if it isn't set."""
+        try:
+            return _GETTERS[key](self)
+        except (AttributeError, KeyError):
+            return default
+
+    def pop(self, key, *default):
+        """Remove a fact and return its value.
+
+        If the fact isn't set, return default if it's given, or else
+        raise KeyError.
+        """
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def keys(self):
+        """Return a list of the facts that are set."""
+        return [key for key in FACT_SCHEMA if key in self]
+
+    def iteritems(self):
+        """Iterate over the (key, value) pairs of the facts that are set."""
+        for key in FACT_SCHEMA:
+            value = self.get(key, self)
+            if value is not self:
+                yield key, value
+
+    def items(self):
+        """Return a list of (key, value) pairs of the facts that are set."""
+        return list(self.iteritems())
 
+    def is_from_app_store(self):
+        """Can't make this recipe if the app is from the App Store."""
+        return self["is_from_app_store"]
 
-class NoisyNotifyingList(NotifyingList):
-    """A NotifyingList that robo_prints when updated."""
 
-    def send_notification(self, message):
-        """Notify that an item has been set, and robo_print it."""
-        super(NoisyNotifyingList, self).send_notification(message)
-        log_level = LogLevel.__getattribute__(
-            LogLevel, self.message_type.rstrip("s").upper())
-        robo_print(message, log_level)
+class FactList(list):
+    """A list that records items added to it in its Facts' journal.
 
+    Attributes:
+        facts: The Facts the list belongs to.
+        key: The name of the fact the list is stored as.
+    """
 
-class NotifyingString(NotificationMixin, str):
-    """A string that sends notifications."""
+    __slots__ = ("facts", "key")
 
-    def __new__(cls, message_type, text=""):
-        """Set up NotifyingString for use.
+    def __init__(self, facts, key, iterable=()):
+        super(FactList, self).__init__(iterable)
+        self.facts = facts
+        self.key = key
 
-        Args:
-            message_type: String name appended to message identifier.
-            text: Optional string to use to fill the instance.
-        """
-        instance = super(NotifyingString, cls).__new__(cls, text.encode("utf-8"))
-        instance.message_type = message_type
-        return instance
+    def __setitem__(self, index, val):
+        """Set val at index, and record the change."""
+        super(FactList, self).__setitem__(index, val)
+        self.facts.record(self.key, "add", val)
 
-    # pylint: disable=unused-argument
-    def __init__(self, message_type, text=""):
-        """Set up NotifyingString for use.
+    def append(self, val):
+        """Append val, and record the change."""
+        super(FactList, self).append(val)
+        self.facts.record(self.key, "add", val)
 
-        Args:
-            message_type: String name appended to message identifier.
-            text: Optional string to use to fill the instance.
-        """
-        # NSDistributedNotificationCenter is the NotificationCenter
-        # that allows messages to be sent between applications.
-        self.notification_center = (
-            NSDistributedNotificationCenter.defaultCenter())
-        self.send_notification(text)
-        super(NotifyingString, self).__init__(self, text)
+    def insert(self, index, val):
+        """Insert val before index, and record the change."""
+        super(FactList, self).insert(index, val)
+        self.facts.record(self.key, "add", val)
 
-    # pylint: enable=unused-argument
+    def extend(self, iterable):
+        """Append each item of iterable, and record the changes."""
+        for val in iterable:
+            self.append(val)
 
+    def __iadd__(self, iterable):
+        self.extend(iterable)
+        return self
 
-class NotifyingBool(NotificationMixin, object):
-    """A bool that sends notifications."""
 
-    def __new__(cls, message_type, val):
-        """Set up NotifyingBool for use.
+def print_messages(change):
+    """Print errors, warnings, and reminders as they're added."""
+    if change.action == "add" and change.key in PRINTED_MESSAGES:
+        robo_print(_message(change.value), PRINTED_MESSAGES[change.key])
 
-        Args:
-            message_type: String name appended to message identifier.
-            val: True or False
-        """
-        instance = super(NotifyingBool, cls).__new__(cls)
-        instance.message_type = message_type
-        # NSDistributedNotificationCenter is the NotificationCenter
-        # that allows messages to be sent between applications.
-        instance.notification_center = (
-            NSDistributedNotificationCenter.defaultCenter())
-        instance.send_notification(val)
-        return bool(val)
 
+def notify_app(change):
+    """Send new facts, and items added to lists, to the app.
 
-# pylint: enable=too-few-public-methods, too-many-ancestors
+    Facts set to strings and bools are sent as "information" messages.
+    Items added to the lists in MESSAGE_TYPES are sent as that type of
+    message, and items added to other lists as "information".
+    """
+    if change.action == "add":
+        message_type = (change.key if change.key in MESSAGE_TYPES
+                        else "information")
+        notifications.send_notification(message_type, _message(change.value))
+    elif (change.action == "set" and
+          isinstance(change.value, (basestring, bool))):
+        notifications.send_notification("information", change.value)
+
+
+def _message(value):
+    """Return value as a string, without encoding it if it is one."""
+    return value if isinstance(value, basestring) else str(value)
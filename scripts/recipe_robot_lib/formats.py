@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+formats.py
+
+Identify the format of a downloaded file from its contents.
+
+Download URLs and filenames don't reliably say what a file is, and
+finding out by trying to mount it, then unzip it, then untar it costs a
+subprocess (and sometimes a partial extraction) per wrong guess. Almost
+every format we handle can be recognized from a few bytes at the start
+or end of the file instead.
+"""
+
+
+import mmap
+import os
+
+
+DMG = "dmg"
+ISO = "iso"
+ZIP = "zip"
+GZIP = "gzip"
+BZIP2 = "bzip2"
+XZ = "xz"
+XAR = "xar"
+XML = "xml"
+
+# The download_format (see tools.SUPPORTED_ARCHIVE_FORMATS) to use for
+# each archive format that inspect_archive() can unpack.
+ARCHIVE_FORMATS = {ZIP: "zip", GZIP: "tgz", BZIP2: "tbz"}
+
+# Bytes at the start of the file to examine. ISO 9660 volumes have
+# their identifier in the volume descriptor at 0x8001.
+HEAD_SIZE = 0x8006
+
+# UDIF disk images end with a 512 byte "koly" trailer.
+TAIL_SIZE = 512
+
+ISO_MAGIC_OFFSET = 0x8001
+
+# Magic bytes at the start of the file, and the formats they indicate.
+HEAD_MAGIC = (
+    ("xar!", XAR),
+    ("PK\x03\x04", ZIP),
+    ("PK\x05\x06", ZIP),  # Empty zip archive.
+    ("\x1f\x8b", GZIP),
+    ("BZh", BZIP2),
+    ("\xfd7zXZ\x00", XZ),
+)
+
+
+def sniff_format(path):
+    """Return the format of the file at path, judging by its contents.
+
+    Only the first and last few KB of the file are read, through a
+    memory map where possible.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        One of the format constants in this module, or None if the
+        format isn't recognized.
+    """
+    with open(path, "rb") as openfile:
+        size = os.fstat(openfile.fileno()).st_size
+        if size == 0:
+            return None
+        try:
+            mapped = mmap.mmap(openfile.fileno(), 0, access=mmap.ACCESS_READ)
+        except (mmap.error, OverflowError, ValueError):
+            head = openfile.read(HEAD_SIZE)
+            openfile.seek(max(0, size - TAIL_SIZE))
+            tail = openfile.read(TAIL_SIZE)
+        else:
+            try:
+                head = mapped[:HEAD_SIZE]
+                tail = mapped[max(0, size - TAIL_SIZE):]
+            finally:
+                mapped.close()
+    return sniff_bytes(head, tail)
+
+
+def sniff_bytes(head, tail):
+    """Return the format indicated by the start and end of a file.
+
+    Args:
+        head: The first HEAD_SIZE bytes of the file (or all of it).
+        tail: The last TAIL_SIZE bytes of the file (or all of it).
+
+    Returns:
+        One of the format constants in this module, or None.
+    """
+    # Check the trailer first, since the data in a disk image can start
+    # with anything.
+    if tail[-TAIL_SIZE:].startswith("koly"):
+        return DMG
+    for magic, file_format in HEAD_MAGIC:
+        if head.startswith(magic):
+            return file_format
+    if head[ISO_MAGIC_OFFSET:ISO_MAGIC_OFFSET + 5] == "CD001":
+        return ISO
+    text = head[:1024].lstrip("\xef\xbb\xbf \t\r\n")
+    if text.startswith(("<?xml", "<rss")):
+        return XML
+    return None
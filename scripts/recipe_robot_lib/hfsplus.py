@@ -0,0 +1,686 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+hfsplus.py
+
+HfsVolume: Read files from an HFS+ volume without mounting it.
+
+Mounting a disk image with hdiutil is slow, only works on macOS, and
+goes through the disk arbitration daemon, which handles one image at a
+time. Most of the disk images we download hold an HFS+ volume, and to
+inspect the app on it we only need a few of its files. HfsVolume reads
+the volume header, then looks paths up in the catalog B-tree, and reads
+files through their extents (including those in the extents overflow
+file). Files compressed with HFS+ compression (decmpfs) are supported
+if they use zlib.
+
+open_disk_image() finds the HFS+ volume in a UDIF disk image.
+"""
+
+
+import os
+import posixpath
+import stat
+import struct
+import unicodedata
+import zlib
+from functools import wraps
+from StringIO import StringIO
+
+from .udif import UdifImage, UdifError
+
+
+# Offset of the volume header from the start of the volume.
+VOLUME_HEADER_OFFSET = 1024
+SIGNATURES = ("H+", "HX")
+
+# Offsets in the volume header.
+BLOCK_SIZE_OFFSET = 40
+EXTENTS_FORK_OFFSET = 192
+CATALOG_FORK_OFFSET = 272
+ATTRIBUTES_FORK_OFFSET = 352
+
+# Catalog node IDs.
+ROOT_FOLDER_ID = 2
+EXTENTS_FILE_ID = 3
+CATALOG_FILE_ID = 4
+ATTRIBUTES_FILE_ID = 8
+
+# Catalog record types.
+FOLDER_RECORD = 1
+FILE_RECORD = 2
+
+# B-tree node kinds.
+INDEX_NODE = 0
+LEAF_NODE = -1
+
+# B-tree header attribute: index nodes have variable-length keys.
+VARIABLE_INDEX_KEYS = 0x4
+
+# Fork types in the extents overflow file.
+DATA_FORK = 0x00
+RESOURCE_FORK = 0xff
+
+# BSD flag of files compressed with HFS+ compression.
+UF_COMPRESSED = 0x20
+
+# Folder that holds the targets of hard links.
+PRIVATE_DATA_FOLDER = u"\x00\x00\x00\x00HFS+ Private Data"
+
+DECMPFS_XATTR = u"com.apple.decmpfs"
+
+# Size of the blocks in which file data is copied.
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# Limit on the number of symlinks followed while looking up a path.
+MAX_SYMLINKS = 16
+
+
+class HfsError(Exception):
+    """The volume isn't HFS+, or can't be read."""
+
+
+def _malformed_as_hfs_error(func):
+    """Raise the struct.errors of parsing a malformed volume as
+    HfsErrors, which callers expect."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        """Call func, converting struct.error."""
+        try:
+            return func(*args, **kwargs)
+        except struct.error as error:
+            raise HfsError("The volume is malformed. (%s)" % error)
+    return wrapper
+
+
+class HfsEntry(object):
+    """A file, folder or symlink in an HFS+ volume."""
+
+    def __init__(self, name, record):
+        """Set up an HfsEntry from its catalog record.
+
+        Args:
+            name: The entry's name.
+            record: The data of its file or folder catalog record.
+        """
+        self.name = name
+        self.record = record
+        (record_type, _, _, self.cnid) = struct.unpack_from(">hHII", record)
+        self.owner_flags, mode = struct.unpack_from(">xBH", record, 40)
+        if record_type == FOLDER_RECORD:
+            self.mode = mode if stat.S_ISDIR(mode) else stat.S_IFDIR | 0o755
+            self.size = 0
+        else:
+            if not stat.S_IFMT(mode):
+                mode |= stat.S_IFREG | 0o644
+            self.mode = mode
+            self.size = struct.unpack_from(">Q", record, 88)[0]
+        self.file_type = record[48:52] if record_type == FILE_RECORD else ""
+        self.creator = record[52:56] if record_type == FILE_RECORD else ""
+
+    def isdir(self):
+        """Return whether the entry is a folder."""
+        return stat.S_ISDIR(self.mode)
+
+    def isfile(self):
+        """Return whether the entry is a regular file."""
+        return stat.S_ISREG(self.mode)
+
+    def islink(self):
+        """Return whether the entry is a symlink."""
+        return stat.S_ISLNK(self.mode)
+
+    def is_compressed(self):
+        """Return whether the file uses HFS+ compression."""
+        return bool(self.owner_flags & UF_COMPRESSED)
+
+    def is_hard_link(self):
+        """Return whether the file is a hard link to another file."""
+        return self.file_type == "hlnk" and self.creator == "hfs+"
+
+    def fork_data(self, fork_type=DATA_FORK):
+        """Return the HFSPlusForkData of one of the file's forks."""
+        offset = 88 if fork_type == DATA_FORK else 168
+        return self.record[offset:offset + 80]
+
+
+class HfsVolume(object):
+    """Read-only access to the files in an HFS+ volume."""
+
+    @_malformed_as_hfs_error
+    def __init__(self, fileobj, offset=0):
+        """Read the volume header and open the catalog.
+
+        Args:
+            fileobj: A seekable file-like object containing the volume,
+                such as a udif.UdifImage. HfsVolume takes ownership of
+                it, and closes it when the volume is closed.
+            offset: Offset of the volume in fileobj, in bytes.
+
+        Raises:
+            HfsError: There's no HFS+ volume at offset, or it's
+                malformed.
+        """
+        self.fileobj = fileobj
+        self.offset = offset
+        header = self.read_at(VOLUME_HEADER_OFFSET, 512)
+        if header[:2] not in SIGNATURES:
+            raise HfsError("Not an HFS+ volume.")
+        self.case_sensitive = header[:2] == "HX"
+        self.block_size = struct.unpack_from(
+            ">I", header, BLOCK_SIZE_OFFSET)[0]
+        if not self.block_size or self.block_size % 512:
+            raise HfsError("Invalid HFS+ block size.")
+        self.extents = BTree(_Fork(
+            self, header[EXTENTS_FORK_OFFSET:EXTENTS_FORK_OFFSET + 80]), 4)
+        self.catalog = BTree(_Fork(
+            self, header[CATALOG_FORK_OFFSET:CATALOG_FORK_OFFSET + 80],
+            CATALOG_FILE_ID), 2)
+        attributes_fork = _Fork(
+            self, header[ATTRIBUTES_FORK_OFFSET:ATTRIBUTES_FORK_OFFSET + 80],
+            ATTRIBUTES_FILE_ID)
+        self.attributes = BTree(attributes_fork, 4) if attributes_fork.size \
+            else None
+        self._folders = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the underlying file."""
+        if self.fileobj is not None:
+            self.fileobj.close()
+            self.fileobj = None
+
+    @_malformed_as_hfs_error
+    def listdir(self, path):
+        """Return the names of the entries in a folder.
+
+        Raises:
+            KeyError: The path doesn't exist.
+            HfsError: The path isn't a folder, or can't be read.
+        """
+        entry = self.lookup(path)
+        if not entry.isdir():
+            raise HfsError("%s is not a folder." % path)
+        return [name for name in self._children(entry.cnid)
+                if not name.startswith((u"\x00", u".HFS+ Private"))]
+
+    @_malformed_as_hfs_error
+    def lookup(self, path, follow_symlinks=True):
+        """Return the HfsEntry for a path, relative to the volume root.
+
+        Args:
+            path: The path to look up, e.g. "Foo.app/Contents".
+            follow_symlinks: Whether to follow a symlink at the end of
+                the path. (Symlinks earlier in the path are always
+                followed.)
+
+        Raises:
+            KeyError: The path doesn't exist.
+            HfsError: The volume can't be read.
+        """
+        return self._lookup(path, follow_symlinks, 0)
+
+    def exists(self, path):
+        """Return whether a path exists."""
+        try:
+            self.lookup(path)
+        except KeyError:
+            return False
+        return True
+
+    @_malformed_as_hfs_error
+    def readlink(self, path):
+        """Return the target of a symlink."""
+        entry = self.lookup(path, follow_symlinks=False)
+        if not entry.islink():
+            raise HfsError("%s is not a symlink." % path)
+        return self._read_entry(entry)
+
+    def read(self, path):
+        """Return the contents of a file."""
+        return self.open(path).read()
+
+    @_malformed_as_hfs_error
+    def open(self, path):
+        """Return a file-like object that reads a file's contents."""
+        entry = self.lookup(path)
+        if entry.isdir():
+            raise HfsError("%s is a folder." % path)
+        if entry.is_compressed():
+            return StringIO(self._read_compressed(entry))
+        return _ForkFile(_Fork(self, entry.fork_data(), entry.cnid))
+
+    @_malformed_as_hfs_error
+    def extract(self, path, dest_path, skip_existing=False):
+        """Copy a file, symlink or folder (recursively) out of the volume.
+
+        File modes are kept.
+
+        Args:
+            path: The path to extract.
+            dest_path: Where to put it.
+            skip_existing: Leave files that already exist at their
+                destination alone.
+        """
+        entry = self.lookup(path, follow_symlinks=False)
+        if entry.isdir():
+            if not os.path.isdir(dest_path):
+                os.makedirs(dest_path)
+            for name in self.listdir(path):
+                if isinstance(dest_path, str):
+                    name = name.encode("utf-8")
+                self.extract(posixpath.join(path, name),
+                             os.path.join(dest_path, name), skip_existing)
+            return
+        if os.path.lexists(dest_path):
+            if skip_existing:
+                return
+            os.remove(dest_path)
+        if entry.islink():
+            os.symlink(self._read_entry(entry), dest_path)
+            return
+        if not entry.isfile():
+            return
+        source = self.open(path)
+        with open(dest_path, "wb") as dest_file:
+            for chunk in iter(lambda: source.read(COPY_BLOCK_SIZE), ""):
+                dest_file.write(chunk)
+        os.chmod(dest_path, stat.S_IMODE(entry.mode) | stat.S_IRUSR |
+                 stat.S_IWUSR)
+
+    def read_at(self, offset, size):
+        """Return size bytes at offset in the volume.
+
+        Raises:
+            HfsError: The volume is truncated.
+        """
+        self.fileobj.seek(self.offset + offset)
+        data = self.fileobj.read(size)
+        if len(data) != size:
+            raise HfsError("The volume is truncated.")
+        return data
+
+    def _lookup(self, path, follow_symlinks, depth):
+        """Look up a path, following symlinks. (See lookup().)"""
+        if depth > MAX_SYMLINKS:
+            raise HfsError("Too many levels of symlinks in %s." % path)
+        parts = [part for part in path.split("/") if part not in ("", ".")]
+        entry = self._root()
+        resolved = []
+        for index, part in enumerate(parts):
+            if part == "..":
+                if not resolved:
+                    raise KeyError(path)
+                resolved.pop()
+                entry = self._lookup("/".join(resolved), True, depth)
+                continue
+            if not entry.isdir():
+                raise KeyError(path)
+            entry = self._child(entry.cnid, part)
+            if entry is None:
+                raise KeyError(path)
+            last = index == len(parts) - 1
+            if entry.islink() and (follow_symlinks or not last):
+                target = self._read_entry(entry)
+                if target.startswith("/"):
+                    # Symlinks outside the volume can't be followed.
+                    raise KeyError(path)
+                new_path = posixpath.join(
+                    "/".join(resolved), target, *parts[index + 1:])
+                return self._lookup(new_path, follow_symlinks, depth + 1)
+            resolved.append(part)
+        return entry
+
+    def _root(self):
+        """Return the HfsEntry of the root folder."""
+        # The root folder's record is listed under its parent, ID 1.
+        for record in self.catalog.records_with(1):
+            name, data = _catalog_record(record)
+            if data is not None and struct.unpack_from(
+                    ">I", data, 8)[0] == ROOT_FOLDER_ID:
+                return HfsEntry(name, data)
+        raise HfsError("The volume has no root folder.")
+
+    def _children(self, folder_id):
+        """Return a dictionary of the HfsEntry objects in a folder."""
+        if folder_id not in self._folders:
+            children = {}
+            for record in self.catalog.records_with(folder_id):
+                name, data = _catalog_record(record)
+                if data is not None:
+                    children[name.replace(u"/", u":")] = HfsEntry(name, data)
+            # Cache the folder before resolving hard links, since their
+            # targets are found through the root folder.
+            self._folders[folder_id] = children
+            for name, entry in children.items():
+                if entry.is_hard_link():
+                    children[name] = self._hard_link_target(entry) or entry
+        return self._folders[folder_id]
+
+    def _child(self, folder_id, name):
+        """Return the HfsEntry for a name in a folder, or None."""
+        if isinstance(name, str):
+            name = name.decode("utf-8")
+        name = unicodedata.normalize("NFD", name)
+        children = self._children(folder_id)
+        if name in children:
+            return children[name]
+        if not self.case_sensitive:
+            for child_name, entry in children.items():
+                if child_name.lower() == name.lower():
+                    return entry
+        return None
+
+    def _hard_link_target(self, entry):
+        """Return the HfsEntry a hard link points to, or None."""
+        private = self._child(ROOT_FOLDER_ID, PRIVATE_DATA_FOLDER)
+        if private is None:
+            return None
+        link_id = struct.unpack_from(">I", entry.record, 44)[0]
+        target = self._child(private.cnid, u"iNode%d" % link_id)
+        if target is not None:
+            target.name = entry.name
+        return target
+
+    def _read_entry(self, entry):
+        """Return all the data in an entry's data fork."""
+        if entry.is_compressed():
+            return self._read_compressed(entry)
+        fork = _Fork(self, entry.fork_data(), entry.cnid)
+        return fork.read(0, fork.size)
+
+    def _read_compressed(self, entry):
+        """Return the contents of a file that uses HFS+ compression."""
+        header = self._xattr(entry.cnid, DECMPFS_XATTR)
+        if header is None or header[:4] != "fpmc":
+            raise HfsError("%s is compressed, but its compression header "
+                           "is missing." % entry.name)
+        compression_type, size = struct.unpack_from("<IQ", header, 4)
+        try:
+            if compression_type == 3:
+                # The data is in the attribute itself.
+                data = header[16:]
+                if data[:1] and ord(data[0]) & 0x0f == 0x0f:
+                    # The data is stored uncompressed.
+                    return data[1:size + 1]
+                return zlib.decompress(data)
+            if compression_type == 4:
+                # The data is in the resource fork, in 64 KB blocks.
+                fork = _Fork(self, entry.fork_data(RESOURCE_FORK),
+                             entry.cnid, RESOURCE_FORK)
+                resource = fork.read(0, fork.size)
+                base = struct.unpack_from(">I", resource)[0] + 4
+                count = struct.unpack_from("<I", resource, base)[0]
+                blocks = []
+                for index in range(count):
+                    offset, length = struct.unpack_from(
+                        "<II", resource, base + 4 + 8 * index)
+                    block = resource[base + offset:base + offset + length]
+                    if block[:1] == "\xff":
+                        blocks.append(block[1:])
+                    else:
+                        blocks.append(zlib.decompress(block))
+                return "".join(blocks)[:size]
+        except (zlib.error, struct.error) as error:
+            raise HfsError("Unable to decompress %s. (%s)" %
+                           (entry.name, error))
+        raise HfsError("%s uses an unsupported compression method (%s)." %
+                       (entry.name, compression_type))
+
+    def _xattr(self, file_id, name):
+        """Return the value of an inline extended attribute, or None."""
+        if self.attributes is None:
+            return None
+        for record in self.attributes.records_with(file_id):
+            key_length = struct.unpack_from(">H", record)[0] + 2
+            name_length = struct.unpack_from(">H", record, 12)[0]
+            if record[14:14 + 2 * name_length].decode("utf-16-be") != name:
+                continue
+            record_type, size = struct.unpack_from(
+                ">I8xI", record, key_length)
+            if record_type != 0x10:
+                return None
+            return record[key_length + 16:key_length + 16 + size]
+        return None
+
+    def overflow_extents(self, file_id, fork_type):
+        """Return the extents of a fork listed in the extents file."""
+        extents = []
+        for record in self.extents.records_with(file_id):
+            if struct.unpack_from(">B", record, 2)[0] != fork_type:
+                continue
+            key_length = struct.unpack_from(">H", record)[0] + 2
+            extents.extend(_extents(record[key_length:key_length + 64]))
+        return extents
+
+
+class BTree(object):
+    """A B-tree file (catalog, extents or attributes) in a volume."""
+
+    def __init__(self, fork, id_offset):
+        """Read the B-tree's header node.
+
+        Args:
+            fork: The _Fork of the B-tree file.
+            id_offset: Offset in each key of the ID it's sorted by first
+                (the parent ID or file ID).
+        """
+        self.fork = fork
+        self.id_offset = id_offset
+        header = fork.read(0, 512)
+        (_, self.root, _, _, _, self.node_size, self.max_key_length,
+         self.total_nodes) = struct.unpack_from(">HIIIIHHI", header, 14)
+        self.attributes = struct.unpack_from(">I", header, 14 + 38)[0]
+        if self.node_size < 512:
+            raise HfsError("Invalid B-tree node size.")
+
+    def node(self, index):
+        """Return a tuple of (kind, next node, list of records)."""
+        if not 0 < index < self.total_nodes:
+            raise HfsError("Invalid B-tree node number %s." % index)
+        data = self.fork.read(index * self.node_size, self.node_size)
+        if len(data) != self.node_size:
+            raise HfsError("The B-tree is truncated.")
+        forward, _, kind, _, count = struct.unpack_from(">IIbBH", data)
+        offsets = struct.unpack_from(">%dH" % (count + 1), data,
+                                     self.node_size - 2 * (count + 1))
+        offsets = offsets[::-1]
+        records = [data[offsets[index]:offsets[index + 1]]
+                   for index in range(count)]
+        return (kind, forward, records)
+
+    def records_with(self, key_id):
+        """Yield the leaf records whose keys start with key_id, in order.
+
+        Records are sorted by that ID first, so they're all next to each
+        other. This finds the first of them by descending the tree using
+        only the ID, which avoids needing HFS+'s Unicode ordering rules
+        for names.
+        """
+        if not self.root:
+            return
+        index = self.root
+        kind, forward, records = self.node(index)
+        for _ in range(self.total_nodes):
+            if kind != INDEX_NODE:
+                break
+            child = None
+            for record in records:
+                if self._record_id(record) >= key_id and child is not None:
+                    break
+                child = self._child_pointer(record)
+            kind, forward, records = self.node(child)
+        if kind != LEAF_NODE:
+            raise HfsError("Invalid B-tree.")
+
+        visited = 0
+        while True:
+            for record in records:
+                record_id = self._record_id(record)
+                if record_id > key_id:
+                    return
+                if record_id == key_id:
+                    yield record
+            visited += 1
+            if not forward or visited > self.total_nodes:
+                return
+            kind, forward, records = self.node(forward)
+
+    def _record_id(self, record):
+        """Return the ID a record's key starts with."""
+        return struct.unpack_from(">I", record, self.id_offset)[0]
+
+    def _child_pointer(self, record):
+        """Return the child node an index record points to."""
+        if self.attributes & VARIABLE_INDEX_KEYS:
+            key_length = struct.unpack_from(">H", record)[0] + 2
+        else:
+            key_length = self.max_key_length + 2
+        return struct.unpack_from(">I", record, key_length)[0]
+
+
+class _Fork(object):
+    """The data of a file's fork, read through its extents."""
+
+    def __init__(self, volume, fork_data, file_id=None, fork_type=DATA_FORK):
+        """Set up a _Fork.
+
+        Args:
+            volume: The HfsVolume.
+            fork_data: The HFSPlusForkData (80 bytes) describing it.
+            file_id: The file's ID, needed to find any more extents in
+                the extents overflow file.
+            fork_type: DATA_FORK or RESOURCE_FORK.
+        """
+        self.volume = volume
+        self.size, _, total_blocks = struct.unpack_from(">QII", fork_data)
+        self.extents = _extents(fork_data[16:80])
+        if (file_id is not None and
+                sum(count for _, count in self.extents) < total_blocks):
+            self.extents.extend(volume.overflow_extents(file_id, fork_type))
+
+    def read(self, offset, size):
+        """Return up to size bytes at offset in the fork."""
+        size = max(0, min(size, self.size - offset))
+        block_size = self.volume.block_size
+        pieces = []
+        extent_start = 0
+        for start_block, block_count in self.extents:
+            extent_end = extent_start + block_count * block_size
+            if size > 0 and extent_start <= offset < extent_end:
+                length = min(size, extent_end - offset)
+                pieces.append(self.volume.read_at(
+                    start_block * block_size + offset - extent_start, length))
+                offset += length
+                size -= length
+            extent_start = extent_end
+        if size > 0:
+            raise HfsError("A file's extents are incomplete.")
+        return "".join(pieces)
+
+
+class _ForkFile(object):
+    """A read-only, seekable file of a fork's data."""
+
+    def __init__(self, fork):
+        self.fork = fork
+        self._pos = 0
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Move to a new position in the file."""
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.fork.size
+        self._pos = max(0, offset)
+
+    def tell(self):
+        """Return the current position in the file."""
+        return self._pos
+
+    @_malformed_as_hfs_error
+    def read(self, size=-1):
+        """Read up to size bytes (or the rest of the file)."""
+        if size is None or size < 0:
+            size = self.fork.size
+        data = self.fork.read(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        """Do nothing; the volume owns the underlying file."""
+        pass
+
+
+def open_disk_image(path):
+    """Return the HFS+ volume in a UDIF disk image.
+
+    Args:
+        path: Path to the disk image.
+
+    Returns:
+        An HfsVolume of the first HFS+ partition in the image. Closing
+        it closes the image.
+
+    Raises:
+        UdifError: The file isn't a UDIF disk image.
+        HfsError: The image has no HFS+ volume (it might be APFS), or
+            its volume is malformed.
+    """
+    image = UdifImage(path)
+    try:
+        for partition in image.partitions:
+            image.seek(partition.offset + VOLUME_HEADER_OFFSET)
+            if image.read(2) in SIGNATURES:
+                return HfsVolume(image, partition.offset)
+    except (UdifError, HfsError):
+        image.close()
+        raise
+    image.close()
+    raise HfsError("The disk image has no HFS+ volume.")
+
+
+def _catalog_record(record):
+    """Return (name, data) of a catalog leaf record.
+
+    data is None for thread records, which aren't files or folders.
+    """
+    key_length = struct.unpack_from(">H", record)[0] + 2
+    name_length = struct.unpack_from(">H", record, 6)[0]
+    name = record[8:8 + 2 * name_length].decode("utf-16-be")
+    data = record[key_length:]
+    if struct.unpack_from(">h", data)[0] not in (FOLDER_RECORD, FILE_RECORD):
+        return (name, None)
+    return (name, data)
+
+
+def _extents(data):
+    """Return the (start block, block count) pairs in an extent record."""
+    extents = []
+    for index in range(8):
+        start_block, block_count = struct.unpack_from(">II", data, 8 * index)
+        if block_count:
+            extents.append((start_block, block_count))
+    return extents
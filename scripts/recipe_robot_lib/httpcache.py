@@ -0,0 +1,191 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+httpcache.py
+
+HTTPCache: Persistent, on-disk cache of HTTP response bodies.
+
+Used by HTTPSession for API responses and feeds that we request over and
+over again (GitHub, BitBucket and SourceForge project info, Sparkle
+feeds). Each response is stored along with its ETag and Last-Modified
+validators. Within its source's time-to-live a cached response is used
+without touching the network; after that it is revalidated with a
+conditional request, and a "304 Not Modified" answer costs neither
+bandwidth nor GitHub API rate limit.
+
+Each entry is a pair of files named after a hash of the URL: a JSON
+metadata file and the body itself. Files are written to a temporary name
+and renamed into place, so several Recipe Robot processes can share the
+cache safely. The least recently used entries are evicted once the
+cache grows beyond its size limit.
+"""
+
+
+import hashlib
+import json
+import os
+import time
+
+from .tools import atomic_write, ensure_dir
+
+
+# Seconds for which a cached response is used without revalidating it,
+# keyed by the source passed to HTTPSession.read(). Sources not listed
+# here are always revalidated.
+DEFAULT_TTLS = {
+    "github": 60 * 60,
+    "bitbucket": 60 * 60,
+    "sourceforge": 60 * 60,
+    "sparkle": 10 * 60,
+    "macupdate": 24 * 60 * 60,
+}
+
+# Default limit for the total size of all cached bodies, in bytes.
+DEFAULT_MAX_SIZE = 50 * 1024 * 1024
+
+
+class HTTPCache(object):
+    """Store HTTP response bodies on disk, with their validators."""
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, ttls=None):
+        """Set up an HTTPCache.
+
+        Args:
+            path: Folder in which to store cached responses. It's
+                created if it doesn't exist.
+            max_size: Maximum total size of the cached bodies, in bytes.
+            ttls: Optional dictionary of time-to-live values, in
+                seconds, keyed by source name. Defaults to DEFAULT_TTLS.
+        """
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        ensure_dir(self.path)
+
+    def get(self, url):
+        """Return the cached entry for url, or None.
+
+        Returns:
+            Dictionary with keys "url", "source", "etag",
+            "last_modified", "stored_at", "size" and "body".
+        """
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r") as meta_file:
+                entry = json.load(meta_file)
+            with open(body_path, "rb") as body_file:
+                entry["body"] = body_file.read()
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get("url") != url:
+            return None
+        self._touch(body_path)
+        return entry
+
+    def is_fresh(self, entry):
+        """Return True if entry is still within its source's TTL."""
+        ttl = self.ttls.get(entry.get("source"), 0)
+        return time.time() - entry.get("stored_at", 0) < ttl
+
+    def conditional_headers(self, entry):
+        """Return request headers to revalidate a cached entry."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, body, etag=None, last_modified=None, source=None):
+        """Store body as the cached response for url."""
+        meta_path, body_path = self._paths(url)
+        entry = {"url": url, "source": source, "etag": etag,
+                 "last_modified": last_modified, "stored_at": time.time(),
+                 "size": len(body)}
+        try:
+            with atomic_write(body_path, "wb") as body_file:
+                body_file.write(body)
+            with atomic_write(meta_path) as meta_file:
+                json.dump(entry, meta_file)
+        except (IOError, OSError):
+            # The response just isn't cached, and is requested in full
+            # next time.
+            return
+        self.evict()
+
+    def refresh(self, url, entry):
+        """Restart the TTL of an entry that was just revalidated."""
+        meta_path, _ = self._paths(url)
+        entry = dict(entry)
+        entry.pop("body", None)
+        entry["stored_at"] = time.time()
+        try:
+            with atomic_write(meta_path) as meta_file:
+                json.dump(entry, meta_file)
+        except (IOError, OSError):
+            pass
+
+    def evict(self):
+        """Delete least recently used entries until under max_size."""
+        bodies = []
+        total_size = 0
+        for filename in os.listdir(self.path):
+            if not filename.endswith(".body"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, filename))
+            except OSError:
+                continue
+            bodies.append((stat.st_mtime, stat.st_size, filename))
+            total_size += stat.st_size
+        bodies.sort()
+        while total_size > self.max_size and bodies:
+            _, size, filename = bodies.pop(0)
+            key = filename[:-len(".body")]
+            for suffix in (".json", ".body"):
+                try:
+                    os.remove(os.path.join(self.path, key + suffix))
+                except OSError:
+                    pass
+            total_size -= size
+
+    def clear(self):
+        """Delete every cached entry."""
+        for filename in os.listdir(self.path):
+            if filename.endswith((".json", ".body")):
+                try:
+                    os.remove(os.path.join(self.path, filename))
+                except OSError:
+                    pass
+
+    def _paths(self, url):
+        """Return the (metadata, body) file paths for url."""
+        if isinstance(url, unicode):
+            url = url.encode("utf-8")
+        key = hashlib.sha1(url).hexdigest()
+        return (os.path.join(self.path, key + ".json"),
+                os.path.join(self.path, key + ".body"))
+
+    def _touch(self, path):
+        """Mark an entry as recently used, for LRU eviction."""
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
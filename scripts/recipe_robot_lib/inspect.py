@@ -25,41 +25,83 @@ Look at a path or URL for an app and generate facts about it.
 
 
 from distutils.version import LooseVersion, StrictVersion
+from functools import partial
+from httplib import HTTPException
 from ssl import CertificateError, SSLError
-from urllib2 import build_opener, HTTPError, Request, URLError, urlopen
+from StringIO import StringIO
+from urllib import quote
+from urllib2 import HTTPError, URLError
 from urlparse import urlparse
 from xml.etree.ElementTree import parse, ParseError
-import httplib
 import json
 import os
+import posixpath
 import re
 import shutil
-import sys
-import xattr
+import zipfile
 
 from recipe_robot_lib import FoundationPlist as FoundationPlist
+from recipe_robot_lib.bundle import (
+    AppBundle, BundleError, DirectorySource, HfsSource, ZipSource)
+from recipe_robot_lib import commands
+from recipe_robot_lib.archives import (
+    extract_app_skeleton, extract_members, extraction_path, find_app,
+    find_pkg, members_under, RangeFile, REMOTE_MIN_SIZE)
+from recipe_robot_lib.download import Download, RangesNotSupported
 from recipe_robot_lib.exceptions import RoboError
+from recipe_robot_lib import formats
+from recipe_robot_lib import hfsplus
+from recipe_robot_lib import robolog
+from recipe_robot_lib.network import new_session
+from recipe_robot_lib.store import new_download_store
 from recipe_robot_lib.tools import (
-    ALL_SUPPORTED_FORMATS, any_item_in_string, CACHE_DIR,
-    get_exitcode_stdout_stderr, LogLevel, robo_print,
+    ALL_SUPPORTED_FORMATS, any_item_in_string, LogLevel,
+    robo_print,
     SUPPORTED_ARCHIVE_FORMATS, SUPPORTED_IMAGE_FORMATS,
     SUPPORTED_INSTALL_FORMATS)
+from recipe_robot_lib.tracing import span, traced
+from recipe_robot_lib.udif import UdifError
 
 
+# Files in each component of a flat package that are worth extracting to
+# look for clues. (The Payload is only read if we need to find an app.)
+PKG_METADATA_FILES = ("PackageInfo", "Bom", "Distribution")
+
+# Seconds to wait for codesign to display an app's signature.
+CODESIGN_TIMEOUT = 2 * 60
+
+
+def getxattr(path, attr):
+    """Return an extended attribute of a file.
+
+    xattr is slow to import, and most inputs never need it, so it's
+    imported here rather than at the top of the module.
+
+    Raises:
+        KeyError: The file doesn't have the attribute.
+    """
+    import xattr
+    return xattr.getxattr(path, attr)
+
+
+@traced("inspect")
 def process_input_path(facts):
     """Determine which functions to call based on type of input path.
 
     Args:
-        args: The command line arguments.
         facts: A continually-updated dictionary containing all the
             information we know so far about the app associated with the
-            input path.
+            input path. Required keys:
+                args: The command line arguments.
+                cache_dir: The folder in which to store downloads and
+                    other temporary files for this run.
+
+    Raises:
+        RoboError: The input path is missing or can't be handled.
     """
     args = facts["args"]
-    # If --config was specified without an input path, stop here.
     if not args.input_path:
-        sys.exit(0)
-    # Otherwise, retrieve the input path.
+        raise RoboError("No input path was specified.")
     input_path = args.input_path
     robo_print("Processing %s ..." % input_path)
 
@@ -70,8 +112,15 @@ def process_input_path(facts):
     # Put input_path into our facts for reporting purposes
     facts["input_path"] = input_path
 
+    # Share one HTTP session, and its pool of open connections, across
+    # all the inspections for this input path.
+    if "session" not in facts:
+        facts["session"] = new_session()
+    if "download_store" not in facts:
+        facts["download_store"] = new_download_store()
+
     # Initialize facts that are lists.
-    facts["inspections"] = []
+    facts["inspections"] = set()
     facts["blocking_applications"] = []
     facts["codesign_authorities"] = []
 
@@ -131,11 +180,13 @@ def process_input_path(facts):
         facts = inspect_func(input_path, args, facts)
 
 
-def check_url(url):
+def check_url(url, session):
     """Test a URL's headers, and switch to HTTPS if available.
 
     Args:
         url: The URL to check.
+        session: The HTTPSession to use. Connections it opens here are
+            kept open for downloading the URL afterwards.
 
     Returns:
         url: The URL that was tested, which may not be the same as the URL
@@ -150,31 +201,37 @@ def check_url(url):
         robo_print("Checking for HTTPS URL...", LogLevel.VERBOSE)
         try:
             # Try switching to HTTPS.
-            c = httplib.HTTPSConnection(p.netloc, 443, timeout=10)
-            c.request("HEAD", p.path)
-            r = c.getresponse()
-            if r.status < 400:
-                url = "https" + url[4:]
-                robo_print("Found HTTPS URL: %s" % url, LogLevel.VERBOSE, 4)
-                return url
-            else:
-                robo_print("No usable HTTPS URL found.", LogLevel.VERBOSE, 4)
+            session.head("https" + url[4:])
+            url = "https" + url[4:]
+            robo_print("Found HTTPS URL: %s", LogLevel.VERBOSE, 4, url)
+            return url
+        except HTTPError:
+            robo_print("No usable HTTPS URL found.", LogLevel.VERBOSE, 4)
         except (CertificateError, SSLError) as err:
             robo_print("Domain does not have a valid SSL certificate.",
                        LogLevel.VERBOSE, 4)
+        except URLError as err:
+            if isinstance(err.reason, SSLError):
+                robo_print("Domain does not have a valid SSL certificate.",
+                           LogLevel.VERBOSE, 4)
+            else:
+                robo_print("An error occurred while checking for an HTTPS "
+                           "URL: %s", LogLevel.VERBOSE, 4, err)
         except Exception as err:
             robo_print("An error occurred while checking for an HTTPS "
-                       "URL: %s" % err, LogLevel.VERBOSE, 4)
+                       "URL: %s", LogLevel.VERBOSE, 4, err)
 
     # Use HTTP if HTTPS fails.
-    c = httplib.HTTPConnection(p.netloc, 80, timeout=10)
-    c.request("HEAD", p.path)
-    r = c.getresponse()
-    # TODO (Elliot): Mitigation of errors based on r.status.
+    try:
+        session.head(url)
+    except HTTPError:
+        # TODO (Elliot): Mitigation of errors based on status code.
+        pass
 
     return url
 
 
+@traced("inspect")
 def inspect_app(input_path, args, facts):
     """Process an app
 
@@ -195,12 +252,19 @@ def inspect_app(input_path, args, facts):
     if "app" in facts["inspections"]:
         return facts
     else:
-        facts["inspections"].append("app")
+        facts["inspections"].add("app")
 
     # Save the path of the app. (Used when overriding AppStoreApp
     # recipes.)
     facts["app_path"] = input_path
 
+    # Files are read from wherever the app actually is (e.g. a zip
+    # archive or disk image), if the caller set that up.
+    bundle = facts.get("app_bundle")
+    if bundle is None or bundle.path != input_path:
+        bundle = AppBundle(input_path)
+        facts["app_bundle"] = bundle
+
     # Record this app as a blocking application (for munki recipe based
     # on pkg).
     facts["blocking_applications"].append(os.path.basename(input_path))
@@ -208,10 +272,9 @@ def inspect_app(input_path, args, facts):
     # Read the app's Info.plist.
     robo_print("Validating app...", LogLevel.VERBOSE)
     try:
-        info_plist = FoundationPlist.readPlist(
-            input_path + "/Contents/Info.plist")
+        info_plist = bundle.info_plist()
         robo_print("App seems valid", LogLevel.VERBOSE, 4)
-    except (ValueError, FoundationPlist.NSPropertyListSerializationException) as error:
+    except (BundleError, ValueError, FoundationPlist.NSPropertyListSerializationException) as error:
         raise RoboError("%s doesn't look like a valid app to me." % input_path,
                         error)
 
@@ -229,7 +292,7 @@ def inspect_app(input_path, args, facts):
         app_name = info_plist["CFBundleExecutable"]
     else:
         app_name = app_file
-    robo_print("App name is: %s" % app_name, LogLevel.VERBOSE, 4)
+    robo_print("App name is: %s", LogLevel.VERBOSE, 4, app_name)
     facts["app_name"] = app_name
 
     # If the app's filename is different than the app's name, we need to
@@ -237,7 +300,8 @@ def inspect_app(input_path, args, facts):
     # for this.
     if app_name != app_file:
         robo_print("App name differs from the actual app filename.", LogLevel.VERBOSE)
-        robo_print("Actual app filename: %s.app" % app_file, LogLevel.VERBOSE, 4)
+        robo_print("Actual app filename: %s.app",
+                   LogLevel.VERBOSE, 4, app_file)
         facts["app_file"] = app_file
 
     # Determine the bundle identifier of the app. (Overwrites any
@@ -249,7 +313,7 @@ def inspect_app(input_path, args, facts):
         bundle_id = info_plist["CFBundleIdentifier"]
     else:
         raise RoboError("Strange, this app doesn't have a bundle identifier.")
-    robo_print("Bundle identifier is: %s" % bundle_id, LogLevel.VERBOSE, 4)
+    robo_print("Bundle identifier is: %s", LogLevel.VERBOSE, 4, bundle_id)
     facts["bundle_id"] = bundle_id
 
     # Leave a hint for people testing Recipe Robot on itself.
@@ -275,7 +339,7 @@ def inspect_app(input_path, args, facts):
     if "is_from_app_store" not in facts:
         robo_print("Determining whether app was downloaded from the Mac App "
                    "Store...", LogLevel.VERBOSE)
-        if os.path.exists("%s/Contents/_MASReceipt/receipt" % input_path):
+        if bundle.exists("Contents/_MASReceipt/receipt"):
             robo_print("App came from the App Store", LogLevel.VERBOSE, 4)
             facts["is_from_app_store"] = True
         else:
@@ -317,8 +381,9 @@ def inspect_app(input_path, args, facts):
             if "CFBundleVersion" in info_plist:
                 version_key = "CFBundleVersion"
         if version_key not in ("", None):
-            robo_print("Version key is: %s (%s)" %
-                       (version_key, info_plist[version_key]), LogLevel.VERBOSE, 4)
+            robo_print("Version key is: %s (%s)",
+                       LogLevel.VERBOSE, 4, version_key,
+                       info_plist[version_key])
             facts["version_key"] = version_key
         else:
             raise RoboError("Sorry, I can't determine which version key to "
@@ -328,21 +393,29 @@ def inspect_app(input_path, args, facts):
     if "icon_path" not in facts and not args.skip_icon:
         icon_path = ""
         robo_print("Looking for app icon...", LogLevel.VERBOSE)
-        if "CFBundleIconFile" in info_plist:
-            icon_path = os.path.join(input_path, "Contents", "Resources", info_plist["CFBundleIconFile"])
-        else:
+        icon = bundle.icon()
+        if icon is not None:
+            # The icon is converted after inspection, when the app's
+            # source may be gone, so it needs a real path now.
+            try:
+                icon_path = bundle.local_path(icon)
+            except BundleError as error:
+                robo_print("Unable to extract the app icon. (%s)",
+                           LogLevel.DEBUG, 0, error)
+        if icon_path in ("", None):
             facts["warnings"].append("Can't determine app icon.")
         if icon_path not in ("", None):
-            robo_print("App icon is: %s" % icon_path, LogLevel.VERBOSE, 4)
+            robo_print("App icon is: %s", LogLevel.VERBOSE, 4, icon_path)
             facts["icon_path"] = icon_path
 
     # Attempt to get a description of the app from MacUpdate.com.
     if "description" not in facts:
         robo_print("Getting app description from MacUpdate...", LogLevel.VERBOSE)
-        description, warning = get_app_description(app_name)
+        description, warning = get_app_description(app_name,
+                                                    facts["session"])
         if description:
             description = unicode(description, 'utf-8')
-            robo_print("Description: %s" % description, LogLevel.VERBOSE, 4)
+            robo_print("Description: %s", LogLevel.VERBOSE, 4, description)
             facts["description"] = description
         if warning:
             facts["warnings"].append(warning)
@@ -358,8 +431,25 @@ def inspect_app(input_path, args, facts):
         developer = ""
         codesign_version = ""
         robo_print("Gathering code signature information...", LogLevel.VERBOSE)
-        cmd = "codesign --display --verbose=2 -r- \"%s\"" % (input_path)
-        exitcode, out, err = get_exitcode_stdout_stderr(cmd)
+        try:
+            bundle.extract_skeleton()
+        except (BundleError, FoundationPlist.NSPropertyListSerializationException) as error:
+            robo_print("Unable to extract the app's code signature. (%s)",
+                       LogLevel.DEBUG, 0, error)
+        cmd = ["/usr/bin/codesign", "--display", "--verbose=2", "-r-",
+               bundle.real_path()]
+        exitcode, out, err = commands.run(cmd, timeout=CODESIGN_TIMEOUT)
+        if exitcode != 0 and bundle.is_partial():
+            # Only part of the app has been extracted from its source.
+            # Extract the rest, and try again.
+            robo_print("Extracting the rest of the app...", LogLevel.VERBOSE,
+                       4)
+            try:
+                bundle.materialize()
+            except BundleError as error:
+                robo_print("Unable to extract the app. (%s)",
+                           LogLevel.DEBUG, 0, error)
+            exitcode, out, err = commands.run(cmd, timeout=CODESIGN_TIMEOUT)
         if exitcode == 0:
             # From stdout:
             reqs_marker = "designated => "
@@ -392,20 +482,22 @@ def inspect_app(input_path, args, facts):
         else:
             robo_print("Code signature verification requirements recorded", LogLevel.VERBOSE, 4)
             facts["codesign_reqs"] = codesign_reqs
-            robo_print("%s authority names recorded" % len(codesign_authorities), LogLevel.VERBOSE, 4)
+            robo_print("%s authority names recorded",
+                       LogLevel.VERBOSE, 4, len(codesign_authorities))
             facts["codesign_authorities"] = codesign_authorities
         if developer not in ("", None):
-            robo_print("Developer: %s" % developer, LogLevel.VERBOSE, 4)
+            robo_print("Developer: %s", LogLevel.VERBOSE, 4, developer)
             facts["developer"] = developer
 
     return facts
 
 
-def get_app_description(app_name):
+def get_app_description(app_name, session):
     """Use an app's name to generate a description from MacUpdate.com.
 
     Args:
         app_name: The name of the app that we need to describe.
+        session: The HTTPSession to use.
 
     Returns:
         description: A string containing a description of the app.
@@ -419,13 +511,17 @@ def get_app_description(app_name):
     # MacUpdate search results page.
     description_marker = "-shortdescrip\">"
 
-    cmd = "curl --silent \"https://www.macupdate.com/find/mac/%s\"" % app_name
-    exitcode, out, err = get_exitcode_stdout_stderr(cmd)
+    try:
+        out = session.read("https://www.macupdate.com/find/mac/%s" %
+                           quote(app_name), cache_source="macupdate")
+        err = None
+    except (HTTPError, URLError) as err:
+        out = ""
 
     # For each line in the resulting text, look for the description
     # marker.
     html = out.split("\n")
-    if exitcode == 0:
+    if err is None:
         for line in html:
             if description_marker in line:
                 # Trim the HTML from the beginning of the line.
@@ -442,7 +538,8 @@ def get_app_description(app_name):
     return (description, warning)
 
 
-def inspect_archive(input_path, args, facts):
+@traced("inspect")
+def inspect_archive(input_path, args, facts, archive_format=None):
     """Process an archive
 
     Gather information required to create a recipe.
@@ -454,6 +551,9 @@ def inspect_archive(input_path, args, facts):
         facts: A continually-updated dictionary containing all the
             information we know so far about the app associated with the
             input path.
+        archive_format: The format of the archive ("zip", "tgz" or
+            "tbz"), if known. Otherwise it's determined from the file's
+            contents, or by trial and error.
 
     Returns:
         facts dictionary.
@@ -462,16 +562,18 @@ def inspect_archive(input_path, args, facts):
     if "archive" in facts["inspections"]:
         return facts
     else:
-        facts["inspections"].append("archive")
+        facts["inspections"].add("archive")
+    cache_dir = facts["cache_dir"]
 
     # See if we can determine the download URL from the file metadata.
     if "download_url" not in facts:
         try:
-            where_froms_string = xattr.getxattr(input_path, "com.apple.metadata:kMDItemWhereFroms")
+            where_froms_string = getxattr(input_path, "com.apple.metadata:kMDItemWhereFroms")
             where_froms = FoundationPlist.readPlistFromString(where_froms_string)
             if len(where_froms) > 0:
                 facts["download_url"] = where_froms[0]
-                robo_print("Download URL found in file metadata: %s" % where_froms[0], LogLevel.VERBOSE, 4)
+                robo_print("Download URL found in file metadata: %s",
+                           LogLevel.VERBOSE, 4, where_froms[0])
         except KeyError as err:
             robo_print("Unable to derive a download URL from this archive.", LogLevel.WARNING)
 
@@ -479,18 +581,38 @@ def inspect_archive(input_path, args, facts):
     # next.)
     archive_cmds = ({
         "format": "zip",
-        "cmd": "/usr/bin/unzip \"%s\" -d \"%s\"" % (input_path, os.path.join(CACHE_DIR, "unpacked"))
+        "cmd": ["/usr/bin/unzip", input_path, "-d", os.path.join(cache_dir, "unpacked")]
     },{
         "format": "tgz",
-        "cmd": "/usr/bin/tar -zxvf \"%s\" -C \"%s\"" % (input_path, os.path.join(CACHE_DIR, "unpacked"))
+        "cmd": ["/usr/bin/tar", "-zxvf", input_path, "-C", os.path.join(cache_dir, "unpacked")]
+    },{
+        "format": "tbz",
+        "cmd": ["/usr/bin/tar", "-jxvf", input_path, "-C", os.path.join(cache_dir, "unpacked")]
     })
+
+    # Skip the formats the file's contents rule out.
+    if archive_format is None and os.path.isfile(input_path):
+        sniffed_format = formats.sniff_format(input_path)
+        if sniffed_format is not None:
+            archive_format = formats.ARCHIVE_FORMATS.get(sniffed_format, "")
+    if archive_format is not None:
+        archive_cmds = [this_format for this_format in archive_cmds
+                        if this_format["format"] == archive_format]
+
+    # Zip archives can be inspected without unpacking every file.
+    if (archive_format in (None, "zip") and os.path.isfile(input_path) and
+            zipfile.is_zipfile(input_path)):
+        if inspect_zip_archive(input_path, args, facts):
+            return facts
+
     for this_format in archive_cmds:
-        exitcode, out, err = get_exitcode_stdout_stderr(this_format["cmd"])
+        exitcode, out, err = commands.run(this_format["cmd"])
         if exitcode == 0:
 
             # Confirmed; the download was a disk image. Make a note of
             # that.
-            robo_print("Successfully unarchived %s" % this_format["format"], LogLevel.VERBOSE, 4)
+            robo_print("Successfully unarchived %s",
+                       LogLevel.VERBOSE, 4, this_format["format"])
             facts["download_format"] = this_format["format"]
 
             # If the download filename was ambiguous, change it.
@@ -499,20 +621,20 @@ def inspect_archive(input_path, args, facts):
 
             # Locate and inspect any apps or pkgs on the root level.
             stop_searching_archive = False
-            for this_file in os.listdir(os.path.join(CACHE_DIR, "unpacked")):
+            for this_file in os.listdir(os.path.join(cache_dir, "unpacked")):
                 if this_file.endswith(".app"):
-                    facts = inspect_app(os.path.join(CACHE_DIR, "unpacked", this_file), args, facts)
+                    facts = inspect_app(os.path.join(cache_dir, "unpacked", this_file), args, facts)
                     stop_searching_archive = True
                     return facts
                 elif this_file.endswith(SUPPORTED_INSTALL_FORMATS):
-                    facts = inspect_pkg(os.path.join(CACHE_DIR, "unpacked", this_file), args, facts)
+                    facts = inspect_pkg(os.path.join(cache_dir, "unpacked", this_file), args, facts)
                     stop_searching_archive = True
                     return facts
 
             # Didn't find an app or pkg on the root level? Look deeper.
             # TODO(Elliot): Pass the relative app/pkg path into the recipe generator.
             if stop_searching_archive is False:
-                for dirpath, dirnames, filenames in os.walk(os.path.join(CACHE_DIR, "unpacked")):
+                for dirpath, dirnames, filenames in os.walk(os.path.join(cache_dir, "unpacked")):
                     for dirname in dirnames:
                         if dirname.startswith("."):
                             dirnames.remove(dirname)
@@ -520,30 +642,103 @@ def inspect_archive(input_path, args, facts):
                             facts = inspect_app(os.path.join(dirpath, dirname), args, facts)
                             facts["relative_path"] = os.path.relpath(
                                 os.path.join(dirpath), os.path.join(
-                                    CACHE_DIR, "unpacked")) + "/"
+                                    cache_dir, "unpacked")) + "/"
                             return facts
                         elif dirname.endswith(".pkg"):  # bundle packages
                             facts = inspect_pkg(os.path.join(dirpath, dirname), args, facts)
                             facts["relative_path"] = os.path.relpath(
                                 os.path.join(dirpath), os.path.join(
-                                    CACHE_DIR, "unpacked")) + "/"
+                                    cache_dir, "unpacked")) + "/"
                             return facts
                     for filename in filenames:
                         if filename.endswith(".pkg"):  # flat packages
                             facts = inspect_pkg(os.path.join(dirpath, filename), args, facts)
                             facts["relative_path"] = os.path.relpath(
                                 os.path.join(dirpath), os.path.join(
-                                    CACHE_DIR, "unpacked")) + "/"
+                                    cache_dir, "unpacked")) + "/"
                             return facts
 
             return facts
 
     robo_print("Unable to unpack this archive: %s\n(You can ignore this "
                "message if the previous attempt to mount the downloaded file "
-               "as a disk image succeeded.)" % input_path, LogLevel.DEBUG)
+               "as a disk image succeeded.)", LogLevel.DEBUG, 0, input_path)
     return facts
 
 
+@traced("inspect")
+def inspect_zip_archive(input_path, args, facts):
+    """Inspect the app or pkg in a local zip archive, in-process.
+
+    Only the files needed to inspect the app (see
+    archives.app_skeleton_members()) are extracted. The rest of the app
+    is extracted later only if it's needed. Packages are extracted in
+    full.
+
+    Args:
+        input_path: Path to the zip archive.
+        args: The command line arguments.
+        facts: A continually-updated dictionary containing all the
+            information we know so far about the app associated with the
+            input path.
+
+    Returns:
+        True if the archive was read. False if it couldn't be, in which
+        case it should be unpacked with unzip instead.
+    """
+    unpacked = os.path.join(facts["cache_dir"], "unpacked")
+    app_path = None
+    pkg = None
+    try:
+        zip_file = zipfile.ZipFile(input_path)
+        try:
+            app = find_app(zip_file.namelist())
+            if app is not None:
+                app_path, app = extract_app_skeleton(zip_file, unpacked)
+            else:
+                pkg = find_pkg(zip_file.namelist())
+                if pkg is not None:
+                    extract_members(zip_file, members_under(zip_file, pkg),
+                                    unpacked)
+        finally:
+            zip_file.close()
+    except (zipfile.BadZipfile, zipfile.LargeZipFile, RuntimeError,
+            IOError, OSError, KeyError, ValueError) as err:
+        robo_print("Unable to read zip archive in-process. (%s)",
+                   LogLevel.DEBUG, 0, err)
+        shutil.rmtree(unpacked, ignore_errors=True)
+        return False
+
+    # Confirmed; the download was a zip archive. Make a note of that.
+    robo_print("Successfully unarchived zip", LogLevel.VERBOSE, 4)
+    facts["download_format"] = "zip"
+
+    # If the download filename was ambiguous, change it.
+    if not facts.get("download_filename", input_path).endswith(SUPPORTED_ARCHIVE_FORMATS):
+        facts["download_filename"] = "%s.zip" % facts.get("download_filename", os.path.basename(input_path))
+
+    if app_path is not None:
+        # Remember where the rest of the app is, in case it's needed.
+        bundle = AppBundle(app_path, ZipSource(input_path, app))
+        facts["app_bundle"] = bundle
+        try:
+            facts = inspect_app(app_path, args, facts)
+        finally:
+            bundle.close()
+        found = app
+    elif pkg is not None:
+        facts = inspect_pkg(os.path.join(unpacked, *pkg.split("/")), args,
+                            facts)
+        found = pkg
+    else:
+        return True
+    # TODO(Elliot): Pass the relative app/pkg path into the recipe generator.
+    if "/" in found:
+        facts["relative_path"] = posixpath.dirname(found) + "/"
+    return True
+
+
+@traced("inspect")
 def inspect_bitbucket_url(input_path, args, facts):
     """Process a BitBucket URL
 
@@ -564,7 +759,7 @@ def inspect_bitbucket_url(input_path, args, facts):
     if "bitbucket_url" in facts["inspections"]:
         return facts
     else:
-        facts["inspections"].append("bitbucket_url")
+        facts["inspections"].add("bitbucket_url")
 
     # Grab the BitBucket repo path.
     bitbucket_repo = ""
@@ -573,7 +768,8 @@ def inspect_bitbucket_url(input_path, args, facts):
     if r_obj is not None:
         bitbucket_repo = r_obj.group(0)
     if bitbucket_repo not in ("", None):
-        robo_print("BitBucket repo is: %s" % bitbucket_repo, LogLevel.VERBOSE, 4)
+        robo_print("BitBucket repo is: %s",
+                   LogLevel.VERBOSE, 4, bitbucket_repo)
         facts["bitbucket_repo"] = bitbucket_repo
 
         # Use GitHub API to obtain information about the repo and
@@ -581,9 +777,11 @@ def inspect_bitbucket_url(input_path, args, facts):
         repo_api_url = "https://api.bitbucket.org/2.0/repositories/%s" % bitbucket_repo
         releases_api_url = "https://api.bitbucket.org/2.0/repositories/%s/downloads" % bitbucket_repo
         try:
-            raw_json_repo = urlopen(repo_api_url).read()
+            raw_json_repo, raw_json_release = (
+                facts["session"].read_concurrently(
+                    (repo_api_url, releases_api_url),
+                    cache_source="bitbucket"))
             parsed_repo = json.loads(raw_json_repo)
-            raw_json_release = urlopen(releases_api_url).read()
             parsed_release = json.loads(raw_json_release)
         except HTTPError as err:
             if err.code == 403:
@@ -623,7 +821,7 @@ def inspect_bitbucket_url(input_path, args, facts):
             if parsed_repo.get("name", "") not in ("", None):
                 app_name = parsed_repo["name"]
             if app_name not in ("", None):
-                robo_print("App name is: %s" % app_name, LogLevel.VERBOSE, 4)
+                robo_print("App name is: %s", LogLevel.VERBOSE, 4, app_name)
                 facts["app_name"] = app_name
 
         # Get full name of owner.
@@ -632,7 +830,7 @@ def inspect_bitbucket_url(input_path, args, facts):
             developer = parsed_repo["owner"]["display_name"]
         if developer not in ("", None):
             robo_print("BitBucket owner full name "
-                       "is: %s" % developer, LogLevel.VERBOSE, 4)
+                       "is: %s", LogLevel.VERBOSE, 4, developer)
             facts["developer"] = developer
 
         # Get app description.
@@ -642,7 +840,8 @@ def inspect_bitbucket_url(input_path, args, facts):
             if parsed_repo.get("description", "") not in ("", None):
                 description = parsed_repo["description"]
             if description not in ("", None):
-                robo_print("BitBucket description is: %s" % description, LogLevel.VERBOSE, 4)
+                robo_print("BitBucket description is: %s",
+                           LogLevel.VERBOSE, 4, description)
                 facts["description"] = description
             else:
                 facts["warnings"].append(
@@ -662,14 +861,14 @@ def inspect_bitbucket_url(input_path, args, facts):
                             break
             if download_format not in ("", None):
                 robo_print("BitBucket release download format "
-                           "is: %s" % download_format, LogLevel.VERBOSE, 4)
+                           "is: %s", LogLevel.VERBOSE, 4, download_format)
                 facts["download_format"] = download_format
             else:
                 facts["warnings"].append(
                     "Could not detect BitBucket release download format.")
             if download_url not in ("", None):
                 robo_print("BitBucket release download URL "
-                           "is: %s" % download_url, LogLevel.VERBOSE, 4)
+                           "is: %s", LogLevel.VERBOSE, 4, download_url)
                 facts["download_url"] = download_url
                 facts = inspect_download_url(download_url, args, facts)
             else:
@@ -688,6 +887,7 @@ def inspect_bitbucket_url(input_path, args, facts):
     return facts
 
 
+@traced("inspect")
 def inspect_disk_image(input_path, args, facts):
     """Process an image
 
@@ -708,40 +908,55 @@ def inspect_disk_image(input_path, args, facts):
     if "disk_image" in facts["inspections"]:
         return facts
     else:
-        facts["inspections"].append("disk_image")
+        facts["inspections"].add("disk_image")
+    cache_dir = facts["cache_dir"]
+
+    # Don't bother with hdiutil if the file's contents show it's
+    # something else entirely.
+    sniffed_format = formats.sniff_format(input_path)
+    if sniffed_format not in (None, formats.DMG, formats.ISO):
+        robo_print("%s is not a disk image.", LogLevel.DEBUG, 0, input_path)
+        return facts
 
     # See if we can determine the download URL from the file metadata.
     if "download_url" not in facts:
         try:
-            where_froms_string = xattr.getxattr(input_path, "com.apple.metadata:kMDItemWhereFroms")
+            where_froms_string = getxattr(input_path, "com.apple.metadata:kMDItemWhereFroms")
             where_froms = FoundationPlist.readPlistFromString(where_froms_string)
             if len(where_froms) > 0:
                 facts["download_url"] = where_froms[0]
-                robo_print("Download URL found in file metadata: %s" % where_froms[0], LogLevel.VERBOSE, 4)
+                robo_print("Download URL found in file metadata: %s",
+                           LogLevel.VERBOSE, 4, where_froms[0])
         except KeyError as err:
             robo_print("Unable to derive a download URL from this disk image.", LogLevel.WARNING)
 
+    # Read the disk image directly if we can, which is much faster than
+    # mounting it.
+    if sniffed_format != formats.ISO and inspect_hfs_image(input_path, args,
+                                                           facts):
+        return facts
+
     # Determine whether the dmg has a software license agreement.
     # Inspired by: https://github.com/autopkg/autopkg/blob/master/Code/autopkglib/DmgMounter.py#L74-L98
     dmg_has_sla = False
-    cmd = "/usr/bin/hdiutil imageinfo -plist \"%s\"" % input_path
-    exitcode, out, err = get_exitcode_stdout_stderr(cmd)
+    cmd = ["/usr/bin/hdiutil", "imageinfo", "-plist", input_path]
+    exitcode, out, err = commands.run(cmd)
     if exitcode == 0:
-        with open(os.path.join(CACHE_DIR, "dmg_info.plist"), "wb") as dmg_plist:
+        with open(os.path.join(cache_dir, "dmg_info.plist"), "wb") as dmg_plist:
             dmg_plist.write(out)
         try:
-            dmg_info = FoundationPlist.readPlist(os.path.join(CACHE_DIR, "dmg_info.plist"))
+            dmg_info = FoundationPlist.readPlist(os.path.join(cache_dir, "dmg_info.plist"))
             if dmg_info.get("Properties").get("Software License Agreement") == True:
                 dmg_has_sla = True
         except FoundationPlist.NSPropertyListSerializationException:
             pass
 
     # Mount the dmg and look for an app.
-    cmd = "/usr/bin/hdiutil attach -nobrowse -plist \"%s\"" % input_path
+    cmd = ["/usr/bin/hdiutil", "attach", "-nobrowse", "-plist", input_path]
     if dmg_has_sla is True:
-        exitcode, out, err = get_exitcode_stdout_stderr(cmd, "Y\n")
+        exitcode, out, err = commands.run(cmd, "Y\n")
     else:
-        exitcode, out, err = get_exitcode_stdout_stderr(cmd)
+        exitcode, out, err = commands.run(cmd)
     if exitcode == 0:
 
         # Confirmed; the download was a disk image. Make a note of that.
@@ -757,10 +972,10 @@ def inspect_disk_image(input_path, args, facts):
         out_clean = out[out.find("<?xml"):]
 
         # Locate and inspect the app.
-        with open(os.path.join(CACHE_DIR, "dmg_attach.plist"), "wb") as dmg_plist:
+        with open(os.path.join(cache_dir, "dmg_attach.plist"), "wb") as dmg_plist:
             dmg_plist.write(out_clean)
         try:
-            dmg_dict = FoundationPlist.readPlist(os.path.join(CACHE_DIR, "dmg_attach.plist"))
+            dmg_dict = FoundationPlist.readPlist(os.path.join(cache_dir, "dmg_attach.plist"))
         except Exception as error:
             raise RoboError(
                 "Shoot, I had trouble parsing the output of hdiutil while "
@@ -769,33 +984,105 @@ def inspect_disk_image(input_path, args, facts):
             if "mount-point" in entity:
                 dmg_mount = entity["mount-point"]
                 break
-        for this_file in os.listdir(dmg_mount):
-            if this_file.endswith(".app"):
-                # Copy app to cache folder.
-                # TODO(Elliot): What if .app isn't on root of dmg mount? (#26)
-                attached_app_path = os.path.join(dmg_mount, this_file)
-                cached_app_path = os.path.join(CACHE_DIR, "unpacked", this_file)
-                if not os.path.exists(cached_app_path):
+        try:
+            for this_file in os.listdir(dmg_mount):
+                if this_file.endswith(".app"):
+                    # Inspect the app where it is, copying files to the
+                    # cache folder only as they're needed.
+                    # TODO(Elliot): What if .app isn't on root of dmg mount? (#26)
+                    attached_app_path = os.path.join(dmg_mount, this_file)
+                    cached_app_path = os.path.join(cache_dir, "unpacked", this_file)
+                    bundle = AppBundle(cached_app_path,
+                                       DirectorySource(attached_app_path))
+                    facts["app_bundle"] = bundle
                     try:
-                        shutil.copytree(attached_app_path, cached_app_path)
-                    except shutil.Error:
-                        pass
-                # Unmount attached volume when done.
-                cmd = "/usr/bin/hdiutil detach \"%s\"" % dmg_mount
-                exitcode, out, err = get_exitcode_stdout_stderr(cmd)
-                facts = inspect_app(cached_app_path, args, facts)
-                break
-            if this_file.endswith(SUPPORTED_INSTALL_FORMATS):
-                facts = inspect_pkg(os.path.join(dmg_mount, this_file), args, facts)
-                break
+                        facts = inspect_app(cached_app_path, args, facts)
+                    finally:
+                        bundle.close()
+                    break
+                if this_file.endswith(SUPPORTED_INSTALL_FORMATS):
+                    facts = inspect_pkg(os.path.join(dmg_mount, this_file), args, facts)
+                    break
+        finally:
+            # Unmount attached volume when done, whatever was in it.
+            cmd = ["/usr/bin/hdiutil", "detach", dmg_mount]
+            exitcode, out, err = commands.run(cmd)
     else:
         robo_print("Unable to mount %s. (%s)\n(You can ignore this message if "
                    "the upcoming attempt to unzip the downloaded file as an "
-                   "archive succeeds.)" % (input_path, err), LogLevel.DEBUG)
+                   "archive succeeds.)", LogLevel.DEBUG, 0, input_path, err)
 
     return facts
 
 
+@traced("inspect")
+def inspect_hfs_image(input_path, args, facts):
+    """Inspect the app or pkg in a disk image, without mounting it.
+
+    This works for UDIF disk images containing an HFS+ volume. Files of
+    an app are read from the disk image as they're needed (see
+    bundle.AppBundle); packages are extracted in full. As when the disk
+    image is mounted, only the root of the volume is searched.
+
+    Args:
+        input_path: Path to the disk image.
+        args: The command line arguments.
+        facts: A continually-updated dictionary containing all the
+            information we know so far about the app associated with the
+            input path.
+
+    Returns:
+        True if the disk image was read. False if it couldn't be (for
+        example, if its volume is APFS), in which case it should be
+        mounted instead.
+    """
+    unpacked = os.path.join(facts["cache_dir"], "unpacked")
+    bundle = None
+    pkg = None
+    try:
+        with hfsplus.open_disk_image(input_path) as volume:
+            for this_file in sorted(volume.listdir("")):
+                this_file = this_file.encode("utf-8")
+                if this_file.endswith(".app"):
+                    bundle = AppBundle(os.path.join(unpacked, this_file),
+                                       HfsSource(input_path, this_file))
+                    break
+                if this_file.endswith(SUPPORTED_INSTALL_FORMATS):
+                    pkg = this_file
+                    volume.extract(pkg, os.path.join(unpacked, pkg))
+                    break
+        if bundle is not None:
+            # Make sure the app can be read before committing to it.
+            bundle.info_plist()
+    except (UdifError, hfsplus.HfsError, BundleError, KeyError, IOError,
+            OSError, FoundationPlist.NSPropertyListSerializationException) as err:
+        robo_print("Unable to read disk image in-process. (%s)",
+                   LogLevel.DEBUG, 0, err)
+        if bundle is not None:
+            bundle.close()
+        shutil.rmtree(unpacked, ignore_errors=True)
+        return False
+
+    # Confirmed; the download was a disk image. Make a note of that.
+    robo_print("Successfully read disk image", LogLevel.VERBOSE, 4)
+    facts["download_format"] = "dmg"
+
+    # If the download filename was ambiguous, change it.
+    if not facts.get("download_filename", input_path).endswith(SUPPORTED_IMAGE_FORMATS):
+        facts["download_filename"] = facts.get("download_filename", input_path) + ".dmg"
+
+    if bundle is not None:
+        facts["app_bundle"] = bundle
+        try:
+            facts = inspect_app(bundle.path, args, facts)
+        finally:
+            bundle.close()
+    elif pkg is not None:
+        facts = inspect_pkg(os.path.join(unpacked, pkg), args, facts)
+    return True
+
+
+@traced("inspect")
 def inspect_download_url(input_path, args, facts):
     """Process a direct download URL
 
@@ -817,11 +1104,13 @@ def inspect_download_url(input_path, args, facts):
     # situations in which the download URL is in a different format than
     # the Sparkle download.
 
+    cache_dir = facts["cache_dir"]
+
     # Remove leading and trailing spaces from URL.
     input_path = input_path.strip()
 
     # Save the download URL to the dictionary of facts.
-    robo_print("Download URL is: %s" % input_path, LogLevel.VERBOSE, 4)
+    robo_print("Download URL is: %s", LogLevel.VERBOSE, 4, input_path)
     facts["download_url"] = input_path
     facts["is_from_app_store"] = False
 
@@ -882,7 +1171,7 @@ def inspect_download_url(input_path, args, facts):
         facts["specify_filename"] = False
 
     # Check to make sure URL is valid, and switch to HTTPS if possible.
-    checked_url = check_url(input_path)
+    checked_url = check_url(input_path, facts["session"])
     if checked_url.startswith("http:"):
         facts["warnings"].append(
             "This download URL is not using HTTPS. I recommend contacting "
@@ -895,16 +1184,25 @@ def inspect_download_url(input_path, args, facts):
     # big files? https://gist.github.com/gourneau/1430932 (#24)
     robo_print("Downloading file for further inspection...", LogLevel.VERBOSE)
 
-    # Actually download the file.
+    # Actually download the file. (Ask for it uncompressed, so that the
+    # Content-Length header matches the size of the file on disk.) If
+    # we've downloaded it before, only download it again if it has
+    # changed since.
+    download_headers = {"Accept-Encoding": "identity"}
+    download_store = facts["download_store"]
+    stored_download = download_store.lookup(checked_url)
+    if stored_download is not None:
+        download_headers.update(
+            download_store.conditional_headers(stored_download))
     try:
-        raw_download = urlopen(checked_url)
+        raw_download = facts["session"].open(checked_url, download_headers)
     except HTTPError as err:
         if err.code == 403:
             # Try again, this time with a user-agent.
             try:
-                opener = build_opener()
-                opener.addheaders = [("User-agent", "Mozilla/5.0")]
-                raw_download = opener.open(checked_url)
+                download_headers["User-agent"] = "Mozilla/5.0"
+                raw_download = facts["session"].open(checked_url,
+                                                     download_headers)
                 facts["warnings"].append(
                     "I had to use a different user-agent in order to "
                     "download this file. If you run the recipes and get a "
@@ -940,60 +1238,50 @@ def inspect_download_url(input_path, args, facts):
             # TODO: If input path was HTTP, revert to that and try again.
         return facts
 
-    # Get the actual filename from the server, if it exists.
-    if "Content-Disposition" in raw_download.info():
-        content_disp = raw_download.info()["Content-Disposition"]
-        r_obj = re.search(r"filename=\"(.+)\"\;", content_disp)
-        if r_obj is not None:
-            filename = r_obj.group(1)
-
-    # If filename was not detected from either the URL or the headers,
-    # use a safe default name.
-    if filename == "":
-        filename = "download"
-    facts["download_filename"] = filename
-
-    # Write the downloaded file to the cache folder, showing progress.
-    if len(raw_download.info().getheaders("Content-Length")) > 0:
-        file_size = int(raw_download.info().getheaders("Content-Length")[0])
+    if stored_download is not None and raw_download.getcode() == 304:
+        raw_download.close()
+        filename = stored_download["filename"]
+        facts["download_filename"] = filename
+        download_store.link_into(stored_download,
+                                 os.path.join(cache_dir, filename))
+        download_store.touch(checked_url)
+        robo_print("File has not changed since it was last downloaded. "
+                   "Using stored copy at %s",
+                   LogLevel.VERBOSE, 4, os.path.join(cache_dir, filename))
     else:
-        # File size is unknown, so we can't show progress.
-        file_size = 0
-    with open(os.path.join(CACHE_DIR, filename), "wb") as download_file:
-        file_size_dl = 0
-        block_sz = 8192
-        while True:
-            buffer = raw_download.read(block_sz)
-            if not buffer:
-                break
-            # Write downloaded chunk.
-            file_size_dl += len(buffer)
-            download_file.write(buffer)
-            # Show progress if file size is known.
-            if file_size > 0:
-                p = float(file_size_dl) / file_size
-                status = r"    {0:.2%}".format(p)
-                status = status + chr(8)*(len(status)+1)
-                if args.app_mode:
-                    # Show progress in 10% increments.
-                    if (file_size_dl / block_sz) % (file_size / block_sz / 10) == 0:
-                        robo_print(status, LogLevel.VERBOSE)
-                else:
-                    # Show progress in real time.
-                    sys.stdout.flush()
-                    sys.stdout.write(status)
-    robo_print("Downloaded to %s" % os.path.join(
-        CACHE_DIR, filename), LogLevel.VERBOSE, 4)
+        filename = get_download_filename(raw_download, filename)
+        facts["download_filename"] = filename
+        if can_inspect_remotely(raw_download, filename):
+            # Try reading just the parts of the zip that we need.
+            raw_download.close()
+            if inspect_remote_zip(checked_url, raw_download.info(),
+                                  filename, args, facts):
+                return facts
+            try:
+                raw_download = facts["session"].open(checked_url,
+                                                     download_headers)
+            except (URLError, HTTPException) as err:
+                facts["warnings"].append(
+                    "Error encountered during file download. (%s)" % err)
+                return facts
+        try:
+            filename = save_download(raw_download, checked_url, filename,
+                                     args, facts)
+        except (URLError, IOError, HTTPException) as err:
+            facts["warnings"].append(
+                "Error encountered during file download. (%s)" % err)
+            return facts
+
+    # Identify the file from its contents, which are more trustworthy
+    # than its name.
+    download_path = os.path.join(cache_dir, filename)
+    sniffed_format = formats.sniff_format(download_path)
 
     # Just in case the "download" was actually a Sparkle feed.
-    hidden_sparkle = False
-    with open(os.path.join(CACHE_DIR, filename), "r") as download_file:
-        if download_file.read()[:6] == "<?xml ":
-            robo_print("This download is actually a Sparkle "
-                       "feed", LogLevel.VERBOSE, 4)
-            hidden_sparkle = True
-    if hidden_sparkle is True:
-        os.remove(os.path.join(CACHE_DIR, filename))
+    if sniffed_format == formats.XML:
+        robo_print("This download is actually a Sparkle "
+                   "feed", LogLevel.VERBOSE, 4)
+        os.remove(download_path)
         facts = inspect_sparkle_feed_url(checked_url, args, facts)
         return facts
 
@@ -1006,7 +1294,8 @@ def inspect_download_url(input_path, args, facts):
         if filename.lower().endswith(this_format) or this_format in parsed_url.query:
             download_format = this_format
             facts["download_format"] = this_format
-            robo_print("File extension is %s" % this_format, LogLevel.VERBOSE, 4)
+            robo_print("File extension is %s",
+                       LogLevel.VERBOSE, 4, this_format)
             break  # should stop after the first format match
 
     # If we've already seen the app and the download format, there's no
@@ -1015,28 +1304,45 @@ def inspect_download_url(input_path, args, facts):
         return facts
 
     robo_print("Opening downloaded file...", LogLevel.VERBOSE)
-    robo_print("Download format is unknown, so we're going to try mounting it "
-               "as a disk image first, then unarchiving it. This may produce "
-               "errors, but will hopefully result in a "
-               "success.", LogLevel.DEBUG)
+    if sniffed_format is not None:
+        robo_print("File contents look like %s",
+                   LogLevel.VERBOSE, 4, sniffed_format)
+    if sniffed_format in (formats.DMG, formats.ISO):
+        facts = inspect_disk_image(download_path, args, facts)
+    elif sniffed_format in formats.ARCHIVE_FORMATS:
+        facts = inspect_archive(download_path, args, facts,
+                                formats.ARCHIVE_FORMATS[sniffed_format])
+    elif sniffed_format == formats.XAR:
+        # Flat packages are xar archives.
+        download_format = "pkg"
+    elif sniffed_format == formats.XZ:
+        facts["warnings"].append(
+            "This download is an xz-compressed archive, which AutoPkg's "
+            "Unarchiver processor can't unpack.")
+    else:
+        robo_print("Download format is unknown, so we're going to try "
+                   "mounting it as a disk image first, then unarchiving it. "
+                   "This may produce errors, but will hopefully result in a "
+                   "success.", LogLevel.DEBUG)
 
-    # Open the disk image (or test to see whether the download is one).
-    if (facts.get("download_format", "") == "" or download_format == "") or download_format in SUPPORTED_IMAGE_FORMATS:
-        facts = inspect_disk_image(os.path.join(CACHE_DIR, filename), args, facts)
+        # Open the disk image (or test to see whether the download is one).
+        if (facts.get("download_format", "") == "" or download_format == "") or download_format in SUPPORTED_IMAGE_FORMATS:
+            facts = inspect_disk_image(download_path, args, facts)
 
-    # Open the zip archive (or test to see whether the download is one).
-    if (facts.get("download_format", "") == "" or download_format == "") or download_format in SUPPORTED_ARCHIVE_FORMATS:
-        facts = inspect_archive(os.path.join(CACHE_DIR, filename), args, facts)
+        # Open the zip archive (or test to see whether the download is one).
+        if (facts.get("download_format", "") == "" or download_format == "") or download_format in SUPPORTED_ARCHIVE_FORMATS:
+            facts = inspect_archive(download_path, args, facts)
 
     # Inspect the installer (or test to see whether the download is
     # one).
     if download_format in SUPPORTED_INSTALL_FORMATS:
 
-        robo_print("Download format is %s" % download_format, LogLevel.VERBOSE, 4)
+        robo_print("Download format is %s",
+                   LogLevel.VERBOSE, 4, download_format)
         facts["download_format"] = download_format
 
         # Inspect the package.
-        facts = inspect_pkg(os.path.join(CACHE_DIR, filename), args, facts)
+        facts = inspect_pkg(download_path, args, facts)
 
     if facts.get("download_format", "") == "":
         facts["warnings"].append(
@@ -1046,6 +1352,182 @@ def inspect_download_url(input_path, args, facts):
     return facts
 
 
+def get_download_filename(raw_download, filename):
+    """Return the filename to save a download as.
+
+    Args:
+        raw_download: The response object for the download.
+        filename: The filename derived from the download URL.
+
+    Returns:
+        The filename given by the server, if any, otherwise filename
+        (or a safe default, if filename is empty).
+    """
+    # Get the actual filename from the server, if it exists.
+    if "Content-Disposition" in raw_download.info():
+        content_disp = raw_download.info()["Content-Disposition"]
+        r_obj = re.search(r"filename=\"(.+)\"\;", content_disp)
+        if r_obj is not None:
+            filename = r_obj.group(1)
+
+    # If filename was not detected from either the URL or the headers,
+    # use a safe default name.
+    if filename == "":
+        filename = "download"
+    return filename
+
+
+def can_inspect_remotely(raw_download, filename):
+    """Return True if a download is a large zip we can read remotely.
+
+    Args:
+        raw_download: The (unread) response object for the download.
+        filename: The filename of the download.
+    """
+    headers = raw_download.info()
+    content_type = headers.getheader("Content-Type", "").lower()
+    is_zip = (filename.lower().endswith(".zip") or
+              content_type in ("application/zip",
+                               "application/x-zip-compressed"))
+    accepts_ranges = (
+        headers.getheader("Accept-Ranges", "").lower() == "bytes")
+    size = int(headers.getheader("Content-Length") or 0)
+    return is_zip and accepts_ranges and size >= REMOTE_MIN_SIZE
+
+
+@traced("inspect")
+def inspect_remote_zip(url, headers, filename, args, facts):
+    """Inspect the app in a zip download, without downloading it all.
+
+    Reads the zip's central directory using Range requests, then fetches
+    only the members of the app needed for inspection, and inspects
+    them as an app.
+
+    Args:
+        url: The URL of the zip archive.
+        headers: The headers of the response to a GET request for url.
+        filename: The filename of the download.
+        args: The command line arguments.
+        facts: A continually-updated dictionary containing all the
+            information we know so far about the app associated with the
+            input path.
+
+    Returns:
+        True if an app was found and inspected. False if the archive
+        couldn't be read remotely, or contains no app, in which case it
+        should be downloaded and inspected as usual.
+    """
+    robo_print("Reading zip archive directly from the server...",
+               LogLevel.VERBOSE)
+    request_headers = None
+    if "user-agent" in facts:
+        request_headers = {"User-agent": facts["user-agent"]}
+    range_file = RangeFile(
+        facts["session"], url, int(headers.getheader("Content-Length")),
+        headers.getheader("ETag") or headers.getheader("Last-Modified"),
+        request_headers)
+    unpacked = os.path.join(facts["cache_dir"], "unpacked")
+    try:
+        zip_file = zipfile.ZipFile(range_file)
+        app_path, app = extract_app_skeleton(zip_file, unpacked)
+    except (zipfile.BadZipfile, zipfile.LargeZipFile, RangesNotSupported,
+            URLError, IOError, HTTPException, KeyError, ValueError) as err:
+        robo_print("Unable to read zip archive remotely. (%s)",
+                   LogLevel.VERBOSE, 4, err)
+        shutil.rmtree(unpacked, ignore_errors=True)
+        return False
+    if app_path is None:
+        robo_print("No app found in zip archive.", LogLevel.VERBOSE, 4)
+        shutil.rmtree(unpacked, ignore_errors=True)
+        return False
+    robo_print("Read %s of %s bytes using %s requests",
+               LogLevel.VERBOSE, 4, range_file.bytes_fetched, range_file.size,
+               range_file.requests)
+
+    facts["download_format"] = "zip"
+    if not filename.lower().endswith(SUPPORTED_ARCHIVE_FORMATS):
+        facts["download_filename"] = "%s.zip" % filename
+    inspect_app(app_path, args, facts)
+    if "/" in app:
+        facts["relative_path"] = posixpath.dirname(app) + "/"
+    return True
+
+
+def save_download(raw_download, url, filename, args, facts):
+    """Write a download to the cache folder and the download store.
+
+    Args:
+        raw_download: The response object for the download.
+        url: The URL the file was downloaded from.
+        filename: The filename derived from the download URL.
+        args: The command line arguments.
+        facts: A continually-updated dictionary containing all the
+            information we know so far about the app associated with the
+            input path.
+
+    Returns:
+        The filename the download was saved as, which may come from the
+        server's Content-Disposition header instead.
+
+    Raises:
+        URLError, HTTPError: A request failed.
+        IOError: The download was incomplete.
+    """
+    cache_dir = facts["cache_dir"]
+    filename = get_download_filename(raw_download, filename)
+    facts["download_filename"] = filename
+
+    # Write the downloaded file to the cache folder, showing progress.
+    # Large files are fetched in parallel segments, if the server allows.
+    deciles_shown = set()
+
+    def show_progress(file_size_dl, file_size):
+        """Show progress if file size is known."""
+        if file_size > 0:
+            p = float(file_size_dl) / file_size
+            status = r"    {0:.2%}".format(p)
+            if args.app_mode or not robolog.is_live():
+                # Show progress in 10% increments, as messages of their
+                # own, so the output stays readable by other programs.
+                if int(p * 10) not in deciles_shown:
+                    deciles_shown.add(int(p * 10))
+                    if args.app_mode:
+                        status = status + chr(8)*(len(status)+1)
+                    robo_print(status, LogLevel.VERBOSE)
+            else:
+                # Show progress in real time.
+                robolog.write_status(status + chr(8)*(len(status)+1))
+
+    headers = None
+    if "user-agent" in facts:
+        headers = {"User-agent": facts["user-agent"]}
+    download = Download(facts["session"], url,
+                        os.path.join(cache_dir, filename),
+                        facts["download_store"].partial_dir, headers,
+                        progress=show_progress)
+    with span("download", "download", url=url):
+        download.run(raw_download)
+    robo_print("Downloaded to %s",
+               LogLevel.VERBOSE, 4, os.path.join(cache_dir, filename))
+
+    # Keep the file, so that it needn't be downloaded again next time.
+    # (Without validators we couldn't tell whether it has changed, so
+    # there's no point.)
+    etag = raw_download.info().getheader("ETag")
+    last_modified = raw_download.info().getheader("Last-Modified")
+    if etag or last_modified:
+        try:
+            facts["download_store"].add(
+                url, os.path.join(cache_dir, filename), filename, etag,
+                last_modified)
+        except (IOError, OSError) as err:
+            robo_print("Unable to store download for reuse. (%s)",
+                       LogLevel.VERBOSE, 4, err)
+
+    return filename
+
+
+@traced("inspect")
 def inspect_github_url(input_path, args, facts):
     """Process a GitHub URL
 
@@ -1066,7 +1548,7 @@ def inspect_github_url(input_path, args, facts):
     if "github_url" in facts["inspections"]:
         return facts
     else:
-        facts["inspections"].append("github_url")
+        facts["inspections"].add("github_url")
 
     # Grab the GitHub repo path.
     github_repo = ""
@@ -1092,7 +1574,7 @@ def inspect_github_url(input_path, args, facts):
     else:
         github_repo = path[0] + "/" + path[1]
     if github_repo not in ("", None):
-        robo_print("GitHub repo is: %s" % github_repo, LogLevel.VERBOSE, 4)
+        robo_print("GitHub repo is: %s", LogLevel.VERBOSE, 4, github_repo)
         facts["github_repo"] = github_repo
 
         # Leave a hint for people testing Recipe Robot on itself.
@@ -1116,9 +1598,10 @@ def inspect_github_url(input_path, args, facts):
 
         # Download the information from the GitHub API.
         try:
-            raw_json_repo = urlopen(repo_api_url).read()
-            raw_json_release = urlopen(releases_api_url).read()
-            raw_json_user = urlopen(user_api_url).read()
+            (raw_json_repo, raw_json_release,
+             raw_json_user) = facts["session"].read_concurrently(
+                 (repo_api_url, releases_api_url, user_api_url),
+                 cache_source="github")
         except HTTPError as err:
             if err.code == 403:
                 facts["warnings"].append(
@@ -1165,7 +1648,7 @@ def inspect_github_url(input_path, args, facts):
             if parsed_repo.get("name", None) is not None:
                 app_name = parsed_repo["name"]
             if app_name not in ("", None):
-                robo_print("App name is: %s" % app_name, LogLevel.VERBOSE, 4)
+                robo_print("App name is: %s", LogLevel.VERBOSE, 4, app_name)
                 facts["app_name"] = app_name
 
         # Get app description.
@@ -1175,8 +1658,8 @@ def inspect_github_url(input_path, args, facts):
             if parsed_repo.get("description", None) is not None:
                 description = parsed_repo["description"]
             if description not in ("", None):
-                robo_print("GitHub description is: %s" % description,
-                           LogLevel.VERBOSE, 4)
+                robo_print("GitHub description is: %s",
+                           LogLevel.VERBOSE, 4, description)
                 facts["description"] = description
             else:
                 facts["warnings"].append("No GitHub description provided.")
@@ -1196,15 +1679,14 @@ def inspect_github_url(input_path, args, facts):
                             break
             if download_format not in ("", None):
                 robo_print("GitHub release download format "
-                           "is: %s" % download_format,
-                           LogLevel.VERBOSE, 4)
+                           "is: %s", LogLevel.VERBOSE, 4, download_format)
                 facts["download_format"] = download_format
             else:
                 facts["warnings"].append(
                     "Could not detect GitHub release download format.")
             if download_url not in ("", None):
                 robo_print("GitHub release download URL "
-                           "is: %s" % download_url, LogLevel.VERBOSE, 4)
+                           "is: %s", LogLevel.VERBOSE, 4, download_url)
                 facts["download_url"] = download_url
                 facts = inspect_download_url(download_url, args, facts)
             else:
@@ -1220,7 +1702,7 @@ def inspect_github_url(input_path, args, facts):
                 developer = parsed_user["name"]
             if developer not in ("", None):
                 robo_print("GitHub developer "
-                           "is: %s" % developer, LogLevel.VERBOSE, 4)
+                           "is: %s", LogLevel.VERBOSE, 4, developer)
                 facts["developer"] = developer
             else:
                 facts["warnings"].append("Could not detect GitHub developer.")
@@ -1242,6 +1724,7 @@ def inspect_github_url(input_path, args, facts):
     return facts
 
 
+@traced("inspect")
 def inspect_pkg(input_path, args, facts):
     """Process a package
 
@@ -1258,27 +1741,31 @@ def inspect_pkg(input_path, args, facts):
     Returns:
         facts dictionary.
     """
+    from recipe_robot_lib import xar
+
     # Only proceed if we haven't inspected this pkg yet.
     if "pkg" in facts["inspections"]:
         return facts
     else:
-        facts["inspections"].append("pkg")
+        facts["inspections"].add("pkg")
+    cache_dir = facts["cache_dir"]
 
     # See if we can determine the download URL from the file metadata.
     if "download_url" not in facts:
         try:
-            where_froms_string = xattr.getxattr(input_path, "com.apple.metadata:kMDItemWhereFroms")
+            where_froms_string = getxattr(input_path, "com.apple.metadata:kMDItemWhereFroms")
             where_froms = FoundationPlist.readPlistFromString(where_froms_string)
             if len(where_froms) > 0:
                 facts["download_url"] = where_froms[0]
-                robo_print("Download URL found in file metadata: %s" % where_froms[0], LogLevel.VERBOSE, 4)
+                robo_print("Download URL found in file metadata: %s",
+                           LogLevel.VERBOSE, 4, where_froms[0])
         except KeyError as err:
             robo_print("Unable to derive a download URL from this package.", LogLevel.WARNING)
 
     # Check whether package is signed.
     robo_print("Checking whether package is signed...", LogLevel.VERBOSE)
-    cmd = "/usr/sbin/pkgutil --check-signature \"%s\"" % input_path
-    exitcode, out, err = get_exitcode_stdout_stderr(cmd)
+    cmd = ["/usr/sbin/pkgutil", "--check-signature", input_path]
+    exitcode, out, err = commands.run(cmd)
     if exitcode == 1:
         robo_print("Package is not signed", LogLevel.VERBOSE, 4)
     elif exitcode == 0:
@@ -1295,7 +1782,7 @@ def inspect_pkg(input_path, args, facts):
                         line = line.split(" (")[0]
                     developer = line[len(marker):]
             if developer not in ("", None):
-                robo_print("Developer is: %s" % developer, LogLevel.VERBOSE, 4)
+                robo_print("Developer is: %s", LogLevel.VERBOSE, 4, developer)
                 facts["developer"] = developer
             else:
                 robo_print("Developer is unknown", LogLevel.VERBOSE, 4)
@@ -1309,126 +1796,236 @@ def inspect_pkg(input_path, args, facts):
                 if re.match("^    [\d]\. ", line):
                     codesign_authorities.append(line[7:])
             if codesign_authorities != []:
-                robo_print("%s authority names recorded" % len(codesign_authorities), LogLevel.VERBOSE, 4)
+                robo_print("%s authority names recorded",
+                           LogLevel.VERBOSE, 4, len(codesign_authorities))
                 facts["codesign_authorities"] = codesign_authorities
             else:
                 robo_print("Authority names unknown, treating as unsigned", LogLevel.VERBOSE, 4)
 
     else:
         robo_print("I don't know whether the package is signed - probably not "
-                   "(pkgutil returned exit code %s)" % exitcode, LogLevel.VERBOSE, 4)
+                   "(pkgutil returned exit code %s)",
+                   LogLevel.VERBOSE, 4, exitcode)
 
-    # Expand the flat package and look for more facts.
-    robo_print("Expanding package to look for clues...", LogLevel.VERBOSE)
-    expand_path = os.path.join(CACHE_DIR, "expanded")
+    # Read the package's metadata and look for more facts.
+    expand_path = os.path.join(cache_dir, "expanded")
     if os.path.exists(expand_path):
         shutil.rmtree(expand_path)
-    cmd = "/usr/sbin/pkgutil --expand \"%s\" \"%s\"" % (input_path, expand_path)
-    exitcode, out, err = get_exitcode_stdout_stderr(cmd)
-    if exitcode == 0:
-        # Locate and inspect the app.
-        robo_print("Package expanded to: %s" % os.path.join(CACHE_DIR, "expanded"), LogLevel.VERBOSE, 4)
-        install_filename = ""
-        for dirpath, dirnames, filenames in os.walk(os.path.join(CACHE_DIR, "expanded")):
-            for dirname in dirnames:
-                if dirname.startswith("."):
-                    dirnames.remove(dirname)
-            for filename in filenames:
-
-                if filename == "PackageInfo":
-                    robo_print("Getting information from PackageInfo file...", LogLevel.VERBOSE)
-                    pkginfo_file = open(os.path.join(CACHE_DIR, "expanded", dirpath, filename), "r")
-                    pkginfo_parsed = parse(pkginfo_file)
-
-                    bundle_id = ""
-                    if "bundle_id" not in facts:
-                        bundle_id = pkginfo_parsed.getroot().attrib["identifier"]
-                    if bundle_id not in ("", None):
-                        robo_print("Bundle identifier: %s" % bundle_id, LogLevel.VERBOSE, 4)
-                        facts["bundle_id"] = bundle_id
-
-                    install_loc = pkginfo_parsed.getroot().attrib.get("install-location", "")
-                    if install_loc not in ("", None):
-                        robo_print("Install location: %s" % install_loc, LogLevel.VERBOSE, 4)
-                    else:
-                        robo_print("No install location specified", LogLevel.VERBOSE, 4)
-
-                    install_filename = os.path.basename(install_loc)
-                    robo_print("Install filename: %s" % install_filename, LogLevel.VERBOSE, 4)
-                    continue  # TODO(Elliot): Or should we stop after the first? (#27)
-
-                if filename == "Payload":
-                    # We found a payload. Let's peek inside and see if
-                    # there's an app.
-                    robo_print("Extracting the package payload to see if we "
-                               "can find an app...", LogLevel.VERBOSE)
-                    app_found = False
-                    payload_path = os.path.join(CACHE_DIR, "expanded", dirpath, filename)
-                    if install_filename.endswith(".app"):
-                        extracted_app_path = os.path.join(CACHE_DIR, "extracted_apps", install_filename)
-                        if os.path.exists(extracted_app_path):
-                            shutil.rmtree(extracted_app_path)
-                        cmd = "/usr/bin/gunzip -c \"%s\" | pax -r -s \",./,%s/,\"" % (payload_path, extracted_app_path)
-                        # TODO(Elliot): This doesn't work because it's outside the working directory. (#27)
-                        exitcode, out, err = get_exitcode_stdout_stderr(cmd)
-                        if exitcode == 0:
-                            app_found = True
-                            robo_print("Found app: %s" % extracted_app_path, LogLevel.VERBOSE, 4)
-                            facts = inspect_app(extracted_app_path, args, facts)
-                            break  # Struck pay dirt, so stop iterating
-                                   # through apps in the payload
-                        else:
-                            robo_print("Error extracting the payload. (%s)" % err, LogLevel.VERBOSE, 4)
-
-                    elif install_filename == "":
-
-                        cmd = "/usr/bin/gunzip -c \"%s\" | pax" % payload_path
-                        exitcode, out, err = get_exitcode_stdout_stderr(cmd)
-                        if exitcode == 0:
-                            out = out.split("\n")
-                            for line in out:
-                                if line.endswith(".app"):
-                                    facts["blocking_applications"].append(os.path.basename(line))
-                                    if ".app/Contents/" not in line:
-                                        app_found = True
-                                        robo_print("Found app: %s" % line, LogLevel.VERBOSE, 4)
-                                        extracted_app_path = os.path.join(CACHE_DIR, "extracted_apps", os.path.split(line)[1])
-                                        cmd = "/usr/bin/gunzip -c \"%s\" | pax -r -s \",%s,%s,\"" % (os.path.join(CACHE_DIR, "expanded", filename), line, extracted_app_path)
-                                        exitcode, out, err = get_exitcode_stdout_stderr(cmd)
-                                        if exitcode == 0:
-                                            facts = inspect_app(extracted_app_path, args, facts)
-                                            break  # Struck pay dirt, so stop iterating
-                                                   # through apps in the payload
-                                            # TODO(Elliot): Should we stop at the first app? (#27)
-                                            # Find multiple, but use the one with the shortest path?
-                                            # Find multiple, but use the largest file size?
-                                            # Inspect all of them, use only the one with a Sparkle feed?
-                                        else:
-                                            robo_print("Error while extracting the package payload. "
-                                                       "(%s)" % err, LogLevel.VERBOSE, 4)
-                        else:
-                            robo_print("Error while examining the package payload. "
-                                       "(%s)" % err, LogLevel.VERBOSE, 4)
+    archive = None
+    if (os.path.isfile(input_path) and
+            formats.sniff_format(input_path) == formats.XAR):
+        try:
+            archive = xar.XarArchive(input_path)
+        except (xar.XarError, IOError) as err:
+            robo_print("Unable to read package (%s)", LogLevel.DEBUG, 4, err)
+    if archive is not None:
+        robo_print("Reading package metadata to look for clues...",
+                   LogLevel.VERBOSE)
+        try:
+            components = expand_pkg_metadata(archive, expand_path)
+        except xar.XarError as err:
+            robo_print("Unable to read package metadata (%s)",
+                       LogLevel.DEBUG, 4, err)
+            archive.close()
+            archive = None
+            shutil.rmtree(expand_path, ignore_errors=True)
+    if archive is None:
+        robo_print("Expanding package to look for clues...", LogLevel.VERBOSE)
+        components = expand_pkg(input_path, expand_path)
+    if components is None:
+        robo_print("Unable to expand package", LogLevel.DEBUG, 4)
+        return facts
+    robo_print("Package expanded to: %s", LogLevel.VERBOSE, 4, expand_path)
+
+    try:
+        for component_dir, open_payload in components:
+            facts = inspect_pkg_component(component_dir, open_payload, args,
+                                          facts)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    # TODO(Elliot): What info do we need to gather to produce recipes here? (#27)
 
-                    if app_found is False:
-                        robo_print("Did not find an app in the package "
-                                   "payload", LogLevel.VERBOSE, 4)
-                    break  # Once we're done examining the Payload, there's not
-                           # much else we can examine.
+    return facts
+
+
+def expand_pkg_metadata(archive, expand_path):
+    """Extract the metadata files of each component of a flat package.
+
+    Only the small files that describe each component (PackageInfo, Bom
+    and Distribution) are extracted. The Payload, which holds the files
+    the package installs, is left in the package until it's needed.
 
-                if filename.endswith(".app"):
-                    facts = inspect_app(filename, args, facts)
-                    break  # Struck pay dirt, so stop iterating through files
-                           # in the package
+    Args:
+        archive: A xar.XarArchive of the flat package.
+        expand_path: Folder to extract into, which mirrors the layout of
+            the package (as if expanded with "pkgutil --expand").
+
+    Returns:
+        List of (folder, open_payload) tuples, one for each component
+        that has a PackageInfo file. The folder holds the component's
+        extracted metadata, and open_payload() returns a file-like
+        object that streams the component's Payload (or raises KeyError
+        if it has none).
+    """
+    components = []
+    for name in archive.names():
+        if posixpath.basename(name) not in PKG_METADATA_FILES:
+            continue
+        if not archive.getmember(name).isfile():
+            continue
+        dest_path = extraction_path(expand_path, name)
+        if dest_path is None:
+            continue
+        archive.extract(name, dest_path)
+        if posixpath.basename(name) == "PackageInfo":
+            component = posixpath.dirname(name)
+            components.append((
+                os.path.dirname(dest_path),
+                partial(archive.open, posixpath.join(component, "Payload"))))
+    return components
+
+
+def expand_pkg(input_path, expand_path):
+    """Expand a package with pkgutil.
+
+    This is the fallback for packages that the xar reader can't read,
+    such as bundle packages.
+
+    Args:
+        input_path: Path to the package.
+        expand_path: Folder to expand the package into.
+
+    Returns:
+        List of (folder, open_payload) tuples, as returned by
+        expand_pkg_metadata(), or None if the package couldn't be
+        expanded.
+    """
+    cmd = ["/usr/sbin/pkgutil", "--expand", input_path, expand_path]
+    exitcode, _, _ = commands.run(cmd)
+    if exitcode != 0:
+        return None
+    components = []
+    for dirpath, dirnames, filenames in os.walk(expand_path):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        if "PackageInfo" in filenames:
+            components.append((dirpath, partial(
+                open, os.path.join(dirpath, "Payload"), "rb")))
+    return components
+
+
+@traced("inspect")
+def inspect_pkg_component(component_dir, open_payload, args, facts):
+    """Process one component of a package, and the app it installs.
 
+    Args:
+        component_dir: Folder holding the component's PackageInfo file.
+        open_payload: Function returning a file-like object that reads
+            the component's Payload.
+        args: The command line arguments.
+        facts: A continually-updated dictionary containing all the
+            information we know so far about the app associated with the
+            input path.
+
+    Returns:
+        facts dictionary.
+    """
+    from recipe_robot_lib import bom, payload, xar
+
+    robo_print("Getting information from PackageInfo file...", LogLevel.VERBOSE)
+    pkginfo_parsed = parse(os.path.join(component_dir, "PackageInfo"))
+
+    bundle_id = ""
+    if "bundle_id" not in facts:
+        bundle_id = pkginfo_parsed.getroot().attrib["identifier"]
+    if bundle_id not in ("", None):
+        robo_print("Bundle identifier: %s", LogLevel.VERBOSE, 4, bundle_id)
+        facts["bundle_id"] = bundle_id
+
+    install_loc = pkginfo_parsed.getroot().attrib.get("install-location", "")
+    if install_loc not in ("", None):
+        robo_print("Install location: %s", LogLevel.VERBOSE, 4, install_loc)
     else:
-        robo_print("Unable to expand package", LogLevel.DEBUG, 4)
+        robo_print("No install location specified", LogLevel.VERBOSE, 4)
+
+    install_filename = os.path.basename(install_loc)
+    robo_print("Install filename: %s", LogLevel.VERBOSE, 4, install_filename)
+
+    cache_dir = facts["cache_dir"]
+    if install_filename.endswith(".app"):
+        # The payload is the app itself.
+        app = ""
+        dest_dir = os.path.join(cache_dir, "extracted_apps", install_filename)
+        if os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+    elif install_filename == "":
+        app = None
+        dest_dir = os.path.join(cache_dir, "extracted_apps")
+    else:
+        return facts
 
-    # TODO(Elliot): What info do we need to gather to produce recipes here? (#27)
+    # The Bom lists everything in the payload, so the apps can be found
+    # without decompressing it.
+    apps = None
+    bom_path = os.path.join(component_dir, "Bom")
+    if install_filename == "" and os.path.isfile(bom_path):
+        try:
+            apps = bom.find_apps(bom.read_bom(bom_path))
+        except (bom.BomError, IOError) as err:
+            robo_print("Unable to read the package's Bom. (%s)",
+                       LogLevel.VERBOSE, 4, err)
+    if apps is not None:
+        facts["blocking_applications"].extend(
+            posixpath.basename(path) for path in apps)
+        candidates = bom.top_level_apps(apps)
+        if not candidates:
+            robo_print("Did not find an app in the package "
+                       "payload", LogLevel.VERBOSE, 4)
+            return facts
+        app = candidates[0]
 
-    return facts
+    try:
+        payload_file = open_payload()
+    except (KeyError, IOError):
+        return facts
+
+    # We found a payload. Let's peek inside and see if there's an app.
+    # The app's code signature can only be checked if all of the app is
+    # extracted, which is only necessary if the package isn't signed.
+    complete = (facts.get("codesign_reqs", "") == "" and
+                len(facts["codesign_authorities"]) == 0)
+    robo_print("Extracting the package payload to see if we "
+               "can find an app...", LogLevel.VERBOSE)
+    try:
+        app, payload_apps = payload.extract_app(
+            payload_file, dest_dir, app=app, complete=complete,
+            list_apps=install_filename == "" and apps is None)
+    except (payload.PayloadError, xar.XarError, IOError, OSError) as err:
+        robo_print("Error while extracting the package payload. "
+                   "(%s)", LogLevel.VERBOSE, 4, err)
+        return facts
+    finally:
+        payload_file.close()
+
+    if install_filename == "" and apps is None:
+        facts["blocking_applications"].extend(
+            posixpath.basename(path) for path in payload_apps)
+    if app is None:
+        robo_print("Did not find an app in the package "
+                   "payload", LogLevel.VERBOSE, 4)
+        return facts
+    if app:
+        dest_dir = os.path.join(dest_dir, posixpath.basename(app))
+    robo_print("Found app: %s", LogLevel.VERBOSE, 4, dest_dir)
+    # TODO(Elliot): Should we stop at the first app? (#27)
+    # Find multiple, but use the one with the shortest path?
+    # Find multiple, but use the largest file size?
+    # Inspect all of them, use only the one with a Sparkle feed?
+    return inspect_app(dest_dir, args, facts)
 
 
+@traced("inspect")
 def inspect_sourceforge_url(input_path, args, facts):
     """Process a SourceForge URL
 
@@ -1449,7 +2046,7 @@ def inspect_sourceforge_url(input_path, args, facts):
     if "sourceforge_url" in facts["inspections"]:
         return facts
     else:
-        facts["inspections"].append("sourceforge_url")
+        facts["inspections"].add("sourceforge_url")
 
     # Determine the name of the SourceForge project.
     proj_name = ""
@@ -1484,7 +2081,8 @@ def inspect_sourceforge_url(input_path, args, facts):
         # Use SourceForge API to obtain project information.
         project_api_url = "https://sourceforge.net/rest/p/" + proj_name
         try:
-            raw_json = urlopen(project_api_url).read()
+            raw_json = facts["session"].read(project_api_url,
+                                             cache_source="sourceforge")
         except HTTPError as err:
             if err.code == 403:
                 facts["warnings"].append(
@@ -1527,7 +2125,7 @@ def inspect_sourceforge_url(input_path, args, facts):
                 if parsed_json["name"] not in ("", None):
                     app_name = parsed_json["name"]
             if app_name not in ("", None):
-                robo_print("App name is: %s" % app_name, LogLevel.VERBOSE, 4)
+                robo_print("App name is: %s", LogLevel.VERBOSE, 4, app_name)
                 facts["app_name"] = app_name
 
         # Determine project ID.
@@ -1537,7 +2135,8 @@ def inspect_sourceforge_url(input_path, args, facts):
             if "sourceforge_group_id" in this_dict:
                 proj_id = this_dict["sourceforge_group_id"]
         if proj_id not in ("", None):
-            robo_print("SourceForge project ID is: %s" % proj_id, LogLevel.VERBOSE, 4)
+            robo_print("SourceForge project ID is: %s",
+                       LogLevel.VERBOSE, 4, proj_id)
             facts["sourceforge_id"] = proj_id
         else:
             facts["warnings"].append(
@@ -1553,7 +2152,8 @@ def inspect_sourceforge_url(input_path, args, facts):
                 elif parsed_json["short_description"] not in ("", None):
                     description = parsed_json["short_description"]
             if description not in ("", None):
-                robo_print("SourceForge description is: %s" % description, LogLevel.VERBOSE, 4)
+                robo_print("SourceForge description is: %s",
+                           LogLevel.VERBOSE, 4, description)
                 facts["description"] = description
             else:
                 facts["warnings"].append(
@@ -1567,7 +2167,8 @@ def inspect_sourceforge_url(input_path, args, facts):
             # Example: https://sourceforge.net/projects/cord/rss
             files_rss = "https://sourceforge.net/projects/%s/rss" % proj_name
             try:
-                raw_xml = urlopen(files_rss)
+                raw_xml = StringIO(facts["session"].read(
+                    files_rss, cache_source="sourceforge"))
             except Exception as err:
                 facts["warnings"].append(
                     "Error occurred while inspecting SourceForge RSS feed: "
@@ -1606,6 +2207,7 @@ def inspect_sourceforge_url(input_path, args, facts):
     return facts
 
 
+@traced("inspect")
 def inspect_sparkle_feed_url(input_path, args, facts):
     """Process a Sparkle feed URL
 
@@ -1626,14 +2228,14 @@ def inspect_sparkle_feed_url(input_path, args, facts):
     if "sparkle_feed_url" in facts["inspections"]:
         return facts
     else:
-        facts["inspections"].append("sparkle_feed_url")
+        facts["inspections"].add("sparkle_feed_url")
 
     # Save the Sparkle feed URL to the dictionary of facts.
-    robo_print("Sparkle feed is: %s" % input_path, LogLevel.VERBOSE, 4)
+    robo_print("Sparkle feed is: %s", LogLevel.VERBOSE, 4, input_path)
     facts["sparkle_feed"] = input_path
 
     # Check to make sure URL is valid, and switch to HTTPS if possible.
-    checked_url = check_url(input_path)
+    checked_url = check_url(input_path, facts["session"])
     if checked_url.startswith("http:"):
         facts["warnings"].append(
             "This Sparkle feed is not using HTTPS. I recommend contacting "
@@ -1642,14 +2244,15 @@ def inspect_sparkle_feed_url(input_path, args, facts):
 
     # Download the Sparkle feed.
     try:
-        raw_xml = urlopen(checked_url)
+        raw_xml = StringIO(facts["session"].read(checked_url,
+                                                 cache_source="sparkle"))
     except HTTPError as err:
         if err.code == 403:
             # Try again, this time with a user-agent.
             try:
-                opener = build_opener()
-                opener.addheaders = [("User-agent", "Mozilla/5.0")]
-                raw_xml = opener.open(checked_url)
+                raw_xml = StringIO(facts["session"].read(
+                    checked_url, {"User-agent": "Mozilla/5.0"},
+                    cache_source="sparkle"))
                 facts["warnings"].append(
                     "I had to use a different user-agent in order to read "
                     "this Sparkle feed. If you run the recipes and get a "
@@ -1725,7 +2328,8 @@ def inspect_sparkle_feed_url(input_path, args, facts):
                    "number", LogLevel.VERBOSE, 4)
     facts["sparkle_provides_version"] = sparkle_provides_version
     if latest_version not in ("", None):
-        robo_print("The latest version is %s" % latest_version, LogLevel.VERBOSE, 4)
+        robo_print("The latest version is %s",
+                   LogLevel.VERBOSE, 4, latest_version)
     if latest_url not in ("", None):
         facts = inspect_download_url(latest_url, args, facts)
 
@@ -0,0 +1,506 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+network.py
+
+HTTPSession: Keep-alive HTTP client shared by all of the inspectors.
+
+Each inspection touches the same few hosts several times (a HEAD to
+check for HTTPS, then a GET for the feed or download, plus API calls).
+Opening a fresh connection every time means paying for a new TCP and
+TLS handshake on each request. HTTPSession keeps idle connections in a
+per-host pool and reuses them, asks servers for gzipped responses, and
+records how long each request took.
+
+Responses that are requested again and again (API info and feeds) can
+also be stored in an on-disk HTTPCache and revalidated with conditional
+requests.
+
+Errors are raised as urllib2's HTTPError and URLError, so callers can
+handle them exactly as they would errors from urlopen().
+"""
+
+
+from multiprocessing.pool import ThreadPool
+from StringIO import StringIO
+from urllib import getproxies, proxy_bypass
+from urllib2 import HTTPError, Request, URLError, urlopen
+from urlparse import urljoin, urlparse, urlunparse
+import httplib
+import os
+import socket
+import threading
+import timeit
+import zlib
+
+from .httpcache import HTTPCache
+from .tracing import add_span
+from .tools import CACHE_ROOT
+
+
+# Maximum number of idle connections to keep for each host.
+MAX_IDLE_PER_HOST = 4
+
+# Maximum number of redirects to follow for a single request.
+MAX_REDIRECTS = 10
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+# Largest redirect or error response body, in bytes, worth reading just
+# to keep its connection open for the next request.
+MAX_DRAIN_SIZE = 64 * 1024
+
+
+class HTTPSession(object):
+    """Make HTTP requests over pooled, persistent connections.
+
+    A session is safe to use from several threads at once. Each request
+    checks a connection out of the pool for its exclusive use, and the
+    connection is returned when the response body has been read in full
+    or the response is closed.
+    """
+
+    def __init__(self, timeout=30, headers=None, cache=None):
+        """Set up an HTTPSession.
+
+        Args:
+            timeout: Socket timeout, in seconds, for each connection.
+            headers: Optional dictionary of headers to send with every
+                request.
+            cache: Optional HTTPCache in which to store responses read
+                with a cache_source.
+        """
+        self.timeout = timeout
+        self.headers = {"Accept-Encoding": "gzip"}
+        self.headers.update(headers or {})
+        self.cache = cache
+        self.cache_hits = 0
+        self.timings = []
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, headers=None, follow_redirects=True):
+        """Make an HTTP request and return the response.
+
+        Args:
+            method: HTTP method, like "GET" or "HEAD".
+            url: The URL to request.
+            headers: Optional dictionary of headers for this request,
+                which override the session's headers.
+            follow_redirects: Whether to follow 3xx redirects.
+
+        Returns:
+            SessionResponse object. Its body has not been read yet.
+
+        Raises:
+            HTTPError: The server returned a status code of 400 or
+                greater.
+            URLError: The connection failed.
+        """
+        if urlparse(url).scheme not in ("http", "https"):
+            # Let urllib2 handle anything else, like ftp:// URLs.
+            return urlopen(Request(url, headers=headers or {}))
+
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._send(method, url, headers)
+            location = response.getheader("Location")
+            if (not follow_redirects or location is None or
+                    response.status not in REDIRECT_CODES):
+                break
+            response.drain()
+            url = urljoin(url, location)
+            if response.status == 303:
+                method = "GET"
+        else:
+            raise URLError("Too many redirects while opening %s" % url)
+
+        if response.status >= 400:
+            raise HTTPError(response.geturl(), response.status,
+                            response.reason, response.info(),
+                            StringIO(response.drain()))
+        return response
+
+    def open(self, url, headers=None):
+        """GET a URL and return the response, like urlopen()."""
+        return self.request("GET", url, headers)
+
+    def head(self, url, headers=None, follow_redirects=False):
+        """Make a HEAD request and return the (already closed) response."""
+        response = self.request("HEAD", url, headers, follow_redirects)
+        response.close()
+        return response
+
+    def read(self, url, headers=None, cache_source=None):
+        """GET a URL and return the entire (decoded) response body.
+
+        Args:
+            url: The URL to read.
+            headers: Optional dictionary of headers for this request.
+            cache_source: If given (and the session has a cache), the
+                name of the kind of resource being read, like "github"
+                or "sparkle". The response is cached, and the source
+                determines how long it's used before revalidating.
+        """
+        use_cache = self.cache is not None and cache_source is not None
+        entry = self.cache.get(url) if use_cache else None
+        if entry is not None:
+            if self.cache.is_fresh(entry):
+                with self._lock:
+                    self.cache_hits += 1
+                return entry["body"]
+            headers = dict(headers or {})
+            headers.update(self.cache.conditional_headers(entry))
+
+        response = self.open(url, headers)
+        try:
+            if entry is not None and response.getcode() == 304:
+                self.cache.refresh(url, entry)
+                return entry["body"]
+            body = response.read()
+        finally:
+            response.close()
+
+        if use_cache:
+            self.cache.put(url, body, response.info().getheader("ETag"),
+                           response.info().getheader("Last-Modified"),
+                           cache_source)
+        return body
+
+    def read_concurrently(self, urls, headers=None, cache_source=None):
+        """GET several URLs at the same time and return their bodies.
+
+        Waiting on each API request in turn makes the total latency the
+        sum of every round trip. Issuing them all at once brings it
+        down to about the slowest one.
+
+        Args:
+            urls: A sequence of URLs to read.
+            headers: Optional dictionary of headers for every request.
+            cache_source: Optional cache source for every request. (See
+                read().)
+
+        Returns:
+            List of response bodies, in the same order as urls.
+
+        Raises:
+            The exception raised while reading the earliest URL (in the
+            order given) that failed, so that callers can handle errors
+            exactly as if the URLs had been read one after another.
+        """
+        def read_url(url):
+            """Return a (body, exception) tuple for url."""
+            try:
+                return (self.read(url, headers, cache_source), None)
+            except Exception as err:  # pylint: disable=broad-except
+                return (None, err)
+
+        pool = ThreadPool(len(urls))
+        try:
+            results = pool.map(read_url, urls)
+        finally:
+            pool.close()
+            pool.join()
+
+        for _, err in results:
+            if err is not None:
+                raise err
+        return [body for body, _ in results]
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def _send(self, method, url, headers):
+        """Send one request, retrying with a fresh connection if a
+        pooled connection turns out to have been closed by the server."""
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc.lower())
+        path = urlunparse(("", "", parsed.path or "/", parsed.params,
+                           parsed.query, ""))
+        request_headers = dict(self.headers)
+        request_headers.update(headers or {})
+
+        while True:
+            conn, reused = self._checkout(key)
+            start = timeit.default_timer()
+            try:
+                if not reused:
+                    conn.connect()
+                connected = timeit.default_timer()
+                conn.request(method, conn.request_path(url, path),
+                             headers=request_headers)
+                raw_response = conn.getresponse()
+            except (socket.error, httplib.HTTPException) as err:
+                conn.close()
+                if reused:
+                    # Idle connections may be dropped by the server at
+                    # any time. Try again with a fresh connection.
+                    continue
+                raise URLError(err)
+            break
+
+        timing = {"method": method, "url": url, "status": raw_response.status,
+                  "reused_connection": reused,
+                  "connect": connected - start,
+                  "first_byte": timeit.default_timer() - start}
+        return SessionResponse(self, key, conn, raw_response, url, timing,
+                               start)
+
+    def _checkout(self, key):
+        """Return (connection, reused) for the host described by key."""
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                return connections.pop(), True
+        return self._new_connection(key), False
+
+    def _new_connection(self, key):
+        """Return a new, unconnected connection to the host in key."""
+        return _PooledConnection(key[0], key[1], self.timeout)
+
+    def _checkin(self, key, conn, timing):
+        """Return a connection to the pool, and record a timing."""
+        with self._lock:
+            self.timings.append(timing)
+            if conn is None:
+                return
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < MAX_IDLE_PER_HOST:
+                connections.append(conn)
+                return
+        conn.close()
+
+    def summarize_timings(self):
+        """Return a dictionary of totals for the requests made so far."""
+        with self._lock:
+            timings = list(self.timings)
+        return {
+            "requests": len(timings),
+            "cache_hits": self.cache_hits,
+            "reused_connections": len(
+                [t for t in timings if t["reused_connection"]]),
+            "bytes": sum(t.get("bytes", 0) for t in timings),
+            "seconds": sum(t.get("total", 0) for t in timings)}
+
+
+def new_session():
+    """Return an HTTPSession backed by the shared, on-disk HTTP cache."""
+    return HTTPSession(cache=HTTPCache(os.path.join(CACHE_ROOT, "http")))
+
+
+class SessionResponse(object):
+    """A file-like HTTP response, similar to the one urlopen() returns.
+
+    Gzipped bodies are decoded transparently. Reading the body to the
+    end (or closing the response) releases the underlying connection
+    back to the session's pool.
+    """
+
+    def __init__(self, session, key, conn, raw_response, url, timing, start):
+        self._session = session
+        self._key = key
+        self._conn = conn
+        self._raw = raw_response
+        self._url = url
+        self._timing = timing
+        self._start = start
+        self._bytes = 0
+        self._buffer = ""
+        self._released = False
+        self.status = raw_response.status
+        self.code = raw_response.status
+        self.reason = raw_response.reason
+        if (raw_response.getheader("Content-Encoding", "").lower() == "gzip"):
+            self._decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        else:
+            self._decoder = None
+        if raw_response.length == 0:
+            # Nothing to read, as for HEAD requests and 304 responses.
+            raw_response.read()
+            self._release()
+
+    def read(self, amt=None):
+        """Read and return up to amt bytes of the body (or all of it)."""
+        if amt is None:
+            data, self._buffer = self._buffer, ""
+            while not self._released:
+                data += self._read_chunk(None)
+            return data
+        if not self._buffer:
+            self._buffer = self._read_chunk(amt)
+        data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+        return data
+
+    def readline(self, limit=-1):
+        """Read and return one line of the body."""
+        while "\n" not in self._buffer and not self._released:
+            self._buffer += self._read_chunk(8192)
+        end = self._buffer.find("\n") + 1 or len(self._buffer)
+        if limit >= 0:
+            end = min(end, limit)
+        data, self._buffer = self._buffer[:end], self._buffer[end:]
+        return data
+
+    def readlines(self):
+        """Read the rest of the body and return it as a list of lines."""
+        return self.read().splitlines(True)
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+    def _read_chunk(self, amt):
+        """Read and decode the next chunk of the body from the socket."""
+        if self._released:
+            return ""
+        try:
+            while True:
+                if amt is None:
+                    data = self._raw.read()
+                else:
+                    data = self._raw.read(amt)
+                self._bytes += len(data)
+                finished = self._raw.isclosed() or not data
+                if self._decoder is not None:
+                    data = self._decoder.decompress(data)
+                    if finished:
+                        data += self._decoder.flush()
+                # A chunk of gzipped data doesn't always decode to
+                # anything, but an empty result would look like the end
+                # of the body.
+                if data or finished:
+                    break
+        except (socket.error, httplib.HTTPException, zlib.error) as err:
+            # The rest of the body can't be read, so the connection
+            # can't be reused.
+            self.close()
+            raise URLError(err)
+        if finished:
+            self._release()
+        return data
+
+    def drain(self, limit=MAX_DRAIN_SIZE):
+        """Read the rest of a short body, and release the connection.
+
+        The connection is returned to the pool, unless more than limit
+        bytes had to be read, in which case it's closed instead.
+
+        Returns:
+            The rest of the body, or as much of it as was read.
+        """
+        data, self._buffer = self._buffer, ""
+        try:
+            while not self._released and self._bytes <= limit:
+                data += self._read_chunk(8192)
+        except URLError:
+            # The response has been closed.
+            return data
+        self.close()
+        return data
+
+    def getheader(self, name, default=None):
+        """Return the value of the named response header."""
+        return self._raw.getheader(name, default)
+
+    def info(self):
+        """Return the response headers, as urlopen() responses do."""
+        return self._raw.msg
+
+    def geturl(self):
+        """Return the URL that was requested."""
+        return self._url
+
+    def getcode(self):
+        """Return the HTTP status code."""
+        return self.status
+
+    def close(self):
+        """Close the response, discarding any unread body."""
+        if not self._released:
+            self._raw.close()
+            self._conn.close()
+            self._conn = None
+            self._release()
+
+    def _release(self):
+        """Return our connection to the pool, if it can be reused."""
+        if self._released:
+            return
+        self._released = True
+        conn = self._conn
+        if conn is not None and (self._raw.will_close or
+                                 not self._raw.isclosed()):
+            conn.close()
+            conn = None
+        self._timing["bytes"] = self._bytes
+        end = timeit.default_timer()
+        self._timing["total"] = end - self._start
+        name = "%s %s" % (self._timing["method"], urlparse(self._url).netloc)
+        add_span(name, "http", self._start, end, **self._timing)
+        self._session._checkin(  # pylint: disable=protected-access
+            self._key, conn, self._timing)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _PooledConnection(object):
+    """An httplib connection to one host, honoring proxy settings."""
+
+    def __init__(self, scheme, netloc, timeout):
+        self.via_proxy = False
+        host = netloc.split(":")[0]
+        proxy = getproxies().get(scheme)
+        if proxy and not proxy_bypass(host):
+            proxy_netloc = urlparse(proxy).netloc or proxy
+            if scheme == "https":
+                self._conn = httplib.HTTPSConnection(
+                    proxy_netloc, timeout=timeout)
+                self._conn.set_tunnel(netloc)
+            else:
+                self._conn = httplib.HTTPConnection(
+                    proxy_netloc, timeout=timeout)
+                self.via_proxy = True
+        elif scheme == "https":
+            self._conn = httplib.HTTPSConnection(netloc, timeout=timeout)
+        else:
+            self._conn = httplib.HTTPConnection(netloc, timeout=timeout)
+
+    def request_path(self, url, path):
+        """Return the request target: absolute only for plain proxies."""
+        return url.split("#")[0] if self.via_proxy else path
+
+    def connect(self):
+        self._conn.connect()
+
+    def request(self, method, path, headers):
+        self._conn.request(method, path, headers=headers)
+
+    def getresponse(self):
+        return self._conn.getresponse()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,226 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+notifications.py
+
+NotificationBus: Batch up the notifications sent to the Recipe Robot app.
+
+Every fact, warning, and error is sent to the app as a notification.
+Posting each one as a separate cross-process message as soon as it's
+made means hundreds of messages per inspection, so the bus collects
+them per message type and posts them together at most once per
+FLUSH_INTERVAL. Each posted notification's userInfo has the latest
+message under "message" (which is all the app has ever looked at), and
+every message since the last one under "messages".
+
+Messages are never dropped: anything still waiting is posted when the
+bus is flushed, which happens at exit at the latest. If a transport
+fails to post, its messages are kept and posted again next time.
+
+Transports:
+    DistributedNotificationTransport: Posts NSDistributedNotifications
+        for the app. Used by default on macOS.
+    NullTransport: Discards everything. Used by default elsewhere, and
+        in batch mode's worker processes.
+    QueueTransport: Puts notifications on a Queue, for consumers in the
+        same process (and for testing).
+"""
+
+
+from collections import OrderedDict
+import atexit
+import Queue
+import sys
+import threading
+
+
+# Prefix of the notification names the app listens for.
+NOTIFICATION_PREFIX = "com.elliotjordan.recipe-robot.dnc."
+
+# Seconds to collect messages for before posting them.
+FLUSH_INTERVAL = 0.25
+
+
+class NullTransport(object):
+    """A transport that discards notifications."""
+
+    def post(self, message_type, messages):
+        """Discard messages."""
+        pass
+
+
+class QueueTransport(object):
+    """A transport that puts notifications on a Queue.
+
+    Attributes:
+        queue: A Queue.Queue of (message_type, messages) tuples.
+    """
+
+    def __init__(self, queue=None):
+        self.queue = queue if queue is not None else Queue.Queue()
+
+    def post(self, message_type, messages):
+        """Put a (message_type, messages) tuple on the queue."""
+        self.queue.put((message_type, list(messages)))
+
+
+class DistributedNotificationTransport(object):
+    """A transport that posts NSDistributedNotifications to the app.
+
+    Raises:
+        ImportError: PyObjC's Foundation isn't available.
+    """
+
+    def __init__(self):
+        # pylint: disable=no-name-in-module
+        from Foundation import (NSDistributedNotificationCenter,
+                                NSNotificationDeliverImmediately)
+        # pylint: enable=no-name-in-module
+        # NSDistributedNotificationCenter is the NotificationCenter
+        # that allows messages to be sent between applications.
+        self.center = NSDistributedNotificationCenter.defaultCenter()
+        self.options = NSNotificationDeliverImmediately
+
+    def post(self, message_type, messages):
+        """Post one notification for all of messages."""
+        user_info = {"message": messages[-1], "messages": list(messages)}
+        self.center.postNotificationName_object_userInfo_options_(
+            NOTIFICATION_PREFIX + message_type, None, user_info,
+            self.options)
+
+
+def default_transport():
+    """Return the transport to use if none has been set."""
+    if sys.platform == "darwin":
+        try:
+            return DistributedNotificationTransport()
+        except ImportError:
+            pass
+    return NullTransport()
+
+
+class NotificationBus(object):
+    """Collect messages by type, and post them in batches.
+
+    Attributes:
+        transport: Object with a post(message_type, messages) method.
+        interval: Seconds to collect messages for before posting them.
+            If 0, messages are posted as soon as they're sent.
+    """
+
+    def __init__(self, transport, interval=FLUSH_INTERVAL):
+        self.transport = transport
+        self.interval = interval
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        # Held while posting, so that batches are posted in order.
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def send(self, message_type, message):
+        """Queue a message to be posted.
+
+        Args:
+            message_type: String name appended to the notification name
+                (e.g. "warnings").
+            message: The message string.
+        """
+        if isinstance(message, unicode):
+            message = message.encode("utf-8")
+        with self._lock:
+            self._pending.setdefault(message_type, []).append(message)
+            if self.interval > 0 and self._timer is None:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.interval <= 0:
+            self.flush()
+
+    def flush(self):
+        """Post everything that's waiting to be posted."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, OrderedDict()
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            for message_type, messages in pending.iteritems():
+                try:
+                    self.transport.post(message_type, messages)
+                except Exception:  # pylint: disable=broad-except
+                    # Keep them for the next flush, ahead of anything
+                    # sent since.
+                    with self._lock:
+                        messages.extend(
+                            self._pending.pop(message_type, []))
+                        self._pending[message_type] = messages
+
+    def clear(self):
+        """Discard everything that's waiting to be posted."""
+        with self._lock:
+            self._pending.clear()
+
+    def pending_count(self):
+        """Return the number of messages waiting to be posted."""
+        with self._lock:
+            return sum(len(messages) for messages in self._pending.values())
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """Return the NotificationBus used by Facts.
+
+    The bus (and its transport) is created the first time it's needed.
+    """
+    global _bus  # pylint: disable=global-statement
+    with _bus_lock:
+        if _bus is None:
+            _bus = NotificationBus(default_transport())
+            atexit.register(_bus.flush)
+        return _bus
+
+
+def set_transport(transport, interval=FLUSH_INTERVAL):
+    """Replace the bus used by Facts with one that uses transport.
+
+    Messages waiting on the old bus are discarded, since they might
+    have been inherited from a parent process.
+    """
+    global _bus  # pylint: disable=global-statement
+    with _bus_lock:
+        if _bus is not None:
+            _bus.clear()
+        _bus = NotificationBus(transport, interval)
+        atexit.register(_bus.flush)
+        return _bus
+
+
+def send_notification(message_type, message):
+    """Send a message to the app, via the bus."""
+    get_bus().send(message_type, message)
+
+
+def flush():
+    """Post everything waiting on the bus, if there is one."""
+    if _bus is not None:
+        _bus.flush()
@@ -0,0 +1,443 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+payload.py
+
+Find and extract an app from a package Payload in a single pass.
+
+A Payload is a cpio archive, compressed either with gzip or (in newer
+packages) as "pbzx": a series of independently xz-compressed chunks.
+Both are decoded here as a stream, a block or chunk at a time, so memory
+use doesn't grow with the size of the payload. The entries are read in
+order, only the app's Info.plist and icon are written to disk, and
+reading stops as soon as we have them.
+
+Reading pbzx payloads requires the lzma module (or backports.lzma on
+Python 2). Without it, they're reported as unreadable.
+"""
+
+
+import bz2
+import os
+import posixpath
+import stat
+import struct
+import sys
+import zlib
+
+from . import FoundationPlist
+from .archives import extraction_path
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma  # pylint: disable=no-name-in-module
+    except ImportError:
+        lzma = None
+
+
+# Size of the blocks in which compressed data is read and entry data is
+# copied.
+BLOCK_SIZE = 64 * 1024
+
+# Flag set in a pbzx header when another chunk follows.
+PBZX_MORE_CHUNKS = 0x01000000
+
+XZ_MAGIC = "\xfd7zXZ\x00"
+
+# Name of the entry that marks the end of a cpio archive.
+CPIO_TRAILER = "TRAILER!!!"
+
+# "Portable" (odc) cpio header: magic, dev, ino, mode, uid, gid, nlink,
+# rdev, mtime, namesize, filesize; all octal.
+ODC_MAGIC = "070707"
+ODC_HEADER_SIZE = 76
+
+# "New" (newc) cpio header: magic, then 13 hexadecimal fields.
+NEWC_MAGICS = ("070701", "070702")
+NEWC_HEADER_SIZE = 110
+
+
+class PayloadError(Exception):
+    """The payload isn't in a format we can read, or is corrupt."""
+
+
+class CpioEntry(object):
+    """The header of one entry in a cpio archive."""
+
+    def __init__(self, name, mode, size):
+        """Set up a CpioEntry.
+
+        Args:
+            name: Path of the entry, without any leading "./", or None
+                if it's outside the archive's root.
+            mode: The entry's file mode, including its type.
+            size: Size of the entry's data, in bytes.
+        """
+        self.name = name
+        self.mode = mode
+        self.size = size
+
+    def isdir(self):
+        """Return whether the entry is a directory."""
+        return stat.S_ISDIR(self.mode)
+
+    def isfile(self):
+        """Return whether the entry is a regular file."""
+        return stat.S_ISREG(self.mode)
+
+    def islink(self):
+        """Return whether the entry is a symlink."""
+        return stat.S_ISLNK(self.mode)
+
+
+class CpioReader(object):
+    """Read the entries of a cpio archive from a stream, in order.
+
+    Iterating over the reader yields a CpioEntry for each entry. While
+    an entry is current, its data can be read with read(); any data
+    that isn't read is skipped when moving on to the next entry.
+    """
+
+    def __init__(self, stream):
+        """Set up a CpioReader.
+
+        Args:
+            stream: A file-like object returning the uncompressed cpio
+                archive, such as the result of open_payload().
+        """
+        self.stream = stream
+        self._remaining = 0
+        self._padding = 0
+
+    def __iter__(self):
+        while True:
+            self._skip(self._remaining + self._padding)
+            self._remaining = self._padding = 0
+            entry = self._read_header()
+            if entry is None:
+                return
+            yield entry
+
+    def read(self, size=-1):
+        """Read up to size bytes (or all) of the current entry's data."""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = _read_exactly(self.stream, size)
+        self._remaining -= size
+        return data
+
+    def _read_header(self):
+        """Return the next CpioEntry, or None at the end of the archive."""
+        magic = self.stream.read(6)
+        if not magic:
+            return None
+        if magic == ODC_MAGIC:
+            header = magic + _read_exactly(self.stream, ODC_HEADER_SIZE - 6)
+            try:
+                mode = int(header[18:24], 8)
+                name_size = int(header[59:65], 8)
+                size = int(header[65:76], 8)
+            except ValueError:
+                raise PayloadError("Invalid cpio header.")
+            name_padding = data_padding = 0
+        elif magic in NEWC_MAGICS:
+            header = magic + _read_exactly(self.stream, NEWC_HEADER_SIZE - 6)
+            try:
+                mode = int(header[14:22], 16)
+                size = int(header[54:62], 16)
+                name_size = int(header[94:102], 16)
+            except ValueError:
+                raise PayloadError("Invalid cpio header.")
+            name_padding = -(NEWC_HEADER_SIZE + name_size) % 4
+            data_padding = -size % 4
+        else:
+            raise PayloadError("Invalid cpio header.")
+        name = _read_exactly(self.stream, name_size).rstrip("\x00")
+        self._skip(name_padding)
+        if name == CPIO_TRAILER:
+            return None
+        self._remaining = size
+        self._padding = data_padding
+        return CpioEntry(_normalize_name(name), mode, size)
+
+    def _skip(self, size):
+        """Read and discard size bytes from the stream."""
+        while size > 0:
+            size -= len(_read_exactly(self.stream, min(size, BLOCK_SIZE)))
+
+
+class ChunkStream(object):
+    """A file-like object that reads from a sequence of data chunks."""
+
+    def __init__(self, chunks):
+        """Set up a ChunkStream.
+
+        Args:
+            chunks: Iterator of strings, which are read one at a time
+                as they're needed.
+        """
+        self._chunks = chunks
+        self._chunk = ""
+        self._offset = 0
+
+    def read(self, size=-1):
+        """Read up to size bytes (or everything that's left)."""
+        if size is None or size < 0:
+            size = sys.maxsize
+        pieces = []
+        while size > 0:
+            if self._offset >= len(self._chunk):
+                self._chunk = next(self._chunks, None)
+                self._offset = 0
+                if self._chunk is None:
+                    self._chunk = ""
+                    break
+                continue
+            end = min(len(self._chunk), self._offset + size)
+            pieces.append(self._chunk[self._offset:end])
+            size -= end - self._offset
+            self._offset = end
+        return "".join(pieces)
+
+
+def open_payload(payload_file):
+    """Return a stream of the cpio archive in a package Payload.
+
+    Args:
+        payload_file: A file-like object that reads the Payload, such as
+            the one returned by xar.XarArchive.open().
+
+    Returns:
+        A ChunkStream of the uncompressed cpio archive.
+
+    Raises:
+        PayloadError: The Payload is compressed with something we can't
+            decompress.
+    """
+    head = payload_file.read(6)
+    if head.startswith("\x1f\x8b"):
+        chunks = _gzip_chunks(head, payload_file)
+    elif head.startswith("pbzx"):
+        chunks = _pbzx_chunks(head, payload_file)
+    elif head.startswith("BZh"):
+        chunks = _bzip2_chunks(head, payload_file)
+    elif head.startswith("0707"):
+        chunks = _raw_chunks(head, payload_file)
+    else:
+        raise PayloadError("The payload's format isn't recognized.")
+    return ChunkStream(chunks)
+
+
+def extract_app(payload_file, dest_dir, app=None, complete=False,
+                list_apps=False):
+    """Extract an app from a package Payload, reading it only once.
+
+    Only the app's Info.plist and icon are extracted (unless complete
+    is True), and reading stops as soon as they've been found.
+
+    Args:
+        payload_file: A file-like object that reads the Payload.
+        dest_dir: Folder to extract into. The app is extracted to a
+            folder in dest_dir with the app's name, or (if app is "")
+            straight into dest_dir.
+        app: Path of the app within the payload. Use "" if the payload
+            is the app itself (i.e. the package installs to the app's
+            path), or None to use the first app in the payload.
+        complete: Extract every file in the app. (The app's code
+            signature can only be checked if it's complete.)
+        list_apps: Keep reading to the end of the payload to find every
+            app in it.
+
+    Returns:
+        Tuple of (path of the extracted app within the payload, or None
+        if there wasn't one; list of the paths of the apps found in the
+        payload).
+
+    Raises:
+        PayloadError: The payload can't be read.
+    """
+    apps = []
+    info_plist = icons = None
+    reader = CpioReader(open_payload(payload_file))
+    for entry in reader:
+        if entry.name is None:
+            continue
+        if entry.name.endswith(".app") and entry.name not in apps:
+            apps.append(entry.name)
+        if app is None:
+            app = _app_containing(entry.name)
+        if app is None:
+            continue
+
+        if app == "":
+            rel_path = entry.name
+        elif entry.name.startswith(app + "/"):
+            rel_path = entry.name[len(app) + 1:]
+        elif entry.name == app:
+            continue
+        else:
+            if info_plist is not None and not list_apps:
+                # We've been through all of the app.
+                break
+            continue
+
+        if not (complete or rel_path == "Contents/Info.plist" or
+                (icons and rel_path in icons)):
+            continue
+        dest_path = extraction_path(
+            dest_dir, posixpath.join(posixpath.basename(app), rel_path)
+            if app else rel_path)
+        if dest_path is None:
+            continue
+        _extract_entry(reader, entry, dest_path)
+
+        if rel_path == "Contents/Info.plist":
+            info_plist = dest_path
+            icons = _icon_paths(info_plist)
+        elif icons and rel_path in icons:
+            icons = ()
+        if (not complete and not list_apps and info_plist is not None and
+                not icons):
+            break
+
+    if info_plist is None:
+        return (None, apps)
+    return (app, apps)
+
+
+def _extract_entry(reader, entry, dest_path):
+    """Write the current entry of a CpioReader to dest_path, whose
+    parent folder exists."""
+    if entry.isdir():
+        if not os.path.isdir(dest_path):
+            os.makedirs(dest_path)
+        return
+    if os.path.lexists(dest_path):
+        os.remove(dest_path)
+    if entry.islink():
+        os.symlink(reader.read(), dest_path)
+        return
+    if not entry.isfile():
+        return
+    with open(dest_path, "wb") as dest_file:
+        for chunk in iter(lambda: reader.read(BLOCK_SIZE), ""):
+            dest_file.write(chunk)
+    os.chmod(dest_path, entry.mode & 0o777 | stat.S_IWUSR | stat.S_IRUSR)
+
+
+def _icon_paths(info_plist_path):
+    """Return the paths within an app its icon might have."""
+    try:
+        info_plist = FoundationPlist.readPlist(info_plist_path)
+    except Exception:  # pylint: disable=broad-except
+        return ()
+    icon = info_plist.get("CFBundleIconFile")
+    if not icon:
+        return ()
+    icon = "Contents/Resources/" + icon
+    return (icon, icon + ".icns")
+
+
+def _app_containing(name):
+    """Return the path of the outermost app that name is in, or None."""
+    parts = name.split("/")
+    for index, part in enumerate(parts):
+        if part.endswith(".app"):
+            return "/".join(parts[:index + 1])
+    return None
+
+
+def _normalize_name(name):
+    """Return a payload path without any leading "./" or "/".
+
+    Returns None for paths outside the payload's root (e.g. "../foo").
+    """
+    name = posixpath.normpath(name.lstrip("/"))
+    if name.startswith("../") or name == "..":
+        return None
+    return "" if name == "." else name
+
+
+def _read_exactly(stream, size):
+    """Read size bytes from stream, or raise PayloadError."""
+    data = stream.read(size)
+    if len(data) != size:
+        raise PayloadError("The payload is truncated.")
+    return data
+
+
+def _raw_chunks(head, payload_file):
+    """Yield the blocks of an uncompressed payload."""
+    yield head
+    for block in iter(lambda: payload_file.read(BLOCK_SIZE), ""):
+        yield block
+
+
+def _gzip_chunks(head, payload_file):
+    """Yield the decompressed blocks of a gzipped payload."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    block = head
+    try:
+        while block:
+            yield decompressor.decompress(block)
+            if decompressor.unused_data:
+                # Another gzip member follows.
+                block = decompressor.unused_data
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                continue
+            block = payload_file.read(BLOCK_SIZE)
+        yield decompressor.flush()
+    except zlib.error as error:
+        raise PayloadError("Unable to decompress the payload. (%s)" % error)
+
+
+def _bzip2_chunks(head, payload_file):
+    """Yield the decompressed blocks of a bzip2-compressed payload."""
+    decompressor = bz2.BZ2Decompressor()
+    block = head
+    try:
+        while block:
+            yield decompressor.decompress(block)
+            block = payload_file.read(BLOCK_SIZE)
+    except (IOError, EOFError) as error:
+        raise PayloadError("Unable to decompress the payload. (%s)" % error)
+
+
+def _pbzx_chunks(head, payload_file):
+    """Yield the decompressed chunks of a pbzx payload."""
+    header = head + _read_exactly(payload_file, 12 - len(head))
+    flags = struct.unpack(">Q", header[4:12])[0]
+    while flags & PBZX_MORE_CHUNKS:
+        flags, length = struct.unpack(">QQ", _read_exactly(payload_file, 16))
+        chunk = _read_exactly(payload_file, length)
+        if not chunk.startswith(XZ_MAGIC):
+            # Chunks that don't compress well are stored as they are.
+            yield chunk
+            continue
+        if lzma is None:
+            raise PayloadError("Reading this payload requires the lzma "
+                               "module (or backports.lzma).")
+        try:
+            yield lzma.decompress(chunk)
+        except lzma.LZMAError as error:
+            raise PayloadError("Unable to decompress the payload. (%s)" %
+                               error)
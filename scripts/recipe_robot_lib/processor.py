@@ -23,22 +23,48 @@ processor.py
 Processor class to encapsulate information that Recipe Robot needs to
 write recipes.
 
-Makes Processor subclasses from importing and introspection on the
-AutoPkg autopkglib.
+Makes Processor subclasses from a manifest of AutoPkg's processors and
+their input variables. Importing autopkglib and introspecting every
+processor is slow (and impossible where AutoPkg isn't installed), so
+the manifest is generated from autopkglib only once per AutoPkg version
+and cached. If AutoPkg isn't installed, a snapshot of the manifest that
+ships with Recipe Robot (processors.json) is used instead. To update
+the snapshot after a new AutoPkg release:
+
+    python -c "from recipe_robot_lib import processor; \\
+        processor.write_manifest(processor.generate_manifest(), \\
+        'recipe_robot_lib/processors.json')"
+
+Processor classes are created when they're first used, as attributes
+of this module (e.g. processor.URLDownloader).
 """
 
 
+import json
+import os
 import sys
+import types
 
+from . import FoundationPlist
 from .roboabc import RoboDict
-from .tools import robo_print, LogLevel
+from .tools import atomic_write, CACHE_ROOT, robo_print, LogLevel
+
+
+# Version of the manifest format. Cached manifests in other formats are
+# generated again.
+MANIFEST_VERSION = 1
+
+# Where AutoPkg installs autopkglib, and its version file.
+AUTOPKG_LIB_ROOT = "/Library/AutoPkg"
+AUTOPKG_VERSION_FILE = os.path.join(AUTOPKG_LIB_ROOT, "autopkglib",
+                                    "version.plist")
 
-sys.path.append("/Library/AutoPkg")
-try:
-    import autopkglib
-except ImportError:
-    robo_print("AutoPkg must be installed!")
-    sys.exit(1)
+# The manifest that ships with Recipe Robot.
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "processors.json")
+
+# Folder of manifests generated from autopkglib, named by AutoPkg version.
+MANIFEST_CACHE_DIR = os.path.join(CACHE_ROOT, "processors")
 
 
 class AbstractProcessor(object):
@@ -89,14 +115,142 @@ def ProcessorFactory(name, attributes, base_class=AbstractProcessor):
     return newclass
 
 
-# Processors without input_variables are meant to be used as base
-# classes.
-processor_classes = [
-    ProcessorFactory(proc_type,
-                     autopkglib.get_processor(proc_type).input_variables)
-    for proc_type in autopkglib.processor_names() if
-    hasattr(autopkglib.get_processor(proc_type), "input_variables")]
+def autopkg_version(version_file=AUTOPKG_VERSION_FILE):
+    """Return the installed version of AutoPkg, or None."""
+    try:
+        return FoundationPlist.readPlist(version_file)["Version"]
+    except Exception:  # pylint: disable=broad-except
+        # AutoPkg isn't installed, or its version file is unreadable.
+        return None
+
+
+def generate_manifest():
+    """Return a manifest of the processors in autopkglib.
+
+    Processors without input_variables are meant to be used as base
+    classes, so they're left out.
+
+    Raises:
+        ImportError: AutoPkg isn't installed.
+    """
+    if AUTOPKG_LIB_ROOT not in sys.path:
+        sys.path.append(AUTOPKG_LIB_ROOT)
+    import autopkglib  # pylint: disable=import-error
+
+    processors = {}
+    for proc_type in autopkglib.processor_names():
+        proc_class = autopkglib.get_processor(proc_type)
+        if hasattr(proc_class, "input_variables"):
+            processors[proc_type] = sorted(proc_class.input_variables)
+    return {"manifest_version": MANIFEST_VERSION,
+            "autopkg_version": autopkglib.get_autopkg_version(),
+            "processors": processors}
+
+
+def read_manifest(path):
+    """Return the manifest at path, or None if it's missing or invalid."""
+    try:
+        with open(path, "r") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (IOError, OSError, ValueError):
+        return None
+    if (not isinstance(manifest, dict) or
+            manifest.get("manifest_version") != MANIFEST_VERSION):
+        return None
+    return manifest
+
+
+def write_manifest(manifest, path):
+    """Write a manifest to path, atomically."""
+    with atomic_write(path) as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True,
+                  separators=(",", ": "))
+        manifest_file.write("\n")
+
+
+def load_manifest(version_file=AUTOPKG_VERSION_FILE,
+                  cache_dir=MANIFEST_CACHE_DIR):
+    """Return the processor manifest for the installed AutoPkg.
+
+    It's read from the cache if it has been generated for this version
+    of AutoPkg already. Otherwise it's generated from autopkglib and
+    cached. If AutoPkg isn't installed, the bundled snapshot is used.
+
+    Args:
+        version_file: Path of AutoPkg's version.plist.
+        cache_dir: Folder of cached manifests.
+    """
+    version = autopkg_version(version_file)
+    if version is not None:
+        cache_path = os.path.join(cache_dir, "%s.json" % version)
+        manifest = read_manifest(cache_path)
+        if manifest is not None:
+            return manifest
+        try:
+            manifest = generate_manifest()
+        except Exception as error:  # pylint: disable=broad-except
+            robo_print("Unable to read AutoPkg's processors. (%s)",
+                       LogLevel.DEBUG, 0, error)
+        else:
+            try:
+                write_manifest(manifest, cache_path)
+            except (IOError, OSError) as error:
+                robo_print("Unable to cache AutoPkg's processors. (%s)",
+                           LogLevel.DEBUG, 0, error)
+            return manifest
+    robo_print("Using the processors of AutoPkg %s, since AutoPkg isn't "
+               "installed.", LogLevel.DEBUG, 0, _snapshot()["autopkg_version"])
+    return _snapshot()
+
+
+def processor_names():
+    """Return the names of the processors in the manifest."""
+    return sorted(_manifest()["processors"])
+
+
+class _ProcessorModule(types.ModuleType):
+    """This module, with a Processor class for each processor in the
+    manifest created as it's first accessed."""
+
+    def __getattr__(self, name):
+        # Only called for names that aren't module attributes yet.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attributes = _manifest()["processors"].get(name)
+        if attributes is None:
+            raise AttributeError(
+                "module %r has no attribute %r" % (self.__name__, name))
+        processor = ProcessorFactory(name, attributes)
+        setattr(self, name, processor)
+        return processor
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(processor_names()))
+
+
+_loaded_manifest = None
+_loaded_snapshot = None
+
+
+def _manifest():
+    """Return the processor manifest, loading it the first time."""
+    global _loaded_manifest  # pylint: disable=global-statement
+    if _loaded_manifest is None:
+        _loaded_manifest = load_manifest()
+    return _loaded_manifest
+
+
+def _snapshot():
+    """Return the bundled processor manifest."""
+    global _loaded_snapshot  # pylint: disable=global-statement
+    if _loaded_snapshot is None:
+        _loaded_snapshot = read_manifest(SNAPSHOT_PATH)
+    return _loaded_snapshot
+
 
-# Add classes to this module for each AutoPkg processor.
-for processor in processor_classes:
-    globals()[processor.__name__] = processor
+# Replace this module with a _ProcessorModule, keeping a reference to
+# the original so that its globals stay alive.
+_module = _ProcessorModule(__name__, __doc__)
+_module.__dict__.update(globals())
+_module._original_module = sys.modules[__name__]
+sys.modules[__name__] = _module
@@ -34,15 +34,18 @@ import os
 
 from .exceptions import RoboError
 import processor
+from .recipe_index import get_repo_inventory
 from .tools import (create_dest_dirs, create_existing_recipe_list,
                     extract_app_icon, robo_print, robo_join, get_user_defaults,
-                    save_user_defaults, LogLevel, __version__,
-                    get_exitcode_stdout_stderr, timed, SUPPORTED_IMAGE_FORMATS,
+                    LogLevel, __version__,
+                    timed, SUPPORTED_IMAGE_FORMATS,
                     SUPPORTED_ARCHIVE_FORMATS, SUPPORTED_INSTALL_FORMATS,
                     ALL_SUPPORTED_FORMATS)
+from .tracing import traced
 
 
 @timed
+@traced("generate")
 def generate_recipes(facts, prefs):
     """Generate the selected types of recipes.
 
@@ -50,6 +53,8 @@ def generate_recipes(facts, prefs):
         facts: A continually-updated dictionary containing all the information
             we know so far about the app associated with the input path.
         prefs: The dictionary containing a key/value pair for each preference.
+            Its RecipeCreateCount is increased for each recipe created,
+            but it isn't saved; that's up to the caller.
     """
     recipes = facts["recipes"]
     if "app_name" in facts:
@@ -81,11 +86,6 @@ def generate_recipes(facts, prefs):
             "want to verify that and modify the recipes if necessary.")
         facts["version_key"] = "CFBundleShortVersionString"
 
-    # TODO(Elliot): Run `autopkg repo-list` once and store the resulting value
-    # for future use when detecting missing required repos, rather than running
-    # `autopkg repo-list` separately during each check. (For example, the
-    # FileWaveImporter repo must be present to run created filewave recipes.)
-
     # Prepare the destination directory.
     # TODO (Shea): This JSS Recipe format code is repeated all over.
     # Smells like a refactor.
@@ -101,11 +101,6 @@ def generate_recipes(facts, prefs):
 
     build_recipes(facts, preferred, prefs)
 
-    # TODO (Shea): As far as I can tell, the only pref that changes is the
-    # recipe created count. Move out from here!
-    # Save preferences to disk for next time.
-    save_user_defaults(prefs)
-
 
 def raise_if_recipes_cannot_be_generated(facts, preferred):
     """Raise a RoboError if recipes cannot be generated."""
@@ -130,11 +125,7 @@ def raise_if_recipes_cannot_be_generated(facts, preferred):
 
 def required_repo_reminder(repo_name, repo_url, facts):
     """Print a reminder if a required repo is not already added."""
-    cmd = "/usr/local/bin/autopkg repo-list"
-    exitcode, out, err = get_exitcode_stdout_stderr(cmd)
-    if not any((line.endswith("(%s)" % repo_url) or
-                line.endswith("(%s.git)" % repo_url)) for
-                line in out.splitlines()):
+    if not get_repo_inventory().has_repo(repo_url):
         facts["reminders"].append(
             "You'll need to add the %s repo in order to use "
             "this recipe:\n        autopkg repo-add "
@@ -201,6 +192,7 @@ def get_generation_func(facts, prefs, recipe):
     return generation_func
 
 
+@traced("generate")
 def generate_download_recipe(facts, prefs, recipe):
     """Generate a download recipe on passed recipe dict.
 
@@ -251,10 +243,9 @@ def generate_download_recipe(facts, prefs, recipe):
             SOURCEFORGE_FILE_PATTERN="\\.%s" % facts["download_format"],
             SOURCEFORGE_PROJECT_ID=facts["sourceforge_id"])
         recipe.append_processor(sf_url_provider)
-        if not os.path.exists(os.path.expanduser(
-                "~/Library/AutoPkg/RecipeRepos/com.github.autopkg."
-                "jessepeterson-recipes/GrandPerspective/"
-                "SourceForgeURLProvider.py")):
+        if not get_repo_inventory().has_file(
+                "https://github.com/autopkg/jessepeterson-recipes",
+                "GrandPerspective/SourceForgeURLProvider.py"):
             facts["reminders"].append(
                 "The download recipe I created uses the "
                 "SourceForgeURLProvider processor, which is not in the "
@@ -375,6 +366,7 @@ def needs_versioner(facts):
     return format_needs_versioner and not sparkle_version
 
 
+@traced("generate")
 def generate_app_store_munki_recipe(facts, prefs, recipe):
     """Generate a munki recipe on passed recipe dict.
 
@@ -419,6 +411,7 @@ def generate_app_store_munki_recipe(facts, prefs, recipe):
     return recipe
 
 
+@traced("generate")
 def generate_munki_recipe(facts, prefs, recipe):
     """Generate a munki recipe on passed recipe dict.
 
@@ -561,6 +554,7 @@ def generate_munki_recipe(facts, prefs, recipe):
     return recipe
 
 
+@traced("generate")
 def generate_app_store_pkg_recipe(facts, prefs, recipe):
     """Generate a pkg recipe on passed recipe dict.
 
@@ -589,6 +583,7 @@ def generate_app_store_pkg_recipe(facts, prefs, recipe):
     return recipe
 
 
+@traced("generate")
 def generate_pkg_recipe(facts, prefs, recipe):
     """Generate a pkg recipe on passed recipe dict.
 
@@ -685,6 +680,7 @@ def generate_pkg_recipe(facts, prefs, recipe):
     return recipe
 
 
+@traced("generate")
 def generate_install_recipe(facts, prefs, recipe):
     """Generate an install recipe on passed recipe dict.
 
@@ -766,6 +762,7 @@ def generate_install_recipe(facts, prefs, recipe):
     return recipe
 
 
+@traced("generate")
 def generate_jss_recipe(facts, prefs, recipe):
     """Generate a JSS recipe on passed recipe dict.
 
@@ -871,6 +868,7 @@ def generate_jss_recipe(facts, prefs, recipe):
     return recipe
 
 
+@traced("generate")
 def generate_lanrev_recipe(facts, prefs, recipe):
     """Generate a LANrev recipe on passed recipe dict.
 
@@ -906,9 +904,8 @@ def generate_lanrev_recipe(facts, prefs, recipe):
     recipe.set_parent_from(prefs, facts, "pkg")
 
     # Print a reminder if the required repo isn't present on disk.
-    required_repo_reminder("LANrevImporter",
-                           "https://github.com/jbaker10/LANrevImporter",
-                           facts)
+    lanrevimporter_url = "https://github.com/jbaker10/LANrevImporter"
+    required_repo_reminder("LANrevImporter", lanrevimporter_url, facts)
 
     recipe.append_processor({
         "Processor":
@@ -927,6 +924,7 @@ def generate_lanrev_recipe(facts, prefs, recipe):
     return recipe
 
 
+@traced("generate")
 def generate_sccm_recipe(facts, prefs, recipe):
     """Generate an SCCM recipe on passed recipe dict.
 
@@ -960,9 +958,8 @@ def generate_sccm_recipe(facts, prefs, recipe):
     recipe.set_parent_from(prefs, facts, "pkg")
 
     # Print a reminder if the required repo isn't present on disk.
-    required_repo_reminder("cgerke-recipes",
-                           "https://github.com/autopkg/cgerke-recipes",
-                           facts)
+    cgerke_url = "https://github.com/autopkg/cgerke-recipes"
+    required_repo_reminder("cgerke-recipes", cgerke_url, facts)
 
     recipe.append_processor({
         "Processor":
@@ -977,6 +974,7 @@ def generate_sccm_recipe(facts, prefs, recipe):
     return recipe
 
 
+@traced("generate")
 def generate_filewave_recipe(facts, prefs, recipe):
     """Generate a FileWave recipe on passed recipe dict.
 
@@ -1068,6 +1066,7 @@ def generate_filewave_recipe(facts, prefs, recipe):
     return recipe
 
 
+@traced("generate")
 def generate_ds_recipe(facts, prefs, recipe):
     """Generate a DeployStudio recipe on passed recipe dict.
 
@@ -1123,6 +1122,7 @@ def generate_ds_recipe(facts, prefs, recipe):
 
 
 # TODO: Not completed, does not function yet
+@traced("generate")
 def generate_bigfix_recipe(facts, prefs, recipe):
     """Generate a BigFix recipe on passed recipe dict.
 
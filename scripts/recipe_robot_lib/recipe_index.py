@@ -0,0 +1,581 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+recipe_index.py
+
+RecipeIndex: Persistent index of existing AutoPkg recipes.
+
+Before generating recipes we check whether recipes already exist for the
+app. Running `autopkg search` for that queries the GitHub search API
+once per name variant, which is slow and uses up the API rate limit,
+especially in batch mode. The index instead records the filename,
+Identifier, NAME input and ParentRecipe of every recipe in the recipe
+repos that AutoPkg has cloned locally, along with the results of recent
+`autopkg search` runs. It's refreshed incrementally: only recipe files
+whose modification time or size has changed are read again.
+
+Lookups are answered from in-memory tables built when the index is
+loaded: exact (case-insensitive) lookups from a dictionary, prefix
+lookups by bisecting a sorted list of keys, and fuzzy lookups from a
+trigram index.
+
+The index is stored as a JSON file, and is only written while holding
+an exclusive lock on a lock file, so that several Recipe Robot
+processes can share it.
+
+RepoInventory: The recipe repos that AutoPkg has added.
+
+Recipes that use processors from other repos come with a reminder to add
+those repos. get_repo_inventory() loads the list of repos once, from
+AutoPkg's preferences (or `autopkg repo-list` if they can't be read),
+and only loads it again if the preferences or the recipe repos folder
+have been modified since.
+"""
+
+
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+import fcntl
+import json
+import os
+import plistlib
+import re
+import time
+
+from . import commands
+from . import FoundationPlist
+from .tools import atomic_write, CACHE_ROOT, ensure_dir
+
+
+# Version of the index file format. Indexes written in other formats are
+# discarded and rebuilt.
+INDEX_VERSION = 1
+
+# AutoPkg's preferences, which say where its recipe repos are.
+AUTOPKG_PREFS_FILE = os.path.expanduser(
+    "~/Library/Preferences/com.github.autopkg.plist")
+DEFAULT_RECIPE_REPO_DIR = "~/Library/AutoPkg/RecipeRepos"
+
+# Seconds for which cached `autopkg search` results are used.
+SEARCH_TTL = 24 * 60 * 60
+
+# A line of `autopkg search --path-only` output: the recipe's filename
+# (which may contain spaces), its repo, and its path in the repo.
+SEARCH_RESULT_RE = re.compile(r"^(\S.*?\.recipe)\s+(\S+)\s+(\S.*?)\s*$")
+
+# Minimum similarity (0 to 1) of fuzzy matches.
+DEFAULT_FUZZY_THRESHOLD = 0.5
+
+# A line of `autopkg repo-list` output: the repo's path and its URL.
+REPO_LIST_RE = re.compile(r"^(.+?) \((\S+)\)\s*$")
+
+# The RepoInventory loaded by get_repo_inventory(), the recipe repos
+# folder it was loaded from, and the modification times of AutoPkg's
+# preferences and that folder at the time.
+_repo_inventory = None
+_repo_inventory_dir = None
+_repo_inventory_mtimes = None
+
+
+class RecipeIndex(object):
+    """Find existing AutoPkg recipes by name, without searching GitHub."""
+
+    def __init__(self, path, recipe_dirs=None):
+        """Set up a RecipeIndex, loading it from disk if it exists.
+
+        Args:
+            path: Path of the index file. Its folder is created if it
+                doesn't exist.
+            recipe_dirs: Folders containing recipes (usually clones of
+                recipe repos). Defaults to those in AutoPkg's
+                preferences.
+        """
+        self.path = os.path.expanduser(path)
+        self.lock_path = self.path + ".lock"
+        if recipe_dirs is None:
+            recipe_dirs = autopkg_recipe_dirs()
+        self.recipe_dirs = [os.path.expanduser(recipe_dir)
+                            for recipe_dir in recipe_dirs]
+        ensure_dir(os.path.dirname(self.path))
+        self._data = self._read()
+        self._build_tables()
+
+    def __len__(self):
+        """Return the number of recipes in the index."""
+        return len(self._recipes)
+
+    def refresh(self):
+        """Bring the index up to date with the recipe folders.
+
+        The recipe files are listed every time, but only recipes whose
+        modification time or size has changed since they were indexed
+        are read again, and the index file is only locked and written
+        if something changed.
+
+        Returns:
+            Number of recipe files read.
+        """
+        recipe_files = list(self._list_recipe_files())
+        if self._is_current(self._data, recipe_files):
+            return 0
+        data = None
+        try:
+            with self._locked():
+                # Start from what other processes may have written.
+                current = self._read()
+                if self._is_current(current, recipe_files):
+                    data, read_count = current, 0
+                else:
+                    data, read_count = self._refreshed(current, recipe_files)
+                    self._write(data)
+        except (IOError, OSError):
+            # The index can't be saved, but can still be used.
+            if data is None:
+                data, read_count = self._refreshed(self._data, recipe_files)
+        self._data = data
+        self._build_tables()
+        return read_count
+
+    def has_local_recipes(self):
+        """Return whether any local recipes are indexed."""
+        return bool(self._recipes)
+
+    def exact(self, term):
+        """Return recipes whose filename, Identifier or NAME is term.
+
+        Filenames match with or without their ".recipe" extension, and
+        case doesn't matter.
+        """
+        return self._lookup(self._exact.get(term.lower(), ()))
+
+    def prefix(self, term):
+        """Return recipes with a filename, Identifier or NAME starting
+        with term (case-insensitively)."""
+        term = term.lower()
+        found = set()
+        index = bisect_left(self._keys, term)
+        while index < len(self._keys) and self._keys[index].startswith(term):
+            found.update(self._exact[self._keys[index]])
+            index += 1
+        return self._lookup(found)
+
+    def fuzzy(self, term, threshold=DEFAULT_FUZZY_THRESHOLD):
+        """Return recipes with a filename or NAME similar to term.
+
+        Similarity is the Dice coefficient of the trigrams of term and
+        of the filename or NAME, ignoring case.
+
+        Returns:
+            List of (similarity, recipe) tuples, most similar first.
+        """
+        term_trigrams = trigrams(term)
+        if not term_trigrams:
+            return []
+        shared = defaultdict(int)
+        for trigram in term_trigrams:
+            for key in self._trigrams.get(trigram, ()):
+                shared[key] += 1
+        scores = {}
+        for key, count in shared.items():
+            trigram_count, recipe_ids = self._fuzzy_keys[key]
+            score = 2.0 * count / (len(term_trigrams) + trigram_count)
+            if score < threshold:
+                continue
+            for recipe_id in recipe_ids:
+                scores[recipe_id] = max(score, scores.get(recipe_id, 0))
+        return sorted(((score, self._recipes[recipe_id])
+                       for recipe_id, score in scores.items()),
+                      key=lambda item: (-item[0], item[1]["filename"]))
+
+    def find_existing(self, names, recipe_types):
+        """Find local recipes of the given types for any of the names.
+
+        Recipes match if their filename is "<name>.<type>.recipe", or if
+        they're of the right type and their NAME input is the name. All
+        name variants are looked up at once.
+
+        Args:
+            names: Variants of the app's name, e.g. ["Google Chrome",
+                "GoogleChrome"].
+            recipe_types: Recipe types, e.g. ["download", "munki"].
+
+        Returns:
+            Dictionary of lists of matching recipes, keyed by recipe
+            type. Types without matches are left out.
+        """
+        found = {}
+        for recipe_type in recipe_types:
+            matches = {}
+            for name in names:
+                for recipe in (self.exact("%s.%s" % (name, recipe_type)) +
+                               self.exact(name)):
+                    if (recipe["type"] or "").lower() == recipe_type.lower():
+                        matches[recipe["path"]] = recipe
+            if matches:
+                found[recipe_type] = sorted(
+                    matches.values(), key=lambda recipe: recipe["filename"])
+        return found
+
+    def cached_search(self, term):
+        """Return recent `autopkg search` results for term, or None.
+
+        Returns:
+            List of [filename, repo, path] lists.
+        """
+        search = self._data["searches"].get(term.lower())
+        if search is None or time.time() - search["stored_at"] >= SEARCH_TTL:
+            return None
+        return search["results"]
+
+    def add_search(self, term, output):
+        """Record the output of `autopkg search --path-only term`."""
+        results = parse_search_output(output)
+        try:
+            with self._locked():
+                data = self._read()
+                data["searches"][term.lower()] = {"stored_at": time.time(),
+                                                  "results": results}
+                for key, search in data["searches"].items():
+                    if time.time() - search["stored_at"] >= SEARCH_TTL:
+                        del data["searches"][key]
+                self._write(data)
+        except (IOError, OSError):
+            # The search just runs again next time.
+            return results
+        self._data["searches"] = data["searches"]
+        return results
+
+    def _is_current(self, data, recipe_files):
+        """Return whether data indexes exactly the recipe_files listed
+        by _list_recipe_files()."""
+        if data["recipe_dirs"] != self.recipe_dirs:
+            return False
+        if len(data["files"]) != len(recipe_files):
+            return False
+        for path, mtime, size in recipe_files:
+            entry = data["files"].get(path)
+            if (entry is None or entry["mtime"] != mtime or
+                    entry["size"] != size):
+                return False
+        return True
+
+    def _refreshed(self, data, recipe_files):
+        """Return data updated with the recipe_files listed by
+        _list_recipe_files(), and the number of recipe files read."""
+        data = dict(data)
+        old_files = data["files"]
+        if data["recipe_dirs"] != self.recipe_dirs:
+            old_files = {}
+            data["recipe_dirs"] = list(self.recipe_dirs)
+        files = {}
+        read_count = 0
+        for path, mtime, size in recipe_files:
+            entry = old_files.get(path)
+            if (entry is None or entry["mtime"] != mtime or
+                    entry["size"] != size):
+                entry = {"mtime": mtime, "size": size,
+                         "recipe": read_recipe(path)}
+                read_count += 1
+            files[path] = entry
+        data["files"] = files
+        return data, read_count
+
+    def _list_recipe_files(self):
+        """Yield (path, mtime, size) for each recipe in the folders."""
+        for recipe_dir in self.recipe_dirs:
+            for parent, dirnames, filenames in os.walk(recipe_dir):
+                # Skip .git and other hidden folders.
+                dirnames[:] = [name for name in dirnames
+                               if not name.startswith(".")]
+                for filename in filenames:
+                    if not filename.endswith(".recipe"):
+                        continue
+                    path = os.path.join(parent, filename)
+                    try:
+                        info = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, info.st_mtime, info.st_size
+
+    def _build_tables(self):
+        """Build the in-memory lookup tables from the index data."""
+        self._recipes = []
+        self._exact = defaultdict(set)
+        for path, entry in sorted(self._data["files"].items()):
+            recipe = entry["recipe"]
+            if recipe is None:
+                continue
+            recipe = dict(recipe, path=path)
+            recipe_id = len(self._recipes)
+            self._recipes.append(recipe)
+            stem = recipe["filename"][:-len(".recipe")]
+            for key in (recipe["filename"], stem, recipe["identifier"],
+                        recipe["name"]):
+                if key:
+                    self._exact[key.lower()].add(recipe_id)
+        self._exact = dict(self._exact)
+        self._keys = sorted(self._exact)
+
+        # Trigrams of the app names in filenames, and of NAMEs, for
+        # fuzzy lookups. Identifiers mostly share their reverse-domain
+        # prefixes, so they would only add noise.
+        self._trigrams = defaultdict(set)
+        self._fuzzy_keys = {}
+        for recipe_id, recipe in enumerate(self._recipes):
+            base = recipe["filename"][:-len(".recipe")]
+            if recipe["type"]:
+                base = base[:-len(recipe["type"]) - 1]
+            for key in (base, recipe["name"]):
+                if not key:
+                    continue
+                key = key.lower()
+                if key not in self._fuzzy_keys:
+                    key_trigrams = trigrams(key)
+                    self._fuzzy_keys[key] = (len(key_trigrams), set())
+                    for trigram in key_trigrams:
+                        self._trigrams[trigram].add(key)
+                self._fuzzy_keys[key][1].add(recipe_id)
+
+    def _lookup(self, recipe_ids):
+        """Return the recipes with the given ids, sorted by filename."""
+        return sorted((self._recipes[recipe_id] for recipe_id in recipe_ids),
+                      key=lambda recipe: (recipe["filename"], recipe["path"]))
+
+    def _read(self):
+        """Return the index data, which is empty if it can't be read."""
+        data = None
+        try:
+            with open(self.path, "r") as index_file:
+                data = json.load(index_file)
+        except (IOError, OSError, ValueError):
+            pass
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            data = {"version": INDEX_VERSION, "recipe_dirs": None,
+                    "files": {}, "searches": {}}
+        return data
+
+    def _write(self, data):
+        """Replace the index file. Caller holds the lock."""
+        with atomic_write(self.path) as index_file:
+            json.dump(data, index_file)
+
+    @contextmanager
+    def _locked(self):
+        """Hold an exclusive lock on the index, across processes."""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def new_recipe_index():
+    """Return the shared RecipeIndex in the Recipe Robot cache."""
+    return RecipeIndex(os.path.join(CACHE_ROOT, "recipe_index.json"))
+
+
+class RepoInventory(object):
+    """The recipe repos that AutoPkg has added, looked up by URL."""
+
+    def __init__(self, repos):
+        """Set up a RepoInventory.
+
+        Args:
+            repos: Dictionary of repo URLs, keyed by the path of the
+                repo's local clone.
+        """
+        self.repos = dict(repos)
+        self._paths = dict((normalize_repo_url(url), path)
+                           for path, url in self.repos.items())
+
+    def __len__(self):
+        """Return the number of repos."""
+        return len(self.repos)
+
+    @classmethod
+    def from_prefs(cls, prefs):
+        """Return the RepoInventory in AutoPkg's RECIPE_REPOS pref."""
+        repos = {}
+        for path, info in prefs.get("RECIPE_REPOS", {}).items():
+            if info.get("URL"):
+                repos[os.path.expanduser(path)] = info["URL"]
+        return cls(repos)
+
+    @classmethod
+    def from_repo_list(cls, output):
+        """Return the RepoInventory in `autopkg repo-list` output."""
+        repos = {}
+        for line in output.splitlines():
+            match = REPO_LIST_RE.match(line)
+            if match:
+                repos[match.group(1)] = match.group(2)
+        return cls(repos)
+
+    def has_repo(self, url):
+        """Return whether the repo at url has been added."""
+        return normalize_repo_url(url) in self._paths
+
+    def repo_path(self, url):
+        """Return the path of the repo at url, or None."""
+        return self._paths.get(normalize_repo_url(url))
+
+    def has_file(self, url, rel_path):
+        """Return whether the repo at url has been added and has a file.
+
+        Args:
+            url: URL of the repo.
+            rel_path: Path of the file within the repo.
+        """
+        path = self.repo_path(url)
+        return path is not None and os.path.exists(
+            os.path.join(path, rel_path))
+
+
+def get_repo_inventory():
+    """Return the RepoInventory of the recipe repos AutoPkg has added.
+
+    It's loaded from AutoPkg's preferences (or, if they can't be read,
+    from `autopkg repo-list`) the first time, and only loaded again if
+    the preferences or the recipe repos folder have changed since.
+    """
+    global _repo_inventory, _repo_inventory_dir  # pylint: disable=global-statement
+    global _repo_inventory_mtimes  # pylint: disable=global-statement
+    if (_repo_inventory is not None and _repo_inventory_mtimes ==
+            _mtimes(AUTOPKG_PREFS_FILE, _repo_inventory_dir)):
+        return _repo_inventory
+
+    prefs = read_autopkg_prefs(AUTOPKG_PREFS_FILE)
+    repo_dir = os.path.expanduser((prefs or {}).get(
+        "RECIPE_REPO_DIR", DEFAULT_RECIPE_REPO_DIR))
+    # Take the modification times first, so that changes made while
+    # loading are picked up next time.
+    mtimes = _mtimes(AUTOPKG_PREFS_FILE, repo_dir)
+    if prefs is not None and "RECIPE_REPOS" in prefs:
+        inventory = RepoInventory.from_prefs(prefs)
+    else:
+        exitcode, out, _ = commands.run(
+            ["/usr/local/bin/autopkg", "repo-list"])
+        inventory = RepoInventory.from_repo_list(out if exitcode == 0 else "")
+    _repo_inventory = inventory
+    _repo_inventory_dir = repo_dir
+    _repo_inventory_mtimes = mtimes
+    return inventory
+
+
+def normalize_repo_url(url):
+    """Return a repo URL without any trailing slash or ".git", in
+    lowercase, so that URLs of the same repo compare equal."""
+    url = url.strip().rstrip("/")
+    if url.endswith(".git"):
+        url = url[:-len(".git")]
+    return url.lower()
+
+
+def read_autopkg_prefs(prefs_file=AUTOPKG_PREFS_FILE):
+    """Return AutoPkg's preferences, or None if they can't be read."""
+    try:
+        prefs = FoundationPlist.readPlist(prefs_file)
+    except Exception:  # pylint: disable=broad-except
+        # No preferences, or ones we can't parse.
+        return None
+    return prefs if hasattr(prefs, "get") else None
+
+
+def autopkg_recipe_dirs(prefs_file=AUTOPKG_PREFS_FILE):
+    """Return the folders where AutoPkg keeps recipes.
+
+    These are the recipe repos folder and any RECIPE_SEARCH_DIRS from
+    AutoPkg's preferences. Folders that don't exist are left out.
+    """
+    prefs = read_autopkg_prefs(prefs_file) or {}
+    recipe_dirs = [prefs.get("RECIPE_REPO_DIR", DEFAULT_RECIPE_REPO_DIR)]
+    search_dirs = prefs.get("RECIPE_SEARCH_DIRS", [])
+    if isinstance(search_dirs, basestring):
+        search_dirs = [search_dirs]
+    recipe_dirs.extend(search_dirs)
+    result = []
+    for recipe_dir in recipe_dirs:
+        recipe_dir = os.path.abspath(os.path.expanduser(recipe_dir))
+        if recipe_dir in result or not os.path.isdir(recipe_dir):
+            continue
+        # Search dirs are often inside the repos folder, or contain it.
+        if any(recipe_dir.startswith(other + os.sep) for other in result):
+            continue
+        result = [other for other in result
+                  if not other.startswith(recipe_dir + os.sep)]
+        result.append(recipe_dir)
+    return result
+
+
+def read_recipe(path):
+    """Return the indexed details of a recipe file, or None.
+
+    Returns:
+        Dictionary with keys "filename", "type", "identifier", "name"
+        and "parent". Any but "filename" may be None.
+    """
+    try:
+        recipe = plistlib.readPlist(path)
+    except Exception:  # pylint: disable=broad-except
+        # A recipe we can't parse is just left out of the index.
+        return None
+    if not isinstance(recipe, dict):
+        return None
+    name = recipe.get("Input", {}).get("NAME")
+    filename = os.path.basename(path)
+    parts = filename.split(".")
+    return {"filename": filename,
+            "type": parts[-2] if len(parts) > 2 else None,
+            "identifier": recipe.get("Identifier"),
+            "name": name if isinstance(name, basestring) else None,
+            "parent": recipe.get("ParentRecipe")}
+
+
+def parse_search_output(output):
+    """Parse the output of `autopkg search --path-only`.
+
+    Returns:
+        List of [filename, repo, path] lists.
+    """
+    results = []
+    for line in output.splitlines():
+        match = SEARCH_RESULT_RE.match(line)
+        if match:
+            results.append(list(match.groups()))
+    return results
+
+
+def trigrams(text):
+    """Return the set of trigrams of text, ignoring case and spaces."""
+    text = "  %s " % "".join(text.lower().split())
+    return set(text[index:index + 3] for index in range(len(text) - 2))
+
+
+def _mtimes(*paths):
+    """Return the modification times of paths (None if missing)."""
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
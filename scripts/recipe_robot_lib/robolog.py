@@ -0,0 +1,342 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+robolog.py
+
+robo_print: Recipe Robot's output, from the welcome robot to debug
+messages.
+
+Output goes through a small pipeline:
+    1. robo_print() checks the log level before doing anything else.
+       Messages can be given %-style arguments, which are only
+       formatted if the message is going to be output:
+           robo_print("App name is: %s", LogLevel.VERBOSE, 4, app_name)
+    2. The formatter turns the message into text. HumanFormatter is the
+       usual (optionally colored) terminal output, and JsonFormatter
+       outputs a JSON object per line, for other programs to read.
+    3. The text is queued for a LogWriter thread, which writes it to
+       stdout (or stderr, for errors and warnings) in batches.
+
+Each message also carries the current context: details such as the
+batch job number, input path, and stage (set with set_context() and
+stage()), which JsonFormatter includes and HumanFormatter uses to tag
+batch jobs' output.
+
+Since output is written by another thread, call flush() before writing
+to stdout or stderr directly, or prompting for input. Text that isn't a
+message of its own (like a download's progress, updated in place) can
+be written with write_status(), in order with the messages around it.
+"""
+
+
+from collections import namedtuple
+from contextlib import contextmanager
+import atexit
+import json
+import os
+import Queue
+import sys
+import threading
+import time
+
+
+ENDC = "\033[0m"
+
+# Writes of up to this many bytes to a pipe aren't interleaved with
+# other processes' writes, so batch workers' lines stay whole.
+PIPE_BUF = 512
+
+
+class LogLevel(object):
+    """Specify colors that are used in Terminal output."""
+    DEBUG = ("\033[95m", "DEBUG")
+    ERROR = ("\033[1;38;5;196m", "ERROR")
+    LOG = ("", "")
+    REMINDER = ("\033[1;38;5;33m", "REMINDER")
+    VERBOSE = ("\033[0m", "")
+    WARNING = ("\033[1;38;5;208m", "WARNING")
+
+
+# Names of the log levels, as output by JsonFormatter.
+LEVEL_NAMES = {LogLevel.DEBUG: "debug",
+               LogLevel.ERROR: "error",
+               LogLevel.LOG: "log",
+               LogLevel.REMINDER: "reminder",
+               LogLevel.VERBOSE: "verbose",
+               LogLevel.WARNING: "warning"}
+
+
+class OutputMode(object):
+    """Manage global output mode state with a singleton."""
+
+    # Use --verbose command-line argument, or hard-code
+    # to "True" here for additional user-facing output.
+    verbose_mode = False
+
+    # Use --debug command-line argument, or hard-code
+    # to "True" here for additional development output.
+    debug_mode = False
+
+    @classmethod
+    def set_verbose_mode(cls, value):
+        """Set the class variable for verbose_mode."""
+        if isinstance(value, bool):
+            cls.verbose_mode = value
+        else:
+            raise ValueError
+
+    @classmethod
+    def set_debug_mode(cls, value):
+        """Set the class variable for debug_mode."""
+        if isinstance(value, bool):
+            cls.debug_mode = value
+        else:
+            raise ValueError
+
+
+class Record(namedtuple(
+        "Record", ("created", "level", "message", "args", "indent",
+                   "context"))):
+    """A message to be output.
+
+    Attributes:
+        created: Time the message was logged, in seconds since the
+            epoch.
+        level: The message's LogLevel.
+        message: The message string, to be %-formatted with args.
+        args: Tuple of arguments for message.
+        indent: Number of spaces to indent the message by.
+        context: Dictionary of the context the message was logged in.
+    """
+    __slots__ = ()
+
+    def get_message(self):
+        """Return the message, formatted with its arguments."""
+        message = self.message
+        if self.args:
+            message = message % self.args
+        if isinstance(message, unicode):
+            message = message.encode("utf-8")
+        return message
+
+
+class HumanFormatter(object):
+    """Format messages for people to read.
+
+    Attributes:
+        color: Whether to color messages by level.
+    """
+
+    def __init__(self, color=False):
+        self.color = color
+
+    def format(self, record):
+        """Return a record as a string."""
+        level = record.level
+        color = level[0] if self.color else ""
+        suffix = ENDC if self.color else ""
+        prefix = "[%s] " % level[1] if level[1] else ""
+        if "job" in record.context:
+            # Tag each batch job's output, since jobs run concurrently.
+            prefix = "[job %s] %s" % (record.context["job"], prefix)
+        return (color + record.indent * " " + prefix + record.get_message() +
+                suffix)
+
+
+class JsonFormatter(object):
+    """Format messages as JSON objects, one per line."""
+
+    def format(self, record):
+        """Return a record as a single line of JSON."""
+        entry = dict(record.context)
+        entry.update({"time": round(record.created, 3),
+                      "level": LEVEL_NAMES.get(record.level, "log"),
+                      "message": record.get_message().strip()})
+        return json.dumps(entry, sort_keys=True)
+
+
+class LogWriter(object):
+    """Write text to streams from a background thread, in batches.
+
+    Each process gets its own thread (which is started when the first
+    text is written), so the writer carries on working in batch mode's
+    worker processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def write(self, stream, text):
+        """Queue text to be written to stream."""
+        if isinstance(text, unicode):
+            text = text.encode("utf-8")
+        self._get_queue().put((stream, text))
+
+    def flush(self):
+        """Wait until all the queued text has been written."""
+        if self._queue is not None and self._pid == os.getpid():
+            self._queue.join()
+
+    def _get_queue(self):
+        """Return the queue, starting a thread to empty it if needed."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Anything queued in our parent process is its own
+                    # to write.
+                    self._queue = Queue.Queue()
+                    thread = threading.Thread(target=self._run,
+                                              args=(self._queue,))
+                    thread.daemon = True
+                    thread.start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def _run(self, queue):
+        """Write everything put on the queue."""
+        while True:
+            items = [queue.get()]
+            # Take whatever else is waiting, to write it all at once.
+            while True:
+                try:
+                    items.append(queue.get_nowait())
+                except Queue.Empty:
+                    break
+            try:
+                self._write_items(items)
+            except Exception:  # pylint: disable=broad-except
+                # There's nowhere to report this, and the thread must
+                # carry on so flush() doesn't wait forever.
+                pass
+            finally:
+                for _ in items:
+                    queue.task_done()
+
+    @staticmethod
+    def _write_items(items):
+        """Write (stream, text) items, combining them where possible."""
+        chunks = []
+        for stream, text in items:
+            if (chunks and chunks[-1][0] is stream and
+                    len(chunks[-1][1]) + len(text) <= PIPE_BUF):
+                chunks[-1][1] += text
+            else:
+                chunks.append([stream, text])
+        for stream, text in chunks:
+            try:
+                fileno = stream.fileno()
+            except (AttributeError, IOError, ValueError):
+                # Not a real file (e.g. a StringIO in tests).
+                stream.write(text)
+                stream.flush()
+                continue
+            stream.flush()
+            while text:
+                written = os.write(fileno, text)
+                text = text[written:]
+
+
+_writer = LogWriter()
+_formatter = HumanFormatter()
+_context = {}
+
+atexit.register(_writer.flush)
+
+
+def is_enabled(log_level):
+    """Return whether messages of a log level are output."""
+    if log_level is LogLevel.VERBOSE:
+        return OutputMode.verbose_mode or OutputMode.debug_mode
+    elif log_level is LogLevel.DEBUG:
+        return OutputMode.debug_mode
+    return True
+
+
+def robo_print(message, log_level=LogLevel.LOG, indent=0, *args):
+    """Print the specified message in an appropriate color, and only print
+    debug output if debug_mode is True.
+
+    Args:
+        message: String to be printed to output. If args are given, it's
+            %-formatted with them, but only if it's going to be printed.
+        log_level: LogLevel property for desired loglevel.
+        indent: Number of spaces to indent the message by.
+        args: Arguments to format the message with.
+    """
+    if not is_enabled(log_level):
+        return
+    record = Record(time.time(), log_level, message, args, indent,
+                    _context.copy())
+    if log_level in (LogLevel.ERROR, LogLevel.WARNING):
+        stream = sys.stderr
+    else:
+        stream = sys.stdout
+    _writer.write(stream, _formatter.format(record) + "\n")
+
+
+def set_formatter(formatter):
+    """Use formatter (e.g. a HumanFormatter) to format messages."""
+    global _formatter  # pylint: disable=global-statement
+    _formatter = formatter
+
+
+def set_context(**context):
+    """Add to the context that's logged with each message.
+
+    Context set to None is removed.
+    """
+    for key, value in context.iteritems():
+        if value is None:
+            _context.pop(key, None)
+        else:
+            _context[key] = value
+
+
+@contextmanager
+def stage(name):
+    """Log messages within the with statement as being in a stage."""
+    previous = _context.get("stage")
+    set_context(stage=name)
+    try:
+        yield
+    finally:
+        set_context(stage=previous)
+
+
+def is_live():
+    """Return whether output is for a person watching a terminal.
+
+    That's not the case when it's JSON for another program to read, or
+    when batch jobs' output is interleaved.
+    """
+    return isinstance(_formatter, HumanFormatter) and "job" not in _context
+
+
+def write_status(text):
+    """Write text to stdout as is (without a newline), in order with
+    messages. Only use this for output that's live (see is_live())."""
+    _writer.write(sys.stdout, text)
+
+
+def flush():
+    """Wait until all the messages so far have been output."""
+    _writer.flush()
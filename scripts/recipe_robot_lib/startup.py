@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+startup.py
+
+ImportProfiler: Measure how long each module takes to import.
+
+The Recipe Robot app runs a new recipe-robot process for every job, so
+the time taken to import modules is paid every time. Run recipe-robot
+with --profile-startup to see which modules are worth importing lazily.
+
+This module must stay cheap to import, since it's imported before
+everything else when profiling.
+"""
+
+
+import imp
+import sys
+import timeit
+
+
+class ImportProfiler(object):
+    """Time imports by hooking into the import machinery (PEP 302).
+
+    Each module is found as usual, then imported while a timer runs.
+    The time taken by the modules it imports in turn counts towards its
+    cumulative time, but not towards its own ("self") time.
+
+    Attributes:
+        timings: List of (module name, cumulative seconds, self
+            seconds, depth) tuples, in the order the imports finished.
+            Depth is 0 for modules that weren't imported by another
+            timed module.
+    """
+
+    def __init__(self):
+        self.timings = []
+        self.started_at = None
+        self._loading = set()
+        self._child_times = []
+
+    def start(self):
+        """Start timing imports."""
+        self.started_at = timeit.default_timer()
+        sys.meta_path.insert(0, self)
+
+    def stop(self):
+        """Stop timing imports."""
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_module(self, fullname, path=None):
+        """Return self as the loader of fullname, if it can be found.
+
+        Modules that can't be found are left to the rest of the import
+        machinery, so that Python 2's implicit relative imports fall
+        back to absolute imports as usual.
+        """
+        if fullname in self._loading:
+            return None
+        try:
+            found = imp.find_module(fullname.rpartition(".")[2], path)
+        except ImportError:
+            return None
+        if found[0] is not None:
+            found[0].close()
+        return self
+
+    def load_module(self, fullname):
+        """Import fullname, and record how long it took."""
+        depth = len(self._child_times)
+        self._loading.add(fullname)
+        self._child_times.append(0.0)
+        start = timeit.default_timer()
+        try:
+            __import__(fullname)
+            return sys.modules[fullname]
+        finally:
+            elapsed = timeit.default_timer() - start
+            child_time = self._child_times.pop()
+            if self._child_times:
+                self._child_times[-1] += elapsed
+            self._loading.discard(fullname)
+            self.timings.append((fullname, elapsed, elapsed - child_time,
+                                 depth))
+
+    def report(self, limit=30):
+        """Return a report of the slowest imports, as a string.
+
+        Args:
+            limit: Maximum number of modules to list.
+        """
+        elapsed = timeit.default_timer() - self.started_at
+        # Modules imported by other modules are included in the times
+        # of the modules that imported them.
+        total = sum(timing[1] for timing in self.timings if timing[3] == 0)
+        lines = ["Imported %d modules in %.1f ms (%.1f ms since start):" %
+                 (len(self.timings), total * 1000, elapsed * 1000),
+                 "%10s %10s  %s" % ("total ms", "self ms", "module")]
+        for name, cumulative, own, _ in sorted(
+                self.timings, key=lambda timing: -timing[1])[:limit]:
+            lines.append("%10.1f %10.1f  %s" %
+                         (cumulative * 1000, own * 1000, name))
+        return "\n".join(lines)
+
+
+def time_startup(argv, runs=5):
+    """Return how long a command takes to run, in seconds.
+
+    The command is run several times, and the fastest run is returned,
+    since slower runs mostly measure whatever else the computer was
+    doing at the time.
+
+    Args:
+        argv: The command to run, as a list of arguments.
+        runs: Number of times to run the command.
+    """
+    # Imported here to keep this module cheap to import.
+    import os
+    import subprocess
+
+    best = None
+    with open(os.devnull, "w") as devnull:
+        for _ in range(runs):
+            start = timeit.default_timer()
+            subprocess.call(argv, stdout=devnull, stderr=devnull)
+            elapsed = timeit.default_timer() - start
+            if best is None or elapsed < best:
+                best = elapsed
+    return best
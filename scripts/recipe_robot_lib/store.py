@@ -0,0 +1,417 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+store.py
+
+DownloadStore: Persistent, content-addressed store of downloaded files.
+
+Each run's cache folder is deleted when the run ends, but the files we
+download into it (often hundreds of megabytes) rarely change from one
+run to the next. The store keeps each downloaded file as a "blob" named
+after its SHA-256 digest, plus an index mapping each download URL to its
+blob and to the ETag and Last-Modified validators the server sent. The
+next download of that URL is made conditionally, and if the server
+answers "304 Not Modified" the blob is linked into the run's cache
+folder instead of being downloaded again.
+
+Layout of the store folder:
+    index.json          URL -> blob digest, size, filename, validators
+    blobs/ab/abcd...    Blobs, named by SHA-256 digest
+    partial/            Incomplete downloads, which can be resumed
+    lock                Lock file, held while the index is changed
+
+The index is only changed while holding an exclusive lock on the lock
+file, so several Recipe Robot processes (e.g. batch mode workers) can
+share the store. The least recently used blobs are evicted once the
+store grows beyond its size limit.
+"""
+
+
+from contextlib import contextmanager
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+from .tools import atomic_write, CACHE_ROOT, ensure_dir
+
+
+# Default limit for the total size of all blobs, in bytes.
+DEFAULT_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+# Incomplete downloads that haven't been touched for this many seconds
+# are removed when pruning.
+PARTIAL_MAX_AGE = 7 * 24 * 60 * 60
+
+# Size of the chunks in which files are read when hashing them.
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# ioctl request that clones a file on Linux (_IOW(0x94, 9, int)).
+FICLONE = 0x40049409
+
+# The C library, loaded on demand by _libc().
+_LIBC = None
+
+
+class DownloadStore(object):
+    """Keep downloaded files across runs, keyed by their SHA-256."""
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        """Set up a DownloadStore.
+
+        Args:
+            path: Folder in which to keep the store. It's created if it
+                doesn't exist.
+            max_size: Maximum total size of the stored blobs, in bytes.
+        """
+        self.path = os.path.expanduser(path)
+        self.max_size = max_size
+        self.blob_dir = os.path.join(self.path, "blobs")
+        self.partial_dir = os.path.join(self.path, "partial")
+        self.index_path = os.path.join(self.path, "index.json")
+        self.lock_path = os.path.join(self.path, "lock")
+        for folder in (self.blob_dir, self.partial_dir):
+            ensure_dir(folder)
+
+    def lookup(self, url):
+        """Return the index entry for url, or None.
+
+        Entries whose blob has gone missing are ignored.
+
+        Returns:
+            Dictionary with keys "sha256", "size", "filename", "etag",
+            "last_modified" and "last_used".
+        """
+        entry = self._read_index().get(url)
+        if entry is None:
+            return None
+        if not os.path.isfile(self.blob_path(entry["sha256"])):
+            return None
+        return entry
+
+    def conditional_headers(self, entry):
+        """Return request headers to revalidate a stored download."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def add(self, url, file_path, filename=None, etag=None,
+            last_modified=None, sha256=None):
+        """Store a downloaded file and index it under url.
+
+        The file is hard-linked into the store where possible, so adding
+        it costs no extra disk space or copying.
+
+        Args:
+            url: The URL the file was downloaded from.
+            file_path: Path to the downloaded file.
+            filename: The name the file should have when it's linked
+                back out of the store. Defaults to the basename of
+                file_path.
+            etag, last_modified: Validators sent by the server, if any.
+            sha256: Hex digest of the file, if already known (e.g.
+                computed while downloading).
+
+        Returns:
+            The SHA-256 hex digest of the file.
+        """
+        if sha256 is None:
+            sha256 = hash_file(file_path)
+        blob_path = self.blob_path(sha256)
+        with self._locked():
+            # Import while holding the lock, so that another process
+            # can't evict the blob before it's in the index.
+            if not os.path.isfile(blob_path):
+                self._import_blob(file_path, blob_path)
+            entry = {"sha256": sha256, "size": os.path.getsize(blob_path),
+                     "filename": filename or os.path.basename(file_path),
+                     "etag": etag, "last_modified": last_modified,
+                     "last_used": time.time()}
+            index = self._read_index()
+            index[url] = entry
+            self._write_index(index)
+            self._evict(index, self.max_size)
+        return sha256
+
+    def touch(self, url):
+        """Mark the download for url as recently used."""
+        with self._locked():
+            index = self._read_index()
+            if url in index:
+                index[url]["last_used"] = time.time()
+                self._write_index(index)
+
+    def link_into(self, entry, dest_path):
+        """Make the blob for an entry available at dest_path.
+
+        Uses a hard link if possible, and a copy otherwise. Anything
+        already at dest_path (such as the same download, fetched earlier
+        in the run) is replaced.
+        """
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        link_or_copy(self.blob_path(entry["sha256"]), dest_path)
+
+    def blob_path(self, sha256):
+        """Return the path of the blob with the given digest."""
+        return os.path.join(self.blob_dir, sha256[:2], sha256)
+
+    def stats(self):
+        """Return a dictionary describing the contents of the store."""
+        index = self._read_index()
+        blobs = self._list_blobs()
+        return {
+            "path": self.path,
+            "urls": len(index),
+            "blobs": len(blobs),
+            "size": sum(size for size in blobs.values()),
+            "max_size": self.max_size}
+
+    def prune(self, max_size=None):
+        """Evict blobs until the store is within max_size.
+
+        Also removes index entries whose blob is missing, blobs that no
+        index entry refers to, and stale incomplete downloads.
+
+        Args:
+            max_size: Size to prune down to, in bytes. Defaults to the
+                store's size limit. Use 0 to empty the store.
+
+        Returns:
+            Number of blobs removed.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        cutoff = time.time() - (PARTIAL_MAX_AGE if max_size else 0)
+        for filename in os.listdir(self.partial_dir):
+            path = os.path.join(self.partial_dir, filename)
+            try:
+                if os.path.getmtime(path) <= cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+        with self._locked():
+            index = self._read_index()
+            return self._evict(index, max_size)
+
+    def verify(self):
+        """Re-hash every blob, and remove any that are corrupt.
+
+        Returns:
+            Tuple of (number of blobs checked, list of digests of the
+            corrupt blobs that were removed).
+        """
+        with self._locked():
+            index = self._read_index()
+            blobs = self._list_blobs()
+            corrupt = []
+            for sha256 in blobs:
+                if hash_file(self.blob_path(sha256)) != sha256:
+                    corrupt.append(sha256)
+                    _remove(self.blob_path(sha256))
+            if corrupt:
+                for url, entry in index.items():
+                    if entry["sha256"] in corrupt:
+                        del index[url]
+                self._write_index(index)
+        return (len(blobs), corrupt)
+
+    def _import_blob(self, file_path, blob_path):
+        """Move a copy (or hard link) of file_path into place as a blob."""
+        blob_parent = os.path.dirname(blob_path)
+        ensure_dir(blob_parent)
+        handle, temp_path = tempfile.mkstemp(dir=blob_parent, suffix=".tmp")
+        os.close(handle)
+        try:
+            os.remove(temp_path)
+            link_or_copy(file_path, temp_path)
+            # Blobs are shared, so make sure they can't be changed by
+            # accident through one of their links.
+            os.chmod(temp_path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+            os.rename(temp_path, blob_path)
+        except (IOError, OSError):
+            _remove(temp_path)
+            raise
+
+    def _evict(self, index, max_size):
+        """Remove dangling entries and LRU blobs. Caller holds the lock.
+
+        Returns:
+            Number of blobs removed.
+        """
+        blobs = self._list_blobs()
+        changed = False
+        for url, entry in index.items():
+            if entry["sha256"] not in blobs:
+                del index[url]
+                changed = True
+
+        # A blob was last used when any of the URLs pointing at it was.
+        last_used = {}
+        for entry in index.values():
+            last_used[entry["sha256"]] = max(
+                last_used.get(entry["sha256"], 0), entry["last_used"])
+
+        removed = 0
+        total_size = sum(blobs.values())
+        for sha256 in sorted(blobs, key=lambda key: last_used.get(key, 0)):
+            if sha256 in last_used and total_size <= max_size:
+                break
+            _remove(self.blob_path(sha256))
+            total_size -= blobs[sha256]
+            removed += 1
+            for url, entry in index.items():
+                if entry["sha256"] == sha256:
+                    del index[url]
+                    changed = True
+        if changed:
+            self._write_index(index)
+        return removed
+
+    def _list_blobs(self):
+        """Return a dictionary of blob sizes, keyed by digest."""
+        blobs = {}
+        for parent, _, filenames in os.walk(self.blob_dir):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                try:
+                    blobs[filename] = os.path.getsize(
+                        os.path.join(parent, filename))
+                except OSError:
+                    continue
+        return blobs
+
+    def _read_index(self):
+        """Return the URL index, which is empty if it can't be read."""
+        try:
+            with open(self.index_path, "r") as index_file:
+                return json.load(index_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        """Replace the index file. Caller holds the lock."""
+        with atomic_write(self.index_path) as index_file:
+            json.dump(index, index_file)
+
+    @contextmanager
+    def _locked(self):
+        """Hold an exclusive lock on the store, across processes."""
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def new_download_store():
+    """Return the shared DownloadStore in the Recipe Robot cache."""
+    return DownloadStore(os.path.join(CACHE_ROOT, "downloads"))
+
+
+def hash_file(path):
+    """Return the SHA-256 hex digest of the file at path."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as openfile:
+        for chunk in iter(lambda: openfile.read(HASH_CHUNK_SIZE), ""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source, dest):
+    """Hard-link source to dest, or copy it if linking isn't possible.
+
+    Copies are made as clones (reflinks) where the filesystem supports
+    them, so they share the source's blocks until either is changed.
+    """
+    try:
+        os.link(source, dest)
+    except OSError as error:
+        if error.errno == errno.EEXIST:
+            raise
+        if not clone_file(source, dest):
+            shutil.copy2(source, dest)
+
+
+def clone_file(source, dest):
+    """Clone source to dest, if the filesystem supports it.
+
+    Uses clonefile() on APFS, and the FICLONE ioctl on Linux filesystems
+    such as Btrfs and XFS.
+
+    Returns:
+        True if dest was created as a clone of source. False if cloning
+        isn't possible, in which case dest hasn't been created.
+    """
+    if sys.platform == "darwin":
+        clonefile = getattr(_libc(), "clonefile", None)
+        if clonefile is None:
+            return False
+        if clonefile(source, dest, 0) != 0:
+            return False
+        return True
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        with open(source, "rb") as source_file:
+            with open(dest, "wb") as dest_file:
+                try:
+                    fcntl.ioctl(dest_file.fileno(), FICLONE,
+                                source_file.fileno())
+                except IOError:
+                    cloned = False
+                else:
+                    cloned = True
+    except IOError:
+        return False
+    if not cloned:
+        _remove(dest)
+        return False
+    shutil.copystat(source, dest)
+    return True
+
+
+def _libc():
+    """Return the C library, loaded with ctypes."""
+    global _LIBC  # pylint: disable=global-statement
+    if _LIBC is None:
+        _LIBC = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    return _LIBC
+
+
+def _remove(path):
+    """Remove a file, ignoring errors."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -25,20 +25,23 @@ support the main `recipe-robot` script and the `recipe_generator.py` module.
 """
 
 
+from contextlib import contextmanager
 from datetime import datetime
-from Foundation import NSUserDefaults
 from functools import wraps
 from random import choice as random_choice
-from subprocess import PIPE, Popen
 from urllib import quote_plus
-from urllib2 import urlopen
 import os
 import re
-import shlex
 import sys
+import tempfile
 import timeit
 
+from . import commands
 from .exceptions import RoboError
+# Output is handled by robolog, but most modules import it from here.
+from .robolog import (  # pylint: disable=unused-import
+    ENDC, flush as flush_output, LogLevel, OutputMode, robo_print)
+from .tracing import tracer
 # TODO(Elliot): Can we use the one at /Library/AutoPkg/FoundationPlist instead?
 # Or not use it at all (i.e. use the preferences system correctly). (#16)
 try:
@@ -49,7 +52,6 @@ except ImportError:
 
 
 __version__ = '1.0.5'
-ENDC = "\033[0m"
 PREFS_FILE = os.path.expanduser(
     "~/Library/Preferences/com.elliotjordan.recipe-robot.plist")
 
@@ -60,48 +62,14 @@ SUPPORTED_INSTALL_FORMATS = ("pkg",)
 ALL_SUPPORTED_FORMATS = (SUPPORTED_IMAGE_FORMATS + SUPPORTED_ARCHIVE_FORMATS +
                          SUPPORTED_INSTALL_FORMATS)
 
-# Global variables.
-CACHE_DIR = os.path.join(os.path.expanduser("~/Library/Caches/Recipe Robot"),
-                         datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f"))
-color_setting = False
-
-
-class LogLevel(object):
-    """Specify colors that are used in Terminal output."""
-    DEBUG = ("\033[95m", "DEBUG")
-    ERROR = ("\033[1;38;5;196m", "ERROR")
-    LOG = ("", "")
-    REMINDER = ("\033[1;38;5;33m", "REMINDER")
-    VERBOSE = ("\033[0m", "")
-    WARNING = ("\033[1;38;5;208m", "WARNING")
-
-
-class OutputMode(object):
-    """Manage global output mode state with a singleton."""
+# Seconds to wait for each `autopkg search`, which queries GitHub.
+SEARCH_TIMEOUT = 2 * 60
 
-    # Use --verbose command-line argument, or hard-code
-    # to "True" here for additional user-facing output.
-    verbose_mode = False
+# Seconds to wait for sips to convert an app's icon.
+SIPS_TIMEOUT = 60
 
-    # Use --debug command-line argument, or hard-code
-    # to "True" here for additional development output.
-    debug_mode = False
-
-    @classmethod
-    def set_verbose_mode(cls, value):
-        """Set the class variable for verbose_mode."""
-        if isinstance(value, bool):
-            cls.verbose_mode = value
-        else:
-            raise ValueError
-
-    @classmethod
-    def set_debug_mode(cls, value):
-        """Set the class variable for debug_mode."""
-        if isinstance(value, bool):
-            cls.debug_mode = value
-        else:
-            raise ValueError
+# Global variables.
+CACHE_ROOT = os.path.expanduser("~/Library/Caches/Recipe Robot")
 
 
 def timed(func):
@@ -120,37 +88,6 @@ def timed(func):
     return run_func
 
 
-def robo_print(message, log_level=LogLevel.LOG, indent=0):
-    """Print the specified message in an appropriate color, and only print
-    debug output if debug_mode is True.
-
-    Args:
-        log_level: LogLevel property for desired loglevel.
-        message: String to be printed to output.
-    """
-    color = log_level[0] if color_setting else ""
-    indents = indent * " "
-    if log_level[1]:
-        prefix = "[%s] " % log_level[1]
-    else:
-        prefix = ""
-    suffix = ENDC if color_setting else ""
-
-    line = color + indents + prefix + message + suffix
-
-    if log_level in (LogLevel.ERROR, LogLevel.WARNING):
-        print_func = _print_stderr
-    else:
-        print_func = _print_stdout
-
-    if ((log_level in (LogLevel.ERROR, LogLevel.REMINDER, LogLevel.WARNING,
-                       LogLevel.LOG)) or
-        (log_level is LogLevel.DEBUG and OutputMode.debug_mode) or
-        (log_level is LogLevel.VERBOSE and (OutputMode.verbose_mode or
-                                            OutputMode.debug_mode))):
-        print_func(line)
-
-
 def create_dest_dirs(path):
     """Creates the path to the recipe export location, if it doesn't exist. If
     intermediate folders are necessary in order to create the path, they will
@@ -168,6 +105,75 @@ def create_dest_dirs(path):
                             error)
 
 
+def ensure_dir(path):
+    """Create a folder (and its parents) if it doesn't exist yet.
+
+    Unlike create_dest_dirs(), this doesn't mind another process
+    creating the folder at the same time, and doesn't raise an error if
+    it can't be created, which is left to whatever tries to use it.
+
+    Args:
+        path: The path to the folder.
+
+    Returns:
+        True if the folder exists.
+    """
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            pass
+    return os.path.isdir(path)
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """Open a temporary file that replaces path once it's written.
+
+    Other readers (including other processes) see either the old file
+    or the whole new one, never part of it. If the with block raises an
+    exception, the temporary file is removed and path is left alone.
+    The folder containing path is created if necessary.
+
+    Args:
+        path: The path to the file to write.
+        mode: The mode in which to open the temporary file.
+
+    Yields:
+        The temporary file object.
+
+    Raises:
+        IOError or OSError: The file couldn't be written.
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    ensure_dir(folder)
+    handle, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(handle, mode) as temp_file:
+            yield temp_file
+        os.rename(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def new_cache_dir(parent=CACHE_ROOT):
+    """Return the path to a new, uniquely named cache folder.
+
+    The folder itself is not created; use create_dest_dirs() for that.
+    Each run (and each job of a batch run) gets its own cache folder,
+    which is stored in facts["cache_dir"] and cleaned up afterwards.
+
+    Args:
+        parent: The folder in which to put the new cache folder.
+
+    Returns:
+        Path to the new cache folder.
+    """
+    return os.path.join(parent, "%s_%s" % (
+        datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f"), os.getpid()))
+
+
 def extract_app_icon(facts, png_path):
     """Convert the app's icns file to 300x300 png at the specified path.
     300x300 is Munki's preferred size, and 128x128 is Casper's preferred size,
@@ -187,63 +193,17 @@ def extract_app_icon(facts, png_path):
         icon_path = icon_path + ".icns"
 
     if not os.path.exists(png_path_absolute):
-        cmd = ("sips -s format png \"%s\" --out \"%s\" "
-               "--resampleHeightWidthMax 300" % (icon_path, png_path_absolute))
-        exitcode, _, err = get_exitcode_stdout_stderr(cmd)
+        cmd = ["/usr/bin/sips", "-s", "format", "png", icon_path, "--out",
+               png_path_absolute, "--resampleHeightWidthMax", "300"]
+        exitcode, _, err = commands.run(cmd, timeout=SIPS_TIMEOUT)
         if exitcode == 0:
-            robo_print("%s" % png_path, LogLevel.VERBOSE, 4)
+            robo_print(png_path, LogLevel.VERBOSE, 4)
             facts["icons"].append(png_path)
         else:
             facts["warnings"].append(
                 "An error occurred during icon extraction: %s" % err)
 
 
-def get_exitcode_stdout_stderr(cmd, stdin=""):
-    """Execute the external command and get its exitcode, stdout and stderr.
-
-    Args:
-        cmd: The shell command to be executed.
-
-    Returns:
-        exitcode: Zero upon success. Non-zero upon error.
-        out: String from standard output.
-        err: String from standard error.
-    """
-    if "|" in cmd:
-        cmd_parts = cmd.split("|")
-    else:
-        cmd_parts = [cmd]
-
-    i = 0
-    p = {}
-    for cmd_part in cmd_parts:
-        cmd_part = cmd_part.strip()
-        if i == 0:
-            p[i] = Popen(shlex.split(cmd_part),
-                         stdin=PIPE,
-                         stdout=PIPE,
-                         stderr=PIPE)
-        else:
-            p[i] = Popen(shlex.split(cmd_part),
-                         stdin=p[i-1].stdout,
-                         stdout=PIPE,
-                         stderr=PIPE)
-        i = i + 1
-
-    out, err = p[i-1].communicate(stdin)
-    exitcode = p[i-1].returncode
-
-    return exitcode, out, err
-
-
-def _print_stderr(p):
-    print >> sys.stderr, p
-
-
-def _print_stdout(p):
-    print p
-
-
 def print_welcome_text():
     """Print the text that appears when you run Recipe Robot."""
     welcome_text = """
@@ -274,20 +234,51 @@ def print_death_text():
 
 def reset_term_colors():
     """Ensure terminal colors are normal."""
+    flush_output()
     sys.stdout.write(ENDC)
 
 
+def build_report(facts, timings=None):
+    """Return a summary of what happened for an input path.
+
+    Args:
+        facts: The Facts for the input path.
+        timings: Summary of the spans recorded while processing the
+            input path, as returned by Tracer.summarize(). Defaults to
+            that of the shared Tracer.
+
+    Returns:
+        A dictionary (which can be written with write_report()) of the
+        input path, errors, warnings, reminders, recipes created,
+        execution time, and timings.
+    """
+    if timings is None:
+        timings = tracer.summarize()
+    return {
+        "input_path": facts.get("input_path", ""),
+        "errors": list(facts["errors"]),
+        "warnings": list(facts["warnings"]),
+        "reminders": list(facts["reminders"]),
+        "recipes": [item for item in facts["recipes"]
+                    if isinstance(item, basestring)],
+        "execution_time": facts.get("execution_time", 0.0),
+        "timings": timings}
+
+
 def write_report(report, report_file):
     FoundationPlist.writePlist(report, report_file)
 
 
 def get_user_defaults():
+    # Imported here, since Foundation is slow to import.
+    from Foundation import NSUserDefaults
     defaults = NSUserDefaults.alloc().initWithSuiteName_('com.elliotjordan.recipe-robot')
     default_dict = defaults.dictionaryRepresentation()
     return default_dict if len(default_dict) else None
 
 
 def save_user_defaults(prefs):
+    from Foundation import NSUserDefaults
     defaults = NSUserDefaults.alloc().initWithSuiteName_('com.elliotjordan.recipe-robot')
     for key, value in prefs.iteritems():
         defaults.setValue_forKey_(value, key)
@@ -299,7 +290,12 @@ def any_item_in_string(items, test_string):
 
 
 def create_existing_recipe_list(facts):
-    """Use autopkg search results to build existing recipe list.
+    """Check whether AutoPkg recipes already exist for the app.
+
+    Recipes in the locally cloned recipe repos are found with the recipe
+    index. If there are none, `autopkg search` is run for each variant
+    of the app's name (concurrently, since each one queries GitHub), and
+    its results are cached in the index.
 
     Args:
         facts: The Facts instance containing all of our information.
@@ -307,75 +303,119 @@ def create_existing_recipe_list(facts):
                 app_name: The app's name.
                 recipes: The recipes to build.
                 args: ArgParser args with github_token bool.
+
+    Raises:
+        RoboError: Recipes already exist, or searching for them failed.
     """
+    # Imported here because recipe_index imports this module.
+    from .recipe_index import new_recipe_index
+
     app_name = facts["app_name"]
     recipes = facts["recipes"]
-    use_github_token = facts["args"].github_token
     # TODO(Elliot): Suggest users create GitHub API token to prevent
     # limiting. (#29)
 
-    # Generate an array to run through `autopkg search`.
-    recipe_searches = [quote_plus(app_name)]
+    # Generate the variants of the app's name to look for.
+    name_variants = [app_name]
+    for variant in ("".join(app_name.split()),
+                    re.sub(r'[^\w]', '', app_name)):
+        if variant and variant not in name_variants:
+            name_variants.append(variant)
+
+    index = new_recipe_index()
+    index.refresh()
+    robo_print("Searching for existing AutoPkg recipes for %s...",
+               LogLevel.VERBOSE, 0, ", ".join(name_variants))
+    recipe_types = [recipe["type"] for recipe in recipes]
+    existing = {}
+    for recipe_type, matches in index.find_existing(
+            name_variants, recipe_types).items():
+        existing[recipe_type] = [match["filename"] for match in matches]
+    if not existing:
+        existing = search_existing_recipes(facts, index, name_variants,
+                                           recipe_types)
+
+    if existing:
+        robo_print("Found existing recipe(s):", LogLevel.LOG, 4)
+        for recipe in recipes:
+            if recipe["type"] in existing:
+                recipe["existing"] = True
+                for filename in existing[recipe["type"]]:
+                    robo_print(filename, LogLevel.LOG, 8)
+        raise RoboError(
+            "Sorry, AutoPkg recipes already exist for this app, and "
+            "I can't blend new recipes with existing recipes.\n\nHere "
+            "are my suggestions:\n\t- See if one of the above recipes "
+            "meets your needs, either as-is or using an override."
+            "\n\t- Write your own recipe using one of the above as "
+            "the ParentRecipe.\n\t- Use Recipe Robot to assist in "
+            "the creation of a new child recipe, as seen here:\n\t  "
+            "https://youtu.be/5VKDzY8bBxI?t=2829")
+
+    robo_print("No results", LogLevel.VERBOSE, 4)
+    similar = index.fuzzy(app_name)
+    if similar:
+        robo_print("Recipes with similar names:", LogLevel.VERBOSE, 4)
+        for _, recipe in similar[:5]:
+            robo_print(recipe["filename"], LogLevel.VERBOSE, 8)
+
+
+def search_existing_recipes(facts, index, name_variants, recipe_types):
+    """Use `autopkg search` (or its cached results) to find recipes.
 
-    app_name_no_space = quote_plus("".join(app_name.split()))
-    if app_name_no_space not in recipe_searches:
-        recipe_searches.append(app_name_no_space)
+    Args:
+        facts: The Facts instance containing all of our information.
+        index: The RecipeIndex in which search results are cached.
+        name_variants: Variants of the app's name to search for.
+        recipe_types: Types of recipe to look for.
 
-    app_name_no_symbol = quote_plus(re.sub(r'[^\w]', '', app_name))
-    if app_name_no_symbol not in recipe_searches:
-        recipe_searches.append(app_name_no_symbol)
+    Returns:
+        Dictionary of lists of recipe filenames found, keyed by recipe
+        type. Types without results are left out.
 
-    for this_search in recipe_searches:
-        robo_print("Searching for existing AutoPkg recipes for %s..." %
-                   this_search, LogLevel.VERBOSE)
+    Raises:
+        RoboError: `autopkg search` failed.
+    """
+    use_github_token = facts["args"].github_token
+    results = {}
+    searches = []
+    for variant in name_variants:
+        term = quote_plus(variant)
+        results[variant] = index.cached_search(term)
+        if results[variant] is not None:
+            continue
+        cmd = ["/usr/local/bin/autopkg", "search", "--path-only"]
         if use_github_token:
             if not os.path.exists(os.path.expanduser("~/.autopkg_gh_token")):
-                facts["warnings"].append(
-                    "I couldn't find a GitHub token to use.")
-                cmd = ("/usr/local/bin/autopkg search --path-only %s" %
-                       this_search)
+                if not searches:
+                    facts["warnings"].append(
+                        "I couldn't find a GitHub token to use.")
             else:
                 # TODO(Elliot): Learn how to use the GitHub token. (#18) https://github.com/autopkg/autopkg/blob/680c75855f00b588e6dd50fb431bed5d5fd41d9c/Code/autopkglib/github/__init__.py#L31
-                facts["warnings"].append(
-                    "I found a GitHub token, but I'm still learning how to "
-                    "use it.")
-                cmd = ("/usr/local/bin/autopkg search --path-only --use-token "
-                       "%s" % this_search)
-        else:
-            cmd = ("/usr/local/bin/autopkg search --path-only %s" %
-                   this_search)
-        exitcode, out, err = get_exitcode_stdout_stderr(cmd)
-        out = out.split("\n")
-        if exitcode == 0:
-            # Set to False by default. If found, set True.
-            is_existing = False
-            # For each recipe type, see if it exists in the search results.
-            for recipe in recipes:
-                recipe_name = "%s.%s.recipe" % (this_search, recipe["type"])
-                for line in out:
-                    if line.lower().startswith(recipe_name.lower()):
-                        # An existing recipe was found.
-                        if is_existing is False:
-                            robo_print("Found existing recipe(s):",
-                                       LogLevel.LOG, 4)
-                            is_existing = True
-                            recipe["existing"] = True
-                        robo_print(recipe_name, LogLevel.LOG, 8)
-                        break
-            if is_existing is True:
-                raise RoboError(
-                    "Sorry, AutoPkg recipes already exist for this app, and "
-                    "I can't blend new recipes with existing recipes.\n\nHere "
-                    "are my suggestions:\n\t- See if one of the above recipes "
-                    "meets your needs, either as-is or using an override."
-                    "\n\t- Write your own recipe using one of the above as "
-                    "the ParentRecipe.\n\t- Use Recipe Robot to assist in "
-                    "the creation of a new child recipe, as seen here:\n\t  "
-                    "https://youtu.be/5VKDzY8bBxI?t=2829")
-            else:
-                robo_print("No results", LogLevel.VERBOSE, 4)
-        else:
-            raise RoboError(err.message)
+                if not searches:
+                    facts["warnings"].append(
+                        "I found a GitHub token, but I'm still learning "
+                        "how to use it.")
+                cmd.append("--use-token")
+        cmd.append(term)
+        searches.append((variant, term, commands.run_async(
+            cmd, timeout=SEARCH_TIMEOUT)))
+
+    for variant, term, search in searches:
+        exitcode, out, err = search.get(SEARCH_TIMEOUT * len(searches))
+        if exitcode != 0:
+            raise RoboError(err)
+        results[variant] = index.add_search(term, out)
+
+    existing = {}
+    for variant in name_variants:
+        for recipe_type in recipe_types:
+            recipe_name = "%s.%s.recipe" % (variant, recipe_type)
+            for filename, _, _ in results[variant]:
+                if (filename.lower().startswith(recipe_name.lower()) and
+                        filename not in existing.get(recipe_type, ())):
+                    existing.setdefault(recipe_type, []).append(filename)
+    return existing
 
 
 def congratulate(prefs):
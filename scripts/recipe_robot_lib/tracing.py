@@ -0,0 +1,272 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+tracing.py
+
+Tracer: Record how long each part of a run takes.
+
+A span is a named, timed piece of work, such as an inspection, an HTTP
+request, a command, or the generation of a recipe. Spans started while
+another span is running on the same thread are its children, so a slow
+run can be narrowed down to the request or command that made it slow:
+
+    with span("check_url", "http", url=url):
+        ...
+
+    @traced("inspect")
+    def inspect_app(input_path, args, facts):
+        ...
+
+Recorded spans can be exported as Chrome trace events (open the file
+in chrome://tracing or https://ui.perfetto.dev) with
+write_chrome_trace(), or totalled up by category with summarize().
+"""
+
+
+from contextlib import contextmanager
+from functools import wraps
+import itertools
+import json
+import os
+import threading
+import timeit
+
+
+class Span(object):
+    """A timed piece of work.
+
+    Attributes:
+        name: What the work was, e.g. "inspect_app" or "hdiutil".
+        category: The kind of work, e.g. "inspect", "http",
+            "subprocess", "download", or "generate".
+        args: Dictionary of details about the work.
+        span_id: Number identifying the span.
+        parent_id: span_id of the span this one was started within, or
+            None.
+        thread: Identifier of the thread the span ran on.
+        start: Time the span started, in seconds since the epoch.
+        end: Time the span ended, in seconds since the epoch.
+    """
+
+    __slots__ = ("name", "category", "args", "span_id", "parent_id",
+                 "thread", "start", "end")
+
+    def __init__(self, name, category, args, span_id, parent_id=None):
+        self.name = name
+        self.category = category
+        self.args = args
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.thread = threading.current_thread().ident
+        self.start = None
+        self.end = None
+
+    @property
+    def duration(self):
+        """Return the span's length, in seconds."""
+        return self.end - self.start
+
+
+class Tracer(object):
+    """Record spans.
+
+    Attributes:
+        spans: List of the Spans that have finished, in the order they
+            finished.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+
+    def _stack(self):
+        """Return the calling thread's stack of running spans."""
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _new_span(self, name, category, args):
+        """Return a new Span, as a child of the running span."""
+        stack = self._stack()
+        parent_id = stack[-1].span_id if stack else None
+        return Span(name, category, args, next(self._ids), parent_id)
+
+    @contextmanager
+    def span(self, name, category="", **args):
+        """Record a span around the body of a with statement.
+
+        The Span is the with statement's target, so that details can be
+        added to its args as they're learned.
+        """
+        new_span = self._new_span(name, category, args)
+        stack = self._stack()
+        stack.append(new_span)
+        new_span.start = timeit.default_timer()
+        try:
+            yield new_span
+        finally:
+            new_span.end = timeit.default_timer()
+            stack.pop()
+            with self._lock:
+                self.spans.append(new_span)
+
+    def add_span(self, name, category, start, end, **args):
+        """Record a span that has already finished.
+
+        This is for work whose start and end are in different places
+        (such as an HTTP response, which is read after the request
+        returns).
+        """
+        new_span = self._new_span(name, category, args)
+        new_span.start = start
+        new_span.end = end
+        with self._lock:
+            self.spans.append(new_span)
+
+    def reset(self):
+        """Forget the spans recorded so far."""
+        with self._lock:
+            self.spans = []
+
+    def chrome_events(self):
+        """Return the spans as a list of Chrome trace events."""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+        return [{"name": item.name,
+                 "cat": item.category,
+                 "ph": "X",
+                 "ts": int(item.start * 1000000),
+                 "dur": int(item.duration * 1000000),
+                 "pid": pid,
+                 "tid": item.thread,
+                 "args": dict((key, _json_safe(value))
+                              for key, value in item.args.iteritems())}
+                for item in spans]
+
+    def summarize(self, limit=10):
+        """Return a summary of the spans, for reports.
+
+        Each span's "self" time is its duration less the durations of
+        its children, so that the self times of all the spans add up to
+        (about) the time taken, without counting any time twice.
+
+        Args:
+            limit: Number of the slowest spans to list.
+
+        Returns:
+            A dictionary of:
+                seconds: Time from the start of the first span to the
+                    end of the last.
+                categories: Dictionary of each category's span count
+                    and total self seconds.
+                slowest: List of the spans with the most self time,
+                    slowest first, each with its name, category,
+                    seconds, and self seconds.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        if not spans:
+            return {"seconds": 0.0, "categories": {}, "slowest": []}
+
+        child_time = {}
+        for item in spans:
+            if item.parent_id is not None:
+                child_time[item.parent_id] = (
+                    child_time.get(item.parent_id, 0.0) + item.duration)
+        categories = {}
+        entries = []
+        for item in spans:
+            own = max(0.0, item.duration - child_time.get(item.span_id, 0.0))
+            category = categories.setdefault(
+                item.category or "other", {"count": 0, "seconds": 0.0})
+            category["count"] += 1
+            category["seconds"] += own
+            entries.append({"name": item.name,
+                            "category": item.category or "other",
+                            "seconds": item.duration,
+                            "self_seconds": own})
+        entries.sort(key=lambda entry: entry["self_seconds"], reverse=True)
+        return {"seconds": (max(item.end for item in spans) -
+                            min(item.start for item in spans)),
+                "categories": categories,
+                "slowest": entries[:limit]}
+
+
+def _json_safe(value):
+    """Return value if it can be written as JSON, or else a string."""
+    if isinstance(value, (bool, int, long, float)) or value is None:
+        return value
+    if isinstance(value, basestring):
+        return value
+    return str(value)
+
+
+# The Tracer used throughout Recipe Robot.
+tracer = Tracer()
+
+
+def span(name, category="", **args):
+    """Record a span with the shared Tracer. See Tracer.span()."""
+    return tracer.span(name, category, **args)
+
+
+def add_span(name, category, start, end, **args):
+    """Record a finished span with the shared Tracer."""
+    tracer.add_span(name, category, start, end, **args)
+
+
+def traced(category, name=None):
+    """Decorator that records a span for each call of a function.
+
+    Args:
+        category: The span's category.
+        name: The span's name. Defaults to the function's name.
+    """
+    def decorator(func):
+        """Wrap func in a span."""
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def run_func(*args, **kwargs):
+            """Call the function within a span."""
+            with tracer.span(span_name, category):
+                return func(*args, **kwargs)
+        return run_func
+    return decorator
+
+
+def write_chrome_trace(path, events=None):
+    """Write Chrome trace events to a JSON file.
+
+    Args:
+        path: Path of the file to write.
+        events: List of trace events. Defaults to those of the shared
+            Tracer's spans.
+    """
+    if events is None:
+        events = tracer.chrome_events()
+    with open(path, "w") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"},
+                  trace_file)
@@ -0,0 +1,326 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+udif.py
+
+UdifImage: Read the disk inside a UDIF disk image (.dmg) as a file.
+
+A UDIF image ends with a 512 byte "koly" trailer pointing at an XML
+property list. Its "blkx" resources describe each partition of the disk
+as a table of chunks: runs of sectors stored raw, compressed (with ADC,
+zlib, bzip2 or lzma), or omitted because they're empty. UdifImage maps
+reads of the disk onto those chunks and decompresses only the chunks it
+needs, so a few files can be read from a volume in the image (see
+hfsplus.py) without decompressing or mounting the whole thing.
+
+Chunks compressed with LZFSE aren't supported, and lzma chunks require
+the lzma module (or backports.lzma on Python 2).
+"""
+
+
+from bisect import bisect_right
+from collections import OrderedDict
+from xml.parsers.expat import ExpatError
+import bz2
+import os
+import plistlib
+import struct
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma  # pylint: disable=no-name-in-module
+    except ImportError:
+        lzma = None
+
+
+SECTOR_SIZE = 512
+
+KOLY_SIZE = 512
+
+# Offsets of the fields we need in the koly trailer.
+KOLY_DATA_FORK_OFFSET = 24
+KOLY_XML_OFFSET = 216
+KOLY_SECTOR_COUNT = 492
+
+# signature, version, first sector, sector count, data offset, buffers
+# needed, block descriptors, reserved, checksum, number of chunks.
+MISH_FORMAT = ">4sIQQQII24s136sI"
+MISH_SIZE = struct.calcsize(MISH_FORMAT)
+
+# type, comment, first sector, sector count, compressed offset,
+# compressed length.
+CHUNK_FORMAT = ">IIQQQQ"
+CHUNK_SIZE = struct.calcsize(CHUNK_FORMAT)
+
+# Chunk types.
+ZERO_FILL = 0x00000000
+RAW = 0x00000001
+IGNORED = 0x00000002
+ADC = 0x80000004
+ZLIB = 0x80000005
+BZIP2 = 0x80000006
+LZFSE = 0x80000007
+LZMA = 0x80000008
+COMMENT = 0x7ffffffe
+TERMINATOR = 0xffffffff
+
+# Exceptions raised by the decompressors when data is corrupt.
+DECOMPRESSION_ERRORS = (zlib.error, IOError, EOFError, ValueError)
+if lzma is not None:
+    DECOMPRESSION_ERRORS += (lzma.LZMAError,)
+
+# Number of decompressed chunks to keep in memory. (hdiutil usually
+# makes chunks of 1 MB or less.)
+CHUNK_CACHE_SIZE = 16
+
+
+class UdifError(Exception):
+    """The file isn't a UDIF image, or can't be read."""
+
+
+class UdifPartition(object):
+    """A partition of the disk in a UDIF image."""
+
+    def __init__(self, name, first_sector, sector_count):
+        """Set up a UdifPartition.
+
+        Args:
+            name: The name of the partition's blkx resource, e.g.
+                "disk image (Apple_HFS : 4)".
+            first_sector: The sector of the disk the partition starts at.
+            sector_count: The length of the partition, in sectors.
+        """
+        self.name = name
+        self.first_sector = first_sector
+        self.sector_count = sector_count
+
+    @property
+    def offset(self):
+        """Return the offset of the partition in the disk, in bytes."""
+        return self.first_sector * SECTOR_SIZE
+
+
+class UdifImage(object):
+    """A read-only, seekable file of the disk inside a UDIF image."""
+
+    def __init__(self, path):
+        """Read the trailer and chunk tables of a UDIF image.
+
+        Args:
+            path: Path to the image.
+
+        Raises:
+            UdifError: The file isn't a UDIF image.
+        """
+        self.path = path
+        self._file = open(path, "rb")
+        self._pos = 0
+        self._cache = OrderedDict()
+        try:
+            self._read_tables()
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the image file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._cache.clear()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Move to a new position in the disk."""
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise IOError("Invalid seek position: %s" % offset)
+        self._pos = offset
+
+    def tell(self):
+        """Return the current position in the disk."""
+        return self._pos
+
+    def read(self, size=-1):
+        """Read up to size bytes (or the rest of the disk)."""
+        if size is None or size < 0:
+            size = self.size
+        size = max(0, min(size, self.size - self._pos))
+        pieces = []
+        while size > 0:
+            sector, offset = divmod(self._pos, SECTOR_SIZE)
+            index = bisect_right(self._starts, sector) - 1
+            chunk = self._chunks[index] if index >= 0 else None
+            if chunk is None or sector >= chunk[0] + chunk[1]:
+                # Sectors that no chunk describes read as zeros.
+                following = (self._starts[index + 1]
+                             if index + 1 < len(self._starts)
+                             else self.size // SECTOR_SIZE)
+                data = "\x00" * min(size, following * SECTOR_SIZE - self._pos)
+            else:
+                start = (sector - chunk[0]) * SECTOR_SIZE + offset
+                data = self._chunk_data(index)[start:start + size]
+            if not data:
+                break
+            pieces.append(data)
+            self._pos += len(data)
+            size -= len(data)
+        return "".join(pieces)
+
+    def _read_tables(self):
+        """Read the koly trailer and the blkx chunk tables."""
+        file_size = os.fstat(self._file.fileno()).st_size
+        if file_size < KOLY_SIZE:
+            raise UdifError("Not a UDIF disk image.")
+        self._file.seek(file_size - KOLY_SIZE)
+        koly = self._file.read(KOLY_SIZE)
+        if not koly.startswith("koly"):
+            raise UdifError("Not a UDIF disk image.")
+        data_fork_offset = struct.unpack_from(
+            ">Q", koly, KOLY_DATA_FORK_OFFSET)[0]
+        xml_offset, xml_length = struct.unpack_from(
+            ">QQ", koly, KOLY_XML_OFFSET)
+        sector_count = struct.unpack_from(">Q", koly, KOLY_SECTOR_COUNT)[0]
+        if not xml_length:
+            raise UdifError("The disk image has no property list.")
+        self._file.seek(xml_offset)
+        try:
+            resources = plistlib.readPlistFromString(
+                self._file.read(xml_length))["resource-fork"]["blkx"]
+        except (ExpatError, KeyError, TypeError) as error:
+            raise UdifError("Unable to read the disk image's property "
+                            "list. (%s)" % error)
+
+        self.partitions = []
+        chunks = []
+        for resource in resources:
+            data = resource["Data"]
+            data = getattr(data, "data", data)
+            try:
+                (signature, _, first_sector, count, data_offset, _, _, _, _,
+                 chunk_count) = struct.unpack_from(MISH_FORMAT, data)
+            except struct.error:
+                raise UdifError("Invalid blkx table.")
+            if signature != "mish":
+                raise UdifError("Invalid blkx table.")
+            self.partitions.append(UdifPartition(
+                resource.get("Name", ""), first_sector, count))
+            for index in range(chunk_count):
+                (chunk_type, _, sector, count, offset,
+                 length) = struct.unpack_from(
+                     CHUNK_FORMAT, data, MISH_SIZE + CHUNK_SIZE * index)
+                if chunk_type in (COMMENT, TERMINATOR) or not count:
+                    continue
+                chunks.append((first_sector + sector, count, chunk_type,
+                               data_fork_offset + data_offset + offset,
+                               length))
+        chunks.sort()
+        self._chunks = chunks
+        self._starts = [chunk[0] for chunk in chunks]
+        self.size = sector_count * SECTOR_SIZE
+        if chunks:
+            self.size = max(self.size,
+                            (chunks[-1][0] + chunks[-1][1]) * SECTOR_SIZE)
+
+    def _chunk_data(self, index):
+        """Return the decompressed data of a chunk."""
+        if index in self._cache:
+            self._cache[index] = self._cache.pop(index)
+            return self._cache[index]
+        _, count, chunk_type, offset, length = self._chunks[index]
+        size = count * SECTOR_SIZE
+        if chunk_type in (ZERO_FILL, IGNORED):
+            data = "\x00" * size
+        else:
+            self._file.seek(offset)
+            data = _decompress(chunk_type, self._file.read(length), size)
+            if len(data) < size:
+                data += "\x00" * (size - len(data))
+        self._cache[index] = data
+        while len(self._cache) > CHUNK_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return data
+
+
+def _decompress(chunk_type, data, size):
+    """Return the decompressed data of a chunk."""
+    try:
+        if chunk_type == RAW:
+            return data
+        elif chunk_type == ZLIB:
+            return zlib.decompress(data)
+        elif chunk_type == BZIP2:
+            return bz2.decompress(data)
+        elif chunk_type == ADC:
+            return adc_decompress(data, size)
+        elif chunk_type == LZMA and lzma is not None:
+            return lzma.decompress(data)
+    except DECOMPRESSION_ERRORS as error:
+        raise UdifError("Unable to decompress the disk image. (%s)" % error)
+    raise UdifError("The disk image uses an unsupported compression "
+                    "method (0x%08x)." % chunk_type)
+
+
+def adc_decompress(data, size):
+    """Decompress Apple Data Compression (ADC) data.
+
+    Args:
+        data: The compressed data.
+        size: The size of the decompressed data.
+
+    Returns:
+        The decompressed data.
+    """
+    out = bytearray()
+    data = bytearray(data)
+    pos = 0
+    while pos < len(data) and len(out) < size:
+        byte = data[pos]
+        if byte & 0x80:
+            # A run of literal bytes.
+            length = (byte & 0x7f) + 1
+            out.extend(data[pos + 1:pos + 1 + length])
+            pos += length + 1
+            continue
+        if byte & 0x40:
+            length = (byte & 0x3f) + 4
+            distance = (data[pos + 1] << 8 | data[pos + 2]) + 1
+            pos += 3
+        else:
+            length = ((byte & 0x3c) >> 2) + 3
+            distance = ((byte & 0x03) << 8 | data[pos + 1]) + 1
+            pos += 2
+        if distance > len(out):
+            raise ValueError("Invalid ADC back reference.")
+        # Copy byte by byte, since the source may overlap the output.
+        for _ in range(length):
+            out.append(out[-distance])
+    return str(out)
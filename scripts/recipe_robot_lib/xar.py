@@ -0,0 +1,301 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+xar.py
+
+XarArchive: Read members of a xar archive (such as a flat package).
+
+A xar archive is a short binary header, a zlib-compressed XML table of
+contents (TOC), and a "heap" holding the data of each member at the
+offset given in the TOC. That makes it cheap to read just the members
+we care about -- a package's PackageInfo, Distribution and Bom are a
+few KB, while its Payload can be gigabytes -- instead of expanding the
+whole package with pkgutil. Member data is only read when asked for,
+and can be streamed through a file-like object.
+"""
+
+
+import bz2
+import posixpath
+import shutil
+import struct
+import zlib
+from xml.etree.ElementTree import fromstring, ParseError
+
+
+MAGIC = "xar!"
+
+# magic, header size, version, compressed TOC length, uncompressed TOC
+# length, checksum algorithm.
+HEADER_FORMAT = ">4sHHQQI"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+# Refuse to inflate tables of contents bigger than this.
+MAX_TOC_SIZE = 64 * 1024 * 1024
+
+# Size of the blocks in which member data is read from the heap.
+BLOCK_SIZE = 64 * 1024
+
+# Member data encodings, and functions returning a decompressor for
+# each. (Despite the name, xar's "gzip" encoding is a zlib stream.)
+DECOMPRESSORS = {
+    "application/octet-stream": None,
+    "application/x-gzip": zlib.decompressobj,
+    "application/x-bzip2": bz2.BZ2Decompressor,
+}
+
+
+class XarError(Exception):
+    """The file isn't a xar archive, or a member can't be read."""
+
+
+class XarMember(object):
+    """Information about one member of a xar archive, from its TOC."""
+
+    def __init__(self, name, member_type="file", offset=0, length=0,
+                 size=0, encoding=None, link=None):
+        """Set up a XarMember.
+
+        Args:
+            name: Path of the member within the archive.
+            member_type: "file", "directory" or "symlink".
+            offset: Offset of the member's data in the heap.
+            length: Length of the member's (encoded) data in the heap.
+            size: Length of the member's data once decoded.
+            encoding: MIME type of the data's encoding.
+            link: Target of a symlink.
+        """
+        self.name = name
+        self.type = member_type
+        self.offset = offset
+        self.length = length
+        self.size = size
+        self.encoding = encoding or "application/octet-stream"
+        self.link = link
+
+    def isfile(self):
+        """Return whether the member is a regular file."""
+        return self.type == "file"
+
+    def isdir(self):
+        """Return whether the member is a directory."""
+        return self.type == "directory"
+
+
+class XarArchive(object):
+    """Read-only access to the members of a xar archive."""
+
+    def __init__(self, file_or_path):
+        """Read the header and table of contents of an archive.
+
+        Args:
+            file_or_path: Path to the archive, or a seekable file-like
+                object open for reading (such as an archives.RangeFile).
+
+        Raises:
+            XarError: The file isn't a xar archive, or its table of
+                contents can't be read.
+        """
+        if isinstance(file_or_path, basestring):
+            self.fileobj = open(file_or_path, "rb")
+            self._close_fileobj = True
+        else:
+            self.fileobj = file_or_path
+            self._close_fileobj = False
+        try:
+            self.members = self._read_toc()
+        except Exception:
+            self.close()
+            raise
+        self._by_name = dict((member.name, member) for member in self.members)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the archive file, if we opened it."""
+        if self._close_fileobj and self.fileobj is not None:
+            self.fileobj.close()
+        self.fileobj = None
+
+    def names(self):
+        """Return the paths of all members, in TOC order."""
+        return [member.name for member in self.members]
+
+    def getmember(self, name):
+        """Return the XarMember for a path. Raises KeyError if absent."""
+        return self._by_name[name]
+
+    def open(self, name):
+        """Return a file-like object that reads a member's data.
+
+        Nothing is read from the archive until the object is read from,
+        and the data is decoded as it's read.
+
+        Raises:
+            KeyError: There's no member with that name.
+            XarError: The member isn't a file, or its encoding isn't
+                supported.
+        """
+        member = self.getmember(name)
+        if not member.isfile():
+            raise XarError("%s is not a file." % name)
+        return XarMemberFile(self, member)
+
+    def read(self, name):
+        """Return all the (decoded) data of a member."""
+        member_file = self.open(name)
+        try:
+            return member_file.read()
+        finally:
+            member_file.close()
+
+    def extract(self, name, dest_path):
+        """Write a member's data to dest_path, streaming it."""
+        member_file = self.open(name)
+        try:
+            with open(dest_path, "wb") as dest_file:
+                shutil.copyfileobj(member_file, dest_file, BLOCK_SIZE)
+        finally:
+            member_file.close()
+
+    def read_heap(self, offset, size):
+        """Return up to size bytes starting at offset in the heap."""
+        self.fileobj.seek(self.heap_offset + offset)
+        return self.fileobj.read(size)
+
+    def _read_toc(self):
+        """Parse the header and TOC, and return a list of XarMembers."""
+        self.fileobj.seek(0)
+        header = self.fileobj.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+            raise XarError("Not a xar archive.")
+        (_, header_size, self.version, toc_length, toc_size,
+         self.checksum_alg) = struct.unpack(HEADER_FORMAT, header)
+        if (header_size < HEADER_SIZE or toc_length > MAX_TOC_SIZE or
+                toc_size > MAX_TOC_SIZE):
+            raise XarError("Invalid xar header.")
+        self.fileobj.seek(header_size)
+        try:
+            toc_xml = zlib.decompress(self.fileobj.read(toc_length))
+            toc = fromstring(toc_xml)
+        except (zlib.error, ParseError) as error:
+            raise XarError("Unable to read xar table of contents. (%s)" %
+                           error)
+        self.heap_offset = header_size + toc_length
+
+        members = []
+        toc = toc.find("toc")
+        if toc is None:
+            raise XarError("The xar archive has no table of contents.")
+        _add_members(toc, "", members)
+        return members
+
+
+class XarMemberFile(object):
+    """A file-like object that reads (and decodes) one xar member."""
+
+    def __init__(self, archive, member):
+        """Set up a XarMemberFile.
+
+        Args:
+            archive: The XarArchive the member belongs to.
+            member: The XarMember to read.
+
+        Raises:
+            XarError: The member's encoding isn't supported.
+        """
+        if member.encoding not in DECOMPRESSORS:
+            raise XarError("%s has an unsupported encoding (%s)." %
+                           (member.name, member.encoding))
+        self.archive = archive
+        self.member = member
+        self.name = member.name
+        factory = DECOMPRESSORS[member.encoding]
+        self._decompressor = factory() if factory else None
+        self._raw_pos = 0
+        self._pos = 0
+        self._buffer = ""
+        self._eof = False
+
+    def read(self, size=-1):
+        """Read up to size bytes (or the rest of the member)."""
+        if size is None or size < 0:
+            chunks = [self.read(BLOCK_SIZE)]
+            while chunks[-1]:
+                chunks.append(self.read(BLOCK_SIZE))
+            return "".join(chunks)
+        while len(self._buffer) < size and not self._eof:
+            self._fill()
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self._pos += len(data)
+        return data
+
+    def tell(self):
+        """Return the number of decoded bytes read so far."""
+        return self._pos
+
+    def close(self):
+        """Discard buffered data."""
+        self._buffer = ""
+        self._eof = True
+
+    def _fill(self):
+        """Read and decode the next block of the member's data."""
+        raw = ""
+        remaining = self.member.length - self._raw_pos
+        if remaining > 0:
+            raw = self.archive.read_heap(
+                self.member.offset + self._raw_pos,
+                min(BLOCK_SIZE, remaining))
+            self._raw_pos += len(raw)
+        if not raw:
+            self._eof = True
+            if hasattr(self._decompressor, "flush"):
+                self._buffer += self._decompressor.flush()
+            return
+        if self._decompressor is None:
+            self._buffer += raw
+            return
+        try:
+            self._buffer += self._decompressor.decompress(raw)
+        except (zlib.error, IOError, EOFError) as error:
+            raise XarError("Unable to decode %s. (%s)" % (self.name, error))
+
+
+def _add_members(element, parent, members):
+    """Add XarMembers for the <file> children of element, recursively."""
+    for file_element in element.findall("file"):
+        name = posixpath.join(parent, file_element.findtext("name", ""))
+        data = file_element.find("data")
+        member = XarMember(name, file_element.findtext("type", "file"))
+        if data is not None:
+            member.offset = int(data.findtext("offset", "0"))
+            member.length = int(data.findtext("length", "0"))
+            member.size = int(data.findtext("size", "0"))
+            encoding = data.find("encoding")
+            if encoding is not None:
+                member.encoding = encoding.get("style") or member.encoding
+        member.link = file_element.findtext("link")
+        members.append(member)
+        _add_members(file_element, name, members)
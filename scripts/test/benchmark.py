@@ -0,0 +1,412 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+benchmark.py
+
+Time Recipe Robot end to end, for every kind of input path, without a
+real app or the internet.
+
+Each scenario runs process_input_path() and generate_recipes() against
+the synthetic app, archives, and web services in fixtures.py, served by
+a local FixtureServer that waits LATENCY seconds before each response
+(like a round trip to a real server would). Every scenario is run:
+    cold: With an empty HTTP cache and download store, like the first
+        run for an app.
+    warm: With the HTTP cache and download store of a previous run,
+        like running Recipe Robot for the same app again.
+    replay: Like cold, but with every response replayed from a cassette
+        recorded beforehand, so no time at all is spent waiting on the
+        network. What's left is Recipe Robot's own work.
+
+usage: benchmark.py [-h] [--output FILE] [--baseline FILE]
+                    [--max-regression FRACTION] [--iterations N]
+                    [--latency SECONDS] [--scenario NAME]
+
+The results are written as JSON. Given the results of an earlier run
+(say, from before a change) with --baseline, the change in each
+scenario's median time is included too, and --max-regression makes the
+benchmark fail if any scenario got slower by more than that fraction.
+The benchmark also fails if any run of any scenario does.
+"""
+
+
+from argparse import ArgumentParser, Namespace
+from collections import OrderedDict
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(TEST_DIR)
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+# pylint: disable=wrong-import-position
+import fixtures
+from recipe_robot_lib import robolog
+from recipe_robot_lib.cassette import Cassette, ReplaySession
+from recipe_robot_lib.exceptions import RoboError
+from recipe_robot_lib.facts import Facts
+from recipe_robot_lib.httpcache import HTTPCache
+from recipe_robot_lib.recipe import RECIPE_TYPES, Recipes
+from recipe_robot_lib.store import DownloadStore
+from recipe_robot_lib.tools import __version__
+from recipe_robot_lib.tracing import tracer
+# pylint: enable=wrong-import-position
+
+
+# Seconds the fixture server waits before each response.
+LATENCY = 0.05
+
+# Number of timed runs of each scenario in each mode.
+ITERATIONS = 3
+
+MODES = ("cold", "warm", "replay")
+
+# Each scenario's input path: a key of build_fixtures()' files, or a
+# URL served by the fixture server.
+SCENARIOS = OrderedDict((
+    ("app", "app"),
+    ("zip", "zip"),
+    ("tarball", "tarball"),
+    ("pkg", "pkg"),
+    ("dmg_url", fixtures.DMG_URL),
+    ("sparkle_feed", fixtures.FEED_URL),
+    ("download_url", fixtures.DOWNLOAD_URL),
+    ("github", fixtures.GITHUB_URL),
+    ("bitbucket", fixtures.BITBUCKET_URL),
+    ("sourceforge", fixtures.SOURCEFORGE_URL),
+))
+
+PREFS = {
+    "RecipeIdentifierPrefix": "com.example.benchmark",
+    "RecipeTypes": sorted(RECIPE_TYPES),
+    "DSPackagesPath": "/Shared/DeployStudio/Packages",
+    "FollowOfficialJSSRecipesFormat": False}
+
+
+class Benchmark(object):
+    """Run scenarios against a fixture server.
+
+    Attributes:
+        work_dir: Folder holding the fixtures, and each run's cache
+            folder, HTTP cache, download store, and recipes.
+        files: Dictionary of fixture names to paths, as returned by
+            fixtures.build_fixtures().
+        server: The running FixtureServer.
+    """
+
+    def __init__(self, work_dir, latency=LATENCY):
+        self.work_dir = work_dir
+        fixtures_dir = os.path.join(work_dir, "fixtures")
+        os.mkdir(fixtures_dir)
+        self.files, routes = fixtures.build_fixtures(fixtures_dir)
+        self.server = fixtures.FixtureServer(routes, latency)
+        self.server.start()
+
+    def close(self):
+        """Stop the fixture server."""
+        self.server.stop()
+
+    def input_path(self, scenario):
+        """Return the input path of a scenario."""
+        target = SCENARIOS[scenario]
+        return self.files.get(target, target)
+
+    def run(self, scenario, state_dir, session=None):
+        """Inspect a scenario's input path and generate its recipes.
+
+        Args:
+            scenario: Name of the scenario (a key of SCENARIOS).
+            state_dir: Folder for the HTTP cache and download store.
+                Anything already in it is used, as it would be by a
+                later run of Recipe Robot.
+            session: Optional HTTPSession to use. Defaults to a
+                FixtureSession with an HTTP cache in state_dir.
+
+        Returns:
+            A dictionary of:
+                inspect: Seconds spent inspecting.
+                generate: Seconds spent generating recipes.
+                requests, cache_hits, reused_connections, bytes:
+                    Totals for the HTTP requests made.
+                categories: Self seconds spent in each category of
+                    span (see Tracer.summarize()).
+                recipes: Number of recipes generated.
+                errors: List of errors, if the run failed.
+        """
+        run_dir = tempfile.mkdtemp(dir=self.work_dir)
+        facts = Facts(observers=[])
+        facts["args"] = Namespace(
+            input_path=self.input_path(scenario), ignore_existing=True,
+            keep_cache=False, skip_icon=True, verbose=False, app_mode=False,
+            trace=None)
+        facts["cache_dir"] = os.path.join(run_dir, "cache")
+        os.mkdir(facts["cache_dir"])
+        if session is None:
+            session = fixtures.FixtureSession(
+                self.server.server_address,
+                cache=HTTPCache(os.path.join(state_dir, "http")))
+        facts["session"] = session
+        facts["download_store"] = DownloadStore(
+            os.path.join(state_dir, "downloads"))
+        facts["recipes"] = Recipes()
+        prefs = dict(PREFS, RecipeCreateCount=0,
+                     RecipeCreateLocation=os.path.join(run_dir, "recipes"))
+
+        # Imported here, so the fixtures are built before timing starts.
+        from recipe_robot_lib.inspect import process_input_path
+        from recipe_robot_lib.recipe_generator import generate_recipes
+
+        tracer.reset()
+        result = {"inspect": 0.0, "generate": 0.0, "errors": []}
+        start = timeit.default_timer()
+        try:
+            process_input_path(facts)
+            result["inspect"] = timeit.default_timer() - start
+            result["generate"], _ = generate_recipes(facts, prefs)  # pylint: disable=assignment-from-no-return
+        except (RoboError, Exception) as error:  # pylint: disable=broad-except
+            # Record the failure, like recipe-robot would, so that the
+            # other scenarios still run.
+            if not result["inspect"]:
+                result["inspect"] = timeit.default_timer() - start
+            result["errors"].append(
+                error.message if isinstance(error, RoboError) else
+                "%s: %s" % (type(error).__name__, error))
+        finally:
+            facts["session"].close()
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+        result.update(facts["session"].summarize_timings())
+        del result["seconds"]
+        result["categories"] = dict(
+            (category, totals["seconds"]) for category, totals
+            in tracer.summarize()["categories"].iteritems())
+        result["recipes"] = prefs["RecipeCreateCount"]
+        return result
+
+    def run_scenario(self, scenario, mode, iterations=ITERATIONS):
+        """Run a scenario several times, and summarize the runs.
+
+        In warm mode, the scenario is run once more beforehand, without
+        being timed, to fill the HTTP cache and download store. In
+        replay mode, that run records the cassette the timed runs are
+        replayed from.
+
+        Returns:
+            A dictionary of the median, minimum, and maximum total
+            seconds, and the details (as returned by run()) of each
+            run.
+        """
+        state_dir = tempfile.mkdtemp(dir=self.work_dir)
+        try:
+            if mode == "warm":
+                self.run(scenario, state_dir)
+            elif mode == "replay":
+                cassette = Cassette()
+                self.run(scenario, state_dir,
+                         fixtures.RecordingFixtureSession(
+                             cassette,
+                             server_address=self.server.server_address))
+            runs = []
+            for _ in range(iterations):
+                session = None
+                if mode != "warm":
+                    shutil.rmtree(state_dir)
+                    os.mkdir(state_dir)
+                if mode == "replay":
+                    cassette.rewind()
+                    session = ReplaySession(cassette)
+                runs.append(self.run(scenario, state_dir, session))
+        finally:
+            shutil.rmtree(state_dir, ignore_errors=True)
+        totals = sorted(run["inspect"] + run["generate"] for run in runs)
+        return {"median": median(totals),
+                "min": totals[0],
+                "max": totals[-1],
+                "runs": runs}
+
+
+def median(values):
+    """Return the median of a sorted list of numbers."""
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def run_benchmark(scenarios=None, iterations=ITERATIONS, latency=LATENCY):
+    """Run scenarios in each mode, and return the results.
+
+    Args:
+        scenarios: List of scenario names. Defaults to all of them.
+        iterations: Number of timed runs of each scenario in each mode.
+        latency: Seconds the fixture server waits before each response.
+
+    Returns:
+        A dictionary describing the environment, with the results of
+        each scenario (as returned by Benchmark.run_scenario()) under
+        "scenarios", by scenario name and mode.
+    """
+    work_dir = tempfile.mkdtemp()
+    benchmark = Benchmark(work_dir, latency)
+    try:
+        results = OrderedDict()
+        for scenario in scenarios or SCENARIOS:
+            results[scenario] = OrderedDict(
+                (mode, benchmark.run_scenario(scenario, mode, iterations))
+                for mode in MODES)
+    finally:
+        benchmark.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return OrderedDict((
+        ("recipe_robot_version", __version__),
+        ("python", platform.python_version()),
+        ("platform", platform.platform()),
+        ("iterations", iterations),
+        ("latency", latency),
+        ("scenarios", results)))
+
+
+def failures(results):
+    """Return the "scenario/mode" names of runs that failed.
+
+    A failed run stops early, so its time says nothing about how fast
+    Recipe Robot is.
+    """
+    return ["%s/%s" % (scenario, mode)
+            for scenario, modes in results["scenarios"].iteritems()
+            for mode, summary in modes.iteritems()
+            if any(run["errors"] for run in summary.get("runs", []))]
+
+
+def compare(results, baseline, max_regression=None):
+    """Compare results with those of an earlier run.
+
+    Args:
+        results: Results, as returned by run_benchmark().
+        baseline: Results of an earlier run.
+        max_regression: If given, the fraction by which a scenario's
+            median time may grow before it counts as a regression.
+
+    Returns:
+        A tuple of:
+            comparison: Dictionary of the baseline and current median
+                seconds, and the change as a fraction of the baseline,
+                by scenario name and mode. Scenarios that aren't in
+                both, or that failed in either (see failures()), are
+                left out.
+            regressions: List of "scenario/mode" names that got slower
+                by more than max_regression.
+    """
+    comparison = OrderedDict()
+    regressions = []
+    failed = set(failures(results)) | set(failures(baseline))
+    for scenario, modes in results["scenarios"].iteritems():
+        for mode, summary in modes.iteritems():
+            try:
+                before = baseline["scenarios"][scenario][mode]["median"]
+            except KeyError:
+                continue
+            if "%s/%s" % (scenario, mode) in failed:
+                continue
+            after = summary["median"]
+            change = (after - before) / before if before else 0.0
+            comparison.setdefault(scenario, OrderedDict())[mode] = {
+                "baseline": before, "current": after, "change": change}
+            if max_regression is not None and change > max_regression:
+                regressions.append("%s/%s" % (scenario, mode))
+    return comparison, regressions
+
+
+def format_table(results):
+    """Return the results as a table, for people to read."""
+    lines = ["%-14s %-6s %9s %9s %8s %6s  %s" % (
+        "scenario", "mode", "median", "min", "requests", "hits", "change")]
+    comparison = results.get("comparison", {})
+    for scenario, modes in results["scenarios"].iteritems():
+        for mode, summary in modes.iteritems():
+            last_run = summary["runs"][-1]
+            change = comparison.get(scenario, {}).get(mode)
+            lines.append("%-14s %-6s %8.3fs %8.3fs %8d %6d  %s" % (
+                scenario, mode, summary["median"], summary["min"],
+                last_run["requests"], last_run["cache_hits"],
+                "%+.1f%%" % (change["change"] * 100) if change else ""))
+            if last_run["errors"]:
+                lines.append("    error: %s" % last_run["errors"][0])
+    return "\n".join(lines)
+
+
+def main():
+    """Run the benchmark from the command line."""
+    parser = ArgumentParser(
+        description="Time Recipe Robot end to end, for every kind of input "
+                    "path, against local fixtures.")
+    parser.add_argument(
+        "--output", metavar="FILE", default="benchmark_results.json",
+        help="Where to write the results, as JSON. Defaults to "
+             "benchmark_results.json.")
+    parser.add_argument(
+        "--baseline", metavar="FILE",
+        help="Results of an earlier run to compare with.")
+    parser.add_argument(
+        "--max-regression", metavar="FRACTION", type=float,
+        help="Fail if a scenario's median time grew by more than FRACTION "
+             "(e.g. 0.2) of its baseline.")
+    parser.add_argument(
+        "--iterations", metavar="N", type=int, default=ITERATIONS,
+        help="Timed runs of each scenario in each mode. Defaults to %d." %
+             ITERATIONS)
+    parser.add_argument(
+        "--latency", metavar="SECONDS", type=float, default=LATENCY,
+        help="Seconds the fixture server waits before each response. "
+             "Defaults to %s." % LATENCY)
+    parser.add_argument(
+        "--scenario", metavar="NAME", action="append",
+        choices=list(SCENARIOS),
+        help="Only run this scenario. Can be given more than once.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.scenario, args.iterations, args.latency)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        results["comparison"], regressions = compare(
+            results, baseline, args.max_regression)
+    with open(args.output, "w") as output_file:
+        json.dump(results, output_file, indent=2)
+
+    robolog.flush()
+    print format_table(results)
+    failed = failures(results)
+    if failed:
+        print "\nFailed: %s" % ", ".join(failed)
+    if regressions:
+        print "\nSlower than the baseline: %s" % ", ".join(regressions)
+    return 1 if failed or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
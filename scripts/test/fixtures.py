@@ -0,0 +1,364 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+fixtures.py
+
+Synthetic apps, archives, packages, disk images, and web services, so
+that whole inspections can run without a real app or the internet.
+
+build_fixtures() writes an app (and a zip, tarball, flat package, and
+disk image of it) to a folder, and returns the routes a FixtureServer
+needs to stand in for its vendor's website, Sparkle feed, download
+CDN, the GitHub, BitBucket, and SourceForge APIs, and MacUpdate.
+
+A FixtureSession is an HTTPSession that sends every request to a
+FixtureServer, whatever host the URL names, so the inspectors' URLs
+don't need to change.
+"""
+
+
+from urlparse import urlparse
+import httplib
+import json
+import os
+import plistlib
+import tarfile
+import zipfile
+
+from local_server import LocalServer
+from recipe_robot_lib.cassette import RecordingSession
+from recipe_robot_lib.network import HTTPSession
+from test_hfsplus import (VolumeBuilder, catalog_key, file_record,
+                          folder_record, fork_data, thread_record)
+from test_payload import DIR_MODE, FILE_MODE, gzip_data, make_odc
+from test_udif import make_udif
+from test_xar import make_xar
+
+
+APP_NAME = "Example"
+VERSION = "1.0"
+FEED_URL = "https://updates.example.com/appcast.xml"
+DOWNLOAD_URL = "https://downloads.example.com/Example-%s.zip" % VERSION
+DMG_URL = "https://downloads.example.com/Example.dmg"
+GITHUB_URL = "https://github.com/example/Example"
+BITBUCKET_URL = "https://bitbucket.org/example/example"
+SOURCEFORGE_URL = "https://sourceforge.net/projects/example/"
+
+INFO_PLIST = {
+    "CFBundleName": APP_NAME,
+    "CFBundleExecutable": APP_NAME,
+    "CFBundleIdentifier": "com.example.Example",
+    "CFBundleIconFile": "AppIcon",
+    "CFBundleShortVersionString": VERSION,
+    "CFBundleVersion": "100",
+    "LSMinimumSystemVersion": "10.9",
+    "SUFeedURL": FEED_URL}
+
+# Paths in the app, and their contents. The executable is big enough
+# that archives of the app aren't trivially small.
+APP_FILES = {
+    "Contents/Info.plist": plistlib.writePlistToString(INFO_PLIST),
+    "Contents/MacOS/Example": "\xcf\xfa\xed\xfe" + "\x00\x01" * 256 * 1024,
+    "Contents/Resources/AppIcon.icns": "icns" + "\x00" * 1024,
+}
+
+SPARKLE_FEED = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"
+     xmlns:sparkle="http://www.andymatuschak.org/xml-namespaces/sparkle">
+  <channel>
+    <title>Example</title>
+    <item>
+      <title>Version %(version)s</title>
+      <enclosure url="%(url)s" sparkle:version="100"
+                 sparkle:shortVersionString="%(version)s"
+                 type="application/octet-stream"/>
+    </item>
+  </channel>
+</rss>
+""" % {"version": VERSION, "url": DOWNLOAD_URL}
+
+SOURCEFORGE_RSS = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0" xmlns:files="https://sourceforge.net/api/files.rdf#">
+  <channel>
+    <item>
+      <link>https://sourceforge.net/projects/example/files/Example-%s.zip/download</link>
+      <files:extra-info>data</files:extra-info>
+    </item>
+  </channel>
+</rss>
+""" % VERSION
+
+
+def make_app(path):
+    """Create the app in APP_FILES at path."""
+    for rel_path, contents in APP_FILES.items():
+        file_path = os.path.join(path, *rel_path.split("/"))
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        with open(file_path, "wb") as openfile:
+            openfile.write(contents)
+    os.chmod(os.path.join(path, "Contents", "MacOS", APP_NAME), 0o755)
+
+
+def make_zip(path, app_path):
+    """Write a zip archive of the app at app_path."""
+    parent = os.path.dirname(app_path)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for dirpath, _, filenames in os.walk(app_path):
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                zip_file.write(file_path, os.path.relpath(file_path, parent))
+
+
+def make_tarball(path, app_path):
+    """Write a gzipped tarball of the app at app_path."""
+    tar_file = tarfile.open(path, "w:gz")
+    try:
+        tar_file.add(app_path, os.path.basename(app_path))
+    finally:
+        tar_file.close()
+
+
+def make_flat_pkg(path):
+    """Write a flat package that installs the app in /Applications."""
+    prefix = "./Applications/%s.app" % APP_NAME
+    entries = [(".", DIR_MODE, ""), ("./Applications", DIR_MODE, ""),
+               (prefix, DIR_MODE, "")]
+    folders = set()
+    for rel_path in sorted(APP_FILES):
+        parts = rel_path.split("/")
+        for index in range(1, len(parts)):
+            folder = "/".join(parts[:index])
+            if folder not in folders:
+                folders.add(folder)
+                entries.append((prefix + "/" + folder, DIR_MODE, ""))
+        mode = 0o100755 if "/MacOS/" in rel_path else FILE_MODE
+        entries.append((prefix + "/" + rel_path, mode, APP_FILES[rel_path]))
+    package_info = (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<pkg-info format-version="2" identifier="com.example.Example.pkg" '
+        'version="%s" install-location="/" auth="root">'
+        '<bundle id="%s" path="%s"/></pkg-info>' %
+        (VERSION, INFO_PLIST["CFBundleIdentifier"], prefix))
+    make_xar(path, [
+        ("Example.pkg/PackageInfo", package_info,
+         "application/octet-stream"),
+        ("Example.pkg/Payload", gzip_data(make_odc(entries)),
+         "application/octet-stream")])
+
+
+def make_disk_image(path):
+    """Write a UDIF disk image of an HFS+ volume holding the app."""
+    builder = VolumeBuilder()
+    extents = dict((rel_path, builder.add(contents))
+                   for rel_path, contents in APP_FILES.items())
+
+    def app_file(cnid, rel_path, mode=0o100644):
+        """Return the catalog record of one of the app's files."""
+        return file_record(cnid, mode, fork_data(len(APP_FILES[rel_path]),
+                                                 [extents[rel_path]]))
+
+    # Catalog records must be sorted by parent ID, then name.
+    catalog = [
+        (catalog_key(1, u"Example"), folder_record(2)),
+        (catalog_key(2, u""), thread_record(1, u"Example")),
+        (catalog_key(2, u"Example.app"), folder_record(20)),
+        (catalog_key(20, u"Contents"), folder_record(21)),
+        (catalog_key(21, u"Info.plist"),
+         app_file(22, "Contents/Info.plist")),
+        (catalog_key(21, u"MacOS"), folder_record(23)),
+        (catalog_key(21, u"Resources"), folder_record(25)),
+        (catalog_key(23, u"Example"),
+         app_file(24, "Contents/MacOS/Example", 0o100755)),
+        (catalog_key(25, u"AppIcon.icns"),
+         app_file(26, "Contents/Resources/AppIcon.icns")),
+    ]
+    volume = builder.build([key + record for key, record in catalog])
+    make_udif(path, volume, chunk_sectors=256)
+
+
+def build_fixtures(path):
+    """Write the fixture files, and return what's needed to serve them.
+
+    Args:
+        path: Folder in which to write the app, zip, tarball, flat
+            package, and disk image.
+
+    Returns:
+        A tuple of:
+            files: Dictionary of "app", "zip", "tarball", "pkg", and
+                "dmg" to the path of each.
+            routes: Dictionary of (host, path) tuples to (content type,
+                body) tuples, for a FixtureServer.
+    """
+    files = {
+        "app": os.path.join(path, "%s.app" % APP_NAME),
+        "zip": os.path.join(path, "%s.zip" % APP_NAME),
+        "tarball": os.path.join(path, "%s.tar.gz" % APP_NAME),
+        "pkg": os.path.join(path, "%s.pkg" % APP_NAME),
+        "dmg": os.path.join(path, "%s.dmg" % APP_NAME)}
+    make_app(files["app"])
+    make_zip(files["zip"], files["app"])
+    make_tarball(files["tarball"], files["app"])
+    make_flat_pkg(files["pkg"])
+    make_disk_image(files["dmg"])
+    with open(files["zip"], "rb") as zip_file:
+        zip_data = zip_file.read()
+    with open(files["dmg"], "rb") as dmg_file:
+        dmg_data = dmg_file.read()
+
+    zip_type = "application/zip"
+    json_type = "application/json"
+    routes = {
+        # The vendor's own site.
+        route(FEED_URL): ("application/rss+xml", SPARKLE_FEED),
+        route(DOWNLOAD_URL): (zip_type, zip_data),
+        route(DMG_URL): ("application/x-apple-diskimage", dmg_data),
+        # GitHub.
+        route("https://api.github.com/repos/example/Example"): (
+            json_type, json.dumps({
+                "name": APP_NAME, "description": "An example app.",
+                "private": False, "fork": False})),
+        route("https://api.github.com/repos/example/Example/releases/"
+              "latest"): (json_type, json.dumps({"assets": [{
+                  "browser_download_url": GITHUB_URL +
+                                          "/releases/download/v%s/"
+                                          "Example-%s.zip" %
+                                          (VERSION, VERSION)}]})),
+        route("https://api.github.com/users/example"): (
+            json_type, json.dumps({"name": "Example Developer"})),
+        route(GITHUB_URL + "/releases/download/v%s/Example-%s.zip" %
+              (VERSION, VERSION)): (zip_type, zip_data),
+        # BitBucket.
+        route("https://api.bitbucket.org/2.0/repositories/example/"
+              "example"): (json_type, json.dumps({
+                  "name": APP_NAME, "description": "An example app.",
+                  "owner": {"display_name": "Example Developer"},
+                  "is_private": False})),
+        route("https://api.bitbucket.org/2.0/repositories/example/example/"
+              "downloads"): (json_type, json.dumps({"values": [{
+                  "links": {"self": {"href": BITBUCKET_URL +
+                                             "/downloads/Example-%s.zip" %
+                                             VERSION}}}]})),
+        route(BITBUCKET_URL + "/downloads/Example-%s.zip" % VERSION): (
+            zip_type, zip_data),
+        # SourceForge.
+        route("https://sourceforge.net/rest/p/example"): (
+            json_type, json.dumps({
+                "shortname": "example", "name": APP_NAME,
+                "summary": "An example app.", "short_description": "",
+                "private": False,
+                "tools": [{"sourceforge_group_id": 123456}]})),
+        route("https://sourceforge.net/projects/example/rss"): (
+            "application/rss+xml", SOURCEFORGE_RSS),
+        route("https://sourceforge.net/projects/example/files/"
+              "Example-%s.zip" % VERSION): (zip_type, zip_data),
+        # MacUpdate.
+        route("https://www.macupdate.com/find/mac/Example"): (
+            "text/html", '<html>\n<span class="app-shortdescrip">An example '
+                         'app.</span>\n</html>\n'),
+    }
+    return files, routes
+
+
+def route(url):
+    """Return the (host, path) route of a URL."""
+    parsed = urlparse(url)
+    return (parsed.hostname, parsed.path or "/")
+
+
+class FixtureServer(LocalServer):
+    """Local HTTP server that stands in for every host in its routes.
+
+    Attributes:
+        routes: Dictionary of (host, path) tuples to (content type,
+            body) tuples, or to HTTP error codes.
+    """
+
+    def __init__(self, routes, latency=0.0):
+        """Set up a FixtureServer.
+
+        Args:
+            routes: Dictionary of (host, path) tuples to (content type,
+                body) tuples, or to HTTP error codes.
+            latency: Seconds to wait before answering each request.
+        """
+        LocalServer.__init__(self, latency=latency)
+        self.routes = routes
+
+    def find(self, host, path):
+        """Return the (content type, body) of a route, its error code,
+        or None."""
+        return self.routes.get((host, path))
+
+
+class FixtureSession(HTTPSession):
+    """An HTTPSession that sends every request to a FixtureServer.
+
+    Requests keep the host of their URL in their Host header (which is
+    how the server knows what they're for), and connections are still
+    pooled per host, just as they would be with the real hosts.
+    """
+
+    def __init__(self, server_address, **kwargs):
+        """Set up a FixtureSession.
+
+        Args:
+            server_address: (host, port) tuple of the FixtureServer.
+            kwargs: Passed on to HTTPSession.
+        """
+        super(FixtureSession, self).__init__(**kwargs)
+        self.server_address = server_address
+
+    def _new_connection(self, key):
+        """Return a new connection to the server, on behalf of a host."""
+        return _FixtureConnection(self.server_address, key[1], self.timeout)
+
+
+class RecordingFixtureSession(RecordingSession, FixtureSession):
+    """A FixtureSession that records its interactions in a Cassette."""
+    pass
+
+
+class _FixtureConnection(object):
+    """An httplib connection to a FixtureServer, on behalf of a host."""
+
+    def __init__(self, server_address, netloc, timeout):
+        self.netloc = netloc
+        self._conn = httplib.HTTPConnection(
+            "%s:%d" % server_address, timeout=timeout)
+
+    def request_path(self, url, path):  # pylint: disable=unused-argument
+        """Return the request target."""
+        return path
+
+    def connect(self):
+        self._conn.connect()
+
+    def request(self, method, path, headers):
+        headers = dict(headers)
+        headers["Host"] = self.netloc
+        self._conn.request(method, path, headers=headers)
+
+    def getresponse(self):
+        return self._conn.getresponse()
+
+    def close(self):
+        self._conn.close()
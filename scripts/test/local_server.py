@@ -0,0 +1,187 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+local_server.py
+
+A local HTTP server for tests, running in a background thread.
+
+By default, a LocalServer serves its files like a real web server would:
+with ETag and Last-Modified headers, 304 responses to conditional
+requests, and partial responses to Range requests (unless it's told not
+to accept them). Tests that need other responses can pass a handler
+class of their own.
+"""
+
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from collections import namedtuple
+import hashlib
+import re
+import threading
+import time
+
+
+# The Last-Modified header of every file served.
+LAST_MODIFIED = "Thu, 01 Jan 2015 00:00:00 GMT"
+
+# A request received by a LocalServer. The headers are a
+# mimetools.Message, so they can be looked up whatever their case.
+Request = namedtuple("Request", ("method", "host", "path", "headers"))
+
+
+def make_etag(body):
+    """Return the ETag header a LocalServer sends with body."""
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """Serve the server's files, honoring conditional and Range requests."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """Send the headers of a file."""
+        self.respond(send_body=False)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Send a file."""
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        """Send all or part of the file the request is for, or an error."""
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        request = server.record(self)
+        found = server.find(request.host, request.path)
+        if found is None:
+            self.send_error(404)
+            return
+        if isinstance(found, int):
+            self.send_error(found)
+            return
+
+        content_type, body = found
+        etag = make_etag(body)
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = 0, len(body)
+        range_match = re.match(r"bytes=(\d+)-(\d*)$",
+                               self.headers.get("Range", ""))
+        if_range = self.headers.get("If-Range")
+        if server.accept_ranges and range_match and if_range in (None, etag):
+            start = int(range_match.group(1))
+            if range_match.group(2):
+                end = min(end, int(range_match.group(2)) + 1)
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (
+                start, end - 1, len(body)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start))
+        if server.accept_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.end_headers()
+        if send_body:
+            try:
+                self.wfile.write(body[start:end])
+            except IOError:
+                # The client closed the connection early.
+                return
+            with server.lock:
+                server.bytes_sent += end - start
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        """Keep test output quiet."""
+        pass
+
+
+class LocalServer(ThreadingMixIn, HTTPServer):
+    """Threaded HTTP server on a free port of 127.0.0.1.
+
+    Attributes:
+        files: Dictionary of paths (like "/Example.zip") to the bodies
+            served for them, or to HTTP error codes to send instead.
+        accept_ranges: Whether Range requests are honored.
+        latency: Seconds to wait before answering each request, to
+            simulate a round trip over the internet.
+        requests: List of the Requests received, in order.
+        bytes_sent: Total size of the bodies sent.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, files=None, accept_ranges=True, latency=0.0,
+                 handler_class=RangeRequestHandler):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), handler_class)
+        self.files = files or {}
+        self.accept_ranges = accept_ranges
+        self.latency = latency
+        self.requests = []
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def url(self, path):
+        """Return the URL of a path on this server."""
+        return "http://127.0.0.1:%d%s" % (self.server_port, path)
+
+    def find(self, host, path):  # pylint: disable=unused-argument
+        """Return the (content type, body) to serve for a request, an
+        HTTP error code to send instead, or None if there's nothing
+        there."""
+        found = self.files.get(path)
+        if found is None or isinstance(found, int):
+            return found
+        return ("application/octet-stream", found)
+
+    def record(self, handler):
+        """Add the request a handler is answering to requests, and
+        return it."""
+        request = Request(handler.command,
+                          handler.headers.get("Host", "").split(":")[0].lower(),
+                          handler.path.split("?")[0], handler.headers)
+        with self.lock:
+            self.requests.append(request)
+        return request
+
+    def start(self):
+        """Serve requests from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests."""
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        """Ignore clients closing connections early, which is expected."""
+        pass
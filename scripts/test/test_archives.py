@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_archives.py
+
+Tests for reading apps out of zip archives, locally and over HTTP.
+"""
+
+
+from StringIO import StringIO
+import os
+import plistlib
+import shutil
+import tempfile
+import zipfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from local_server import LocalServer
+from recipe_robot_lib.archives import (
+    extract_app_skeleton, extract_members, find_app, find_pkg,
+    materialize_app, RangeFile)
+from recipe_robot_lib.network import HTTPSession
+
+
+def build_zip():
+    """Return the bytes of a zip archive containing a large app."""
+    buf = StringIO()
+    zip_file = zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED)
+    contents = "Example/Example.app/Contents/"
+    zip_file.writestr(contents + "Info.plist", plistlib.writePlistToString({
+        "CFBundleExecutable": "Example",
+        "CFBundleIconFile": "Example.icns",
+        "CFBundleIdentifier": "com.example.Example"}))
+    zip_file.writestr(contents + "MacOS/Example", "executable")
+    zip_file.writestr(contents + "_CodeSignature/CodeResources", "signature")
+    zip_file.writestr(contents + "Resources/Example.icns", "icon")
+    # Incompressible, so that the archive is big.
+    zip_file.writestr(contents + "Frameworks/Big.framework/Big",
+                      os.urandom(4 * 1024 * 1024))
+    zip_file.writestr(contents + "Helpers/Helper.app/Contents/Info.plist",
+                      plistlib.writePlistToString({}))
+    zip_file.close()
+    return buf.getvalue()
+
+
+ZIP_CONTENTS = build_zip()
+
+
+class TestArchives(object):
+    """Tests for the archives module."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_find_app_prefers_shallowest(self):
+        """Apps nested inside other apps aren't the main app."""
+        names = ["A.app/Contents/Helpers/B.app/Contents/Info.plist",
+                 "A.app/Contents/Info.plist"]
+        assert_equal(find_app(names), "A.app")
+        assert_is_none(find_app(["README.txt"]))
+
+    def test_extract_app_skeleton(self):
+        """Only the files needed for inspection are extracted."""
+        zip_file = zipfile.ZipFile(StringIO(ZIP_CONTENTS))
+        app_path, app = extract_app_skeleton(zip_file, self.temp_dir)
+        assert_equal(app, "Example/Example.app")
+        for rel_path in ("Info.plist", "MacOS/Example",
+                         "_CodeSignature/CodeResources",
+                         "Resources/Example.icns"):
+            assert_true(os.path.isfile(
+                os.path.join(app_path, "Contents", rel_path)))
+        assert_false(os.path.exists(
+            os.path.join(app_path, "Contents", "Frameworks")))
+
+    def test_find_pkg(self):
+        """Flat and bundle packages are found, shallowest first."""
+        names = ["Example/Nested/Other.pkg",
+                 "Example/Example.pkg/Contents/Info.plist",
+                 "__MACOSX/Example/._Example.pkg"]
+        assert_equal(find_pkg(names), "Example/Example.pkg")
+        assert_is_none(find_pkg(["Example.app/Contents/Info.plist"]))
+
+    def test_materialize_app(self):
+        """The rest of the app can be extracted after the skeleton."""
+        zip_path = os.path.join(self.temp_dir, "Example.zip")
+        with open(zip_path, "wb") as zip_file:
+            zip_file.write(ZIP_CONTENTS)
+        dest_dir = os.path.join(self.temp_dir, "unpacked")
+        extract_app_skeleton(zipfile.ZipFile(zip_path), dest_dir)
+        app_path = materialize_app(zip_path, "Example/Example.app", dest_dir)
+        assert_true(os.path.isfile(os.path.join(
+            app_path, "Contents", "Frameworks", "Big.framework", "Big")))
+
+    def test_extract_members_stays_inside(self):
+        """Members can't be written through a symlink leading outside."""
+        outside = os.path.join(self.temp_dir, "outside")
+        os.mkdir(outside)
+        buf = StringIO()
+        zip_file = zipfile.ZipFile(buf, "w")
+        link = zipfile.ZipInfo("Foo.app/Contents")
+        link.external_attr = 0o120755 << 16
+        zip_file.writestr(link, outside)
+        zip_file.writestr("Foo.app/Contents/evil", "evil")
+        zip_file.writestr("../evil", "evil")
+        zip_file.close()
+        dest_dir = os.path.join(self.temp_dir, "unpacked")
+        zip_file = zipfile.ZipFile(StringIO(buf.getvalue()))
+        extract_members(zip_file, zip_file.namelist(), dest_dir)
+        assert_true(os.path.islink(os.path.join(dest_dir, "Foo.app",
+                                                "Contents")))
+        assert_equal(os.listdir(outside), [])
+        assert_equal(sorted(os.listdir(self.temp_dir)),
+                     ["outside", "unpacked"])
+
+    def test_remote_zip(self):
+        """Reading the app from a server fetches little of the archive."""
+        server = LocalServer({"/Example.zip": ZIP_CONTENTS})
+        server.start()
+        session = HTTPSession()
+        try:
+            range_file = RangeFile(session, server.url("/Example.zip"),
+                                   len(ZIP_CONTENTS))
+            app_path, _ = extract_app_skeleton(
+                zipfile.ZipFile(range_file), self.temp_dir)
+        finally:
+            session.close()
+            server.stop()
+        with open(os.path.join(app_path, "Contents", "MacOS",
+                               "Example")) as executable:
+            assert_equal(executable.read(), "executable")
+        assert_less(range_file.bytes_fetched, len(ZIP_CONTENTS) / 10)
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_batch.py
+
+Unit tests for batch runs, with inspection and recipe generation
+replaced by stand-ins.
+"""
+
+
+from argparse import Namespace
+import os
+import shutil
+import sys
+import tempfile
+import time
+from StringIO import StringIO
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import batch
+from recipe_robot_lib.exceptions import RoboError
+
+
+PREFS = {"RecipeTypes": ["download"]}
+
+
+def process_input_path(facts):
+    """Stand in for inspect.process_input_path.
+
+    Input paths ending in "error", "exit", or "explode" fail in those
+    ways. Others leave a file in the job's cache folder and take longer
+    the lower their number, so that jobs run in parallel finish in
+    reverse order.
+    """
+    input_path = facts["args"].input_path
+    with open(os.path.join(facts["cache_dir"], "download"), "w") as openfile:
+        openfile.write(input_path)
+    if input_path.endswith("error"):
+        raise RoboError("Unable to inspect %s." % input_path)
+    elif input_path.endswith("exit"):
+        sys.exit(2)
+    elif input_path.endswith("explode"):
+        raise ValueError("Unexpected %s." % input_path)
+    time.sleep(0.1 * (4 - int(input_path.rsplit("-", 1)[-1])))
+
+
+def generate_recipes(facts, prefs):
+    """Stand in for recipe_generator.generate_recipes."""
+    facts["recipes"].append("%s.download.recipe" % facts["args"].input_path)
+    prefs["RecipeCreateCount"] += 1
+    return 0.0, None
+
+
+class TestReadBatchInputs(object):
+    """Tests for read_batch_inputs."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.stdin = sys.stdin
+
+    def teardown(self):
+        sys.stdin = self.stdin
+        shutil.rmtree(self.temp_dir)
+
+    def test_file(self):
+        batch_file = os.path.join(self.temp_dir, "inputs.txt")
+        with open(batch_file, "w") as openfile:
+            openfile.write("# Apps\n/Applications/Example.app\n\n"
+                           "  https://example.com/Example.zip  \n"
+                           "   \n#/Applications/Skipped.app\n")
+        assert_equal(["/Applications/Example.app",
+                      "https://example.com/Example.zip"],
+                     batch.read_batch_inputs(batch_file))
+
+    def test_stdin(self):
+        sys.stdin = StringIO("# Apps\n/Applications/Example.app\n\n")
+        assert_equal(["/Applications/Example.app"],
+                     batch.read_batch_inputs("-"))
+
+    def test_missing_file(self):
+        with assert_raises(RoboError):
+            batch.read_batch_inputs(os.path.join(self.temp_dir, "missing"))
+
+
+class TestRunBatch(object):
+    """Tests for run_batch."""
+
+    def setup(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.process_input_path = batch.process_input_path
+        self.generate_recipes = batch.generate_recipes
+        batch.process_input_path = process_input_path
+        batch.generate_recipes = generate_recipes
+        self.args = Namespace(input_path=None, verbose=False,
+                              keep_cache=False, trace=False,
+                              replay_http=None)
+
+    def teardown(self):
+        batch.process_input_path = self.process_input_path
+        batch.generate_recipes = self.generate_recipes
+        shutil.rmtree(self.cache_dir)
+
+    def run_batch(self, input_paths, jobs):
+        """Run a batch of input_paths, and return the results."""
+        return batch.run_batch(input_paths, self.args, PREFS,
+                               self.cache_dir, jobs)
+
+    def check_order(self, jobs):
+        input_paths = ["input-1", "input-2", "input-3"]
+        results = self.run_batch(input_paths, jobs)
+        assert_equal(input_paths,
+                     [result["input_path"] for result in results])
+        assert_equal([0, 1, 2], [result["index"] for result in results])
+        for result in results:
+            assert_true(result["succeeded"])
+            assert_equal(["%s.download.recipe" % result["input_path"]],
+                         result["recipes"])
+            assert_equal(1, result["created_count"])
+
+    def test_order(self):
+        self.check_order(jobs=1)
+
+    def test_order_in_parallel(self):
+        self.check_order(jobs=2)
+
+    def check_failures(self, jobs):
+        input_paths = ["input-1", "input-error", "input-2", "input-exit",
+                       "input-explode", "input-3"]
+        results = self.run_batch(input_paths, jobs)
+        assert_equal([True, False, True, False, False, True],
+                     [result["succeeded"] for result in results])
+        assert_equal(["Unable to inspect input-error."], results[1]["errors"])
+        assert_in("tried to exit (status 2)", results[3]["errors"][0])
+        assert_in("unexpected error: Unexpected input-explode.",
+                  results[4]["errors"][0])
+        assert_equal(3, batch.print_batch_summary(results))
+
+    def test_failures(self):
+        self.check_failures(jobs=1)
+
+    def test_failures_in_parallel(self):
+        self.check_failures(jobs=2)
+
+    def test_cache_removed(self):
+        self.run_batch(["input-1", "input-error"], jobs=1)
+        assert_equal([], os.listdir(self.cache_dir))
+
+    def test_keep_cache(self):
+        self.args.keep_cache = True
+        self.run_batch(["input-1", "input-error"], jobs=1)
+        assert_equal(["job-0000", "job-0001"],
+                     sorted(os.listdir(self.cache_dir)))
+        for job_dir in os.listdir(self.cache_dir):
+            assert_true(os.path.isfile(
+                os.path.join(self.cache_dir, job_dir, "download")))
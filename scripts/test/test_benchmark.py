@@ -0,0 +1,146 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_benchmark.py
+
+Tests for the benchmark suite and its fixtures.
+"""
+
+
+import json
+import shutil
+import sys
+import tempfile
+import zipfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+import benchmark
+import fixtures
+from recipe_robot_lib import xar
+
+
+class TestFixtures(object):
+    """Tests for the fixture files, server, and session."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.files, routes = fixtures.build_fixtures(self.temp_dir)
+        self.server = fixtures.FixtureServer(routes)
+        self.server.start()
+        self.session = fixtures.FixtureSession(self.server.server_address)
+
+    def teardown(self):
+        self.session.close()
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_archives_hold_the_app(self):
+        with zipfile.ZipFile(self.files["zip"]) as zip_file:
+            assert_in("Example.app/Contents/Info.plist", zip_file.namelist())
+        with xar.XarArchive(self.files["pkg"]) as archive:
+            assert_in("Example.pkg/Payload", archive.names())
+
+    def test_session_reaches_any_host(self):
+        body = self.session.read(
+            "https://api.github.com/repos/example/Example")
+        assert_equal(json.loads(body)["name"], fixtures.APP_NAME)
+        assert_equal([request[:3] for request in self.server.requests],
+                     [("GET", "api.github.com", "/repos/example/Example")])
+
+    def test_connections_are_reused(self):
+        self.session.read(fixtures.FEED_URL)
+        self.session.read(fixtures.FEED_URL)
+        assert_equal(self.session.summarize_timings()["reused_connections"],
+                     1)
+
+    def test_conditional_and_range_requests(self):
+        response = self.session.open(fixtures.DOWNLOAD_URL,
+                                     {"Range": "bytes=0-3"})
+        assert_equal(response.getcode(), 206)
+        assert_equal(response.read(), "PK\x03\x04")
+        etag = response.getheader("ETag")
+        response = self.session.open(fixtures.DOWNLOAD_URL,
+                                     {"If-None-Match": etag})
+        assert_equal(response.getcode(), 304)
+        response.close()
+
+    def test_unknown_route(self):
+        assert_raises(Exception, self.session.read,
+                      "https://example.com/missing")
+
+
+class TestBenchmark(object):
+    """Tests for the benchmark runner."""
+
+    def test_every_scenario(self):
+        work_dir = tempfile.mkdtemp()
+        runner = benchmark.Benchmark(work_dir, latency=0)
+        try:
+            failed = {}
+            for scenario in benchmark.SCENARIOS:
+                run = runner.run_scenario(scenario, "cold", 1)["runs"][0]
+                errors = run["errors"]
+                if sys.platform != "darwin":
+                    # Modules that only come with macOS's Python.
+                    errors = [error for error in errors
+                              if not error.startswith("ImportError")]
+                if errors:
+                    failed[scenario] = errors
+        finally:
+            runner.close()
+            shutil.rmtree(work_dir, ignore_errors=True)
+        assert_equal(failed, {})
+
+    def test_sparkle_feed_scenario(self):
+        results = benchmark.run_benchmark(["sparkle_feed"], iterations=1,
+                                          latency=0)
+        modes = results["scenarios"]["sparkle_feed"]
+        for mode in benchmark.MODES:
+            run = modes[mode]["runs"][0]
+            assert_equal(run["errors"], [])
+            assert_greater(run["recipes"], 0)
+        # The warm run reuses the responses cached by the run before it.
+        assert_greater(modes["warm"]["runs"][0]["cache_hits"], 0)
+        json.dumps(results)
+
+    def test_compare(self):
+        ok_run = {"errors": []}
+        failed_run = {"errors": ["Oops"]}
+        baseline = {"scenarios": {
+            "app": {"cold": {"median": 1.0}, "warm": {"median": 1.0}},
+            "pkg": {"cold": {"median": 1.0}}}}
+        results = {"scenarios": {
+            "app": {"cold": {"median": 1.5, "runs": [ok_run]},
+                    "warm": {"median": 0.5, "runs": [ok_run]}},
+            "pkg": {"cold": {"median": 0.1, "runs": [failed_run]}},
+            "zip": {"cold": {"median": 1.0, "runs": [ok_run]}}}}
+        comparison, regressions = benchmark.compare(results, baseline, 0.2)
+        assert_almost_equal(comparison["app"]["cold"]["change"], 0.5)
+        assert_almost_equal(comparison["app"]["warm"]["change"], -0.5)
+        # A failed run isn't a speedup.
+        assert_not_in("pkg", comparison)
+        assert_not_in("zip", comparison)
+        assert_equal(regressions, ["app/cold"])
+        assert_equal(benchmark.failures(results), ["pkg/cold"])
+
+    def test_median(self):
+        assert_equal(benchmark.median([1, 2, 3]), 2)
+        assert_equal(benchmark.median([1, 2, 3, 4]), 2.5)
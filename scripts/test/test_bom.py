@@ -0,0 +1,150 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_bom.py
+
+Unit tests for reading Bom files.
+"""
+
+
+import os
+import shutil
+import struct
+import tempfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import bom
+
+
+def make_bom(paths):
+    """Return a Bom listing paths.
+
+    Args:
+        paths: List of (path ID, parent ID, name, type, mode, size)
+            tuples. The paths are split across two leaves of the tree.
+    """
+    blocks = [""]
+
+    def add(data):
+        """Add a block, and return its index."""
+        blocks.append(data)
+        return len(blocks) - 1
+
+    pairs = []
+    for path_id, parent, name, entry_type, mode, size in paths:
+        info2 = add(struct.pack(">BBHHIIIIBII", entry_type, 1, 3, mode, 0,
+                                80, 0, size, 1, 0, 0))
+        info1 = add(struct.pack(">II", path_id, info2))
+        pairs.append(struct.pack(">II", info1,
+                                 add(struct.pack(">I", parent) + name +
+                                     "\x00")))
+    half = len(pairs) // 2
+    first_leaf = add("")
+    second_leaf = add("")
+    blocks[first_leaf] = (struct.pack(">HHII", 1, half, second_leaf, 0) +
+                          "".join(pairs[:half]))
+    blocks[second_leaf] = (
+        struct.pack(">HHII", 1, len(pairs) - half, 0, first_leaf) +
+        "".join(pairs[half:]))
+    root = add(struct.pack(">HHII", 0, 1, 0, 0) +
+               struct.pack(">II", first_leaf, 0))
+    tree = add(struct.pack(">4sIIIIB", "tree", 1, root, 4096, len(paths), 0))
+
+    data = ["\x00" * 512]
+    addresses = []
+    offset = 512
+    for block in blocks:
+        addresses.append((offset if block else 0, len(block)))
+        data.append(block)
+        offset += len(block)
+    index = struct.pack(">I", len(blocks)) + "".join(
+        struct.pack(">II", *address) for address in addresses)
+    variables = struct.pack(">I", 1) + struct.pack(">IB", tree, 5) + "Paths"
+    header = struct.pack(">8sIIIIII", "BOMStore", 1, len(blocks), offset,
+                         len(index), offset + len(index), len(variables))
+    data[0] = header + data[0][len(header):]
+    return "".join(data) + index + variables
+
+
+PATHS = [
+    (1, 0, ".", bom.DIRECTORY, 0o40755, 0),
+    (2, 1, "Applications", bom.DIRECTORY, 0o40775, 0),
+    (3, 2, "Example.app", bom.DIRECTORY, 0o40755, 0),
+    (4, 3, "Contents", bom.DIRECTORY, 0o40755, 0),
+    (5, 4, "Info.plist", bom.FILE, 0o100644, 1234),
+    (6, 4, "Helper.app", bom.DIRECTORY, 0o40755, 0),
+    (7, 1, "Library", bom.DIRECTORY, 0o40755, 0),
+    (8, 7, "Other.app", bom.DIRECTORY, 0o40755, 0),
+]
+
+
+class TestParseBom(object):
+    """Tests for parse_bom()."""
+
+    def test_paths(self):
+        """Full paths, types, modes and sizes are listed."""
+        entries = bom.parse_bom(make_bom(PATHS))
+        assert_equal([entry.path for entry in entries], [
+            "", "Applications", "Applications/Example.app",
+            "Applications/Example.app/Contents",
+            "Applications/Example.app/Contents/Info.plist",
+            "Applications/Example.app/Contents/Helper.app",
+            "Library", "Library/Other.app"])
+        info_plist = entries[4]
+        assert_true(info_plist.isfile())
+        assert_equal(info_plist.mode, 0o100644)
+        assert_equal(info_plist.size, 1234)
+        assert_true(entries[2].isdir())
+
+    def test_parent_listed_later(self):
+        """Paths can come before their parent folders."""
+        entries = bom.parse_bom(make_bom(list(reversed(PATHS))))
+        assert_in("Applications/Example.app/Contents/Info.plist",
+                  [entry.path for entry in entries])
+
+    def test_not_bom(self):
+        """Other data is reported as BomError."""
+        assert_raises(bom.BomError, bom.parse_bom, "PK\x03\x04" * 100)
+        assert_raises(bom.BomError, bom.parse_bom, make_bom(PATHS)[:600])
+
+    def test_read_bom(self):
+        """Bom files can be read from disk."""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, "Bom")
+            with open(path, "wb") as bom_file:
+                bom_file.write(make_bom(PATHS))
+            assert_equal(len(bom.read_bom(path)), len(PATHS))
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TestFindApps(object):
+    """Tests for find_apps() and top_level_apps()."""
+
+    def test_find_apps(self):
+        """Apps are found, shallowest first, excluding nested apps."""
+        apps = bom.find_apps(bom.parse_bom(make_bom(PATHS)))
+        assert_equal(apps, ["Applications/Example.app",
+                            "Applications/Example.app/Contents/Helper.app",
+                            "Library/Other.app"])
+        assert_equal(bom.top_level_apps(apps),
+                     ["Applications/Example.app", "Library/Other.app"])
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_bundle.py
+
+Unit tests for reading apps lazily from their sources.
+"""
+
+
+import os
+import plistlib
+import shutil
+import tempfile
+import zipfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib.bundle import (
+    AppBundle, BundleError, DirectorySource, ZipSource)
+
+
+INFO_PLIST = {"CFBundleExecutable": "Example",
+              "CFBundleIconFile": "AppIcon",
+              "CFBundleIdentifier": "com.example.Example"}
+
+# Paths in the app, and their contents.
+APP_FILES = {
+    "Contents/Info.plist": plistlib.writePlistToString(INFO_PLIST),
+    "Contents/MacOS/Example": "executable",
+    "Contents/_CodeSignature/CodeResources": "signature",
+    "Contents/Resources/AppIcon.icns": "icon",
+    "Contents/Frameworks/Big.framework/Versions/A/Big": "x" * 10000,
+}
+
+
+def make_app(path):
+    """Create the app in APP_FILES at path."""
+    for rel_path, contents in APP_FILES.items():
+        file_path = os.path.join(path, *rel_path.split("/"))
+        if not os.path.isdir(os.path.dirname(file_path)):
+            os.makedirs(os.path.dirname(file_path))
+        with open(file_path, "wb") as openfile:
+            openfile.write(contents)
+    os.chmod(os.path.join(path, "Contents", "MacOS", "Example"), 0o755)
+    os.symlink("Versions/A/Big", os.path.join(
+        path, "Contents", "Frameworks", "Big.framework", "Big"))
+    os.symlink("A", os.path.join(
+        path, "Contents", "Frameworks", "Big.framework", "Versions",
+        "Current"))
+
+
+class TestAppBundle(object):
+    """Tests for AppBundle."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_app = os.path.join(self.temp_dir, "Volume", "Example.app")
+        make_app(self.source_app)
+        self.local_app = os.path.join(self.temp_dir, "unpacked",
+                                      "Example.app")
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_local_app(self):
+        """Apps without a source are read where they are."""
+        bundle = AppBundle(self.source_app)
+        assert_equal(bundle.info_plist(), INFO_PLIST)
+        assert_equal(bundle.icon(), "Contents/Resources/AppIcon.icns")
+        assert_equal(bundle.real_path(), self.source_app)
+        assert_false(bundle.is_partial())
+        assert_raises(BundleError, bundle.read, "Contents/Missing")
+
+    def test_directory_source(self):
+        """Apps in folders are read in place, copying nothing."""
+        with AppBundle(self.local_app,
+                       DirectorySource(self.source_app)) as bundle:
+            assert_equal(bundle.info_plist(), INFO_PLIST)
+            assert_true(bundle.exists("Contents/_CodeSignature"))
+            assert_equal(bundle.real_path(), self.source_app)
+            assert_false(os.path.exists(self.local_app))
+
+    def test_directory_source_local_path(self):
+        """Files are linked or copied only when a real path is needed."""
+        with AppBundle(self.local_app,
+                       DirectorySource(self.source_app)) as bundle:
+            icon = bundle.local_path(bundle.icon())
+        with open(icon, "rb") as icon_file:
+            assert_equal(icon_file.read(), "icon")
+        # The icon was hard-linked, since it's on the same volume.
+        assert_equal(os.stat(icon).st_ino, os.stat(os.path.join(
+            self.source_app, "Contents", "Resources", "AppIcon.icns")).st_ino)
+        assert_false(os.path.exists(
+            os.path.join(self.local_app, "Contents", "MacOS")))
+
+    def test_directory_source_materialize(self):
+        """Whole apps can be made local, keeping symlinks."""
+        with AppBundle(self.local_app,
+                       DirectorySource(self.source_app)) as bundle:
+            bundle.materialize()
+        framework = os.path.join(self.local_app, "Contents", "Frameworks",
+                                 "Big.framework")
+        assert_equal(os.readlink(os.path.join(framework, "Versions",
+                                              "Current")), "A")
+        with open(os.path.join(framework, "Big"), "rb") as big_file:
+            assert_equal(big_file.read(), "x" * 10000)
+
+    def test_zip_source(self):
+        """Apps in zip archives are extracted a piece at a time."""
+        zip_path = os.path.join(self.temp_dir, "Example.zip")
+        zip_file = zipfile.ZipFile(zip_path, "w")
+        for rel_path, contents in APP_FILES.items():
+            zip_file.writestr("Example/Example.app/" + rel_path, contents)
+        zip_file.close()
+        app_path = os.path.join(self.temp_dir, "unpacked", "Example",
+                                "Example.app")
+        with AppBundle(app_path,
+                       ZipSource(zip_path, "Example/Example.app")) as bundle:
+            assert_equal(bundle.info_plist(), INFO_PLIST)
+            assert_true(bundle.is_partial())
+            bundle.extract_skeleton()
+            contents = os.path.join(app_path, "Contents")
+            assert_true(os.path.isfile(
+                os.path.join(contents, "_CodeSignature", "CodeResources")))
+            assert_false(os.path.exists(
+                os.path.join(contents, "Frameworks")))
+            assert_equal(bundle.materialize(), app_path)
+            assert_true(os.path.isdir(os.path.join(contents, "Frameworks")))
@@ -0,0 +1,176 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_cassette.py
+
+Unit tests for recording and replaying HTTP interactions.
+"""
+
+
+from BaseHTTPServer import BaseHTTPRequestHandler
+from urllib2 import HTTPError, URLError
+import os
+import shutil
+import tempfile
+import zipfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from local_server import LocalServer
+from recipe_robot_lib.cassette import Cassette, RecordingSession, ReplaySession
+from test_payload import gzip_data
+
+
+FEED = "<rss>%s</rss>\n" % ("<item/>" * 1000)
+
+
+class CassetteRequestHandler(BaseHTTPRequestHandler):
+    """Serve a redirect, a gzipped feed, a chunked body, and a 404."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        self.send_response(200)
+        self.send_header("Content-Length", "12345")
+        self.end_headers()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.server.record(self)
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/feed")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif self.path == "/feed":
+            body = gzip_data(FEED)
+            self.send_response(200)
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("X-Count", str(len(self.server.requests)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/chunked":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in ("first ", "second"):
+                self.wfile.write("%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write("0\r\n\r\n")
+        else:
+            self.send_error(404)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestCassette(object):
+    """Tests for recording and replaying with a Cassette."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.server = LocalServer(handler_class=CassetteRequestHandler)
+        self.server.start()
+        self.base_url = self.server.url("")
+
+    def teardown(self):
+        self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def record(self, paths):
+        """Record GETs of paths, and return the cassette, reloaded."""
+        cassette = Cassette()
+        session = RecordingSession(cassette)
+        for path in paths:
+            try:
+                session.read(self.base_url + path)
+            except HTTPError:
+                pass
+        session.close()
+        cassette_path = os.path.join(self.temp_dir, "test.cassette")
+        cassette.save(cassette_path)
+        return Cassette.load(cassette_path)
+
+    def test_redirects_and_gzip(self):
+        cassette = self.record(["/redirect"])
+        assert_equal([item["url"] for item in cassette.interactions],
+                     [self.base_url + "/redirect", self.base_url + "/feed"])
+        session = ReplaySession(cassette)
+        response = session.open(self.base_url + "/redirect")
+        assert_equal(response.geturl(), self.base_url + "/feed")
+        assert_equal(response.read(), FEED)
+        assert_equal(len(self.server.requests), 2)
+
+    def test_streaming_chunked_body(self):
+        session = ReplaySession(self.record(["/chunked"]))
+        response = session.open(self.base_url + "/chunked")
+        assert_equal(response.read(6), "first ")
+        assert_equal(response.read(), "second")
+        assert_is_none(response.getheader("Transfer-Encoding"))
+
+    def test_head_keeps_content_length(self):
+        cassette = Cassette()
+        RecordingSession(cassette).head(self.base_url + "/download")
+        response = ReplaySession(cassette).head(self.base_url + "/download")
+        assert_equal(response.getheader("Content-Length"), "12345")
+
+    def test_errors_are_replayed(self):
+        session = ReplaySession(self.record(["/missing"]))
+        with assert_raises(HTTPError) as context:
+            session.read(self.base_url + "/missing")
+        assert_equal(context.exception.code, 404)
+
+    def test_repeated_requests_replay_in_order(self):
+        session = ReplaySession(self.record(["/feed", "/feed"]))
+        counts = [session.open(self.base_url + "/feed").getheader("X-Count")
+                  for _ in range(3)]
+        assert_equal(counts, ["1", "2", "2"])
+
+    def test_unrecorded_request(self):
+        session = ReplaySession(Cassette())
+        assert_raises(URLError, session.read, self.base_url + "/feed")
+
+    def test_conditional_headers_are_not_sent(self):
+        cassette = Cassette()
+        RecordingSession(cassette).read(self.base_url + "/feed",
+                                        {"If-None-Match": '"abc"'})
+        assert_is_none(self.server.requests[0].headers.get("If-None-Match"))
+        assert_equal(cassette.interactions[0]["status"], 200)
+
+    def test_identical_bodies_are_stored_once(self):
+        self.record(["/feed", "/feed"])
+        with zipfile.ZipFile(os.path.join(self.temp_dir,
+                                          "test.cassette")) as archive:
+            assert_equal(len([name for name in archive.namelist()
+                              if name.startswith("bodies/")]), 1)
+
+    def test_failed_save_leaves_no_file(self):
+        cassette = Cassette()
+        cassette.add({"method": "GET", "url": self.base_url, "range": None,
+                      "status": 200, "reason": "OK", "headers": [],
+                      "body": "", "complete": object()})
+        assert_raises(TypeError, cassette.save,
+                      os.path.join(self.temp_dir, "test.cassette"))
+        assert_equal(os.listdir(self.temp_dir), [])
+
+    def test_load_rejects_other_files(self):
+        path = os.path.join(self.temp_dir, "not-a-cassette")
+        with open(path, "w") as openfile:
+            openfile.write("nope")
+        assert_raises(ValueError, Cassette.load, path)
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_commands.py
+
+Unit tests for running external commands.
+"""
+
+
+import sys
+import timeit
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import commands
+
+
+def python(code):
+    """Return the argument list to run some Python code."""
+    return [sys.executable, "-c", code]
+
+
+class TestRun(object):
+    """Tests for run() and run_pipeline()."""
+
+    def test_run(self):
+        """Exit codes and output are returned, and unpack as a tuple."""
+        exitcode, out, err = commands.run(python(
+            "import sys; sys.stdout.write('out'); sys.stderr.write('err'); "
+            "sys.exit(3)"))
+        assert_equal((exitcode, out, err), (3, "out", "err"))
+
+    def test_arguments_are_not_split(self):
+        """Arguments with spaces and quotes are passed intact."""
+        argument = "a path with \"quotes\" and | pipes"
+        result = commands.run(python("import sys; print sys.argv[1]") +
+                              [argument])
+        assert_equal(result.out, argument + "\n")
+
+    def test_stdin(self):
+        """Input is sent to the command."""
+        result = commands.run(python(
+            "import sys; sys.stdout.write(sys.stdin.read().upper())"),
+                              stdin="y\n")
+        assert_equal(result.out, "Y\n")
+
+    def test_pipeline_drains_stderr(self):
+        """Lots of output on an earlier command's stderr can't hang."""
+        result = commands.run_pipeline([
+            python("import sys; sys.stderr.write('x' * 1000000); "
+                   "print 'data'"),
+            python("import sys; sys.stdout.write(sys.stdin.read() * 2)")],
+                                       timeout=30)
+        assert_false(result.timed_out)
+        assert_equal(result.out, "data\ndata\n")
+        assert_equal(len(result.err), 1000000)
+
+    def test_pipeline_exitcode(self):
+        """Pipelines fail if any of their commands fail."""
+        result = commands.run_pipeline([
+            python("import sys; sys.exit(2)"),
+            python("import sys; sys.stdin.read()")])
+        assert_equal(result.exitcode, 2)
+
+    def test_timeout(self):
+        """Commands that take too long are killed."""
+        start = timeit.default_timer()
+        result = commands.run(python("import time; time.sleep(30)"),
+                              timeout=0.5)
+        assert_true(result.timed_out)
+        assert_not_equal(result.exitcode, 0)
+        assert_less(timeit.default_timer() - start, 10)
+
+    def test_timeout_kills_grandchildren(self):
+        """Processes a command started are killed with it."""
+        start = timeit.default_timer()
+        result = commands.run(["sh", "-c", "sleep 30; true"], timeout=0.5)
+        assert_true(result.timed_out)
+        assert_less(timeit.default_timer() - start, 10)
+
+    def test_timeout_with_background_grandchild(self):
+        """A process left holding a command's pipes doesn't outlast the
+        command's timeout."""
+        start = timeit.default_timer()
+        result = commands.run(["sh", "-c", "echo started; sleep 30 &"],
+                              timeout=0.5)
+        assert_true(result.timed_out)
+        assert_equal(result.out, "started\n")
+        assert_less(timeit.default_timer() - start, 10)
+
+    def test_missing_command(self):
+        """Commands that can't be started fail, like in a shell."""
+        result = commands.run(["/nonexistent/command"])
+        assert_equal(result.exitcode, commands.NOT_STARTED_EXITCODE)
+
+    def test_output_callback(self):
+        """Output is passed to the callback as it arrives."""
+        received = []
+        commands.run(python("print 'hello'"),
+                     output_callback=lambda stream, data: received.append(
+                         (stream, data)))
+        assert_equal(set(stream for stream, _ in received), set(["stdout"]))
+        assert_equal("".join(data for _, data in received), "hello\n")
+
+
+class TestRunAsync(object):
+    """Tests for run_async()."""
+
+    def test_concurrent(self):
+        """Commands run concurrently, and their results are returned."""
+        start = timeit.default_timer()
+        pending = [commands.run_async(python(
+            "import time; time.sleep(1); print %d" % index))
+                   for index in range(2)]
+        results = [result.get(30) for result in pending]
+        assert_equal([result.out for result in results], ["0\n", "1\n"])
+        assert_less(timeit.default_timer() - start, 1.9)
@@ -0,0 +1,142 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_download.py
+
+Tests for segmented, resumable downloads, against a local HTTP server.
+"""
+
+
+import json
+import os
+import shutil
+import tempfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from local_server import LocalServer, make_etag
+from recipe_robot_lib.download import Download, MIN_SEGMENT_SIZE
+from recipe_robot_lib.network import HTTPSession
+
+
+# Not a multiple of the segment size, so the last segment is short.
+FILE_CONTENTS = os.urandom(3 * MIN_SEGMENT_SIZE + 12345)
+ETAG = make_etag(FILE_CONTENTS)
+
+
+class TestDownload(object):
+    """Tests for Download."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.partial_dir = os.path.join(self.temp_dir, "partial")
+        os.mkdir(self.partial_dir)
+        self.dest_path = os.path.join(self.temp_dir, "download.dmg")
+        self.session = HTTPSession()
+        self.server = None
+
+    def teardown(self):
+        self.session.close()
+        if self.server is not None:
+            self.server.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def start_server(self, accept_ranges=True):
+        """Start a local server, and return the URL of its file."""
+        self.server = LocalServer({"/download.dmg": FILE_CONTENTS},
+                                  accept_ranges=accept_ranges)
+        self.server.start()
+        return self.server.url("/download.dmg")
+
+    def ranges_requested(self):
+        """Return the Range header of each request (or None)."""
+        return [request.headers.get("Range")
+                for request in self.server.requests]
+
+    def download(self, url):
+        """Download url to dest_path, and return the Download object."""
+        download = Download(self.session, url, self.dest_path,
+                            self.partial_dir)
+        download.run(self.session.open(url, download.headers))
+        return download
+
+    def assert_downloaded(self):
+        """Make sure the file is intact, and no partial files remain."""
+        with open(self.dest_path, "rb") as openfile:
+            assert_true(openfile.read() == FILE_CONTENTS)
+        leftovers = [name for name in os.listdir(self.partial_dir)
+                     if not name.endswith(".lock")]
+        assert_equal(leftovers, [])
+
+    def test_segmented_download(self):
+        """Files are fetched in segments when ranges are supported."""
+        url = self.start_server()
+        self.download(url)
+        self.assert_downloaded()
+        # The initial request, and then one per segment.
+        ranges = [item for item in self.ranges_requested() if item]
+        assert_equal(len(ranges), 4)
+
+    def test_fallback_without_ranges(self):
+        """Files are streamed when the server doesn't support ranges."""
+        url = self.start_server(accept_ranges=False)
+        self.download(url)
+        self.assert_downloaded()
+        assert_equal(self.ranges_requested(), [None])
+
+    def test_resume_partial_download(self):
+        """An interrupted download continues where it left off."""
+        url = self.start_server()
+        download = Download(self.session, url, self.dest_path,
+                            self.partial_dir)
+        # Pretend the first segment arrived before an interruption.
+        with open(download.partial_path, "wb") as partial_file:
+            partial_file.write(FILE_CONTENTS[:MIN_SEGMENT_SIZE])
+            partial_file.truncate(len(FILE_CONTENTS))
+        segments = [[start, min(start + MIN_SEGMENT_SIZE,
+                                len(FILE_CONTENTS)), 0]
+                    for start in range(0, len(FILE_CONTENTS),
+                                       MIN_SEGMENT_SIZE)]
+        segments[0][2] = MIN_SEGMENT_SIZE
+        with open(download.state_path, "w") as state_file:
+            json.dump({"url": url, "size": len(FILE_CONTENTS),
+                       "validator": ETAG, "segments": segments}, state_file)
+
+        download.run(self.session.open(url, download.headers))
+        self.assert_downloaded()
+        assert_not_in("bytes=0-%d" % (MIN_SEGMENT_SIZE - 1),
+                      self.ranges_requested())
+        assert_false(os.path.exists(download.state_path))
+
+    def test_changed_file_restarts(self):
+        """A partial download of an older version is discarded."""
+        url = self.start_server()
+        download = Download(self.session, url, self.dest_path,
+                            self.partial_dir)
+        with open(download.partial_path, "wb") as partial_file:
+            partial_file.write("x" * len(FILE_CONTENTS))
+        with open(download.state_path, "w") as state_file:
+            json.dump({"url": url, "size": len(FILE_CONTENTS),
+                       "validator": '"old-etag"',
+                       "segments": [[0, len(FILE_CONTENTS),
+                                     len(FILE_CONTENTS)]]}, state_file)
+
+        download.run(self.session.open(url, download.headers))
+        self.assert_downloaded()
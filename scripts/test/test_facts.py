@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_facts.py
+
+Unit tests for the Facts store.
+"""
+
+
+import glob
+import os
+import re
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib.facts import Change, FactList, FACT_SCHEMA, Facts
+
+
+class TestFacts(object):
+    """Tests for Facts."""
+
+    def setup(self):
+        self.changes = []
+        self.facts = Facts(observers=[self.changes.append])
+
+    def test_get_and_set(self):
+        """Facts behave like a dictionary."""
+        assert_not_in("app_name", self.facts)
+        assert_is_none(self.facts.get("app_name"))
+        assert_raises(KeyError, lambda: self.facts["app_name"])
+
+        self.facts["app_name"] = "Robby"
+        assert_in("app_name", self.facts)
+        assert_equal(self.facts["app_name"], "Robby")
+        assert_in("app_name", self.facts.keys())
+        assert_equal(self.facts.pop("app_name"), "Robby")
+        assert_not_in("app_name", self.facts)
+        assert_equal(self.facts.pop("app_name", None), None)
+
+    def test_schema(self):
+        """Unknown facts and values of the wrong type are rejected."""
+        with assert_raises(KeyError):
+            self.facts["not_a_fact"] = "Robby"
+        with assert_raises(TypeError):
+            self.facts["app_name"] = 42
+        assert_not_in("not_a_fact", self.facts)
+
+    def test_strings_are_encoded(self):
+        """Unicode strings are stored UTF-8 encoded."""
+        self.facts["developer"] = u"Caf\xe9 Software"
+        assert_equal(self.facts["developer"], "Caf\xc3\xa9 Software")
+        assert_is_instance(self.facts["developer"], str)
+
+    def test_lists_are_journaled(self):
+        """Lists are stored as FactLists, which journal their items."""
+        self.facts["codesign_authorities"] = ["Developer ID"]
+        authorities = self.facts["codesign_authorities"]
+        assert_is_instance(authorities, FactList)
+        authorities.append("Apple Root CA")
+        self.facts["warnings"].append("Careful!")
+        assert_equal(authorities, ["Developer ID", "Apple Root CA"])
+        assert_equal(
+            self.changes,
+            [Change("codesign_authorities", "set", authorities),
+             Change("codesign_authorities", "add", "Apple Root CA"),
+             Change("warnings", "add", "Careful!")])
+        assert_equal(self.facts.journal, self.changes)
+
+    def test_inspections(self):
+        """Inspections are a set."""
+        self.facts["inspections"] = set()
+        self.facts["inspections"].add("app")
+        assert_in("app", self.facts["inspections"])
+
+    def test_method_names_are_not_facts(self):
+        """Facts named like methods don't clash with them."""
+        self.facts["is_from_app_store"] = True
+        assert_true(self.facts.is_from_app_store())
+        assert_not_in("get", self.facts)
+
+    def test_user_agent(self):
+        """The user-agent fact can be set, despite its dash."""
+        self.facts["user-agent"] = "Mozilla/5.0"
+        assert_in("user-agent", self.facts)
+        assert_equal(self.facts["user-agent"], "Mozilla/5.0")
+        assert_in("user-agent", self.facts.keys())
+
+    def test_facts_in_use_are_known(self):
+        """Every fact set by Recipe Robot is in the schema."""
+        scripts_dir = os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__)))
+        paths = glob.glob(os.path.join(scripts_dir, "recipe_robot_lib",
+                                       "*.py"))
+        paths.append(os.path.join(scripts_dir, "recipe-robot"))
+        for path in paths:
+            with open(path) as source_file:
+                source = source_file.read()
+            for key in re.findall(r'facts\["([\w-]+)"\]\s*=[^=]', source):
+                assert_in(key, FACT_SCHEMA, "%s sets unknown fact %s" %
+                          (os.path.basename(path), key))
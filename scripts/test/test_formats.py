@@ -0,0 +1,100 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_formats.py
+
+Unit tests for identifying downloads from their contents.
+"""
+
+
+import bz2
+import gzip
+import os
+import shutil
+import tempfile
+import zipfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import formats
+
+
+class TestSniffFormat(object):
+    """Tests for sniff_format()."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, contents):
+        """Write contents to a file, and return its path."""
+        path = os.path.join(self.temp_dir, "download")
+        with open(path, "wb") as openfile:
+            openfile.write(contents)
+        return path
+
+    def test_zip(self):
+        """Zip archives are recognized."""
+        path = os.path.join(self.temp_dir, "download")
+        zip_file = zipfile.ZipFile(path, "w")
+        zip_file.writestr("Example.app/Contents/Info.plist", "")
+        zip_file.close()
+        assert_equal(formats.sniff_format(path), formats.ZIP)
+
+    def test_gzip(self):
+        """Gzipped files are recognized."""
+        path = os.path.join(self.temp_dir, "download")
+        gzip_file = gzip.open(path, "wb")
+        gzip_file.write("tar data")
+        gzip_file.close()
+        assert_equal(formats.sniff_format(path), formats.GZIP)
+
+    def test_bzip2(self):
+        """Bzip2 files are recognized."""
+        path = self.write_file(bz2.compress("tar data"))
+        assert_equal(formats.sniff_format(path), formats.BZIP2)
+
+    def test_udif(self):
+        """Disk images are recognized by their koly trailer."""
+        trailer = "koly" + "\x00" * 508
+        path = self.write_file("PK\x03\x04" + "\x00" * 4096 + trailer)
+        assert_equal(formats.sniff_format(path), formats.DMG)
+
+    def test_xar(self):
+        """Flat packages are recognized as xar archives."""
+        path = self.write_file("xar!\x00\x1c\x00\x01" + "\x00" * 100)
+        assert_equal(formats.sniff_format(path), formats.XAR)
+
+    def test_iso(self):
+        """ISO 9660 images are recognized."""
+        path = self.write_file("\x00" * 0x8001 + "CD001" + "\x00" * 2048)
+        assert_equal(formats.sniff_format(path), formats.ISO)
+
+    def test_xml(self):
+        """Sparkle feeds masquerading as downloads are recognized."""
+        path = self.write_file('\n<?xml version="1.0"?><rss></rss>')
+        assert_equal(formats.sniff_format(path), formats.XML)
+
+    def test_unknown(self):
+        """Unrecognized and empty files return None."""
+        assert_is_none(formats.sniff_format(self.write_file("hello")))
+        assert_is_none(formats.sniff_format(self.write_file("")))
@@ -0,0 +1,341 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_hfsplus.py
+
+Unit tests for reading HFS+ volumes.
+"""
+
+
+import os
+import plistlib
+import shutil
+import struct
+import tempfile
+import zlib
+from StringIO import StringIO
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import hfsplus, udif
+
+
+BLOCK_SIZE = 4096
+NODE_SIZE = 4096
+
+INFO_PLIST = plistlib.writePlistToString({
+    "CFBundleIdentifier": "com.example.app"})
+EXECUTABLE = "".join(chr(65 + index) * BLOCK_SIZE for index in range(10))
+README = "Read me. " * 100
+
+
+def make_node(kind, records, forward=0, height=1):
+    """Return a B-tree node holding records."""
+    offsets = [14]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+    data = struct.pack(">IIbBHH", forward, 0, kind, height, len(records), 0)
+    data += "".join(records)
+    data = data.ljust(NODE_SIZE - 2 * len(offsets), "\x00")
+    return data + struct.pack(">%dH" % len(offsets), *reversed(offsets))
+
+
+def make_btree(records, per_leaf=3):
+    """Return a B-tree file holding sorted leaf records.
+
+    The records are split into leaves of per_leaf records, under one
+    index node if there's more than one leaf.
+    """
+    leaves = [records[start:start + per_leaf]
+              for start in range(0, len(records), per_leaf)]
+    nodes = []
+    for index, leaf in enumerate(leaves):
+        forward = index + 2 if index < len(leaves) - 1 else 0
+        nodes.append(make_node(hfsplus.LEAF_NODE, leaf, forward))
+    root = 1 if leaves else 0
+    if len(leaves) > 1:
+        index_records = []
+        for index, leaf in enumerate(leaves):
+            key_length = struct.unpack_from(">H", leaf[0])[0] + 2
+            index_records.append(leaf[0][:key_length] +
+                                 struct.pack(">I", index + 1))
+        nodes.append(make_node(hfsplus.INDEX_NODE, index_records, height=2))
+        root = len(nodes)
+    header = struct.pack(">HIIIIHHIIHIBBI", 2 if len(leaves) > 1 else 1,
+                         root, len(records), 1 if leaves else 0,
+                         len(leaves), NODE_SIZE, 516, len(nodes) + 1, 0, 0,
+                         NODE_SIZE, 0, 0, 0x6)
+    return "".join([make_node(1, [header.ljust(106, "\x00")])] + nodes)
+
+
+def catalog_key(parent_id, name):
+    """Return a catalog B-tree key."""
+    name = name.encode("utf-16-be")
+    return struct.pack(">HIH", 6 + len(name), parent_id,
+                       len(name) // 2) + name
+
+
+def fork_data(size, extents):
+    """Return an HFSPlusForkData of up to 8 (start, count) extents."""
+    total_blocks = (size + BLOCK_SIZE - 1) // BLOCK_SIZE
+    data = struct.pack(">QII", size, 0, total_blocks)
+    data += "".join(struct.pack(">II", *extent) for extent in extents[:8])
+    return data.ljust(80, "\x00")
+
+
+def folder_record(cnid, mode=0o40755):
+    """Return a catalog folder record."""
+    return (struct.pack(">hHII", hfsplus.FOLDER_RECORD, 0, 0, cnid) +
+            "\x00" * 20 + struct.pack(">IIBBHI", 0, 0, 0, 0, mode, 0) +
+            "\x00" * 40)
+
+
+def file_record(cnid, mode, data_fork, owner_flags=0, special=0,
+                file_type="\x00" * 4, creator="\x00" * 4):
+    """Return a catalog file record."""
+    return (struct.pack(">hHII", hfsplus.FILE_RECORD, 0, 0, cnid) +
+            "\x00" * 20 +
+            struct.pack(">IIBBHI", 0, 0, 0, owner_flags, mode, special) +
+            file_type + creator + "\x00" * 32 + data_fork +
+            fork_data(0, []))
+
+
+def thread_record(parent_id, name):
+    """Return a catalog folder thread record."""
+    return struct.pack(">hHI", 3, 0, parent_id) + catalog_key(0, name)[6:]
+
+
+class VolumeBuilder(object):
+    """Lay out the blocks of a small HFS+ volume."""
+
+    def __init__(self):
+        # Block 0 holds the volume header. The B-trees go at the end.
+        self.blocks = ["\x00" * BLOCK_SIZE]
+
+    def add(self, data):
+        """Add data in new blocks, and return its extent."""
+        start = len(self.blocks)
+        for offset in range(0, len(data), BLOCK_SIZE):
+            self.blocks.append(
+                data[offset:offset + BLOCK_SIZE].ljust(BLOCK_SIZE, "\x00"))
+        return (start, len(self.blocks) - start)
+
+    def build(self, catalog, extents=(), attributes=()):
+        """Return the volume, with B-trees of the given sorted records."""
+        trees = []
+        # Every volume has an extents overflow file and a catalog, even
+        # if they're empty. The attributes file is optional.
+        for records, required in ((extents, True), (catalog, True),
+                                  (attributes, False)):
+            tree = make_btree(list(records)) if records or required else ""
+            trees.append(fork_data(len(tree), [self.add(tree)])
+                         if tree else fork_data(0, []))
+        header = bytearray(512)
+        header[0:4] = struct.pack(">2sH", "H+", 4)
+        struct.pack_into(">II", header, hfsplus.BLOCK_SIZE_OFFSET,
+                         BLOCK_SIZE, len(self.blocks))
+        for offset, tree in zip((hfsplus.EXTENTS_FORK_OFFSET,
+                                 hfsplus.CATALOG_FORK_OFFSET,
+                                 hfsplus.ATTRIBUTES_FORK_OFFSET), trees):
+            header[offset:offset + 80] = tree
+        self.blocks[0] = ("\x00" * hfsplus.VOLUME_HEADER_OFFSET +
+                          str(header)).ljust(BLOCK_SIZE, "\x00")
+        return "".join(self.blocks)
+
+
+def make_volume():
+    """Return a volume with an app, a symlink, a hard link and a
+    compressed file.
+
+    The app's executable is split into ten one-block extents, in reverse
+    order, so two of them are in the extents overflow file.
+    """
+    builder = VolumeBuilder()
+    plist_extent = builder.add(INFO_PLIST)
+    executable_extents = []
+    for index in reversed(range(10)):
+        builder.add("\x00" * BLOCK_SIZE)
+        executable_extents.insert(0, builder.add(
+            EXECUTABLE[index * BLOCK_SIZE:(index + 1) * BLOCK_SIZE]))
+    readme_extent = builder.add(README)
+    link_extent = builder.add("Example.app")
+
+    catalog = [
+        (catalog_key(1, u"Example"), folder_record(2)),
+        (catalog_key(2, u""), thread_record(1, u"Example")),
+        (catalog_key(2, u"\x00\x00\x00\x00HFS+ Private Data"),
+         folder_record(18)),
+        (catalog_key(2, u"Applications"), file_record(
+            30, 0o120755, fork_data(11, [link_extent]))),
+        (catalog_key(2, u"Compressed.txt"), file_record(
+            31, 0o100644, fork_data(0, []),
+            owner_flags=hfsplus.UF_COMPRESSED)),
+        (catalog_key(2, u"Example.app"), folder_record(20)),
+        (catalog_key(2, u"Read Me"), file_record(
+            32, 0o100644, fork_data(0, []), special=40,
+            file_type="hlnk", creator="hfs+")),
+        (catalog_key(18, u"iNode40"), file_record(
+            40, 0o100644, fork_data(len(README), [readme_extent]))),
+        (catalog_key(20, u"Contents"), folder_record(21)),
+        (catalog_key(21, u"Info.plist"), file_record(
+            22, 0o100644, fork_data(len(INFO_PLIST), [plist_extent]))),
+        (catalog_key(21, u"MacOS"), folder_record(23)),
+        (catalog_key(23, u"Example"), file_record(
+            24, 0o100755, fork_data(len(EXECUTABLE), executable_extents))),
+    ]
+    overflow = struct.pack(">HBBII", 10, hfsplus.DATA_FORK, 0, 24, 8) + \
+        "".join(struct.pack(">II", *extent)
+                for extent in executable_extents[8:]).ljust(64, "\x00")
+    name = u"com.apple.decmpfs".encode("utf-16-be")
+    compressed = zlib.compress(README)
+    decmpfs = "fpmc" + struct.pack("<IQ", 3, len(README)) + compressed
+    attribute = (struct.pack(">HHIIH", 12 + len(name), 0, 31, 0,
+                             len(name) // 2) + name +
+                 struct.pack(">I8xI", 0x10, len(decmpfs)) + decmpfs)
+    return builder.build([key + record for key, record in catalog],
+                         [overflow], [attribute + "\x00" * (len(attribute) % 2)])
+
+
+class TestHfsVolume(object):
+    """Tests for HfsVolume."""
+
+    def setup(self):
+        self.volume = hfsplus.HfsVolume(StringIO(make_volume()))
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        self.volume.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_listdir(self):
+        """Folders are listed, without the private data folder."""
+        assert_equal(sorted(self.volume.listdir("")),
+                     ["Applications", "Compressed.txt", "Example.app",
+                      "Read Me"])
+        assert_equal(sorted(self.volume.listdir("Example.app/Contents")),
+                     ["Info.plist", "MacOS"])
+
+    def test_read(self):
+        """Files are read through their extents."""
+        assert_equal(self.volume.read("Example.app/Contents/Info.plist"),
+                     INFO_PLIST)
+
+    def test_overflow_extents(self):
+        """Extents in the extents overflow file are read in order."""
+        assert_equal(self.volume.read("Example.app/Contents/MacOS/Example"),
+                     EXECUTABLE)
+        source = self.volume.open("Example.app/Contents/MacOS/Example")
+        source.seek(BLOCK_SIZE * 9 - 10)
+        assert_equal(source.read(20), EXECUTABLE[BLOCK_SIZE * 9 - 10:
+                                                 BLOCK_SIZE * 9 + 10])
+
+    def test_lookup(self):
+        """Lookups are case-insensitive, and follow symlinks."""
+        entry = self.volume.lookup("example.APP/contents/info.plist")
+        assert_equal(entry.size, len(INFO_PLIST))
+        assert_true(self.volume.lookup("Applications/Contents").isdir())
+        assert_true(self.volume.lookup(
+            "Applications", follow_symlinks=False).islink())
+        assert_equal(self.volume.readlink("Applications"), "Example.app")
+        assert_false(self.volume.exists("Missing.app"))
+        assert_raises(KeyError, self.volume.lookup, "Example.app/Missing")
+
+    def test_hard_link(self):
+        """Hard links read their target."""
+        assert_equal(self.volume.read("Read Me"), README)
+
+    def test_compressed(self):
+        """Files with HFS+ compression are decompressed."""
+        assert_equal(self.volume.read("Compressed.txt"), README)
+
+    def test_extract(self):
+        """Folders are extracted recursively, keeping file modes."""
+        dest = os.path.join(self.temp_dir, "Example.app")
+        self.volume.extract("Example.app", dest)
+        executable = os.path.join(dest, "Contents", "MacOS", "Example")
+        with open(executable, "rb") as executable_file:
+            assert_equal(executable_file.read(), EXECUTABLE)
+        assert_true(os.access(executable, os.X_OK))
+
+    def test_not_hfs(self):
+        """Other volumes are reported as HfsError."""
+        assert_raises(hfsplus.HfsError, hfsplus.HfsVolume,
+                      StringIO("\x00" * 4096))
+
+    def test_malformed(self):
+        """Malformed volumes are reported as HfsError."""
+        volume = bytearray(make_volume())
+        # Empty the extents overflow file's fork.
+        offset = hfsplus.VOLUME_HEADER_OFFSET + hfsplus.EXTENTS_FORK_OFFSET
+        volume[offset:offset + 80] = "\x00" * 80
+        assert_raises(hfsplus.HfsError, hfsplus.HfsVolume,
+                      StringIO(str(volume)))
+
+    def test_empty_extents_file(self):
+        """Volumes without overflow extents can be read."""
+        builder = VolumeBuilder()
+        extent = builder.add(INFO_PLIST)
+        volume = hfsplus.HfsVolume(StringIO(builder.build([
+            catalog_key(1, u"Example") + folder_record(2),
+            catalog_key(2, u"Info.plist") + file_record(
+                22, 0o100644, fork_data(len(INFO_PLIST), [extent]))])))
+        assert_equal(volume.read("Info.plist"), INFO_PLIST)
+
+
+class TestOpenDiskImage(object):
+    """Tests for open_disk_image()."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "test.dmg")
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_image(self, disk):
+        """Write disk as a UDIF image of raw chunks."""
+        sectors = len(disk) // udif.SECTOR_SIZE
+        mish = struct.pack(udif.MISH_FORMAT, "mish", 1, 0, sectors, 0, 0, 0,
+                           "", "", 2)
+        mish += struct.pack(udif.CHUNK_FORMAT, udif.RAW, 0, 0, sectors, 0,
+                            len(disk))
+        mish += struct.pack(udif.CHUNK_FORMAT, udif.TERMINATOR, 0, sectors,
+                            0, len(disk), 0)
+        xml = plistlib.writePlistToString({"resource-fork": {"blkx": [{
+            "Name": "disk image", "Data": plistlib.Data(mish)}]}})
+        koly = bytearray(udif.KOLY_SIZE)
+        koly[0:4] = "koly"
+        struct.pack_into(">QQ", koly, udif.KOLY_XML_OFFSET, len(disk),
+                         len(xml))
+        struct.pack_into(">Q", koly, udif.KOLY_SECTOR_COUNT, sectors)
+        with open(self.path, "wb") as image_file:
+            image_file.write(disk + xml + str(koly))
+
+    def test_hfs_image(self):
+        """The HFS+ volume in an image is found."""
+        self.write_image(make_volume())
+        with hfsplus.open_disk_image(self.path) as volume:
+            assert_equal(volume.read("Example.app/Contents/Info.plist"),
+                         INFO_PLIST)
+
+    def test_no_hfs(self):
+        """Images without an HFS+ volume are reported as HfsError."""
+        self.write_image("\x01" * 8192)
+        assert_raises(hfsplus.HfsError, hfsplus.open_disk_image, self.path)
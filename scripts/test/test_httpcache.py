@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_httpcache.py
+
+Unit tests for the on-disk HTTP response cache.
+"""
+
+
+import os
+import shutil
+import tempfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib.httpcache import HTTPCache
+
+
+class TestHTTPCache(object):
+    """Tests for HTTPCache."""
+
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = HTTPCache(self.path, max_size=10,
+                               ttls={"github": 3600, "sparkle": 0})
+
+    def teardown(self):
+        shutil.rmtree(self.path)
+
+    def test_get_missing(self):
+        """An uncached URL returns None."""
+        assert_is_none(self.cache.get("https://example.com/missing"))
+
+    def test_put_and_get(self):
+        """A stored body comes back along with its validators."""
+        url = "https://api.github.com/repos/example/example"
+        self.cache.put(url, "{}", etag='"abc"', source="github")
+        entry = self.cache.get(url)
+        assert_equal(entry["body"], "{}")
+        assert_equal(entry["etag"], '"abc"')
+        assert_equal(self.cache.conditional_headers(entry),
+                     {"If-None-Match": '"abc"'})
+
+    def test_freshness_depends_on_source(self):
+        """Entries are fresh only within their source's TTL."""
+        self.cache.put("https://a.example.com/", "a", source="github")
+        self.cache.put("https://b.example.com/", "b", source="sparkle")
+        github_entry = self.cache.get("https://a.example.com/")
+        sparkle_entry = self.cache.get("https://b.example.com/")
+        assert_true(self.cache.is_fresh(github_entry))
+        assert_false(self.cache.is_fresh(sparkle_entry))
+
+    def test_evicts_least_recently_used(self):
+        """Old entries are removed once the cache exceeds max_size."""
+        self.cache.put("https://a.example.com/", "123456")
+        body_path = [os.path.join(self.path, name)
+                     for name in os.listdir(self.path)
+                     if name.endswith(".body")][0]
+        os.utime(body_path, (0, 0))
+        self.cache.put("https://b.example.com/", "123456")
+        assert_is_none(self.cache.get("https://a.example.com/"))
+        assert_equal(self.cache.get("https://b.example.com/")["body"],
+                     "123456")
@@ -0,0 +1,88 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_inspect.py
+
+Unit tests for inspecting GitHub URLs against a local server.
+"""
+
+
+from argparse import Namespace
+import json
+import timeit
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from fixtures import FixtureServer, FixtureSession, GITHUB_URL, route
+from recipe_robot_lib.facts import Facts
+from recipe_robot_lib.inspect import inspect_github_url
+
+
+# Seconds the server waits before answering each request.
+LATENCY = 0.5
+
+REPO_API_URL = "https://api.github.com/repos/example/Example"
+RELEASES_API_URL = REPO_API_URL + "/releases/latest"
+USER_API_URL = "https://api.github.com/users/example"
+
+
+class TestInspectGitHubURL(object):
+    """Tests for inspect_github_url()."""
+
+    def setup(self):
+        self.routes = {
+            route(REPO_API_URL): ("application/json", json.dumps(
+                {"name": "Example", "description": "An example app."})),
+            route(RELEASES_API_URL): ("application/json",
+                                      json.dumps({"assets": []})),
+            route(USER_API_URL): ("application/json",
+                                  json.dumps({"name": "Example Developer"}))}
+        self.server = FixtureServer(self.routes, latency=LATENCY)
+        self.server.start()
+        self.facts = Facts(observers=[])
+        self.facts["inspections"] = set()
+        self.facts["session"] = FixtureSession(self.server.server_address)
+
+    def teardown(self):
+        self.facts["session"].close()
+        self.server.stop()
+
+    def inspect(self):
+        """Inspect GITHUB_URL, and return how long it took."""
+        start = timeit.default_timer()
+        inspect_github_url(GITHUB_URL, Namespace(ignore_existing=True),
+                           self.facts)
+        return timeit.default_timer() - start
+
+    def test_api_requests_overlap(self):
+        """The three API requests take about one round trip."""
+        elapsed = self.inspect()
+        assert_equal(self.facts["developer"], "Example Developer")
+        assert_equal(len(self.server.requests), 3)
+        assert_less(elapsed, 2 * LATENCY)
+
+    def test_earliest_error_wins(self):
+        """Errors are reported as if the URLs were read in turn."""
+        del self.routes[route(RELEASES_API_URL)]
+        self.routes[route(USER_API_URL)] = 403
+        self.inspect()
+        assert_equal(len(self.facts["warnings"]), 1)
+        assert_true(self.facts["warnings"][0].startswith(
+            "GitHub API URL not found."))
@@ -0,0 +1,192 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_network.py
+
+Unit tests for HTTPSession.
+"""
+
+
+from BaseHTTPServer import BaseHTTPRequestHandler
+from urllib2 import HTTPError, URLError
+import timeit
+import zlib
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from local_server import LocalServer
+from recipe_robot_lib.network import HTTPSession
+
+
+BODY = "<rss>%s</rss>\n" % ("<item/>" * 1000)
+
+
+def gzip_data(data):
+    """Return data compressed in gzip format."""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+class SessionRequestHandler(BaseHTTPRequestHandler):
+    """Serve a redirect, a gzipped body, an error page, a body that ends
+    early, and one that isn't really gzipped."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.server.record(self)
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/gzip")
+            self.send_header("Content-Length", "7")
+            self.end_headers()
+            self.wfile.write("Moved.\n")
+            return
+        if self.path == "/missing":
+            body = '{"message": "Not Found"}'
+            self.send_response(404)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_response(200)
+        if self.path == "/gzip":
+            body = gzip_data(BODY)
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/truncated":
+            self.send_header("Content-Length", "1000")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write("only part of the body")
+            self.close_connection = 1
+        else:
+            body = "not gzipped"
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class TestHTTPSession(object):
+    """Tests for HTTPSession."""
+
+    def setup(self):
+        self.server = LocalServer(handler_class=SessionRequestHandler)
+        self.server.start()
+        self.base_url = self.server.url("")
+        self.session = HTTPSession()
+
+    def teardown(self):
+        self.session.close()
+        self.server.stop()
+
+    def idle_connections(self):
+        """Return the number of connections pooled for the server."""
+        return len(self.session._idle.get(  # pylint: disable=protected-access
+            ("http", "127.0.0.1:%d" % self.server.server_port), []))
+
+    def test_gzip(self):
+        assert_equal(self.session.read(self.base_url + "/gzip"), BODY)
+        response = self.session.open(self.base_url + "/gzip")
+        chunks = list(iter(lambda: response.read(100), ""))
+        assert_equal("".join(chunks), BODY)
+        assert_less_equal(max(len(chunk) for chunk in chunks), 100)
+
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            self.session.read(self.base_url + "/gzip")
+        assert_equal(self.session.summarize_timings()["reused_connections"],
+                     2)
+        assert_equal(self.idle_connections(), 1)
+
+    def test_redirects_reuse_the_connection(self):
+        response = self.session.open(self.base_url + "/redirect")
+        assert_equal(response.geturl(), self.base_url + "/gzip")
+        assert_equal(response.read(), BODY)
+        timings = self.session.timings
+        assert_equal([timing["reused_connection"] for timing in timings],
+                     [False, True])
+
+    def test_errors_release_the_connection(self):
+        with assert_raises(HTTPError) as context:
+            self.session.read(self.base_url + "/missing")
+        assert_equal(context.exception.code, 404)
+        assert_equal(self.idle_connections(), 1)
+        assert_equal(context.exception.read(), '{"message": "Not Found"}')
+
+    def test_truncated_body(self):
+        assert_raises(URLError, self.session.read,
+                      self.base_url + "/truncated")
+        assert_equal(self.session.summarize_timings()["requests"], 1)
+
+    def test_bad_gzip_body(self):
+        response = self.session.open(self.base_url + "/bad-gzip")
+        assert_raises(URLError, response.read, 4)
+        assert_equal(response.read(), "")
+        # The connection isn't returned to the pool.
+        assert_equal(self.idle_connections(), 0)
+
+
+class TestReadConcurrently(object):
+    """Tests for HTTPSession.read_concurrently()."""
+
+    latency = 0.5
+
+    def setup(self):
+        self.server = LocalServer({"/repos/example/Example": "repo",
+                                   "/users/example": "user",
+                                   "/users/forbidden": 403},
+                                  latency=self.latency)
+        self.server.start()
+        self.session = HTTPSession()
+
+    def teardown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_requests_overlap(self):
+        start = timeit.default_timer()
+        bodies = self.session.read_concurrently(
+            [self.server.url(path) for path in (
+                "/repos/example/Example", "/users/example",
+                "/repos/example/Example")])
+        assert_equal(bodies, ["repo", "user", "repo"])
+        assert_less(timeit.default_timer() - start, 2 * self.latency)
+
+    def test_earliest_error_wins(self):
+        with assert_raises(HTTPError) as context:
+            self.session.read_concurrently(
+                [self.server.url(path) for path in (
+                    "/repos/example/Example",
+                    "/repos/example/Example/releases/latest",
+                    "/users/forbidden")])
+        assert_equal(context.exception.code, 404)
+        with assert_raises(HTTPError) as context:
+            self.session.read_concurrently(
+                [self.server.url(path) for path in (
+                    "/users/forbidden",
+                    "/repos/example/Example/releases/latest")])
+        assert_equal(context.exception.code, 403)
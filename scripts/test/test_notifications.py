@@ -0,0 +1,111 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_notifications.py
+
+Unit tests for the notification bus.
+"""
+
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import notifications
+from recipe_robot_lib.facts import Facts
+from recipe_robot_lib.notifications import NotificationBus, QueueTransport
+
+
+def drain(transport):
+    """Return everything posted to a QueueTransport."""
+    posted = []
+    while not transport.queue.empty():
+        posted.append(transport.queue.get_nowait())
+    return posted
+
+
+class FlakyTransport(QueueTransport):
+    """A QueueTransport that fails to post the first time."""
+
+    def __init__(self):
+        super(FlakyTransport, self).__init__()
+        self.failed = False
+
+    def post(self, message_type, messages):
+        if not self.failed:
+            self.failed = True
+            raise IOError("Can't post.")
+        super(FlakyTransport, self).post(message_type, messages)
+
+
+class TestNotificationBus(object):
+    """Tests for NotificationBus."""
+
+    def setup(self):
+        self.transport = QueueTransport()
+        # A long interval, so that only explicit flushes post anything.
+        self.bus = NotificationBus(self.transport, interval=60)
+
+    def teardown(self):
+        self.bus.clear()
+        self.bus.flush()
+
+    def test_coalesces_by_type(self):
+        """Messages of each type are posted together, in order."""
+        self.bus.send("warnings", "one")
+        self.bus.send("information", u"Caf\xe9")
+        self.bus.send("warnings", "two")
+        assert_equal(drain(self.transport), [])
+        assert_equal(self.bus.pending_count(), 3)
+
+        self.bus.flush()
+        assert_equal(drain(self.transport),
+                     [("warnings", ["one", "two"]),
+                      ("information", ["Caf\xc3\xa9"])])
+        assert_equal(self.bus.pending_count(), 0)
+
+    def test_no_interval_posts_immediately(self):
+        """With an interval of 0, each message is posted when sent."""
+        bus = NotificationBus(self.transport, interval=0)
+        bus.send("errors", "Oops.")
+        assert_equal(drain(self.transport), [("errors", ["Oops."])])
+
+    def test_failed_post_is_retried(self):
+        """Messages that fail to post are posted on the next flush."""
+        transport = FlakyTransport()
+        bus = NotificationBus(transport, interval=60)
+        bus.send("warnings", "one")
+        bus.flush()
+        bus.send("warnings", "two")
+        bus.flush()
+        assert_equal(drain(transport), [("warnings", ["one", "two"])])
+
+
+def test_facts_send_through_bus():
+    """Facts and their lists send their values through the bus."""
+    transport = QueueTransport()
+    notifications.set_transport(transport, interval=60)
+    try:
+        facts = Facts()
+        facts["app_name"] = "Robby"
+        facts["warnings"].append("Careful!")
+        notifications.flush()
+        assert_equal(drain(transport), [("information", ["Robby"]),
+                                        ("warnings", ["Careful!"])])
+    finally:
+        notifications.set_transport(notifications.NullTransport())
@@ -0,0 +1,231 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_payload.py
+
+Unit tests for reading package payloads.
+"""
+
+
+import os
+import plistlib
+import shutil
+import struct
+import tempfile
+import zlib
+from StringIO import StringIO
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import payload
+
+
+DIR_MODE = 0o40755
+FILE_MODE = 0o100644
+
+
+def make_odc(entries):
+    """Return an odc cpio archive of (name, mode, data) entries."""
+    archive = []
+    for name, mode, data in entries + [("TRAILER!!!", 0, "")]:
+        archive.append("070707%06o%06o%06o%06o%06o%06o%06o%011o%06o%011o" % (
+            0, 0, mode, 0, 0, 1, 0, 0, len(name) + 1, len(data)))
+        archive.append(name + "\x00" + data)
+    return "".join(archive)
+
+
+def make_newc(entries):
+    """Return a newc cpio archive of (name, mode, data) entries."""
+    archive = []
+    for name, mode, data in entries + [("TRAILER!!!", 0, "")]:
+        header = "070701" + "".join("%08x" % value for value in (
+            0, mode, 0, 0, 1, 0, len(data), 0, 0, 0, 0, len(name) + 1, 0))
+        name += "\x00" + "\x00" * (-(len(header) + len(name) + 1) % 4)
+        archive.append(header + name + data + "\x00" * (-len(data) % 4))
+    return "".join(archive)
+
+
+def gzip_data(data):
+    """Return data compressed in gzip format."""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def make_pbzx(data, chunk_size):
+    """Return data as a pbzx stream of uncompressed chunks."""
+    chunks = [data[start:start + chunk_size]
+              for start in range(0, len(data), chunk_size)]
+    stream = ["pbzx", struct.pack(">Q", chunk_size | 0x01000000)]
+    for index, chunk in enumerate(chunks):
+        flags = chunk_size | (0x01000000 if index < len(chunks) - 1 else 0)
+        stream.append(struct.pack(">QQ", flags, len(chunk)) + chunk)
+    return "".join(stream)
+
+
+def app_entries(prefix="./Applications/Example.app"):
+    """Return cpio entries for an app with an icon, plus a second app."""
+    info_plist = plistlib.writePlistToString({
+        "CFBundleIdentifier": "com.example.app",
+        "CFBundleIconFile": "AppIcon"})
+    return [
+        (".", DIR_MODE, ""),
+        ("./Applications", DIR_MODE, ""),
+        (prefix, DIR_MODE, ""),
+        (prefix + "/Contents", DIR_MODE, ""),
+        (prefix + "/Contents/Info.plist", FILE_MODE, info_plist),
+        (prefix + "/Contents/MacOS/Example", 0o100755, "\xcf\xfa" * 1000),
+        (prefix + "/Contents/Resources/AppIcon.icns", FILE_MODE, "icns"),
+        (prefix + "/Contents/Resources/Large.bin", FILE_MODE,
+         os.urandom(200 * 1024)),
+        ("./Applications/Other.app", DIR_MODE, ""),
+        ("./Applications/Other.app/Contents/Info.plist", FILE_MODE, "x")]
+
+
+class TestCpioReader(object):
+    """Tests for reading cpio archives."""
+
+    def test_odc(self):
+        """Entries of odc archives are read in order."""
+        stream = StringIO(make_odc([("./a", DIR_MODE, ""),
+                                    ("./a/b", FILE_MODE, "data")]))
+        reader = payload.CpioReader(stream)
+        entries = [(entry.name, entry.isdir(), reader.read())
+                   for entry in reader]
+        assert_equal(entries, [("a", True, ""), ("a/b", False, "data")])
+
+    def test_newc(self):
+        """Entries of newc archives are read, skipping padding."""
+        stream = StringIO(make_newc([("./a", FILE_MODE, "abcde"),
+                                     ("./bb", FILE_MODE, "fg")]))
+        reader = payload.CpioReader(stream)
+        assert_equal([(entry.name, reader.read()) for entry in reader],
+                     [("a", "abcde"), ("bb", "fg")])
+
+    def test_unread_data_is_skipped(self):
+        """Data that isn't read is skipped."""
+        stream = StringIO(make_odc([("./a", FILE_MODE, "x" * 100000),
+                                    ("./b", FILE_MODE, "y")]))
+        reader = payload.CpioReader(stream)
+        assert_equal([entry.name for entry in reader], ["a", "b"])
+
+    def test_truncated(self):
+        """Truncated archives are reported as PayloadError."""
+        stream = StringIO(make_odc([("./a", FILE_MODE, "data")])[:-30])
+        reader = payload.CpioReader(stream)
+        assert_raises(payload.PayloadError, list, reader)
+
+
+class TestOpenPayload(object):
+    """Tests for decompressing payloads."""
+
+    def setup(self):
+        self.archive = make_odc(app_entries())
+
+    def read_entries(self, data):
+        """Return the names of the entries in a compressed payload."""
+        reader = payload.CpioReader(payload.open_payload(StringIO(data)))
+        return [entry.name for entry in reader]
+
+    def test_gzip(self):
+        """Gzipped payloads are decompressed."""
+        assert_equal(self.read_entries(gzip_data(self.archive)),
+                     self.read_entries(self.archive))
+
+    def test_pbzx(self):
+        """Entries may span the chunks of pbzx payloads."""
+        assert_equal(self.read_entries(make_pbzx(self.archive, 1000)),
+                     self.read_entries(self.archive))
+
+    def test_unknown(self):
+        """Unrecognized payloads are reported as PayloadError."""
+        assert_raises(payload.PayloadError, payload.open_payload,
+                      StringIO("unknown data"))
+
+
+class TestExtractApp(object):
+    """Tests for extract_app()."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_first_app(self):
+        """Only the Info.plist and icon of the first app are extracted."""
+        data = gzip_data(make_odc(app_entries()))
+        app, apps = payload.extract_app(StringIO(data), self.temp_dir)
+        assert_equal(app, "Applications/Example.app")
+        assert_equal(apps, ["Applications/Example.app"])
+        contents = os.path.join(self.temp_dir, "Example.app", "Contents")
+        assert_true(os.path.isfile(os.path.join(contents, "Info.plist")))
+        assert_true(os.path.isfile(
+            os.path.join(contents, "Resources", "AppIcon.icns")))
+        assert_false(os.path.exists(os.path.join(contents, "MacOS")))
+        assert_false(os.path.exists(
+            os.path.join(contents, "Resources", "Large.bin")))
+
+    def test_list_apps(self):
+        """All the apps are listed if asked."""
+        data = gzip_data(make_odc(app_entries()))
+        _, apps = payload.extract_app(StringIO(data), self.temp_dir,
+                                      list_apps=True)
+        assert_equal(apps, ["Applications/Example.app",
+                            "Applications/Other.app"])
+
+    def test_payload_is_app(self):
+        """Payloads that are an app are extracted into dest_dir."""
+        entries = [(name.replace("./Applications/Example.app", "."), mode,
+                    data) for name, mode, data in app_entries()[3:8]]
+        data = gzip_data(make_odc(entries))
+        app, _ = payload.extract_app(StringIO(data), self.temp_dir, app="")
+        assert_equal(app, "")
+        assert_true(os.path.isfile(
+            os.path.join(self.temp_dir, "Contents", "Info.plist")))
+
+    def test_complete(self):
+        """The whole app is extracted if asked, keeping file modes."""
+        data = gzip_data(make_odc(app_entries()))
+        payload.extract_app(StringIO(data), self.temp_dir, complete=True)
+        executable = os.path.join(self.temp_dir, "Example.app", "Contents",
+                                  "MacOS", "Example")
+        assert_true(os.access(executable, os.X_OK))
+        assert_false(os.path.exists(os.path.join(self.temp_dir, "Other.app")))
+
+    def test_complete_stays_inside(self):
+        """Entries can't be written through a symlink leading outside."""
+        outside = os.path.join(self.temp_dir, "outside")
+        os.mkdir(outside)
+        prefix = "./Applications/Example.app"
+        entries = app_entries()[:5] + [
+            (prefix + "/Contents/MacOS", 0o120755, outside),
+            (prefix + "/Contents/MacOS/evil", FILE_MODE, "evil")]
+        dest_dir = os.path.join(self.temp_dir, "unpacked")
+        payload.extract_app(StringIO(gzip_data(make_odc(entries))), dest_dir,
+                            complete=True)
+        assert_true(os.path.isfile(os.path.join(
+            dest_dir, "Example.app", "Contents", "Info.plist")))
+        assert_equal(os.listdir(outside), [])
+
+    def test_no_app(self):
+        """Payloads without an app return None."""
+        data = gzip_data(make_odc([("./usr/bin/tool", 0o100755, "x")]))
+        assert_equal(payload.extract_app(StringIO(data), self.temp_dir),
+                     (None, []))
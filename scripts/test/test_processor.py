@@ -24,6 +24,13 @@ Unit tests for processor class.
 """
 
 
+import os
+import plistlib
+import shutil
+import sys
+import tempfile
+import types
+
 from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
 
 from recipe_robot_lib import processor
@@ -75,3 +82,61 @@ class TestProcessor(object):
 
         assert_dict_equal(output_dict, test_dict)
 
+
+class FakeProcessor(object):
+    """Stand-in for an autopkglib Processor class."""
+
+    input_variables = {"url": {"required": True},
+                       "filename": {"required": False}}
+
+
+class TestManifest(object):
+    """Tests for the processor manifest."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.version_file = os.path.join(self.temp_dir, "version.plist")
+        self.cache_dir = os.path.join(self.temp_dir, "processors")
+        self.autopkglib = types.ModuleType("autopkglib")
+        self.autopkglib.processor_names = lambda: ["FakeProcessor",
+                                                   "Processor"]
+        self.autopkglib.get_processor = lambda name: (
+            FakeProcessor if name == "FakeProcessor" else object)
+        self.autopkglib.get_autopkg_version = lambda: "9.9"
+        self.old_autopkglib = sys.modules.get("autopkglib")
+        sys.modules["autopkglib"] = self.autopkglib
+
+    def teardown(self):
+        if self.old_autopkglib is None:
+            del sys.modules["autopkglib"]
+        else:
+            sys.modules["autopkglib"] = self.old_autopkglib
+        shutil.rmtree(self.temp_dir)
+
+    def test_generated_and_cached(self):
+        """The manifest is generated once per AutoPkg version."""
+        plistlib.writePlist({"Version": "9.9"}, self.version_file)
+        manifest = processor.load_manifest(self.version_file, self.cache_dir)
+        assert_equal(manifest["processors"],
+                     {"FakeProcessor": ["filename", "url"]})
+        assert_true(os.path.isfile(os.path.join(self.cache_dir, "9.9.json")))
+
+        # The cached manifest is used without touching autopkglib.
+        self.autopkglib.processor_names = None
+        manifest = processor.load_manifest(self.version_file, self.cache_dir)
+        assert_equal(manifest["processors"],
+                     {"FakeProcessor": ["filename", "url"]})
+
+    def test_snapshot(self):
+        """The bundled snapshot is used if AutoPkg isn't installed."""
+        manifest = processor.load_manifest(self.version_file, self.cache_dir)
+        assert_in("URLDownloader", manifest["processors"])
+        assert_false(os.path.exists(self.cache_dir))
+
+    def test_lazy_classes(self):
+        """Processor classes are created when they're first accessed."""
+        assert_not_in("PathDeleter", vars(processor))
+        path_deleter = processor.PathDeleter(path_list=["/tmp/foo"])
+        assert_in("PathDeleter", vars(processor))
+        assert_is(type(path_deleter), processor.PathDeleter)
+        assert_raises(AttributeError, getattr, processor, "NoSuchProcessor")
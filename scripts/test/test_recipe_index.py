@@ -0,0 +1,277 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_recipe_index.py
+
+Unit tests for the index of existing AutoPkg recipes.
+"""
+
+
+import os
+import plistlib
+import shutil
+import tempfile
+import time
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import recipe_index
+from recipe_robot_lib.recipe_index import (
+    autopkg_recipe_dirs, get_repo_inventory, parse_search_output,
+    RecipeIndex, RepoInventory)
+
+
+SEARCH_OUTPUT = """\
+Name                         Repo            Path
+----                         ----            ----
+Firefox.download.recipe      recipes         Mozilla/Firefox.download.recipe
+Firefox ESR.munki.recipe     foo-recipes     Firefox ESR/Firefox ESR.munki.recipe
+
+To add a new recipe repo, use 'autopkg repo-add <repo name>'
+"""
+
+
+class TestRecipeIndex(object):
+    """Tests for RecipeIndex."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.repos = os.path.join(self.temp_dir, "RecipeRepos")
+        self.index_path = os.path.join(self.temp_dir, "cache", "index.json")
+        self.write_recipe("com.github.autopkg.recipes/Mozilla/"
+                          "Firefox.download.recipe",
+                          "com.github.autopkg.download.firefox", "Firefox")
+        self.write_recipe("com.github.autopkg.recipes/Mozilla/"
+                          "Firefox.munki.recipe",
+                          "com.github.autopkg.munki.firefox", "Firefox",
+                          "com.github.autopkg.download.firefox")
+        self.write_recipe("com.github.foo-recipes/Chrome/"
+                          "GoogleChrome.download.recipe",
+                          "com.github.foo.download.chrome", "Google Chrome")
+        self.index = RecipeIndex(self.index_path, [self.repos])
+        self.index.refresh()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_recipe(self, rel_path, identifier, name, parent=None):
+        """Write a recipe into the recipe repos folder."""
+        path = os.path.join(self.repos, rel_path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        recipe = {"Identifier": identifier, "Input": {"NAME": name},
+                  "Process": []}
+        if parent:
+            recipe["ParentRecipe"] = parent
+        plistlib.writePlist(recipe, path)
+        return path
+
+    def test_exact(self):
+        """Recipes are found by filename, Identifier or NAME."""
+        found = self.index.exact("firefox.MUNKI")
+        assert_equal([recipe["filename"] for recipe in found],
+                     ["Firefox.munki.recipe"])
+        assert_equal(found[0]["parent"], "com.github.autopkg.download.firefox")
+        assert_equal(found[0]["type"], "munki")
+        assert_equal(len(self.index.exact("Google Chrome")), 1)
+        assert_equal(len(self.index.exact("com.github.foo.download.chrome")),
+                     1)
+        assert_equal(self.index.exact("Safari"), [])
+
+    def test_prefix(self):
+        """Recipes are found by the start of their names."""
+        assert_equal([recipe["filename"] for recipe in
+                      self.index.prefix("FIRE")],
+                     ["Firefox.download.recipe", "Firefox.munki.recipe"])
+        assert_equal(self.index.prefix("Zzz"), [])
+
+    def test_fuzzy(self):
+        """Recipes are found by names similar to the one given."""
+        found = self.index.fuzzy("Google Chrme")
+        assert_equal([recipe["filename"] for _, recipe in found],
+                     ["GoogleChrome.download.recipe"])
+        assert_greater(found[0][0], 0.5)
+        assert_equal(self.index.fuzzy("Microsoft Word"), [])
+
+    def test_find_existing(self):
+        """All name variants are checked for each recipe type."""
+        found = self.index.find_existing(["Google Chrome", "GoogleChrome"],
+                                         ["download", "munki", "pkg"])
+        assert_equal(found.keys(), ["download"])
+        assert_equal(found["download"][0]["filename"],
+                     "GoogleChrome.download.recipe")
+
+    def test_index_is_persistent(self):
+        """A new RecipeIndex uses the index saved by an earlier one."""
+        index = RecipeIndex(self.index_path, [self.repos])
+        assert_equal(len(index), 3)
+        assert_equal(index.refresh(), 0)
+
+    def test_incremental_refresh(self):
+        """Only new and changed recipes are read again."""
+        path = self.write_recipe("com.github.autopkg.recipes/Mozilla/"
+                                 "Firefox.munki.recipe",
+                                 "com.github.autopkg.munki.firefox",
+                                 "Firefox Browser")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        self.write_recipe("com.github.foo-recipes/Safari/"
+                          "Safari.pkg.recipe", "com.github.foo.pkg.safari",
+                          "Safari")
+        os.remove(os.path.join(self.repos, "com.github.foo-recipes", "Chrome",
+                               "GoogleChrome.download.recipe"))
+        assert_equal(self.index.refresh(), 2)
+        assert_equal(len(self.index), 3)
+        assert_equal(len(self.index.exact("Firefox Browser")), 1)
+        assert_equal(len(self.index.exact("Safari.pkg")), 1)
+        assert_equal(self.index.exact("Google Chrome"), [])
+
+    def test_unchanged_refresh(self):
+        """The index file isn't rewritten if no recipes changed."""
+        os.utime(self.index_path, (0, 0))
+        assert_equal(self.index.refresh(), 0)
+        assert_equal(os.path.getmtime(self.index_path), 0)
+
+    def test_unreadable_recipes_are_skipped(self):
+        """Recipes that can't be parsed are left out."""
+        with open(os.path.join(self.repos, "Broken.download.recipe"),
+                  "w") as recipe_file:
+            recipe_file.write("<plist>")
+        assert_equal(self.index.refresh(), 1)
+        assert_equal(len(self.index), 3)
+
+    def test_cached_search(self):
+        """Search results are cached until they expire."""
+        assert_is_none(self.index.cached_search("Firefox"))
+        self.index.add_search("Firefox", SEARCH_OUTPUT)
+        index = RecipeIndex(self.index_path, [self.repos])
+        assert_equal([result[0] for result in index.cached_search("firefox")],
+                     ["Firefox.download.recipe", "Firefox ESR.munki.recipe"])
+        old_ttl = recipe_index.SEARCH_TTL
+        recipe_index.SEARCH_TTL = 0
+        try:
+            assert_is_none(index.cached_search("Firefox"))
+        finally:
+            recipe_index.SEARCH_TTL = old_ttl
+
+
+class TestRepoInventory(object):
+    """Tests for RepoInventory and get_repo_inventory()."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.repo_dir = os.path.join(self.temp_dir, "RecipeRepos")
+        self.prefs_file = os.path.join(self.temp_dir,
+                                       "com.github.autopkg.plist")
+        self.old_prefs_file = recipe_index.AUTOPKG_PREFS_FILE
+        recipe_index.AUTOPKG_PREFS_FILE = self.prefs_file
+        recipe_index._repo_inventory = None  # pylint: disable=protected-access
+
+    def teardown(self):
+        recipe_index.AUTOPKG_PREFS_FILE = self.old_prefs_file
+        recipe_index._repo_inventory = None  # pylint: disable=protected-access
+        shutil.rmtree(self.temp_dir)
+
+    def write_prefs(self, urls, mtime):
+        """Write AutoPkg preferences listing repos with the given URLs."""
+        repos = {}
+        for url in urls:
+            path = os.path.join(self.repo_dir, url.rsplit("/", 1)[-1])
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            repos[path] = {"URL": url}
+        plistlib.writePlist({"RECIPE_REPO_DIR": self.repo_dir,
+                             "RECIPE_REPOS": repos}, self.prefs_file)
+        os.utime(self.prefs_file, (mtime, mtime))
+
+    def test_from_repo_list(self):
+        """URLs match with or without ".git" and a trailing slash."""
+        inventory = RepoInventory.from_repo_list(
+            "/Users/me/Library/AutoPkg/RecipeRepos/com.github.autopkg.recipes"
+            " (https://github.com/autopkg/recipes.git)\n"
+            "/Users/me/My Repos/filewave (https://github.com/autopkg/filewave)"
+            "\n")
+        assert_equal(len(inventory), 2)
+        assert_true(inventory.has_repo("https://github.com/autopkg/recipes"))
+        assert_true(inventory.has_repo(
+            "https://github.com/autopkg/FileWave.git/"))
+        assert_equal(inventory.repo_path("https://github.com/autopkg/filewave"),
+                     "/Users/me/My Repos/filewave")
+        assert_false(inventory.has_repo("https://github.com/autopkg/other"))
+
+    def test_has_file(self):
+        """Files are looked for in the repo's local clone."""
+        self.write_prefs(["https://github.com/autopkg/jessepeterson-recipes"],
+                         1000)
+        path = os.path.join(self.repo_dir, "jessepeterson-recipes",
+                            "GrandPerspective")
+        os.makedirs(path)
+        open(os.path.join(path, "SourceForgeURLProvider.py"), "w").close()
+        inventory = get_repo_inventory()
+        assert_true(inventory.has_file(
+            "https://github.com/autopkg/jessepeterson-recipes",
+            "GrandPerspective/SourceForgeURLProvider.py"))
+        assert_false(inventory.has_file(
+            "https://github.com/autopkg/jessepeterson-recipes",
+            "GrandPerspective/Missing.py"))
+
+    def test_memoized(self):
+        """The inventory is loaded again only if AutoPkg's prefs change."""
+        self.write_prefs(["https://github.com/autopkg/recipes"], 1000)
+        inventory = get_repo_inventory()
+        assert_is(get_repo_inventory(), inventory)
+        self.write_prefs(["https://github.com/autopkg/recipes",
+                          "https://github.com/autopkg/filewave"], 2000)
+        inventory = get_repo_inventory()
+        assert_true(inventory.has_repo("https://github.com/autopkg/filewave"))
+
+
+class TestHelpers(object):
+    """Tests for the module's functions."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_parse_search_output(self):
+        """Filenames and paths with spaces are parsed."""
+        assert_equal(parse_search_output(SEARCH_OUTPUT), [
+            ["Firefox.download.recipe", "recipes",
+             "Mozilla/Firefox.download.recipe"],
+            ["Firefox ESR.munki.recipe", "foo-recipes",
+             "Firefox ESR/Firefox ESR.munki.recipe"]])
+
+    def test_autopkg_recipe_dirs(self):
+        """Recipe folders come from AutoPkg's preferences."""
+        repo_dir = os.path.join(self.temp_dir, "Repos")
+        search_dir = os.path.join(self.temp_dir, "Recipes")
+        for folder in (repo_dir, search_dir,
+                       os.path.join(repo_dir, "com.github.autopkg.recipes")):
+            os.makedirs(folder)
+        prefs_file = os.path.join(self.temp_dir, "com.github.autopkg.plist")
+        plistlib.writePlist({
+            "RECIPE_REPO_DIR": repo_dir,
+            "RECIPE_SEARCH_DIRS": [
+                os.path.join(repo_dir, "com.github.autopkg.recipes"),
+                search_dir, os.path.join(self.temp_dir, "Missing")]},
+                            prefs_file)
+        assert_equal(autopkg_recipe_dirs(prefs_file),
+                     [repo_dir, search_dir])
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_robolog.py
+
+Unit tests for Recipe Robot's output.
+"""
+
+
+import json
+from StringIO import StringIO
+import sys
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import robolog
+from recipe_robot_lib.robolog import (
+    HumanFormatter, JsonFormatter, LogLevel, OutputMode, robo_print)
+
+
+class CountingArg(object):
+    """An argument that counts how often it's formatted."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        self.count += 1
+        return "counted"
+
+
+class TestRoboPrint(object):
+    """Tests for robo_print()."""
+
+    def setup(self):
+        self.stdout, self.stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        self.verbose_mode = OutputMode.verbose_mode
+
+    def teardown(self):
+        robolog.flush()
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        OutputMode.verbose_mode = self.verbose_mode
+        robolog.set_formatter(HumanFormatter())
+        robolog.set_context(job=None, stage=None)
+
+    def output(self):
+        """Return what's been written to stdout and stderr."""
+        robolog.flush()
+        return sys.stdout.getvalue(), sys.stderr.getvalue()
+
+    def test_levels(self):
+        """Messages go to stdout, or stderr for errors and warnings."""
+        robo_print("Hello.")
+        robo_print("Careful!", LogLevel.WARNING, 4)
+        assert_equal(self.output(), ("Hello.\n", "    [WARNING] Careful!\n"))
+
+    def test_deferred_formatting(self):
+        """Arguments are only formatted if the message is output."""
+        arg = CountingArg()
+        OutputMode.verbose_mode = False
+        robo_print("Found %s", LogLevel.VERBOSE, 4, arg)
+        assert_equal(arg.count, 0)
+        OutputMode.verbose_mode = True
+        robo_print("Found %s", LogLevel.VERBOSE, 4, arg)
+        assert_equal(arg.count, 1)
+        assert_equal(self.output()[0], "    Found counted\n")
+
+    def test_job_context(self):
+        """Batch jobs' output is tagged with the job number."""
+        robolog.set_context(job=3)
+        robo_print("Hello.")
+        assert_equal(self.output()[0], "[job 3] Hello.\n")
+
+    def test_json(self):
+        """JsonFormatter outputs a JSON object per line, with context."""
+        robolog.set_formatter(JsonFormatter())
+        robolog.set_context(job=3)
+        with robolog.stage("inspect"):
+            robo_print("App name is: %s", LogLevel.LOG, 4, u"Caf\xe9")
+        robo_print("Done.")
+        lines = self.output()[0].splitlines()
+        first = json.loads(lines[0])
+        assert_equal(first["message"], u"App name is: Caf\xe9")
+        assert_equal(first["level"], "log")
+        assert_equal(first["job"], 3)
+        assert_equal(first["stage"], "inspect")
+        assert_not_in("stage", json.loads(lines[1]))
+
+    def test_status_is_only_live_for_people(self):
+        """Status text is for people at a terminal, not batches or JSON."""
+        assert_true(robolog.is_live())
+        robo_print("Downloading...")
+        robolog.write_status("    50.00%")
+        assert_equal(self.output()[0], "Downloading...\n    50.00%")
+        robolog.set_context(job=3)
+        assert_false(robolog.is_live())
+        robolog.set_context(job=None)
+        robolog.set_formatter(JsonFormatter())
+        assert_false(robolog.is_live())
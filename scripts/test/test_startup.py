@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_startup.py
+
+Tests that keep the recipe-robot command quick to start.
+
+The cold-start budgets are stored in startup_budget.json, next to this
+file.
+"""
+
+
+import json
+import os
+import subprocess
+import sys
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib.startup import ImportProfiler, time_startup
+
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.dirname(TEST_DIR)
+RECIPE_ROBOT = os.path.join(SCRIPTS_DIR, "recipe-robot")
+
+# Modules that are slow to import, and that commands which don't
+# inspect anything shouldn't need.
+SLOW_MODULES = ("Foundation", "xattr", "autopkglib", "urllib2",
+                "recipe_robot_lib.inspect", "recipe_robot_lib.recipe_generator",
+                "recipe_robot_lib.processor")
+
+
+def imported_modules(statement):
+    """Return the modules imported by running a statement in a new
+    Python process."""
+    code = "import sys\n%s\nprint '\\n'.join(sys.modules)" % statement
+    output = subprocess.check_output(
+        [sys.executable, "-c", code], cwd=SCRIPTS_DIR)
+    return set(output.splitlines())
+
+
+def test_library_imports_lazily():
+    """Importing what every command needs doesn't import slow modules."""
+    modules = imported_modules(
+        "import recipe_robot_lib\n"
+        "from recipe_robot_lib import FoundationPlist, facts, tools")
+    assert_equal(modules.intersection(SLOW_MODULES), set())
+
+
+def test_startup_budget():
+    """Cold-start time of each command stays within its stored budget."""
+    with open(os.path.join(TEST_DIR, "startup_budget.json")) as budget_file:
+        budgets = json.load(budget_file)["budgets"]
+    for command, budget in sorted(budgets.items()):
+        elapsed = time_startup(
+            [sys.executable, RECIPE_ROBOT] + command.split())
+        assert_less_equal(
+            elapsed, budget,
+            "`recipe-robot %s` took %.2f seconds to start, over its budget "
+            "of %.2f seconds." % (command, elapsed, budget))
+
+
+class TestImportProfiler(object):
+    """Tests for ImportProfiler."""
+
+    def setup(self):
+        # Make sure the module is imported afresh.
+        sys.modules.pop("colorsys", None)
+        self.profiler = ImportProfiler()
+
+    def teardown(self):
+        self.profiler.stop()
+
+    def test_times_imports(self):
+        """Imports made while profiling are timed."""
+        self.profiler.start()
+        import colorsys  # pylint: disable=unused-variable
+        self.profiler.stop()
+        names = [timing[0] for timing in self.profiler.timings]
+        assert_in("colorsys", names)
+        assert_not_in(self.profiler, sys.meta_path)
+
+    def test_report(self):
+        """The report lists each timed module."""
+        self.profiler.start()
+        import colorsys  # pylint: disable=unused-variable
+        self.profiler.stop()
+        report = self.profiler.report()
+        assert_true(report.startswith("Imported 1 modules"))
+        assert_in("colorsys", report)
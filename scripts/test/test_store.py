@@ -0,0 +1,136 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_store.py
+
+Unit tests for the content-addressed download store.
+"""
+
+
+import os
+import shutil
+import stat
+import tempfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib.store import clone_file, DownloadStore, hash_file
+
+
+class TestDownloadStore(object):
+    """Tests for DownloadStore."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = DownloadStore(os.path.join(self.temp_dir, "store"),
+                                   max_size=10)
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def make_download(self, name, contents):
+        """Write a file as if it had just been downloaded."""
+        path = os.path.join(self.temp_dir, name)
+        with open(path, "wb") as openfile:
+            openfile.write(contents)
+        return path
+
+    def test_add_and_link_into(self):
+        """A stored download can be linked back out under its name."""
+        url = "https://example.com/download"
+        path = self.make_download("Example.dmg", "12345")
+        sha256 = self.store.add(url, path, etag='"abc"')
+        assert_equal(sha256, hash_file(path))
+        entry = self.store.lookup(url)
+        assert_equal(entry["filename"], "Example.dmg")
+        assert_equal(self.store.conditional_headers(entry),
+                     {"If-None-Match": '"abc"'})
+        dest = os.path.join(self.temp_dir, "linked.dmg")
+        self.store.link_into(entry, dest)
+        with open(dest, "rb") as openfile:
+            assert_equal(openfile.read(), "12345")
+
+    def test_link_into_replaces_existing_file(self):
+        """Linking over an earlier copy of the download works."""
+        url = "https://example.com/download"
+        path = self.make_download("Example.dmg", "12345")
+        self.store.add(url, path)
+        self.store.link_into(self.store.lookup(url), path)
+        with open(path, "rb") as openfile:
+            assert_equal(openfile.read(), "12345")
+
+    def test_identical_downloads_share_a_blob(self):
+        """Two URLs with the same contents use one blob."""
+        self.store.add("https://a.example.com/",
+                       self.make_download("a", "12345"))
+        self.store.add("https://b.example.com/",
+                       self.make_download("b", "12345"))
+        stats = self.store.stats()
+        assert_equal(stats["urls"], 2)
+        assert_equal(stats["blobs"], 1)
+
+    def test_evicts_least_recently_used(self):
+        """Old blobs are removed once the store exceeds max_size."""
+        self.store.add("https://a.example.com/",
+                       self.make_download("a", "123456"))
+        self.store.add("https://b.example.com/",
+                       self.make_download("b", "abcdef"))
+        assert_is_none(self.store.lookup("https://a.example.com/"))
+        assert_is_not_none(self.store.lookup("https://b.example.com/"))
+
+    def test_prune_to_zero(self):
+        """Pruning to a size of zero empties the store."""
+        self.store.add("https://a.example.com/",
+                       self.make_download("a", "12345"))
+        assert_equal(self.store.prune(0), 1)
+        assert_equal(self.store.stats()["blobs"], 0)
+
+    def test_verify_removes_corrupt_blobs(self):
+        """Blobs that no longer match their digest are removed."""
+        url = "https://example.com/download"
+        sha256 = self.store.add(url, self.make_download("a", "12345"))
+        blob_path = self.store.blob_path(sha256)
+        os.chmod(blob_path, stat.S_IRUSR | stat.S_IWUSR)
+        with open(blob_path, "wb") as openfile:
+            openfile.write("54321")
+        assert_equal(self.store.verify(), (1, [sha256]))
+        assert_is_none(self.store.lookup(url))
+
+
+class TestCloneFile(object):
+    """Tests for clone_file()."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_clone_or_nothing(self):
+        """Files are cloned, or left alone if cloning isn't supported."""
+        source = os.path.join(self.temp_dir, "source")
+        dest = os.path.join(self.temp_dir, "dest")
+        with open(source, "wb") as source_file:
+            source_file.write("contents")
+        if clone_file(source, dest):
+            with open(dest, "rb") as dest_file:
+                assert_equal(dest_file.read(), "contents")
+        else:
+            assert_false(os.path.exists(dest))
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_tools.py
+
+Unit tests for the file helpers in tools.
+"""
+
+
+import os
+import shutil
+import tempfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib.tools import atomic_write, ensure_dir
+
+
+class TestFileHelpers(object):
+    """Tests for ensure_dir and atomic_write."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_ensure_dir(self):
+        path = os.path.join(self.temp_dir, "a", "b")
+        assert_true(ensure_dir(path))
+        assert_true(os.path.isdir(path))
+        # Already there.
+        assert_true(ensure_dir(path))
+
+    def test_ensure_dir_failure(self):
+        path = os.path.join(self.temp_dir, "file")
+        open(path, "w").close()
+        assert_false(ensure_dir(os.path.join(path, "folder")))
+
+    def test_atomic_write(self):
+        path = os.path.join(self.temp_dir, "new", "file.json")
+        with atomic_write(path) as openfile:
+            openfile.write("new")
+        with open(path) as openfile:
+            assert_equal(openfile.read(), "new")
+        assert_equal(os.listdir(os.path.dirname(path)), ["file.json"])
+
+    def test_atomic_write_failure(self):
+        path = os.path.join(self.temp_dir, "file.json")
+        with open(path, "w") as openfile:
+            openfile.write("old")
+        with assert_raises(ValueError):
+            with atomic_write(path) as openfile:
+                openfile.write("partial")
+                raise ValueError("Something went wrong.")
+        with open(path) as openfile:
+            assert_equal(openfile.read(), "old")
+        assert_equal(os.listdir(self.temp_dir), ["file.json"])
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_tracing.py
+
+Unit tests for tracing spans.
+"""
+
+
+import json
+import os
+import shutil
+import tempfile
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import tracing
+from recipe_robot_lib.tracing import Span, Tracer
+
+
+class TestTracer(object):
+    """Tests for the Tracer class."""
+
+    def setup(self):
+        self.tracer = Tracer()
+
+    def test_nested_spans_have_parents(self):
+        with self.tracer.span("outer", "inspect") as outer:
+            with self.tracer.span("inner", "http") as inner:
+                pass
+        assert_is_none(outer.parent_id)
+        assert_equal(inner.parent_id, outer.span_id)
+        assert_equal([item.name for item in self.tracer.spans],
+                     ["inner", "outer"])
+
+    def test_span_args_can_be_added(self):
+        with self.tracer.span("hdiutil", "subprocess") as trace:
+            trace.args["exitcode"] = 0
+        assert_equal(self.tracer.spans[0].args, {"exitcode": 0})
+
+    def test_span_is_recorded_on_error(self):
+        try:
+            with self.tracer.span("broken"):
+                raise ValueError
+        except ValueError:
+            pass
+        assert_equal(len(self.tracer.spans), 1)
+        assert_is_not_none(self.tracer.spans[0].end)
+
+    def test_add_span(self):
+        with self.tracer.span("outer") as outer:
+            self.tracer.add_span("GET example.com", "http", 10.0, 10.5,
+                                 status=200)
+        added = self.tracer.spans[0]
+        assert_equal(added.parent_id, outer.span_id)
+        assert_almost_equal(added.duration, 0.5)
+        assert_equal(added.args, {"status": 200})
+
+    def test_summarize_uses_self_time(self):
+        outer = Span("outer", "inspect", {}, 1)
+        outer.start, outer.end = 0.0, 3.0
+        inner = Span("inner", "http", {}, 2, parent_id=1)
+        inner.start, inner.end = 1.0, 3.0
+        self.tracer.spans.extend([inner, outer])
+
+        summary = self.tracer.summarize()
+        assert_almost_equal(summary["seconds"], 3.0)
+        assert_almost_equal(summary["categories"]["inspect"]["seconds"], 1.0)
+        assert_almost_equal(summary["categories"]["http"]["seconds"], 2.0)
+        assert_equal(summary["slowest"][0]["name"], "inner")
+
+    def test_summarize_without_spans(self):
+        assert_equal(self.tracer.summarize(),
+                     {"seconds": 0.0, "categories": {}, "slowest": []})
+
+    def test_chrome_events(self):
+        self.tracer.add_span("GET example.com", "http", 2.0, 2.25,
+                             url=u"https://example.com", conn=object())
+        event = self.tracer.chrome_events()[0]
+        assert_equal(event["ph"], "X")
+        assert_equal(event["cat"], "http")
+        assert_equal(event["ts"], 2000000)
+        assert_equal(event["dur"], 250000)
+        assert_equal(event["pid"], os.getpid())
+        assert_is_instance(event["args"]["conn"], str)
+        json.dumps(event)
+
+    def test_reset(self):
+        with self.tracer.span("old"):
+            pass
+        self.tracer.reset()
+        assert_equal(self.tracer.spans, [])
+
+
+class TestModuleFunctions(object):
+    """Tests for the shared Tracer's functions."""
+
+    def setup(self):
+        tracing.tracer.reset()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        tracing.tracer.reset()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_traced(self):
+        @tracing.traced("generate")
+        def generate_app_recipe():
+            """Return something."""
+            return 42
+
+        assert_equal(generate_app_recipe(), 42)
+        assert_equal(generate_app_recipe.__name__, "generate_app_recipe")
+        span = tracing.tracer.spans[0]
+        assert_equal((span.name, span.category),
+                     ("generate_app_recipe", "generate"))
+
+    def test_write_chrome_trace(self):
+        with tracing.span("download", "download", url="https://example.com"):
+            pass
+        path = os.path.join(self.tmp_dir, "trace.json")
+        tracing.write_chrome_trace(path)
+        with open(path) as trace_file:
+            trace = json.load(trace_file)
+        assert_equal(len(trace["traceEvents"]), 1)
+        assert_equal(trace["traceEvents"][0]["args"]["url"],
+                     "https://example.com")
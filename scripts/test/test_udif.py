@@ -0,0 +1,172 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_udif.py
+
+Unit tests for reading UDIF disk images.
+"""
+
+
+import bz2
+import os
+import plistlib
+import shutil
+import struct
+import tempfile
+import zlib
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import udif
+
+
+def adc_literals(data):
+    """Return data encoded as ADC literal runs (no back references)."""
+    return "".join(chr(0x80 | (len(data[start:start + 128]) - 1)) +
+                   data[start:start + 128]
+                   for start in range(0, len(data), 128))
+
+
+COMPRESSORS = {
+    udif.RAW: lambda data: data,
+    udif.ZLIB: zlib.compress,
+    udif.BZIP2: bz2.compress,
+    udif.ADC: adc_literals,
+}
+
+
+def make_udif(path, disk, chunk_sectors=4, chunk_types=(udif.ZLIB,)):
+    """Write a UDIF image of disk, as one partition.
+
+    Args:
+        path: Where to write the image.
+        disk: The contents of the disk. Its length must be a multiple of
+            the sector size.
+        chunk_sectors: Number of sectors in each chunk.
+        chunk_types: Chunk types to use, in turn. Chunks that are all
+            zeros are omitted (as ZERO_FILL chunks).
+    """
+    sectors = len(disk) // udif.SECTOR_SIZE
+    data_fork = []
+    offset = 0
+    chunks = []
+    for index, sector in enumerate(range(0, sectors, chunk_sectors)):
+        count = min(chunk_sectors, sectors - sector)
+        chunk = disk[sector * udif.SECTOR_SIZE:
+                     (sector + count) * udif.SECTOR_SIZE]
+        if chunk.count("\x00") == len(chunk):
+            chunks.append((udif.ZERO_FILL, sector, count, offset, 0))
+            continue
+        chunk_type = chunk_types[index % len(chunk_types)]
+        compressed = COMPRESSORS[chunk_type](chunk)
+        chunks.append((chunk_type, sector, count, offset, len(compressed)))
+        data_fork.append(compressed)
+        offset += len(compressed)
+    chunks.append((udif.TERMINATOR, sectors, 0, offset, 0))
+
+    mish = struct.pack(udif.MISH_FORMAT, "mish", 1, 0, sectors, 0, 0, 0,
+                       "", "", len(chunks))
+    mish += "".join(struct.pack(udif.CHUNK_FORMAT, chunk_type, 0, sector,
+                                count, chunk_offset, length)
+                    for chunk_type, sector, count, chunk_offset, length
+                    in chunks)
+    xml = plistlib.writePlistToString({"resource-fork": {"blkx": [{
+        "Name": "disk image (Apple_HFS : 1)",
+        "Data": plistlib.Data(mish)}]}})
+
+    data_fork = "".join(data_fork)
+    koly = bytearray(udif.KOLY_SIZE)
+    koly[0:12] = struct.pack(">4sII", "koly", 4, udif.KOLY_SIZE)
+    struct.pack_into(">QQ", koly, udif.KOLY_DATA_FORK_OFFSET, 0,
+                     len(data_fork))
+    struct.pack_into(">QQ", koly, udif.KOLY_XML_OFFSET, len(data_fork),
+                     len(xml))
+    struct.pack_into(">Q", koly, udif.KOLY_SECTOR_COUNT, sectors)
+    with open(path, "wb") as image_file:
+        image_file.write(data_fork + xml + str(koly))
+
+
+class TestUdifImage(object):
+    """Tests for UdifImage."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "test.dmg")
+        # 40 sectors: random data, with a run of zeros in the middle.
+        self.disk = (os.urandom(12 * udif.SECTOR_SIZE) +
+                     "\x00" * 16 * udif.SECTOR_SIZE +
+                     os.urandom(12 * udif.SECTOR_SIZE))
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_read(self):
+        """The disk reads back the same, whatever the chunk types."""
+        make_udif(self.path, self.disk, chunk_types=sorted(COMPRESSORS))
+        with udif.UdifImage(self.path) as image:
+            assert_equal(image.size, len(self.disk))
+            assert_equal(image.read(), self.disk)
+
+    def test_seek(self):
+        """Reads can start and end anywhere, including across chunks."""
+        make_udif(self.path, self.disk, chunk_sectors=3)
+        with udif.UdifImage(self.path) as image:
+            for offset, size in ((0, 10), (1000, 5000), (6000, 10000),
+                                 (len(self.disk) - 10, 100)):
+                image.seek(offset)
+                assert_equal(image.read(size),
+                             self.disk[offset:offset + size])
+            image.seek(-10, os.SEEK_END)
+            assert_equal(image.tell(), len(self.disk) - 10)
+
+    def test_partitions(self):
+        """Partitions are listed with their names and offsets."""
+        make_udif(self.path, self.disk)
+        with udif.UdifImage(self.path) as image:
+            assert_equal([(partition.name, partition.offset)
+                          for partition in image.partitions],
+                         [("disk image (Apple_HFS : 1)", 0)])
+
+    def test_not_udif(self):
+        """Other files are reported as UdifError."""
+        with open(self.path, "wb") as image_file:
+            image_file.write(self.disk)
+        assert_raises(udif.UdifError, udif.UdifImage, self.path)
+
+    def test_unsupported_compression(self):
+        """Chunks compressed with unsupported methods are reported."""
+        make_udif(self.path, self.disk, chunk_types=(udif.RAW,))
+        with udif.UdifImage(self.path) as image:
+            # pylint: disable=protected-access
+            image._chunks[0] = (image._chunks[0][:2] + (udif.LZFSE,) +
+                                image._chunks[0][3:])
+            assert_raises(udif.UdifError, image.read, 10)
+
+
+class TestAdcDecompress(object):
+    """Tests for adc_decompress()."""
+
+    def test_back_references(self):
+        """Literal runs and short and long back references decode."""
+        data = ("\x83abcd" +  # Literal "abcd".
+                chr((6 - 3) << 2) + "\x03" +  # Copy 6 bytes from 4 back.
+                chr(0x40 | (10 - 4)) + "\x00\x00")  # Copy 10 from 1 back.
+        assert_equal(udif.adc_decompress(data, 20),
+                     "abcd" + "abcdab" + "b" * 10)
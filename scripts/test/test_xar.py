@@ -0,0 +1,166 @@
+#!/usr/bin/python
+# This Python file uses the following encoding: utf-8
+
+# Recipe Robot
+# Copyright 2015-2017 Elliot Jordan, Shea G. Craig, and Eldon Ahrold
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""
+test_xar.py
+
+Unit tests for reading xar archives (flat packages).
+"""
+
+
+import bz2
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from xml.sax.saxutils import escape
+
+from nose.tools import *  # pylint: disable=unused-wildcard-import, wildcard-import
+
+from recipe_robot_lib import xar
+
+
+ENCODERS = {
+    "application/octet-stream": lambda data: data,
+    "application/x-gzip": zlib.compress,
+    "application/x-bzip2": bz2.compress,
+}
+
+
+def make_xar(path, members):
+    """Write a xar archive.
+
+    Args:
+        path: Where to write the archive.
+        members: List of (name, data, encoding) tuples. Folders in the
+            names are added as directory members.
+    """
+    heap = []
+    heap_size = 0
+    tree = {}
+    for name, data, encoding in members:
+        parts = name.split("/")
+        folder = tree
+        for part in parts[:-1]:
+            folder = folder.setdefault(part, {})
+        encoded = ENCODERS[encoding](data)
+        folder[parts[-1]] = (heap_size, encoded, len(data), encoding)
+        heap.append(encoded)
+        heap_size += len(encoded)
+
+    ids = [0]
+
+    def file_xml(name, value):
+        """Return the TOC XML for one member."""
+        ids[0] += 1
+        xml = '<file id="%d"><name>%s</name>' % (ids[0], escape(name))
+        if isinstance(value, dict):
+            xml += "<type>directory</type>"
+            xml += "".join(file_xml(key, value[key]) for key in sorted(value))
+        else:
+            offset, encoded, size, encoding = value
+            xml += ("<type>file</type><data><offset>%d</offset>"
+                    "<length>%d</length><size>%d</size>"
+                    '<encoding style="%s"/></data>' %
+                    (offset, len(encoded), size, encoding))
+        return xml + "</file>"
+
+    toc = ('<?xml version="1.0" encoding="UTF-8"?><xar><toc>%s</toc></xar>' %
+           "".join(file_xml(key, tree[key]) for key in sorted(tree)))
+    toc_data = zlib.compress(toc)
+    header = struct.pack(">4sHHQQI", "xar!", 28, 1, len(toc_data), len(toc), 0)
+    with open(path, "wb") as xar_file:
+        xar_file.write(header + toc_data + "".join(heap))
+
+
+class TestXarArchive(object):
+    """Tests for XarArchive."""
+
+    def setup(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "Example.pkg")
+        self.payload = os.urandom(300 * 1024)
+        make_xar(self.path, [
+            ("Distribution", "<installer-gui-script/>", "application/x-gzip"),
+            ("Example.pkg/PackageInfo", '<pkg-info identifier="com.example"/>',
+             "application/x-gzip"),
+            ("Example.pkg/Bom", "BOMStore", "application/x-bzip2"),
+            ("Example.pkg/Payload", self.payload, "application/octet-stream"),
+        ])
+
+    def teardown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_names(self):
+        """Members are listed with their full paths."""
+        archive = xar.XarArchive(self.path)
+        assert_equal(archive.names(), [
+            "Distribution", "Example.pkg", "Example.pkg/Bom",
+            "Example.pkg/PackageInfo", "Example.pkg/Payload"])
+        assert_true(archive.getmember("Example.pkg").isdir())
+        archive.close()
+
+    def test_read_encodings(self):
+        """Members are decoded according to their encoding."""
+        with xar.XarArchive(self.path) as archive:
+            assert_equal(archive.read("Example.pkg/PackageInfo"),
+                         '<pkg-info identifier="com.example"/>')
+            assert_equal(archive.read("Example.pkg/Bom"), "BOMStore")
+            assert_equal(archive.read("Example.pkg/Payload"), self.payload)
+
+    def test_open_is_lazy(self):
+        """Opened members are read a block at a time."""
+        with xar.XarArchive(self.path) as archive:
+            payload = archive.open("Example.pkg/Payload")
+            assert_equal(payload.read(10), self.payload[:10])
+            # Reading another member in between doesn't disturb it.
+            assert_equal(archive.read("Distribution"),
+                         "<installer-gui-script/>")
+            assert_equal(payload.read(), self.payload[10:])
+            assert_equal(payload.tell(), len(self.payload))
+
+    def test_extract(self):
+        """Members can be extracted to a file."""
+        dest_path = os.path.join(self.temp_dir, "Payload")
+        with xar.XarArchive(self.path) as archive:
+            archive.extract("Example.pkg/Payload", dest_path)
+        with open(dest_path, "rb") as payload_file:
+            assert_equal(payload_file.read(), self.payload)
+
+    def test_missing_member(self):
+        """Opening a missing member raises KeyError."""
+        with xar.XarArchive(self.path) as archive:
+            assert_raises(KeyError, archive.open, "Payload")
+            assert_raises(xar.XarError, archive.open, "Example.pkg")
+
+    def test_not_xar(self):
+        """Other files are rejected."""
+        path = os.path.join(self.temp_dir, "not.pkg")
+        with open(path, "wb") as openfile:
+            openfile.write("PK\x03\x04" + "\x00" * 100)
+        assert_raises(xar.XarError, xar.XarArchive, path)
+
+    def test_corrupt_toc(self):
+        """An unreadable table of contents is reported as XarError."""
+        path = os.path.join(self.temp_dir, "corrupt.pkg")
+        with open(path, "wb") as openfile:
+            openfile.write(struct.pack(">4sHHQQI", "xar!", 28, 1, 10, 10, 0) +
+                           "not zlib!!")
+        assert_raises(xar.XarError, xar.XarArchive, path)